@@ -91,6 +91,7 @@ import json
 import datetime
 import boto3
 import botocore
+import rule_runtime
 
 ##############
 # Parameters #
@@ -132,9 +133,8 @@ def evaluate_compliance(event, configuration_item, valid_rule_parameters):
     if not gateways_list:
         return None
 
-    ec2_client = get_client('ec2', event)
-    all_vpc_in_account = ec2_client.describe_vpcs()
-    all_vpce_in_account = get_all_vpce(ec2_client)
+    # The VPCs and VPC endpoints of the account, indexed by ID, see rule_runtime.network
+    network_inventory = rule_runtime.get_network_inventory(get_client('ec2', event), event['accountId'])
 
     evaluations = []
     for gateway in gateways_list:
@@ -165,14 +165,14 @@ def evaluate_compliance(event, configuration_item, valid_rule_parameters):
 
                 if allow_statement_has_attrib(statement, 'aws:sourceVpc'):
                     vpc_list = statement['Condition']['StringEquals']['aws:sourceVpc']
-                    if not is_resource_in_same_account(vpc_list, 'VpcId', all_vpc_in_account['Vpcs']):
+                    if not is_resource_in_same_account(vpc_list, network_inventory.has_vpcs):
                         evaluations.append(build_evaluation(gateway['id'], 'NON_COMPLIANT', event, annotation='The VPCs are not in the same account than this API Gateway.'))
                         is_gateway_compliant = False
                         break
 
                 if allow_statement_has_attrib(statement, 'aws:sourceVpce'):
                     vpce_list = statement['Condition']['StringEquals']['aws:sourceVpce']
-                    if not is_resource_in_same_account(vpce_list, 'VpcEndpointId', all_vpce_in_account):
+                    if not is_resource_in_same_account(vpce_list, network_inventory.has_endpoints):
                         evaluations.append(build_evaluation(gateway['id'], 'NON_COMPLIANT', event, annotation='The VPCEs are not in the same account than this API Gateway.'))
                         is_gateway_compliant = False
                         break
@@ -205,38 +205,14 @@ def allow_statement_has_attrib(statement, attrib_value):
         return False
     return True
 
-def is_resource_in_same_account(resource, key_id, all_resources_in_account):
+def is_resource_in_same_account(resource, is_in_account):
     resource_list = []
     if not isinstance(resource, list):
         resource_list.append(resource)
     else:
         resource_list = resource
 
-    if not resource_list:
-        return True
-
-    for current_resource in resource_list:
-        if not in_dictlist(key_id, str(current_resource), all_resources_in_account):
-            return False
-    return True
-
-def in_dictlist(key, value, my_dictlist):
-    for this in my_dictlist:
-        if this[key] == value:
-            return True
-    return False
-
-def get_all_vpce(client):
-    vpce_list = client.describe_vpc_endpoints(MaxResults=1000)
-    all_vpce_list = []
-    while True:
-        for item in vpce_list['VpcEndpoints']:
-            all_vpce_list.append(item)
-        if 'NextToken' in vpce_list:
-            vpce_list = client.describe_vpc_endpoints(NextToken=vpce_list['NextToken'], MaxResults=1000)
-        else:
-            break
-    return all_vpce_list
+    return is_in_account(resource_list)
 
 def get_all_api_gateway(client):
     rest_apis_list = client.get_rest_apis(limit=500)
@@ -4,6 +4,7 @@
 # Created with the Rule Development Kit: https://github.com/awslabs/aws-config-rdk
 # Can be used stand-alone or with the Rule Compliance Engine: https://github.com/awslabs/aws-config-engine-for-compliance-as-code
 #
+import os
 import sys
 import unittest
 try:
@@ -44,6 +45,7 @@ class Boto3Mock():
             raise Exception("Attempting to create an unknown client")
 
 sys.modules['boto3'] = Boto3Mock()
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
 rule = __import__('API_GW_PRIVATE_RESTRICTED')
 
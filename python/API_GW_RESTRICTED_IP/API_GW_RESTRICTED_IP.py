@@ -91,6 +91,7 @@ import datetime
 import ipaddress
 import boto3
 import botocore
+import rule_runtime
 
 ##############
 # Parameters #
@@ -174,21 +175,8 @@ def is_policy_allows_more_than_whitelist(policy, whitelist):
     return False
 
 def is_ip_in_whitelist(ip_list_or_str, whitelist):
-
-    all_network_in_ip_list = get_all_ip_networks(ip_list_or_str)
-    all_network_in_whitelist = get_all_ip_networks(whitelist)
-    
-    for net in all_network_in_ip_list:
-        is_network_included = False
-        for net_whitelisted in  all_network_in_whitelist:
-            try:
-                list(net_whitelisted.address_exclude(net))
-                is_network_included = True
-            except:
-                continue
-        if not is_network_included:
-            return False
-    return True
+    # The whitelist is merged into sorted ranges once per container, see rule_runtime.cidr
+    return rule_runtime.get_cidr_set(whitelist).contains_all(get_all_ip_networks(ip_list_or_str))
 
 def get_all_ip_networks(ip_list_or_str):                
     ip_network_to_return = []
@@ -1,3 +1,4 @@
+import os
 import sys
 import unittest
 try:
@@ -34,6 +35,8 @@ class Boto3Mock():
 
 sys.modules['boto3'] = Boto3Mock()
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
 RULE = __import__('CLOUDWATCH_LOG_GROUP_ENCRYPTED')
 
 class ComplianceTest(unittest.TestCase):
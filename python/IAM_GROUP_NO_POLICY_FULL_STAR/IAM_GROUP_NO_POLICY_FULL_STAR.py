@@ -13,10 +13,11 @@
    iam-group-no-policy-full-star
 
  Description:
-   Check whether IAM Groups have an IAM policy with all permission enabled (or "Action:*"). IAM Policy includes the AWS-managed policy named AdministratorAccess, Customer-managed policies and inline policies.
+   Check whether IAM Groups have an IAM policy allowing every action on every resource ("Action:*", or a "NotAction", on "Resource:*"). IAM Policy includes the AWS-managed policy named AdministratorAccess, Customer-managed policies and inline policies.
 
  Trigger:
    Configuration Change on AWS::IAM::Group
+   Periodic (every 24 hours): evaluates every group of the account from one IAM authorization snapshot
 
  Reports on:
    AWS::IAM::Group
@@ -27,15 +28,16 @@
  Feature:
    In order to: ensure that policies attached to any group does not have full administrative privileges
             As: a Security Officer
-        I want: to ensure that no policy have "*" in their action.
+        I want: to ensure that no policy allows every action on every resource.
 
  Scenarios:
    Scenario 1:
-     Given: Any allow <Policy> statements of group has Action as "*"
+     Given: Any allow <Policy> statements of group has Action as "*" (or "*:*"), or a NotAction not excluding "*"
+       And: This statement has Resource as "*", or no Resource
       Then: Return NON_COMPLIANT
 
    Scenario 2:
-     Given: All allow <Policy> statments of group do not have Action as "*"
+     Given: No allow <Policy> statement of group matches Scenario 1 (e.g. Action as "*" on a specific Resource)
       Then: Return COMPLIANT
 
    Scenario 3:
@@ -52,6 +54,7 @@ import json
 import datetime
 import boto3
 import botocore
+import rule_runtime
 
 ##############
 # Parameters #
@@ -63,6 +66,9 @@ DEFAULT_RESOURCE_TYPE = 'AWS::IAM::Group'
 # Set to True to get the lambda to assume the Role attached on the Config Service (useful for cross-account).
 ASSUME_ROLE_MODE = False
 
+# AWS managed policies are left out of the snapshot and fetched once each, when attached
+AUTHORIZATION_SNAPSHOT_FILTERS = ['Group', 'LocalManagedPolicy']
+
 #############
 # Main Code #
 #############
@@ -87,27 +93,74 @@ def evaluate_compliance(event, configuration_item, valid_rule_parameters):
     3 -- if None or an empty string, list or dict is returned, the Boilerplate code will put a "shadow" evaluation to feedback that the evaluation took place properly
     """
 
-    group_name = configuration_item['configuration']['groupName']
     iam_client = get_client('iam', event)
 
-    # Inline policies
-    inline_policy_names = get_all_group_inline_policy_names(iam_client, group_name)
-    for policy_name in inline_policy_names:
-        policy_document = iam_client.get_group_policy(GroupName=group_name, PolicyName=policy_name)['PolicyDocument']
-        if is_statements_include_full_star_allow(policy_document['Statement']):
-            return build_evaluation_from_config_item(configuration_item, "NON_COMPLIANT", annotation='An inline policy "' + policy_name + '" attached to the group "' + group_name + '" has full star allow permissions.')
-
-    # Managed policies
-    managed_policy_arn_and_name = get_all_group_managed_policy_arn_and_name(iam_client, group_name)
-    for policy_arn, policy_name in managed_policy_arn_and_name.items():
-        get_policy = iam_client.get_policy(PolicyArn=policy_arn)
-        version = get_policy['Policy']['DefaultVersionId']
-        get_policy_version = iam_client.get_policy_version(PolicyArn=policy_arn, VersionId=version)
-        if is_statements_include_full_star_allow(get_policy_version['PolicyVersion']['Document']['Statement']):
-            return build_evaluation_from_config_item(configuration_item, "NON_COMPLIANT", annotation='A managed policy with name "' + policy_name + '" attached to the group "' + group_name + '" has full star allow permissions.')
+    # A periodic trigger evaluates every group from one authorization snapshot
+    if configuration_item is None:
+        return evaluate_all_groups(event, iam_client)
+
+    group_name = configuration_item['configuration']['groupName']
+    annotation = get_full_star_annotation(group_name, iter_group_inline_policies(iam_client, group_name), iter_group_managed_policies(iam_client, group_name))
+    if annotation:
+        return build_evaluation_from_config_item(configuration_item, "NON_COMPLIANT", annotation=annotation)
 
     return "COMPLIANT"
 
+def evaluate_all_groups(event, iam_client):
+    evaluations = []
+    snapshot = rule_runtime.get_authorization_snapshot(iam_client, filters=AUTHORIZATION_SNAPSHOT_FILTERS)
+    groups = snapshot.groups() if snapshot else get_all_groups(iam_client)
+    for group in groups:
+        if snapshot:
+            inline_policies = snapshot.get_inline_policies(group)
+            managed_policies = ((policy['PolicyName'], snapshot.get_policy_document(policy['PolicyArn'])) for policy in snapshot.get_attached_policies(group))
+        else:
+            inline_policies = iter_group_inline_policies(iam_client, group['GroupName'])
+            managed_policies = iter_group_managed_policies(iam_client, group['GroupName'])
+        annotation = get_full_star_annotation(group['GroupName'], inline_policies, managed_policies)
+        if annotation:
+            evaluations.append(build_evaluation(group['GroupId'], "NON_COMPLIANT", event, annotation=annotation))
+        else:
+            evaluations.append(build_evaluation(group['GroupId'], "COMPLIANT", event))
+    return evaluations
+
+def get_full_star_annotation(group_name, inline_policies, managed_policies):
+    """Return the annotation of the first policy of the group with full star allow permissions, or None.
+
+    Keyword arguments:
+    group_name -- the name of the group
+    inline_policies -- the (policy name, policy document) of the inline policies of the group
+    managed_policies -- the (policy name, policy document) of the managed policies attached to the group
+    """
+    for policy_name, policy_document in inline_policies:
+        if rule_runtime.compile_policy(policy_document).allows_full_star():
+            return 'An inline policy "' + policy_name + '" attached to the group "' + group_name + '" has full star allow permissions.'
+
+    for policy_name, policy_document in managed_policies:
+        if rule_runtime.compile_policy(policy_document).allows_full_star():
+            return 'A managed policy with name "' + policy_name + '" attached to the group "' + group_name + '" has full star allow permissions.'
+
+    return None
+
+def iter_group_inline_policies(iam_client, group_name):
+    for policy_name in get_all_group_inline_policy_names(iam_client, group_name):
+        yield policy_name, iam_client.get_group_policy(GroupName=group_name, PolicyName=policy_name)['PolicyDocument']
+
+def iter_group_managed_policies(iam_client, group_name):
+    for policy_arn, policy_name in get_all_group_managed_policy_arn_and_name(iam_client, group_name).items():
+        yield policy_name, rule_runtime.get_managed_policy_document(iam_client, policy_arn)
+
+def get_all_groups(iam_client):
+    all_groups = []
+    list_groups = iam_client.list_groups(MaxItems=1000)
+    while True:
+        all_groups += list_groups['Groups']
+        if 'Marker' in list_groups:
+            list_groups = iam_client.list_groups(MaxItems=1000, Marker=list_groups['Marker'])
+        else:
+            break
+    return all_groups
+
 def get_all_group_inline_policy_names(iam_client, group_name):
     all_group_inline_policies = []
     list_policy_names = iam_client.list_group_policies(GroupName=group_name, MaxItems=1000)
@@ -131,35 +184,6 @@ def get_all_group_managed_policy_arn_and_name(iam_client, group_name):
             break
     return all_group_managed_policies_arn_and_name
 
-def is_statements_include_full_star_allow(statements):
-    statement_list = []
-    if isinstance(statements, dict):
-        statement_list = [statements]
-    elif isinstance(statements, list):
-        statement_list = statements
-    else:
-        print("Not recognized statement type:")
-        print(statements)
-        return False
-    
-    for statement in statement_list:        
-        if statement['Effect'] == 'Deny':
-            continue
-
-        if 'Action' not in statement:
-            print("No 'Action' in statement")
-            print(statement)
-            continue
-
-        if isinstance(statement['Action'], list):
-            for action in statement['Action']:
-                if action == "*":
-                    return True
-        else:
-            if statement['Action'] == "*":
-                return True
-    return False
-
 def evaluate_parameters(rule_parameters):
     """Evaluate the rule parameters dictionary validity. Raise a ValueError for invalid parameters.
 
@@ -9,13 +9,17 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for
 # the specific language governing permissions and limitations under the License.
 
+import json
+import os
 import sys
+import tempfile
 import unittest
 try:
-    from unittest.mock import MagicMock
+    from unittest.mock import MagicMock, patch
 except ImportError:
-    from mock import MagicMock
+    from mock import MagicMock, patch
 import botocore
+from botocore.exceptions import ClientError
 
 ##############
 # Parameters #
@@ -44,6 +48,11 @@ class Boto3Mock():
         raise Exception("Attempting to create an unknown client")
 
 sys.modules['boto3'] = Boto3Mock()
+# Without the authorization snapshot, the rule lists the policies of every user and group
+ACCESS_DENIED = ClientError({'Error': {'Code': 'AccessDenied', 'Message': 'denied'}}, 'GetAccountAuthorizationDetails')
+IAM_CLIENT_MOCK.get_account_authorization_details = MagicMock(side_effect=ACCESS_DENIED)
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
 RULE = __import__('IAM_IP_RESTRICTION')
 
@@ -177,6 +186,17 @@ class ComplianceTest(unittest.TestCase):
         resp_expected.append(build_expected_response("NON_COMPLIANT", self.user_not_whitelist['UserId'], annotation=f"IAM Policy includes more than maximum ip addresses: {RULE.DEFAULT_MAX_IP_NUMS+1}"))
         assert_successful_evaluation(self, response, resp_expected, 2)
 
+    def test_scenario15_group_policies_fetched_once_for_all_users(self):
+        self.__mock_group_inline_policy_ip_denied()
+        response = RULE.lambda_handler(build_lambda_scheduled_event(), {})
+        resp_expected = []
+        resp_expected.append(build_expected_response("COMPLIANT", self.user_whitelist['UserId']))
+        resp_expected.append(build_expected_response("COMPLIANT", self.user_not_whitelist['UserId']))
+        assert_successful_evaluation(self, response, resp_expected, 2)
+        self.assertEqual(2, IAM_CLIENT_MOCK.list_groups_for_user.call_count)
+        IAM_CLIENT_MOCK.list_group_policies.assert_called_once_with(GroupName='sampleGroup')
+        IAM_CLIENT_MOCK.get_group_policy.assert_called_once_with(GroupName='sampleGroup', PolicyName=self.user_policy_name)
+
     def __mock_only_user_inline_policy_not_ip_allowed(self):
         self.__mock_base()
         ip_allowed_policy = self.__ip_restricted_policy('Allow')
@@ -320,10 +340,88 @@ class ComplianceTest(unittest.TestCase):
         return policy
 
 
+class AuthorizationSnapshotTest(unittest.TestCase):
+
+    allow_all_document = {'Version': '2012-10-17', 'Statement': [{'Effect': 'Allow', 'Action': '*', 'Resource': '*'}]}
+    ip_denied_document = {'Version': '2012-10-17', 'Statement': [{'Effect': 'Deny', 'Action': '*', 'Resource': '*',
+                                                                  'Condition': {'NotIpAddress': {'aws:SourceIp': ['192.169.30.1/32']}}}]}
+    authorization_details = {
+        'UserDetailList': [
+            {'UserName': 'sampleUser1', 'UserId': 'AIDAJYPPIFB65RV8YYLDU', 'Arn': 'arn:aws:iam::123456789012:user/sampleUser1',
+             'GroupList': [], 'UserPolicyList': [], 'AttachedManagedPolicies': []},
+            {'UserName': 'sampleUser2', 'UserId': 'AIDAJYPPIFB65RV8YYLDV', 'Arn': 'arn:aws:iam::123456789012:user/sampleUser2',
+             'GroupList': ['restrictedGroup'],
+             'UserPolicyList': [{'PolicyName': 'sampleInline', 'PolicyDocument': allow_all_document}],
+             'AttachedManagedPolicies': [{'PolicyName': 'AdministratorAccess', 'PolicyArn': 'arn:aws:iam::aws:policy/AdministratorAccess'}]},
+            {'UserName': 'sampleUser3', 'UserId': 'AIDAJYPPIFB65RV8YYLDW', 'Arn': 'arn:aws:iam::123456789012:user/sampleUser3',
+             'GroupList': [], 'UserPolicyList': [], 'AttachedManagedPolicies': [{'PolicyName': 'AdministratorAccess', 'PolicyArn': 'arn:aws:iam::aws:policy/AdministratorAccess'}]}],
+        'GroupDetailList': [
+            {'GroupName': 'restrictedGroup', 'Arn': 'arn:aws:iam::123456789012:group/restrictedGroup', 'GroupPolicyList': [],
+             'AttachedManagedPolicies': [{'PolicyName': 'ipDenied', 'PolicyArn': 'arn:aws:iam::123456789012:policy/ipDenied'}]}],
+        'RoleDetailList': [],
+        'Policies': [{'PolicyName': 'ipDenied', 'Arn': 'arn:aws:iam::123456789012:policy/ipDenied', 'DefaultVersionId': 'v1',
+                      'PolicyVersionList': [{'VersionId': 'v1', 'IsDefaultVersion': True, 'Document': ip_denied_document}]}],
+        'IsTruncated': False}
+
+    def setUp(self):
+        CONFIG_CLIENT_MOCK.reset_mock()
+        IAM_CLIENT_MOCK.reset_mock()
+        IAM_CLIENT_MOCK.get_account_authorization_details = MagicMock(return_value=self.authorization_details)
+        RULE.rule_runtime.POLICY_DOCUMENT_CACHE.clear()
+
+    def tearDown(self):
+        IAM_CLIENT_MOCK.get_account_authorization_details = MagicMock(side_effect=ACCESS_DENIED)
+
+    def test_users_and_groups_from_snapshot(self):
+        IAM_CLIENT_MOCK.get_policy = MagicMock(return_value={'Policy': {'DefaultVersionId': 'v1'}})
+        IAM_CLIENT_MOCK.get_policy_version = MagicMock(return_value={'PolicyVersion': {'Document': self.allow_all_document}})
+        response = RULE.lambda_handler(build_lambda_scheduled_event('{"WhitelistedUserNames":"sampleUser1"}'), {})
+        resp_expected = []
+        resp_expected.append(build_expected_response("COMPLIANT", 'AIDAJYPPIFB65RV8YYLDU', annotation="This user sampleUser1 is whitelisted."))
+        resp_expected.append(build_expected_response("COMPLIANT", 'AIDAJYPPIFB65RV8YYLDV'))
+        resp_expected.append(build_expected_response("NON_COMPLIANT", 'AIDAJYPPIFB65RV8YYLDW', annotation="This user sampleUser3 is not IP restricted."))
+        assert_successful_evaluation(self, response, resp_expected, 3)
+        IAM_CLIENT_MOCK.list_users.assert_not_called()
+        IAM_CLIENT_MOCK.list_user_policies.assert_not_called()
+        IAM_CLIENT_MOCK.list_groups_for_user.assert_not_called()
+        # The AWS managed policy is not in the snapshot: it is fetched once for both users
+        IAM_CLIENT_MOCK.get_policy.assert_called_once_with(PolicyArn='arn:aws:iam::aws:policy/AdministratorAccess')
+
+    def test_incremental_evaluation_of_changed_users(self):
+        IAM_CLIENT_MOCK.get_policy = MagicMock(return_value={'Policy': {'DefaultVersionId': 'v1'}})
+        IAM_CLIENT_MOCK.get_policy_version = MagicMock(return_value={'PolicyVersion': {'Document': self.allow_all_document}})
+        IAM_CLIENT_MOCK.list_users = MagicMock(return_value={'Users': self.authorization_details['UserDetailList']})
+        CONFIG_CLIENT_MOCK.put_evaluations = MagicMock(return_value={'FailedEvaluations': []})
+        state_ids = {'AWS::IAM::User': {'AIDAJYPPIFB65RV8YYLDU': 1, 'AIDAJYPPIFB65RV8YYLDV': 1, 'AIDAJYPPIFB65RV8YYLDW': 1}, 'AWS::IAM::Group': {'AGPA1': 1}, 'AWS::IAM::Policy': {}}
+        CONFIG_CLIENT_MOCK.select_resource_config = MagicMock(side_effect=lambda Expression: build_state_ids_response(state_ids, Expression))
+        with tempfile.TemporaryDirectory() as directory, \
+                patch.dict('os.environ', {'INCREMENTAL_EVALUATION': 'true'}), \
+                patch.object(RULE.rule_runtime.incremental, 'DEFAULT_INCREMENTAL_DIRECTORY', directory):
+            with patch.object(RULE, 'MAX_USERS_WITHOUT_SNAPSHOT', 0):
+                self.assertEqual(3, len(RULE.lambda_handler(build_lambda_scheduled_event(), {})))
+            # The policies of a single changed user are read without the snapshot
+            state_ids['AWS::IAM::User']['AIDAJYPPIFB65RV8YYLDW'] = 2
+            IAM_CLIENT_MOCK.list_user_policies = MagicMock(return_value={'PolicyNames': []})
+            IAM_CLIENT_MOCK.list_attached_user_policies = MagicMock(return_value={'AttachedPolicies': [{'PolicyName': 'AdministratorAccess', 'PolicyArn': 'arn:aws:iam::aws:policy/AdministratorAccess'}]})
+            IAM_CLIENT_MOCK.list_groups_for_user = MagicMock(return_value={'Groups': []})
+            response = RULE.lambda_handler(build_lambda_scheduled_event(), {})
+            resp_expected = []
+            resp_expected.append(build_expected_response("NON_COMPLIANT", 'AIDAJYPPIFB65RV8YYLDW', annotation="This user sampleUser3 is not IP restricted."))
+            assert_successful_evaluation(self, response, resp_expected, 1)
+            IAM_CLIENT_MOCK.list_user_policies.assert_called_once_with(UserName='sampleUser3')
+            # A change of a group evaluates every user again
+            state_ids['AWS::IAM::Group']['AGPA1'] = 2
+            self.assertEqual(3, len(RULE.lambda_handler(build_lambda_scheduled_event(), {})))
+        IAM_CLIENT_MOCK.get_account_authorization_details.assert_called_once()
+
 ####################
 # Helper Functions #
 ####################
 
+def build_state_ids_response(state_ids, expression):
+    resource_type = expression.split("'")[1]
+    return {'Results': [json.dumps({'resourceId': resource_id, 'configurationStateId': state_id}) for resource_id, state_id in state_ids[resource_type].items()]}
+
 def build_lambda_configurationchange_event(invoking_event, rule_parameters=None):
     event_to_return = {
         'configRuleName':'myrule',
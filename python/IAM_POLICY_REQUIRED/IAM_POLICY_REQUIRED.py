@@ -97,6 +97,7 @@ import re
 import datetime
 import boto3
 import botocore
+import rule_runtime
 
 ##############
 # Parameters #
@@ -119,47 +120,14 @@ def should_ignore_config_item(config_item, ignored_roles, ignored_users):
             or (config_item['ARN'].rsplit("/")[1] == 'aws-service-role')
 
 
-def get_attached_policies(configuration_item):
-    # Get the users managed policies
-    attach_policies = [
-        policy["policyArn"] for policy in configuration_item["configuration"].get("attachedManagedPolicies")
-    ]
-
-    return attach_policies
-
-
-def list_contains_all(source_list, items):
-    return all(policy in source_list for policy in items)
-
-
-def paginate(client, method, **kwargs):
-    paginator = client.get_paginator(method.__name__)
-    for page in paginator.paginate(**kwargs).result_key_iters():
-        for result in page:
-            yield result
-
-
 def has_policy_attached(event, configuration_item, policy_arns):
     resource_type = configuration_item['resourceType']
-    if resource_type == 'AWS::IAM::User':
-        managed_policies = get_attached_policies(configuration_item)
-        if list_contains_all(managed_policies, policy_arns):
-            return True
-        # Additively check the users groups to see if they have the required policies
-        client = get_client('iam', event)
-        groups = configuration_item["configuration"].get("groupList", [])
-        for group in groups:
-            attached_policies = paginate(client, client.list_attached_group_policies, **{'GroupName': group})
-            for policy in attached_policies:
-                managed_policies.append(policy['PolicyArn'])
-                if list_contains_all(managed_policies, policy_arns):
-                    return True
-
-        return False
-    elif resource_type == 'AWS::IAM::Role':
-        return list_contains_all(get_attached_policies(configuration_item), policy_arns)
-
-    raise ValueError('Unable to handle resource type {}'.format(resource_type))
+    if resource_type not in ('AWS::IAM::User', 'AWS::IAM::Role'):
+        raise ValueError('Unable to handle resource type {}'.format(resource_type))
+    # The users of a burst of notifications share their groups: the graph lists the policies of a group once per TTL
+    iam_client = get_client('iam', event) if configuration_item['configuration'].get('groupList') else None
+    attached_policy_arns = rule_runtime.PRINCIPAL_GRAPH.get_effective_policy_arns(iam_client, configuration_item, policy_arns)
+    return attached_policy_arns.issuperset(policy_arns)
 
 
 def evaluate_compliance(event, configuration_item, valid_rule_parameters):
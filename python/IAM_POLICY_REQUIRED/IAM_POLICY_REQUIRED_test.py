@@ -1,4 +1,5 @@
 import json
+import os
 import sys
 import unittest
 try:
@@ -36,6 +37,7 @@ class Boto3Mock():
             raise Exception("Attempting to create an unknown client")
 
 sys.modules['boto3'] = Boto3Mock()
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
 
 def build_user_configuration_item(attached_policies_arns, user_groups, user_name="test-user"):
@@ -151,6 +153,10 @@ class TestPolicyRequired(unittest.TestCase):
     invoking_event_iam_user_sample = json.dumps(build_user_configuration_item([
         'arn:aws:iam::aws:policy/AdministratorAccess'], {'group1': [{'PolicyArn':'arn:aws:iam::aws:policy/AdministratorAccess'}]}))
 
+    def setUp(self):
+        rule.rule_runtime.PRINCIPAL_GRAPH.clear()
+        iam_client_mock.reset_mock()
+
     def test_it_marks_service_roles_as_compliant(self):
         rule.ASSUME_ROLE_MODE = False
         response = rule.lambda_handler(build_lambda_configurationchange_event(
@@ -213,6 +219,27 @@ class TestPolicyRequired(unittest.TestCase):
         resp_expected = [build_expected_response('COMPLIANT', 'ABCDEFGHI12JKL4MNO5PQ', 'AWS::IAM::User', ANY)]
         assert_successful_evaluation(self, response, resp_expected)
 
+    def test_it_lists_the_policies_of_a_group_once_for_many_users(self):
+        iam_client_mock.configure_mock(**{
+            "get_paginator.return_value": iam_client_mock,
+            "paginate.return_value": iam_client_mock,
+            "result_key_iters.return_value": [
+                [{
+                    'PolicyName': 'AdministratorAccess',
+                    'PolicyArn': 'arn:aws:iam::aws:policy/AdministratorAccess',
+                }]
+            ]
+        })
+        rule.ASSUME_ROLE_MODE = False
+        for user_name in ('user-1', 'user-2', 'user-3'):
+            invoking_event = json.dumps(build_user_configuration_item(
+                [], {'group1': ['arn:aws:iam::aws:policy/AdministratorAccess']}, user_name))
+            response = rule.lambda_handler(
+                build_lambda_configurationchange_event(invoking_event, self.rule_parameters), {})
+            resp_expected = [build_expected_response('COMPLIANT', 'ABCDEFGHI12JKL4MNO5PQ', 'AWS::IAM::User', ANY)]
+            assert_successful_evaluation(self, response, resp_expected)
+        iam_client_mock.paginate.assert_called_once_with(GroupName='group1')
+
     def test_it_marks_users_without_policy_as_non_compliant(self):
         invoking_event = json.dumps(build_user_configuration_item([], {}))
         rule.ASSUME_ROLE_MODE = False
@@ -24,6 +24,8 @@ Resource Type to report on:
 Rule Parameters:
   regexPattern (Required)
     Find the specified regex pattern in the IAM user name.
+  denyRegexPattern (Optional)
+    A regex pattern the IAM user name must not match.
 Scenarios:
   Scenario 1:
   Given: Regex Pattern is not specified
@@ -39,14 +41,19 @@ Scenarios:
   Given: Regex Pattern
     And: A user name does not contain the regex pattern
     Then: Return NON_COMPLIANT
+  Scenario 5:
+  Given: The parameter denyRegexPattern is configured and valid.
+    And: A user name contains the regex pattern
+    And: A user name contains the deny regex pattern
+    Then: Return NON_COMPLIANT
 '''
 
 import json
-import re
 import sys
 import datetime
 import boto3
 import botocore
+import rule_runtime
 
 try:
     import liblogging
@@ -73,27 +80,35 @@ CONFIG_ROLE_TIMEOUT_SECONDS = 900
 def evaluate_compliance(event, configuration_item, valid_rule_parameters):
     """Form the evaluation(s) to be return to Config Rules
     """
-    iam_user_name = configuration_item["resourceName"]
-    pattern = valid_rule_parameters["regexPattern"]
-    is_compliant = evaluate_username(iam_user_name, pattern)
+    return evaluate_user_name(event, configuration_item["resourceName"], get_name_matcher(valid_rule_parameters), valid_rule_parameters)
 
-    if is_compliant:
-        return build_evaluation(iam_user_name, 'COMPLIANT', event)
+def evaluate_compliance_batch(events, configuration_items, valid_rule_parameters):
+    """Return the evaluation of each configuration item, with one matcher lookup for the whole batch (used by rule_runtime.snapshot)
 
-    return build_evaluation(iam_user_name, 'NON_COMPLIANT', event, annotation='The regex ({}) does not match ({}).'.format(pattern, iam_user_name))
+    Keyword arguments:
+    events -- the event of each configuration item
+    configuration_items -- the configurationItem dictionaries
+    valid_rule_parameters -- the output of the evaluate_parameters() representing validated parameters of the Config Rule
+    """
+    matcher = get_name_matcher(valid_rule_parameters)
+    return [evaluate_user_name(event, configuration_item["resourceName"], matcher, valid_rule_parameters)
+            for event, configuration_item in zip(events, configuration_items)]
 
-def evaluate_username(user_name, pattern_str):
-    """Evaluate the regex pattern for match in the user name
+def evaluate_user_name(event, iam_user_name, matcher, valid_rule_parameters):
+    if not matcher.is_allowed(iam_user_name):
+        return build_evaluation(iam_user_name, 'NON_COMPLIANT', event, annotation='The regex ({}) does not match ({}).'.format(valid_rule_parameters["regexPattern"], iam_user_name))
+    if matcher.is_denied(iam_user_name):
+        return build_evaluation(iam_user_name, 'NON_COMPLIANT', event, annotation='The denied regex ({}) matches ({}).'.format(valid_rule_parameters["denyRegexPattern"], iam_user_name))
+    return build_evaluation(iam_user_name, 'COMPLIANT', event)
 
-    Return:
-    True when regex pattern does match
+def get_name_matcher(valid_rule_parameters):
+    """Return the NameMatcher of the parameters, compiled once per container (see rule_runtime.matcher)
 
     Keyword arguments:
-    user_name -- the string in the iam user name
-    pattern_str -- a string that gets compiled into a regular expression object
+    valid_rule_parameters -- the output of the evaluate_parameters() representing validated parameters of the Config Rule
     """
-    pattern = re.compile(f"{pattern_str}")
-    return pattern.match(user_name)
+    deny_patterns = [valid_rule_parameters['denyRegexPattern']] if valid_rule_parameters.get('denyRegexPattern') else []
+    return rule_runtime.get_name_matcher([valid_rule_parameters['regexPattern']], deny_patterns)
 
 def evaluate_parameters(rule_parameters):
     """Evaluate the rule parameters dictionary validity. Raise a ValueError for invalid parameters.
@@ -105,9 +120,14 @@ def evaluate_parameters(rule_parameters):
     rule_parameters -- the Key/Value dictionary of the Config Rules parameters
     """
     try:
-        re.compile(rule_parameters['regexPattern'])
-    except:
+        rule_runtime.get_name_matcher([rule_parameters['regexPattern']])
+    except (KeyError, ValueError):
         raise ValueError('The Config Rule must have a validate regex value specified for the parameter "regexPattern"')
+    if rule_parameters.get('denyRegexPattern'):
+        try:
+            get_name_matcher(rule_parameters)
+        except ValueError:
+            raise ValueError('The optional parameter "denyRegexPattern" must be a valid regex')
 
     return rule_parameters
 
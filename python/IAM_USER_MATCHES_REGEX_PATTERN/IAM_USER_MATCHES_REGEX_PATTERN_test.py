@@ -3,6 +3,7 @@
  Created with the Rule Development Kit: https://github.com/awslabs/aws-config-rdk
  Can be used stand-alone or with the Rule Compliance Engine: https://github.com/awslabs/aws-config-engine-for-compliance-as-code
 '''
+import os
 import sys
 import json
 import unittest
@@ -35,6 +36,7 @@ class Boto3Mock():
         raise Exception("Attempting to create an unknown client")
 
 sys.modules['boto3'] = Boto3Mock()
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
 RULE = __import__('IAM_USER_MATCHES_REGEX_PATTERN')
 
@@ -106,6 +108,32 @@ class ComplianceTest(unittest.TestCase):
         resp_expected.append(build_expected_response('COMPLIANT', self.user_list['Users'][1]['UserName']))
         assert_successful_evaluation(self, response, resp_expected)
 
+    def test_scenario_5_denied(self):
+        """Test scenario to test user name matching the deny regex pattern
+        Keyword arguments:
+        self -- class ComplianceTest
+        """
+        rule_param = {"regexPattern":".*admin.*", "denyRegexPattern":"user-.*"}
+        invoking_event = construct_invoking_event(construct_config_item(self.user_list['Users'][1]['UserName']))
+        lambda_event = build_lambda_configurationchange_event(invoking_event, rule_parameters=rule_param)
+        response = RULE.lambda_handler(lambda_event, {})
+        resp_expected = []
+        resp_expected.append(build_expected_response('NON_COMPLIANT', self.user_list['Users'][1]['UserName'],
+                                                     annotation='The denied regex (user-.*) matches ({}).'.format(self.user_list['Users'][1]['UserName'])))
+        assert_successful_evaluation(self, response, resp_expected)
+
+    def test_batch_evaluation(self):
+        """Test the evaluation of many user names at once, as done by rule_runtime.snapshot
+        Keyword arguments:
+        self -- class ComplianceTest
+        """
+        rule_param = {"regexPattern":".*admin.*"}
+        configuration_items = [construct_config_item(user['UserName']) for user in self.user_list['Users']]
+        events = [build_lambda_configurationchange_event(construct_invoking_event(configuration_item), rule_parameters=rule_param)
+                  for configuration_item in configuration_items]
+        evaluations = RULE.evaluate_compliance_batch(events, configuration_items, rule_param)
+        self.assertEqual(['NON_COMPLIANT', 'COMPLIANT', 'NON_COMPLIANT', 'NON_COMPLIANT'], [evaluation['ComplianceType'] for evaluation in evaluations])
+
 ####################
 # Helper Functions #
 ####################
@@ -68,6 +68,8 @@ Scenarios:
   Given: WhitelistedUserList is not configured
     And: One MFA is not attached to the IAM User
     Then: Return NON_COMPLIANT
+
+Note: The MFA of the users is read from the IAM credential report, generated at most every 4 hours. A user without MFA in the report is confirmed with list_mfa_devices() before being reported NON_COMPLIANT, but a user whose MFA device was removed after the report stays COMPLIANT until the next evaluation with a newer report. Confirming every user with MFA would cost the list_mfa_devices() call per user the report saves.
 '''
 
 import json
@@ -75,6 +77,7 @@ import datetime
 import re
 import boto3
 import botocore
+import rule_runtime
 
 ##############
 # Parameters #
@@ -111,6 +114,8 @@ def evaluate_compliance(event, configuration_item, valid_rule_parameters):
     """
     iam_client = get_client('iam', event)
     all_users_list = get_all_users(iam_client)
+    # One report replaces the list_mfa_devices() call of every user with an active MFA device
+    credential_report = rule_runtime.get_credential_report(iam_client)
 
     evaluations = []
     for user in all_users_list:
@@ -118,6 +123,12 @@ def evaluate_compliance(event, configuration_item, valid_rule_parameters):
             evaluations.append(build_evaluation(user['UserId'], 'COMPLIANT', event, annotation='The user ({}) is whitelisted.'.format(user['UserName'])))
             continue
 
+        user_credentials = credential_report.get(user['UserName']) if credential_report else None
+        if user_credentials is not None and user_credentials.mfa_active:
+            evaluations.append(build_evaluation(user['UserId'], 'COMPLIANT', event))
+            continue
+
+        # The report can be up to 4 hours old: confirm a missing MFA device before reporting it
         mfa_device_details = iam_client.list_mfa_devices(UserName=user['UserName'])
         if mfa_device_details['MFADevices']:
             evaluations.append(build_evaluation(user['UserId'], 'COMPLIANT', event))
@@ -5,6 +5,7 @@
 # Can be used stand-alone or with the Rule Compliance Engine: https://github.com/awslabs/aws-config-engine-for-compliance-as-code
 #
 import sys
+import os
 import unittest
 try:
     from unittest.mock import MagicMock, patch, ANY
@@ -41,6 +42,11 @@ class Boto3Mock():
             raise Exception("Attempting to create an unknown client")
 
 sys.modules['boto3'] = Boto3Mock()
+# Without the credential report, the rule lists the MFA devices of every user
+ACCESS_DENIED = ClientError({'Error': {'Code': 'AccessDenied', 'Message': 'denied'}}, 'GenerateCredentialReport')
+iam_client_mock.generate_credential_report = MagicMock(side_effect=ACCESS_DENIED)
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
 rule = __import__('IAM_USER_MFA_ENABLED')
 
@@ -180,10 +186,43 @@ class Scenario_3_to_6_TestMFA(unittest.TestCase):
         resp_expected.append(build_expected_response('NON_COMPLIANT', 'AIDAIDFOUX2OSRO6DO7XN', annotation='The user (user-name-2) has no MFA Device detected.'))
         assert_successful_evaluation(self, response, resp_expected, 2)
 
+class Scenario_3_to_6_TestMFAFromCredentialReport(unittest.TestCase):
+
+    user_list = Scenario_3_to_6_TestMFA.user_list
+
+    def setUp(self):
+        config_client_mock.get_compliance_details_by_config_rule = MagicMock(return_value={'EvaluationResults': []})
+        iam_client_mock.generate_credential_report = MagicMock(return_value={'State': 'COMPLETE'})
+        iam_client_mock.get_credential_report = MagicMock(return_value={'Content': build_credential_report([('user-name-1', 'true'), ('user-name-2', 'false')])})
+
+    def tearDown(self):
+        iam_client_mock.generate_credential_report = MagicMock(side_effect=ACCESS_DENIED)
+
+    def test_Scenario_3_and_4_mfa_active_in_report(self):
+        iam_client_mock.list_users = MagicMock(return_value=self.user_list)
+        iam_client_mock.list_mfa_devices = MagicMock(return_value={"MFADevices":[]})
+        lambda_event = build_lambda_scheduled_event()
+        response = rule.lambda_handler(lambda_event, {})
+        resp_expected = []
+        resp_expected.append(build_expected_response('COMPLIANT', 'AIDAIDFOUX2OSRO6DO7XM'))
+        resp_expected.append(build_expected_response('NON_COMPLIANT', 'AIDAIDFOUX2OSRO6DO7XN', annotation='The user (user-name-2) has no MFA Device detected.'))
+        assert_successful_evaluation(self, response, resp_expected, 2)
+        iam_client_mock.list_mfa_devices.assert_called_once_with(UserName='user-name-2')
+
 ####################
 # Helper Functions #
 ####################
 
+def build_credential_report(users):
+    lines = ['user,arn,user_creation_time,password_enabled,password_last_used,password_last_changed,password_next_rotation,mfa_active,'
+             'access_key_1_active,access_key_1_last_rotated,access_key_1_last_used_date,access_key_1_last_used_region,access_key_1_last_used_service,'
+             'access_key_2_active,access_key_2_last_rotated,access_key_2_last_used_date,access_key_2_last_used_region,access_key_2_last_used_service,'
+             'cert_1_active,cert_1_last_rotated,cert_2_active,cert_2_last_rotated']
+    for user_name, mfa_active in users:
+        lines.append('{0},arn:aws:iam::123456789012:user/{0},2018-01-01T00:00:00+00:00,true,N/A,N/A,N/A,{1},'
+                     'false,N/A,N/A,N/A,N/A,false,N/A,N/A,N/A,N/A,false,N/A,false,N/A'.format(user_name, mfa_active))
+    return '\n'.join(lines).encode('utf-8')
+
 def build_lambda_configurationchange_event(invoking_event, rule_parameters=None):
     event_to_return = {
         'configRuleName':'myrule',
@@ -13,10 +13,11 @@
    iam-user-no-policy-full-star
 
  Description:
-   Check whether IAM Users have an IAM policy with all permission enabled (or "Action:*"). IAM Policy includes the AWS-managed policy named AdministratorAccess, Customer-managed policies and inline policies.
+   Check whether IAM Users have an IAM policy allowing every action on every resource ("Action:*", or a "NotAction", on "Resource:*"). IAM Policy includes the AWS-managed policy named AdministratorAccess, Customer-managed policies and inline policies.
 
  Trigger:
    Configuration Change on AWS::IAM::User
+   Periodic (every 24 hours): evaluates every user of the account from one IAM authorization snapshot
 
  Reports on:
    AWS::IAM::User
@@ -27,15 +28,16 @@
  Feature:
    In order to: ensure that policies attached to any user does not have full administrative privileges
             As: a Security Officer
-        I want: to ensure that no policy have "*" in their action.
+        I want: to ensure that no policy allows every action on every resource.
 
  Scenarios:
    Scenario 1:
-     Given: Any allow <Policy> statements of user has Action as "*"
+     Given: Any allow <Policy> statements of user has Action as "*" (or "*:*"), or a NotAction not excluding "*"
+       And: This statement has Resource as "*", or no Resource
       Then: Return NON_COMPLIANT
 
    Scenario 2:
-     Given: All allow <Policy> statments of user do not have Action as "*"
+     Given: No allow <Policy> statement of user matches Scenario 1 (e.g. Action as "*" on a specific Resource)
       Then: Return COMPLIANT
 
    Scenario 3:
@@ -52,6 +54,7 @@ import json
 import datetime
 import boto3
 import botocore
+import rule_runtime
 
 ##############
 # Parameters #
@@ -63,6 +66,9 @@ DEFAULT_RESOURCE_TYPE = 'AWS::IAM::User'
 # Set to True to get the lambda to assume the Role attached on the Config Service (useful for cross-account).
 ASSUME_ROLE_MODE = False
 
+# AWS managed policies are left out of the snapshot and fetched once each, when attached
+AUTHORIZATION_SNAPSHOT_FILTERS = ['User', 'LocalManagedPolicy']
+
 #############
 # Main Code #
 #############
@@ -87,27 +93,74 @@ def evaluate_compliance(event, configuration_item, valid_rule_parameters):
     3 -- if None or an empty string, list or dict is returned, the Boilerplate code will put a "shadow" evaluation to feedback that the evaluation took place properly
     """
 
-    user_name = configuration_item['configuration']['userName']
     iam_client = get_client('iam', event)
 
-    # Inline policies
-    inline_policy_names = get_all_user_inline_policy_names(iam_client, user_name)
-    for policy_name in inline_policy_names:
-        policy_document = iam_client.get_user_policy(UserName=user_name, PolicyName=policy_name)['PolicyDocument']
-        if is_statements_include_full_star_allow(policy_document['Statement']):
-            return build_evaluation_from_config_item(configuration_item, "NON_COMPLIANT", annotation='The inline policy "' + policy_name + '" attached to the user "' + user_name + '" has full star allow permissions.')
-
-    # Managed policies
-    managed_policy_arn_and_name = get_all_user_managed_policy_arn_and_name(iam_client, user_name)
-    for policy_arn, policy_name in managed_policy_arn_and_name.items():
-        get_policy = iam_client.get_policy(PolicyArn=policy_arn)
-        version = get_policy['Policy']['DefaultVersionId']
-        get_policy_version = iam_client.get_policy_version(PolicyArn=policy_arn, VersionId=version)
-        if is_statements_include_full_star_allow(get_policy_version['PolicyVersion']['Document']['Statement']):
-            return build_evaluation_from_config_item(configuration_item, "NON_COMPLIANT", annotation='The managed policy "' + policy_name + '" attached to the user "' + user_name + '" has full star allow permissions.')
+    # A periodic trigger evaluates every user from one authorization snapshot
+    if configuration_item is None:
+        return evaluate_all_users(event, iam_client)
+
+    user_name = configuration_item['configuration']['userName']
+    annotation = get_full_star_annotation(user_name, iter_user_inline_policies(iam_client, user_name), iter_user_managed_policies(iam_client, user_name))
+    if annotation:
+        return build_evaluation_from_config_item(configuration_item, "NON_COMPLIANT", annotation=annotation)
 
     return "COMPLIANT"
 
+def evaluate_all_users(event, iam_client):
+    evaluations = []
+    snapshot = rule_runtime.get_authorization_snapshot(iam_client, filters=AUTHORIZATION_SNAPSHOT_FILTERS)
+    users = snapshot.users() if snapshot else get_all_users(iam_client)
+    for user in users:
+        if snapshot:
+            inline_policies = snapshot.get_inline_policies(user)
+            managed_policies = ((policy['PolicyName'], snapshot.get_policy_document(policy['PolicyArn'])) for policy in snapshot.get_attached_policies(user))
+        else:
+            inline_policies = iter_user_inline_policies(iam_client, user['UserName'])
+            managed_policies = iter_user_managed_policies(iam_client, user['UserName'])
+        annotation = get_full_star_annotation(user['UserName'], inline_policies, managed_policies)
+        if annotation:
+            evaluations.append(build_evaluation(user['UserId'], "NON_COMPLIANT", event, annotation=annotation))
+        else:
+            evaluations.append(build_evaluation(user['UserId'], "COMPLIANT", event))
+    return evaluations
+
+def get_full_star_annotation(user_name, inline_policies, managed_policies):
+    """Return the annotation of the first policy of the user with full star allow permissions, or None.
+
+    Keyword arguments:
+    user_name -- the name of the user
+    inline_policies -- the (policy name, policy document) of the inline policies of the user
+    managed_policies -- the (policy name, policy document) of the managed policies attached to the user
+    """
+    for policy_name, policy_document in inline_policies:
+        if rule_runtime.compile_policy(policy_document).allows_full_star():
+            return 'The inline policy "' + policy_name + '" attached to the user "' + user_name + '" has full star allow permissions.'
+
+    for policy_name, policy_document in managed_policies:
+        if rule_runtime.compile_policy(policy_document).allows_full_star():
+            return 'The managed policy "' + policy_name + '" attached to the user "' + user_name + '" has full star allow permissions.'
+
+    return None
+
+def iter_user_inline_policies(iam_client, user_name):
+    for policy_name in get_all_user_inline_policy_names(iam_client, user_name):
+        yield policy_name, iam_client.get_user_policy(UserName=user_name, PolicyName=policy_name)['PolicyDocument']
+
+def iter_user_managed_policies(iam_client, user_name):
+    for policy_arn, policy_name in get_all_user_managed_policy_arn_and_name(iam_client, user_name).items():
+        yield policy_name, rule_runtime.get_managed_policy_document(iam_client, policy_arn)
+
+def get_all_users(iam_client):
+    all_users = []
+    list_users = iam_client.list_users(MaxItems=1000)
+    while True:
+        all_users += list_users['Users']
+        if 'Marker' in list_users:
+            list_users = iam_client.list_users(MaxItems=1000, Marker=list_users['Marker'])
+        else:
+            break
+    return all_users
+
 def get_all_user_inline_policy_names(iam_client, user_name):
     all_user_inline_policies = []
     list_policy_names = iam_client.list_user_policies(UserName=user_name, MaxItems=1000)
@@ -131,35 +184,6 @@ def get_all_user_managed_policy_arn_and_name(iam_client, user_name):
             break
     return all_user_managed_policies_arn_and_name
 
-def is_statements_include_full_star_allow(statements):
-    statement_list = []
-    if isinstance(statements, dict):
-        statement_list = [statements]
-    elif isinstance(statements, list):
-        statement_list = statements
-    else:
-        print("Not recognized statement type:")
-        print(statements)
-        return False
-    
-    for statement in statement_list:        
-        if statement['Effect'] == 'Deny':
-            continue
-
-        if 'Action' not in statement:
-            print("No 'Action' in statement")
-            print(statement)
-            continue
-
-        if isinstance(statement['Action'], list):
-            for action in statement['Action']:
-                if action == "*":
-                    return True
-        else:
-            if statement['Action'] == "*":
-                return True
-    return False
-
 def evaluate_parameters(rule_parameters):
     """Evaluate the rule parameters dictionary validity. Raise a ValueError for invalid parameters.
 
@@ -4,6 +4,7 @@
 # Created with the Rule Development Kit: https://github.com/awslabs/aws-config-rdk
 # Can be used stand-alone or with the Rule Compliance Engine: https://github.com/awslabs/aws-config-engine-for-compliance-as-code
 #
+import os
 import sys
 import unittest
 try:
@@ -42,9 +43,16 @@ class Boto3Mock():
 
 sys.modules['boto3'] = Boto3Mock()
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
 rule = __import__('IAM_USER_NO_POLICY_FULL_STAR')
 
-class ComplianceTest(unittest.TestCase):
+# The runtime caches the managed policy documents across the invocations of a container: every test starts without them
+class PolicyCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        rule.rule_runtime.POLICY_DOCUMENT_CACHE.clear()
+
+class ComplianceTest(PolicyCacheTestCase):
 
     invoking_event = '{"configurationItemDiff":"SomeDifference", "notificationCreationTime":"SomeTime", "messageType":"ConfigurationItemChangeNotification", "recordVersion":"SomeVersion", "configurationItem":{ "resourceType":"AWS::IAM::User","configurationItemStatus":"ResourceDiscovered", "resourceId":"AIDAICVB3PKAQMPEGDW2C", "configurationItemCaptureTime":"2018-02-20T06:56:55.533Z", "configuration":{"userName": "someusername"}}}'
 
@@ -65,6 +73,16 @@ class ComplianceTest(unittest.TestCase):
         resp_expected.append(build_expected_response('NON_COMPLIANT', 'AIDAICVB3PKAQMPEGDW2C', annotation='The inline policy "policyname1" attached to the user "someusername" has full star allow permissions.'))
         assert_successful_evaluation(self, response, resp_expected)
 
+    def test_non_compliant_inline_not_action(self):
+        # Every action but those of IAM is as good as every action
+        iam_client_mock.list_user_policies = MagicMock(return_value=self.list_user_policy_names)
+        iam_client_mock.get_user_policy = MagicMock(return_value={'PolicyDocument': {"Statement": [{"Effect": "Allow", "NotAction": "iam:*", "Resource": "*"}]}})
+        lambdaEvent = build_lambda_configurationchange_event(invoking_event=self.invoking_event)
+        response = rule.lambda_handler(lambdaEvent, {})
+        resp_expected = []
+        resp_expected.append(build_expected_response('NON_COMPLIANT', 'AIDAICVB3PKAQMPEGDW2C', annotation='The inline policy "policyname1" attached to the user "someusername" has full star allow permissions.'))
+        assert_successful_evaluation(self, response, resp_expected)
+
     def test_non_compliant_managed(self):
         iam_client_mock.list_user_policies = MagicMock(return_value=self.no_list_user_policy_names)
         iam_client_mock.list_attached_user_policies = MagicMock(return_value=self.list_attached_policy_arn)
@@ -87,6 +105,33 @@ class ComplianceTest(unittest.TestCase):
         resp_expected.append(build_expected_response('COMPLIANT', 'AIDAICVB3PKAQMPEGDW2C'))
         assert_successful_evaluation(self, response, resp_expected)
 
+class ScheduledComplianceTest(PolicyCacheTestCase):
+
+    authorization_details = {
+        'UserDetailList': [
+            {'UserName': 'admin-user', 'UserId': 'AIDAADMINUSER', 'Arn': 'arn:aws:iam::123456789012:user/admin-user', 'UserPolicyList': [],
+             'AttachedManagedPolicies': [{'PolicyName': 'AdministratorAccess', 'PolicyArn': 'arn:aws:iam::aws:policy/AdministratorAccess'}]},
+            {'UserName': 'reader-user', 'UserId': 'AIDAREADERUSER', 'Arn': 'arn:aws:iam::123456789012:user/reader-user',
+             'UserPolicyList': [{'PolicyName': 'deny-all', 'PolicyDocument': {"Statement": [{"Effect": "Deny", "Action": "*"}]}}],
+             'AttachedManagedPolicies': [{'PolicyName': 'reader', 'PolicyArn': 'arn:aws:iam::123456789012:policy/reader'}]}],
+        'Policies': [{'PolicyName': 'reader', 'Arn': 'arn:aws:iam::123456789012:policy/reader', 'DefaultVersionId': 'v1',
+                      'PolicyVersionList': [{'VersionId': 'v1', 'IsDefaultVersion': True, 'Document': {"Statement": [{"Effect": "Allow", "Action": "s3:Get*"}]}}]}],
+        'IsTruncated': False}
+
+    def test_all_users_from_snapshot(self):
+        iam_client_mock.reset_mock()
+        config_client_mock.get_compliance_details_by_config_rule = MagicMock(return_value={'EvaluationResults': []})
+        iam_client_mock.get_account_authorization_details = MagicMock(return_value=self.authorization_details)
+        iam_client_mock.get_policy = MagicMock(return_value={'Policy': {'DefaultVersionId': 'v1'}})
+        iam_client_mock.get_policy_version = MagicMock(return_value={"PolicyVersion": {"Document": {"Statement": [{"Effect": "Allow", "Action": "*"}]}}})
+        response = rule.lambda_handler(build_lambda_scheduled_event(), {})
+        resp_expected = []
+        resp_expected.append(build_expected_response('NON_COMPLIANT', 'AIDAADMINUSER', annotation='The managed policy "AdministratorAccess" attached to the user "admin-user" has full star allow permissions.'))
+        resp_expected.append(build_expected_response('COMPLIANT', 'AIDAREADERUSER'))
+        assert_successful_evaluation(self, response, resp_expected, 2)
+        iam_client_mock.list_user_policies.assert_not_called()
+        iam_client_mock.get_policy_version.assert_called_once_with(PolicyArn='arn:aws:iam::aws:policy/AdministratorAccess', VersionId='v1')
+
 ####################
 # Helper Functions #
 ####################
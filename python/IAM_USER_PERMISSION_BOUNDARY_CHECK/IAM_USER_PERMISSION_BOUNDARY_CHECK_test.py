@@ -1,10 +1,13 @@
+import json
+import os
 import sys
+import tempfile
 import unittest
 try:
-    from unittest.mock import MagicMock
+    from unittest.mock import MagicMock, patch
 except ImportError:
     import mock
-    from mock import MagicMock
+    from mock import MagicMock, patch
 import botocore
 from botocore.exceptions import ClientError
 
@@ -36,6 +39,8 @@ class Boto3Mock():
 
 sys.modules['boto3'] = Boto3Mock()
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
 RULE = __import__('IAM_USER_PERMISSION_BOUNDARY_CHECK')
 
 class TESTInvalidpermissionboundary(unittest.TestCase):
@@ -53,10 +58,13 @@ class TESTInvalidpermissionboundary(unittest.TestCase):
 
 class TESTScenarios2to8(unittest.TestCase):
     user_list = {'Users': [{'UserId': 'AIDAIDFOUX2OSRO6DO7XM', 'UserName': 'user-name-1'}, {'UserId': 'AIDAIDFOUX2OSRO6DO7XN', 'UserName': 'user-name-2'}]}
+    boundary_list = {'Policies': [{'PolicyName': 'AdministratorAccess', 'Arn': 'arn:aws:iam::aws:policy/AdministratorAccess'}]}
+    bounded_users = {'PolicyUsers': [{'UserName': 'user-name-1', 'UserId': 'AIDAIDFOUX2OSRO6DO7XM'}, {'UserName': 'user-name-2', 'UserId': 'AIDAIDFOUX2OSRO6DO7XN'}]}
 
-    def construct_permission_list(self, UserName):
-        user_info_list = {"User": {"UserName": "user-name-1", "PermissionsBoundary": {"PermissionsBoundaryType": "Policy", "PermissionsBoundaryArn": "arn:aws:iam::aws:policy/AdministratorAccess"}, "UserId": "AIDAJDTYJDDPUWJ7IR3G2", "Arn": "arn:aws:iam::677885075477:user/ddbtest"}}
-        return user_info_list
+    def setUp(self):
+        IAM_CLIENT_MOCK.reset_mock()
+        IAM_CLIENT_MOCK.list_policies = MagicMock(return_value=self.boundary_list)
+        IAM_CLIENT_MOCK.list_entities_for_policy = MagicMock(return_value={'PolicyUsers': []})
 
     # No IAM users present in the account.
     def test_scenario2(self):
@@ -77,11 +85,11 @@ class TESTScenarios2to8(unittest.TestCase):
         resp_expected.append(build_expected_response('NON_COMPLIANT', 'AIDAIDFOUX2OSRO6DO7XM'))
         resp_expected.append(build_expected_response('NON_COMPLIANT', 'AIDAIDFOUX2OSRO6DO7XN'))
         assert_successful_evaluation(self, response, resp_expected, 2)
+        IAM_CLIENT_MOCK.list_entities_for_policy.assert_not_called()
 
     # Permission Boundary is present in the Account but IAM user does not have it attached.
     def test_scenario4(self):
         IAM_CLIENT_MOCK.list_users = MagicMock(return_value=self.user_list)
-        IAM_CLIENT_MOCK.get_user = MagicMock(return_value={'User':{}})
         lambda_event = build_lambda_scheduled_event()
         response = RULE.lambda_handler(lambda_event, {})
         resp_expected = []
@@ -92,18 +100,20 @@ class TESTScenarios2to8(unittest.TestCase):
     # Permission Boundary is present in the Account and IAM user does have it attached.
     def test_scenario5(self):
         IAM_CLIENT_MOCK.list_users = MagicMock(return_value=self.user_list)
-        IAM_CLIENT_MOCK.get_user = MagicMock(side_effect=self.construct_permission_list)
+        IAM_CLIENT_MOCK.list_entities_for_policy = MagicMock(return_value=self.bounded_users)
         lambda_event = build_lambda_scheduled_event()
         response = RULE.lambda_handler(lambda_event, {})
         resp_expected = []
         resp_expected.append(build_expected_response('COMPLIANT', 'AIDAIDFOUX2OSRO6DO7XM'))
         resp_expected.append(build_expected_response('COMPLIANT', 'AIDAIDFOUX2OSRO6DO7XN'))
         assert_successful_evaluation(self, response, resp_expected, 2)
+        IAM_CLIENT_MOCK.list_entities_for_policy.assert_called_once_with(PolicyArn='arn:aws:iam::aws:policy/AdministratorAccess', EntityFilter='User', PolicyUsageFilter='PermissionsBoundary')
+        IAM_CLIENT_MOCK.get_user.assert_not_called()
 
     # Permission Boundary Name is provided as the input and IAM user does have it attached.
     def test_scenario6(self):
         IAM_CLIENT_MOCK.list_users = MagicMock(return_value=self.user_list)
-        IAM_CLIENT_MOCK.get_user = MagicMock(side_effect=self.construct_permission_list)
+        IAM_CLIENT_MOCK.list_entities_for_policy = MagicMock(return_value=self.bounded_users)
         rule_param = "{\"policyArns\":\"arn:aws:iam::aws:policy/AdministratorAccess\"}"
         lambda_event = build_lambda_scheduled_event(rule_parameters=rule_param)
         response = RULE.lambda_handler(lambda_event, {})
@@ -111,12 +121,11 @@ class TESTScenarios2to8(unittest.TestCase):
         resp_expected.append(build_expected_response('COMPLIANT', 'AIDAIDFOUX2OSRO6DO7XM'))
         resp_expected.append(build_expected_response('COMPLIANT', 'AIDAIDFOUX2OSRO6DO7XN'))
         assert_successful_evaluation(self, response, resp_expected, 2)
+        IAM_CLIENT_MOCK.list_policies.assert_not_called()
 
     # Permission Boundary Name is provided as the input and IAM user does not have any permission boundary attached.
     def test_scenario7(self):
         IAM_CLIENT_MOCK.list_users = MagicMock(return_value=self.user_list)
-        IAM_CLIENT_MOCK.get_user = MagicMock(return_value={'User':{}})
-        IAM_CLIENT_MOCK.get_user = MagicMock(return_value={'User':{}})
         rule_param = "{\"policyArns\":\"arn:aws:iam::aws:policy/AdministratorAccess\"}"
         lambda_event = build_lambda_scheduled_event(rule_parameters=rule_param)
         response = RULE.lambda_handler(lambda_event, {})
@@ -128,8 +137,7 @@ class TESTScenarios2to8(unittest.TestCase):
     # Permission Boundary Name is provided as the input but IAM user does not have it attached.
     def test_scenario8(self):
         IAM_CLIENT_MOCK.list_users = MagicMock(return_value=self.user_list)
-        IAM_CLIENT_MOCK.get_user = MagicMock(return_value={"User": {"UserName": "user-name-2", "PermissionsBoundary": {"PermissionsBoundaryType": "Policy", "PermissionsBoundaryArn": "arn:aws:iam::aws:policy/AdminAccess"}, "UserId": "AIDAIDFOUX2OSRO6DO7XN", "Arn": "arn:aws:iam::677885075477:user/ddbtest"}})
-        IAM_CLIENT_MOCK.get_user = MagicMock(return_value={"User": {"UserName": "user-name-1", "PermissionsBoundary": {"PermissionsBoundaryType": "Policy", "PermissionsBoundaryArn": "arn:aws:iam::aws:policy/AAccess"}, "UserId": "AIDAIDFOUX2OSRO6DO7XN", "Arn": "arn:aws:iam::677885075477:user/ddbtest"}})
+        IAM_CLIENT_MOCK.list_entities_for_policy = MagicMock(side_effect=lambda PolicyArn, **kwargs: self.bounded_users if PolicyArn == 'arn:aws:iam::aws:policy/AAccess' else {'PolicyUsers': []})
         rule_param = "{\"policyArns\":\"arn:aws:iam::aws:policy/AdministratorAccess\"}"
         lambda_event = build_lambda_scheduled_event(rule_parameters=rule_param)
         response = RULE.lambda_handler(lambda_event, {})
@@ -138,10 +146,49 @@ class TESTScenarios2to8(unittest.TestCase):
         resp_expected.append(build_expected_response('NON_COMPLIANT', 'AIDAIDFOUX2OSRO6DO7XN'))
         assert_successful_evaluation(self, response, resp_expected, 2)
 
+    # Several Permission Boundary Names are provided as the input, one of them does not exist and the users of another are paginated.
+    def test_scenario9(self):
+        IAM_CLIENT_MOCK.list_users = MagicMock(return_value=self.user_list)
+        no_such_entity = ClientError({'Error': {'Code': 'NoSuchEntity', 'Message': 'not found'}}, 'ListEntitiesForPolicy')
+        IAM_CLIENT_MOCK.list_entities_for_policy = MagicMock(side_effect=[no_such_entity,
+                                                                          {'PolicyUsers': self.bounded_users['PolicyUsers'][:1], 'Marker': 'page-2'},
+                                                                          {'PolicyUsers': self.bounded_users['PolicyUsers'][1:]}])
+        rule_param = "{\"policyArns\":\"arn:aws:iam::123456789012:policy/deleted, arn:aws:iam::aws:policy/AdministratorAccess\"}"
+        lambda_event = build_lambda_scheduled_event(rule_parameters=rule_param)
+        response = RULE.lambda_handler(lambda_event, {})
+        resp_expected = []
+        resp_expected.append(build_expected_response('COMPLIANT', 'AIDAIDFOUX2OSRO6DO7XM'))
+        resp_expected.append(build_expected_response('COMPLIANT', 'AIDAIDFOUX2OSRO6DO7XN'))
+        assert_successful_evaluation(self, response, resp_expected, 2)
+        IAM_CLIENT_MOCK.list_entities_for_policy.assert_called_with(PolicyArn='arn:aws:iam::aws:policy/AdministratorAccess', EntityFilter='User', PolicyUsageFilter='PermissionsBoundary', Marker='page-2')
+
+    # Incremental evaluation: a few users are looked up one by one, and only the user whose configuration item changed is looked up again.
+    def test_scenario10(self):
+        IAM_CLIENT_MOCK.list_users = MagicMock(return_value=self.user_list)
+        IAM_CLIENT_MOCK.list_entities_for_policy = MagicMock(return_value=self.bounded_users)
+        IAM_CLIENT_MOCK.get_user = MagicMock(return_value={'User': {}})
+        CONFIG_CLIENT_MOCK.put_evaluations = MagicMock(return_value={'FailedEvaluations': []})
+        CONFIG_CLIENT_MOCK.select_resource_config = MagicMock(return_value=build_state_ids_response({'AIDAIDFOUX2OSRO6DO7XM': 1, 'AIDAIDFOUX2OSRO6DO7XN': 1}))
+        with tempfile.TemporaryDirectory() as directory, \
+                patch.dict('os.environ', {'INCREMENTAL_EVALUATION': 'true'}), \
+                patch.object(RULE.rule_runtime.incremental, 'DEFAULT_INCREMENTAL_DIRECTORY', directory):
+            self.assertEqual(2, len(RULE.lambda_handler(build_lambda_scheduled_event(), {})))
+            IAM_CLIENT_MOCK.get_user.reset_mock()
+            CONFIG_CLIENT_MOCK.select_resource_config = MagicMock(return_value=build_state_ids_response({'AIDAIDFOUX2OSRO6DO7XM': 1, 'AIDAIDFOUX2OSRO6DO7XN': 2}))
+            response = RULE.lambda_handler(build_lambda_scheduled_event(), {})
+        resp_expected = []
+        resp_expected.append(build_expected_response('NON_COMPLIANT', 'AIDAIDFOUX2OSRO6DO7XN'))
+        assert_successful_evaluation(self, response, resp_expected, 1)
+        IAM_CLIENT_MOCK.get_user.assert_called_once_with(UserName='user-name-2')
+        IAM_CLIENT_MOCK.list_entities_for_policy.assert_not_called()
+
 ####################
 # Helper Functions #
 ####################
 
+def build_state_ids_response(state_ids):
+    return {'Results': [json.dumps({'resourceId': resource_id, 'configurationStateId': state_id}) for resource_id, state_id in state_ids.items()]}
+
 def build_lambda_configurationchange_event(invoking_event, rule_parameters=None):
     event_to_return = {
         'configRuleName':'myrule',
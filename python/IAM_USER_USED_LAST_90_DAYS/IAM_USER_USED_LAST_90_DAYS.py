@@ -114,6 +114,7 @@ from dateutil.tz import tzutc
 import dateutil.parser
 from datetime import timedelta
 import re
+import rule_runtime
 # import liblogging
 # logger = logging.getLogger()
 
@@ -197,39 +198,63 @@ def is_access_keys_used_recently(iam_client, username, NotUsedTimeOutInDays):
             return True
     return False
 
+def is_access_keys_used_recently_in_report(user_credentials, NotUsedTimeOutInDays):
+    for access_key in user_credentials.access_keys:
+        if access_key.last_used_date and is_older_than(access_key.last_used_date, NotUsedTimeOutInDays):
+            return True
+    return False
+
 def evaluate_scheduled_compliance(event, configuration_item, rule_parameters):
 
     evaluations = []
     iam_client = get_client('iam', event)
     
     users_list = iam_client.list_users()
+    # One report replaces the list_access_keys() and get_access_key_last_used() calls of every user
+    credential_report = rule_runtime.get_credential_report(iam_client)
+    # (user, compliance type), the compliance type is None until the access keys of the user are resolved
+    user_compliance_types = []
+    unresolved_user_names = []
     
     while True:
         for user in users_list['Users']:
 
             if user['UserId'] in rule_parameters['WhitelistedUserList']:
-                evaluations.append(build_evaluation(user['UserId'], 'COMPLIANT', event))
+                user_compliance_types.append((user, 'COMPLIANT'))
                 continue
 
             if is_older_than(user['CreateDate'], rule_parameters['NewUserCooldownInDays']):
-                evaluations.append(build_evaluation(user['UserId'], 'COMPLIANT', event))
+                user_compliance_types.append((user, 'COMPLIANT'))
                 continue
 
             if is_password_used_recently(user, rule_parameters['NotUsedTimeOutInDays']):
-                evaluations.append(build_evaluation(user['UserId'], 'COMPLIANT', event))
+                user_compliance_types.append((user, 'COMPLIANT'))
                 continue
 
-            if is_access_keys_used_recently(iam_client, user['UserName'], rule_parameters['NotUsedTimeOutInDays']):
-                evaluations.append(build_evaluation(user['UserId'], 'COMPLIANT', event))
-                continue
-
-            evaluations.append(build_evaluation(user['UserId'], 'NON_COMPLIANT', event))
+            user_credentials = credential_report.get(user['UserName']) if credential_report else None
+            if user_credentials is not None and is_access_keys_used_recently_in_report(user_credentials, rule_parameters['NotUsedTimeOutInDays']):
+                user_compliance_types.append((user, 'COMPLIANT'))
+            else:
+                # The report can be up to 4 hours old: confirm an unused access key before reporting it
+                user_compliance_types.append((user, None))
+                unresolved_user_names.append(user['UserName'])
 
         if "Marker" in users_list:
                 users_list = iam_client.list_users(Marker=users_list["Marker"])
         else:
             break
 
+    # The access keys of the users missing from the report, or unused in it, are resolved concurrently
+    resolver = rule_runtime.AccessKeyUsageResolver(iam_client)
+    used_recently = resolver.resolve(unresolved_user_names, lambda last_used_date: is_older_than(last_used_date, rule_parameters['NotUsedTimeOutInDays']))
+    if unresolved_user_names:
+        print("Access keys of {} users resolved with {}".format(len(unresolved_user_names), resolver.stats()))
+
+    for user, compliance_type in user_compliance_types:
+        if compliance_type is None:
+            compliance_type = 'COMPLIANT' if used_recently[user['UserName']] else 'NON_COMPLIANT'
+        evaluations.append(build_evaluation(user['UserId'], compliance_type, event))
+
     if not evaluations:
         evaluations.append(build_evaluation(event['accountId'],'NOT_APPLICABLE', event, resource_type='AWS::::Account'))
     return evaluations
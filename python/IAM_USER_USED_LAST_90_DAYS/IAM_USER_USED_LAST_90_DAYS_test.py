@@ -13,6 +13,7 @@ except ImportError:
 import botocore
 from botocore.exceptions import ClientError
 import sys
+import os
 import datetime
 import json
 from dateutil.tz import tzutc
@@ -34,6 +35,11 @@ class Boto3Mock():
             raise Exception("Attempting to create an unknown client")
 
 sys.modules['boto3'] = Boto3Mock()
+# Without the credential report, the rule lists the access keys of every user
+ACCESS_DENIED = ClientError({'Error': {'Code': 'AccessDenied', 'Message': 'denied'}}, 'GenerateCredentialReport')
+iam_client_mock.generate_credential_report = MagicMock(side_effect=ACCESS_DENIED)
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
 rule = __import__('IAM_USER_USED_LAST_90_DAYS')
 
@@ -96,6 +102,17 @@ def get_user_pwd_days(day=90):
 def get_user_access_key_day(day=90):
     return {'AccessKeyLastUsed': {'LastUsedDate': constructDateTime(day)}}
 
+def build_credential_report(users):
+    lines = ['user,arn,user_creation_time,password_enabled,password_last_used,password_last_changed,password_next_rotation,mfa_active,'
+             'access_key_1_active,access_key_1_last_rotated,access_key_1_last_used_date,access_key_1_last_used_region,access_key_1_last_used_service,'
+             'access_key_2_active,access_key_2_last_rotated,access_key_2_last_used_date,access_key_2_last_used_region,access_key_2_last_used_service,'
+             'cert_1_active,cert_1_last_rotated,cert_2_active,cert_2_last_rotated']
+    for user_name, key_last_used_day in users:
+        key_last_used = constructDateTime(key_last_used_day).strftime('%Y-%m-%dT%H:%M:%S+00:00') if key_last_used_day else 'N/A'
+        lines.append('{0},arn:aws:iam::112233445566:user/{0},2015-01-01T00:00:00+00:00,false,N/A,N/A,N/A,false,'
+                     'true,2015-01-01T00:00:00+00:00,{1},us-east-1,iam,false,N/A,N/A,N/A,N/A,false,N/A,false,N/A'.format(user_name, key_last_used))
+    return '\n'.join(lines).encode('utf-8')
+
 def constructDateTime(expiryTime=90):
     today = datetime.datetime.now(tz=tzutc())
     targetDatetime = today - timedelta(days=expiryTime)
@@ -292,6 +309,38 @@ class TestScheduledNotification(unittest.TestCase):
         print(resp_expected)
         assert_successful_evaluation(self, response, resp_expected, ressourcetype='AWS::::Account') 
 
+class TestScheduledNotificationWithCredentialReport(unittest.TestCase):
+
+    users_list = TestScheduledNotification.users_list
+
+    def setUp(self):
+        iam_client_mock.reset_mock()
+        iam_client_mock.generate_credential_report = MagicMock(return_value={'State': 'COMPLETE'})
+        iam_client_mock.get_credential_report = MagicMock(return_value={'Content': build_credential_report([('some-user-1', 87), ('some-user-2', 93)])})
+
+    def tearDown(self):
+        iam_client_mock.generate_credential_report = MagicMock(side_effect=ACCESS_DENIED)
+
+    def test_scheduled_access_keys_from_report(self):
+        iam_client_mock.list_users = MagicMock(return_value=self.users_list)
+        iam_client_mock.list_access_keys = MagicMock(side_effect=lambda UserName: {'AccessKeyMetadata':[{'AccessKeyId':UserName + '-key'}]})
+        iam_client_mock.get_access_key_last_used = MagicMock(side_effect=lambda AccessKeyId: get_user_access_key_day(93 if AccessKeyId == 'some-user-2-key' else 10))
+        response = rule.lambda_handler(buildLambdaEvent(scheduled=True), {})
+        resp_expected = [
+            build_expected_response('COMPLIANT', 'AIDAABCD12345ABCDE123'),
+            build_expected_response('NON_COMPLIANT', 'AIDAJYPPIFB65RV8YYLDU'),
+            build_expected_response('COMPLIANT', 'AIDA12345ABCDE12345AB')]
+        assert_successful_evaluation(self, response, resp_expected, evaluations_count=3)
+        # The user used recently in the report is not checked with per-user calls
+        self.assertEqual(['some-user-2', 'some-user-3'], sorted(call[1]['UserName'] for call in iam_client_mock.list_access_keys.call_args_list))
+
+    def test_scheduled_unused_in_report_but_used_since(self):
+        iam_client_mock.list_users = MagicMock(return_value=self.users_list)
+        iam_client_mock.list_access_keys = MagicMock(return_value={'AccessKeyMetadata':[{'AccessKeyId':'access_key_1'}]})
+        iam_client_mock.get_access_key_last_used = MagicMock(return_value=get_user_access_key_day(0))
+        response = rule.lambda_handler(buildLambdaEvent(scheduled=True), {})
+        self.assertEqual('COMPLIANT', response[1]['ComplianceType'])
+
 def assert_successful_evaluation(testClass, response, resp_expected, ressourcetype='AWS::IAM::User', evaluations_count=1):
     testClass.assertEquals(evaluations_count, len(response))
     for r, value in enumerate(response):
@@ -59,6 +59,7 @@ import botocore
 # Define the default resource to report to Config Rules
 NAME_ROLE_TO_CHECK = '.db.ec2role.iaminstancerole'
 POLICY_NAMES_THAT_MUST_BE_ATTACHED = ['AmazonEC2RoleforSSM', 'CloudWatchAgentServerPolicy', 'EC2InstanceDescribe', 'DBBackupBucket']
+REQUIRED_POLICY_NAMES = frozenset(POLICY_NAMES_THAT_MUST_BE_ATTACHED)
 DEFAULT_RESOURCE_TYPE = 'AWS::IAM::Role'
 
 # Set to True to get the lambda to assume the Role attached on the Config Service (useful for cross-account).
@@ -90,12 +91,9 @@ def evaluate_compliance(event, configuration_item, valid_rule_parameters):
     if resource_name.find(NAME_ROLE_TO_CHECK) == -1:
         return 'NOT_APPLICABLE'
 
-    policy_counter = 0
-    for policy in configuration_item['configuration']['attachedManagedPolicies']:
-        if policy['policyName'] in POLICY_NAMES_THAT_MUST_BE_ATTACHED:
-            policy_counter += 1
-        if policy_counter == len(POLICY_NAMES_THAT_MUST_BE_ATTACHED):
-            return 'COMPLIANT'
+    attached_policy_names = {policy['policyName'] for policy in configuration_item['configuration']['attachedManagedPolicies']}
+    if attached_policy_names.issuperset(REQUIRED_POLICY_NAMES):
+        return 'COMPLIANT'
 
     return build_evaluation_from_config_item(configuration_item, 'NON_COMPLIANT', annotation="One or more mandatory policy is not attached to this instance profile.")
 
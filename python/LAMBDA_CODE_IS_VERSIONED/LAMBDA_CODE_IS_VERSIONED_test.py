@@ -13,6 +13,7 @@ except ImportError:
 import botocore
 from botocore.exceptions import ClientError
 import sys
+import os
 import datetime
 
 config_client_mock = MagicMock()
@@ -31,6 +32,7 @@ class Boto3Mock():
             raise Exception("Attempting to create an unknown client")
 
 sys.modules['boto3'] = Boto3Mock()
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
 rule = __import__('LAMBDA_CODE_IS_VERSIONED')
 
@@ -160,7 +162,8 @@ class TestOnLambdaCodeIsVersioned(unittest.TestCase):
         lambda_client_mock.list_versions_by_function = MagicMock(return_value = self.versionListWithVersioning)
         lambda_client_mock.list_aliases = MagicMock(return_value = self.functionWithAliasNotPointingToLatest)
         config_client_mock.get_compliance_details_by_config_rule = MagicMock(return_value = self.complianceEvaluationResult)
-        response = rule.lambda_handler(build_lambda_event(),{})
+        # The stale evaluations are only returned by the RDK test mode, they are streamed to AWS Config otherwise
+        response = rule.lambda_handler(build_lambda_event(result_token='TESTMODE'),{})
         resp_expected = []
         resp_expected.append({
             'ComplianceResourceType' : 'AWS::Lambda::Function',
@@ -174,7 +177,18 @@ class TestOnLambdaCodeIsVersioned(unittest.TestCase):
         })
         assert_successful_evaluation(self, response, resp_expected, 2)
 
-def build_lambda_event():
+    def test_resume_after_last_evaluated_function(self):
+        lambda_client_mock.list_functions = MagicMock(side_effect=[
+            {"Functions": [{"FunctionName": "function-1"}, {"FunctionName": "function-2"}], "NextMarker": "marker"},
+            {"Functions": [{"FunctionName": "function-3"}]}])
+        lambda_client_mock.list_versions_by_function = MagicMock(return_value = self.versionListWithoutVersioning)
+        cursor = {"PageToken": None, "LastResourceId": "function-1"}
+        slices = list(rule.iter_evaluations(build_lambda_event(), {}, cursor))
+        self.assertEqual(["function-2", "function-3"], [evaluations[0]['ComplianceResourceId'] for evaluations, _ in slices])
+        self.assertEqual({"PageToken": "marker", "LastResourceId": "function-3"}, slices[-1][1])
+        lambda_client_mock.list_functions.assert_called_with(Marker="marker", MaxItems=50)
+
+def build_lambda_event(result_token='token'):
     invoking_event = '{"messageType":"ScheduledNotification","notificationCreationTime":"2017-12-23T22:11:18.158Z"}'
     return {
         'configRuleName':'myrule',
@@ -183,7 +197,7 @@ def build_lambda_event():
         'invokingEvent': invoking_event,
         'accountId': '123456789012',
         'configRuleArn': 'arn:aws:config:us-east-1:123456789012:config-rule/config-rule-8fngan',
-        'resultToken':'token'
+        'resultToken':result_token
 } 
 
 def assert_successful_evaluation(testClass, response, resp_expected, evaluations_count=1):
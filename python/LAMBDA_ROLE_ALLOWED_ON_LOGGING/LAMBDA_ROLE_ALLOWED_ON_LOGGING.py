@@ -17,6 +17,7 @@ Description:
 
 Trigger:
   Configuration Change on AWS::Lambda::Function
+  Periodic (every 24 hours): evaluates every function of the account from one IAM authorization snapshot
 
 Reports on:
   AWS::Lambda::Function
@@ -82,35 +83,81 @@ import fnmatch
 import re
 import boto3
 import botocore.exceptions
+import rule_runtime
 
 AWS_CONFIG_CLIENT = boto3.client('config')
 
 DEFAULT_RESOURCE_TYPE = "AWS::Lambda::Function"
 ASSUME_ROLE_MODE = True
+BASIC_EXECUTION_POLICY_ARN = "arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole"
+# AWS managed policies are left out of the snapshot and fetched once each, when attached
+AUTHORIZATION_SNAPSHOT_FILTERS = ['Role', 'LocalManagedPolicy']
 
 def evaluate_compliance(configuration_item, rule_parameters):
 
     role = configuration_item['relationships'][0]['resourceName']
     try:
-        attachedpolicies = IAM_CLIENT.list_attached_role_policies(RoleName=role)
-        if attachedpolicies['AttachedPolicies']:
-            for policy in attachedpolicies['AttachedPolicies']:
-                if policy['PolicyArn'] == "arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole":
-                    return 'COMPLIANT'
-            if is_a_role_managed_policy_allow_logging(attachedpolicies['AttachedPolicies']):
-                return 'COMPLIANT'
-
-        inlinepolicies = IAM_CLIENT.list_role_policies(RoleName=role)
-        if inlinepolicies['PolicyNames']:
-            if is_a_role_inline_policy_allow_logging(role, inlinepolicies['PolicyNames']):
-                return 'COMPLIANT'
-
+        return evaluate_role(role)
     except Exception as e:
         print("Exception:" + str(e) + "\nFunction: " + configuration_item['configuration']['functionName'])
         raise
 
+def evaluate_role(role):
+    attachedpolicies = IAM_CLIENT.list_attached_role_policies(RoleName=role)
+    if attachedpolicies['AttachedPolicies']:
+        for policy in attachedpolicies['AttachedPolicies']:
+            if policy['PolicyArn'] == BASIC_EXECUTION_POLICY_ARN:
+                return 'COMPLIANT'
+        if is_a_role_managed_policy_allow_logging(attachedpolicies['AttachedPolicies']):
+            return 'COMPLIANT'
+
+    inlinepolicies = IAM_CLIENT.list_role_policies(RoleName=role)
+    if inlinepolicies['PolicyNames']:
+        if is_a_role_inline_policy_allow_logging(role, inlinepolicies['PolicyNames']):
+            return 'COMPLIANT'
+
     return 'NON_COMPLIANT'
 
+# A periodic trigger evaluates the role of every function from one authorization snapshot
+def evaluate_all_functions(event, timestamp):
+    evaluations = []
+    lambda_client = get_client('lambda', event)
+    snapshot = rule_runtime.get_authorization_snapshot(IAM_CLIENT, filters=AUTHORIZATION_SNAPSHOT_FILTERS)
+    for function in get_all_functions(lambda_client):
+        role = snapshot.get_by_arn(function['Role']) if snapshot else None
+        if role is not None:
+            compliance_type = evaluate_role_in_snapshot(snapshot, role)
+        else:
+            compliance_type = evaluate_role(function['Role'].split('/')[-1])
+        evaluations.append(build_evaluation(function['FunctionName'], compliance_type, timestamp))
+    return evaluations
+
+def evaluate_role_in_snapshot(snapshot, role):
+    attachedpolicies = snapshot.get_attached_policies(role)
+    for policy in attachedpolicies:
+        if policy['PolicyArn'] == BASIC_EXECUTION_POLICY_ARN:
+            return 'COMPLIANT'
+    for policy in attachedpolicies:
+        if are_statements_allow_logging(snapshot.get_policy_document(policy['PolicyArn'])['Statement']):
+            return 'COMPLIANT'
+
+    for _, policy_document in snapshot.get_inline_policies(role):
+        if are_statements_allow_logging(policy_document['Statement']):
+            return 'COMPLIANT'
+
+    return 'NON_COMPLIANT'
+
+def get_all_functions(lambda_client):
+    all_functions = []
+    list_functions = lambda_client.list_functions()
+    while True:
+        all_functions += list_functions['Functions']
+        if 'NextMarker' in list_functions:
+            list_functions = lambda_client.list_functions(Marker=list_functions['NextMarker'])
+        else:
+            break
+    return all_functions
+
 def is_a_role_inline_policy_allow_logging(roleName, inlinepolicies):
 
     for policy in inlinepolicies:
@@ -124,9 +171,7 @@ def is_a_role_inline_policy_allow_logging(roleName, inlinepolicies):
 def is_a_role_managed_policy_allow_logging(managedpolicies):
 
     for policy in managedpolicies:
-        getrolepolicy = IAM_CLIENT.get_policy(PolicyArn=policy['PolicyArn'])
-        getpolicyversion = IAM_CLIENT.get_policy_version(PolicyArn=policy['PolicyArn'], VersionId=getrolepolicy['Policy']['DefaultVersionId'])
-        statements = getpolicyversion['PolicyVersion']['Document']['Statement']
+        statements = rule_runtime.get_managed_policy_document(IAM_CLIENT, policy['PolicyArn'])['Statement']
 
         if are_statements_allow_logging(statements):
             return True
@@ -312,7 +357,9 @@ def lambda_handler(event, context):
 
     configuration_item = get_configuration_item(invokingEvent)
 
-    if is_applicable(configuration_item, event):
+    if configuration_item is None:
+        compliance_result = evaluate_all_functions(event, invokingEvent['notificationCreationTime'])
+    elif is_applicable(configuration_item, event):
         compliance_result = evaluate_compliance(configuration_item, rule_parameters)
     else:
         compliance_result = "NOT_APPLICABLE"
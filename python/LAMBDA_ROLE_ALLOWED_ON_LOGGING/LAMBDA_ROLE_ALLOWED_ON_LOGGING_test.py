@@ -4,6 +4,7 @@
 # Created with the Rule Development Kit: https://github.com/awslabs/aws-config-rdk
 # Can be used stand-alone or with the Rule Compliance Engine: https://github.com/awslabs/aws-config-engine-for-compliance-as-code
 #
+import os
 import sys
 import json
 import unittest
@@ -15,6 +16,7 @@ except ImportError:
 CONFIG_CLIENT_MOCK = MagicMock()
 IAM_CLIENT_MOCK = MagicMock()
 STS_CLIENT_MOCK = MagicMock()
+LAMBDA_CLIENT_MOCK = MagicMock()
 
 class Boto3Mock():
     def client(self, client_name, *args, **kwargs):
@@ -24,13 +26,22 @@ class Boto3Mock():
             return IAM_CLIENT_MOCK
         if client_name == 'sts':
             return STS_CLIENT_MOCK
+        if client_name == 'lambda':
+            return LAMBDA_CLIENT_MOCK
         else:
             raise Exception("Attempting to create an unknown client")
 
 sys.modules['boto3'] = Boto3Mock()
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
 rule = __import__('LAMBDA_ROLE_ALLOWED_ON_LOGGING')
 
+# The runtime caches the managed policy documents across the invocations of a container: every test starts without them
+class PolicyCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        rule.rule_runtime.POLICY_DOCUMENT_CACHE.clear()
+
 def assert_successful_evaluation(testClass, response, resp_expected):
     testClass.assertEquals(response[0]['ComplianceType'], resp_expected)
 
@@ -169,7 +180,7 @@ class TestScenario3NoPolicyOnRole(unittest.TestCase):
         resp_expected = "NON_COMPLIANT"
         assert_successful_evaluation(self, response, resp_expected)
   
-class TestScenario4ActionStar(unittest.TestCase):
+class TestScenario4ActionStar(PolicyCacheTestCase):
 
     def test_COMPLIANT_action_star_allow_string_inline(self):
         get_pl = gen_policy_api()
@@ -271,7 +282,7 @@ class TestScenario4ActionStar(unittest.TestCase):
         resp_expected = "COMPLIANT"
         assert_successful_evaluation(self, response, resp_expected)
 
-class TestScenario5LogStar(unittest.TestCase):
+class TestScenario5LogStar(PolicyCacheTestCase):
     
     def test_COMPLIANT_action_logstar_allow_string_inline(self):
         get_pl = gen_policy_api(statement_list=gen_statement_list(gen_statement(action="log:*")))
@@ -373,7 +384,7 @@ class TestScenario5LogStar(unittest.TestCase):
         resp_expected = "COMPLIANT"
         assert_successful_evaluation(self, response, resp_expected)
     
-class TestScenario6LogExactActions(unittest.TestCase):
+class TestScenario6LogExactActions(PolicyCacheTestCase):
     CreateLogGroup = gen_statement(action="logs:CreateLogGroup")
     CreateLogStream = gen_statement(action="logs:CreateLogStream")
     PutLogEvents = gen_statement(action="logs:PutLogEvents")
@@ -439,3 +450,28 @@ class TestScenario6LogExactActions(unittest.TestCase):
             response = rule.lambda_handler(lambdaEvent, {})
             resp_expected = "NON_COMPLIANT"
             assert_successful_evaluation(self, response, resp_expected)
+
+class TestScheduledNotification(PolicyCacheTestCase):
+    authorization_details = {
+        'RoleDetailList': [
+            {'RoleName': 'basic-role', 'Arn': 'arn:aws:iam::123456789012:role/basic-role', 'RolePolicyList': [],
+             'AttachedManagedPolicies': [{'PolicyName': 'AWSLambdaBasicExecutionRole', 'PolicyArn': 'arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole'}]},
+            {'RoleName': 'no-logging-role', 'Arn': 'arn:aws:iam::123456789012:role/service-role/no-logging-role',
+             'RolePolicyList': [{'PolicyName': 'some-inline-name-policy', 'PolicyDocument': {'Statement': [gen_statement(action="s3:*")]}}],
+             'AttachedManagedPolicies': [{'PolicyName': 'some-policy-name', 'PolicyArn': 'some-policy-arn'}]}],
+        'Policies': [{'PolicyName': 'some-policy-name', 'Arn': 'some-policy-arn', 'DefaultVersionId': 'v1',
+                      'PolicyVersionList': [{'VersionId': 'v1', 'IsDefaultVersion': True, 'Document': {'Statement': [gen_statement(action="logs:PutLogEvents")]}}]}],
+        'IsTruncated': False}
+
+    def test_all_functions_from_snapshot(self):
+        IAM_CLIENT_MOCK.reset_mock()
+        IAM_CLIENT_MOCK.get_account_authorization_details = MagicMock(return_value=self.authorization_details)
+        LAMBDA_CLIENT_MOCK.list_functions = MagicMock(side_effect=[
+            {'Functions': [{'FunctionName': 'basic-function', 'Role': 'arn:aws:iam::123456789012:role/basic-role'}], 'NextMarker': 'page-2'},
+            {'Functions': [{'FunctionName': 'no-logging-function', 'Role': 'arn:aws:iam::123456789012:role/service-role/no-logging-role'}]}])
+        invoking_event = json.dumps({"notificationCreationTime": "SomeTime", "messageType": "ScheduledNotification"})
+        response = rule.lambda_handler(build_lambda_event(invokingEvent=invoking_event), {})
+        self.assertEqual([('basic-function', 'COMPLIANT'), ('no-logging-function', 'NON_COMPLIANT')],
+                         [(evaluation['ComplianceResourceId'], evaluation['ComplianceType']) for evaluation in response])
+        IAM_CLIENT_MOCK.list_attached_role_policies.assert_not_called()
+        IAM_CLIENT_MOCK.get_policy.assert_not_called()
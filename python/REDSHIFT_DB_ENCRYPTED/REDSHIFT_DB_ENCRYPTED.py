@@ -40,7 +40,7 @@ import sys
 import datetime
 import boto3
 import botocore
-from time import sleep
+import rule_runtime
 
 try:
     import liblogging
@@ -60,82 +60,12 @@ ASSUME_ROLE_MODE = False
 # Other parameters (no change needed)
 CONFIG_ROLE_TIMEOUT_SECONDS = 900
 
-LIST_PAGE_SIZE = 50
-THROTTLE_PERIOD = 0.5
-
-
-def get_logging_status(cluster_id, redshift_client):
-    response = redshift_client.describe_logging_status(ClusterIdentifier=cluster_id)
-    sleep(THROTTLE_PERIOD)
-    return response["LoggingEnabled"]
-
-
-def get_non_synced_params_list(cluster_parameter_status_list):
-    res_list = []
-    for parameter in cluster_parameter_status_list:
-        if ["ParameterApplyStatus"] != "in-sync":
-            for status in parameter["ClusterParameterStatusList"]:
-                if status["ParameterApplyStatus"] != "in-sync":
-                    res_list.append(status["ParameterName"])
-    return res_list
-
-
-def get_parameters_for_cluster_parameter_group(cluster_parameter_group, redshift_client):
-    params_to_scan = ["require_ssl", "use_fips_ssl", "enable_user_activity_logging"]
-    params_dict = {}
-    response = redshift_client.describe_cluster_parameters(
-        ParameterGroupName=cluster_parameter_group[0]["ParameterGroupName"]
-    )
-    parameters = response["Parameters"]
-    sync_list = get_non_synced_params_list(cluster_parameter_group)
-    for param in parameters:
-        if param["ParameterName"] in params_to_scan:
-            if (
-                param["ParameterValue"] == "true"
-                and param["ParameterName"] not in sync_list
-            ):
-                params_dict[param["ParameterName"]] = True
-            else:
-                params_dict[param["ParameterName"]] = False
-    sleep(THROTTLE_PERIOD)
-    return params_dict
-
-
-def get_cluster_list(redshift_client):
-    cluster_paginator = redshift_client.get_paginator("describe_clusters")
-    cluster_iterator = cluster_paginator.paginate(
-        PaginationConfig={"PageSize": LIST_PAGE_SIZE}
-    )
-    cluster_tuple_list = []
-
-    for clusters in cluster_iterator:
-        for cluster in clusters["Clusters"]:
-            params = get_parameters_for_cluster_parameter_group(
-                cluster["ClusterParameterGroups"], redshift_client
-            )
-            # Create a tuple with as first item the cluster name and as second item the list of security config items
-            params.update({"db_encrypted": cluster["Encrypted"]})
-            params.update(
-                {
-                    "log_enabled": get_logging_status(
-                        cluster["ClusterIdentifier"], redshift_client
-                    )
-                }
-            )
-            cluster_tuple_list.append(
-                (
-                    cluster["ClusterIdentifier"],
-                    params,
-                )
-            )
-        sleep(THROTTLE_PERIOD)
-    return cluster_tuple_list
-
 
 def evaluate_compliance(event, configuration_item):
     evaluations = []
     redshift_client = get_client("redshift", event)
-    cluster_list = get_cluster_list(redshift_client)
+    # The posture of every cluster, collected once for the five Redshift rules, see rule_runtime.redshift
+    cluster_list = rule_runtime.get_redshift_posture(redshift_client, event["accountId"])
     # SCENARIO 1: No Redshift clusters present
     if not cluster_list:
         evaluations.append(
@@ -8,6 +8,7 @@
 # or in the "license" file accompanying this file. This file is distributed on an "AS IS" BASIS,
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for
 # the specific language governing permissions and limitations under the License.
+import os
 import sys
 import unittest
 from botocore.exceptions import ClientError
@@ -49,6 +50,8 @@ class Boto3Mock:
 
 sys.modules["boto3"] = Boto3Mock()
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
 RULE = __import__("REDSHIFT_SSL_REQUIRED")
 
 
@@ -25,6 +25,7 @@
 #
 # Reports on:
 #   AWS::ApiGateway::DomainName
+#   AWS::ApiGateway::RestApi (the REST APIs without a custom domain name)
 #
 # Rule Parameters:
 #   CustomDomainName
@@ -46,7 +47,7 @@
 #   Scenario: 4
 #      Given: REST API GW is active
 #        And: REST API GW does not have a custom domain name
-#       Then: Return NON_COMPLIANT with annotation
+#       Then: Return NON_COMPLIANT with annotation on the AWS::ApiGateway::RestApi
 
 import json
 import sys
@@ -54,6 +55,7 @@ import datetime
 import re
 import boto3
 import botocore
+import rule_runtime
 
 try:
     import liblogging
@@ -79,28 +81,25 @@ CONFIG_ROLE_TIMEOUT_SECONDS = 900
 
 def evaluate_compliance(event, configuration_item, valid_rule_parameters):
     apigw = get_client('apigateway', event)
-    customdomains = []
     evaluations = []
-    count = 0
-    # make the api call. Maximum limit 500 API gateway
-    response = apigw.get_domain_names(limit=500)
-    # check whether there is a custom domain name
-    if not response['items']:
-        restapigws = apigw.get_rest_apis()
-        for count in range(len(restapigws['items'])):
-            print(restapigws['items'][count]['id'] + " API gateway does not have a custom domain name.\n")
-            evaluations.append(build_evaluation(restapigws['items'][count]['id'], 'NON_COMPLIANT', event, annotation='Your API Gateway does not have a custom domain name'))
-    else:
-        customdomains += response['items']
-        for each_customdomain in customdomains:
-            if each_customdomain['domainName']:
-                check = re.search('(?='+valid_rule_parameters['CustomDomainName'].strip().replace(".", r"\.")+'$)', each_customdomain['domainName'], re.I)
-                if check:
-                    evaluations.append(build_evaluation(each_customdomain['regionalDomainName'], 'COMPLIANT', event, annotation='This API Gateway has a COMPLIANT custom domain name: '+each_customdomain['domainName']))
-                else:
-                    # print non compliant custom domain to Cloudwatch logs
-                    print(each_customdomain)
-                    evaluations.append(build_evaluation(each_customdomain['regionalDomainName'], 'NON_COMPLIANT', event, annotation='This API Gateway has a NON_COMPLIANT custom domain name: '+each_customdomain['domainName']))
+    # The domains of each REST API, from the base path mappings of every custom domain name, see rule_runtime.apigateway
+    # One call per domain at the pace of the API Gateway quota: about 100 s for 1000 domains, within the LambdaTimeout of parameters.json
+    domain_index = rule_runtime.DomainIndex.build(apigw)
+    for each_customdomain in domain_index.domains():
+        if each_customdomain['domainName']:
+            check = re.search('(?='+valid_rule_parameters['CustomDomainName'].strip().replace(".", r"\.")+'$)', each_customdomain['domainName'], re.I)
+            if check:
+                evaluations.append(build_evaluation(each_customdomain['regionalDomainName'], 'COMPLIANT', event, annotation='This API Gateway has a COMPLIANT custom domain name: '+each_customdomain['domainName']))
+            else:
+                # print non compliant custom domain to Cloudwatch logs
+                print(each_customdomain)
+                evaluations.append(build_evaluation(each_customdomain['regionalDomainName'], 'NON_COMPLIANT', event, annotation='This API Gateway has a NON_COMPLIANT custom domain name: '+each_customdomain['domainName']))
+    # check whether each REST API has a custom domain name, one page of REST APIs at a time
+    for restapigw in rule_runtime.iter_apigateway_items(apigw.get_rest_apis):
+        if not domain_index.get_domains(restapigw['id']):
+            print(restapigw['id'] + " API gateway does not have a custom domain name.\n")
+            evaluations.append(build_evaluation(restapigw['id'], 'NON_COMPLIANT', event, resource_type='AWS::ApiGateway::RestApi',
+                                                annotation='Your API Gateway does not have a custom domain name'))
     return evaluations
 
 def evaluate_parameters(rule_parameters):
@@ -9,6 +9,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for
 # the specific language governing permissions and limitations under the License.
 
+import os
 import sys
 import unittest
 try:
@@ -44,6 +45,7 @@ class Boto3Mock():
         raise Exception("Attempting to create an unknown client")
 
 sys.modules['boto3'] = Boto3Mock()
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
 RULE = __import__('REST_API_GW_CUSTOMDOMAIN_CHECK')
 
@@ -72,7 +74,17 @@ class ComplianceTest(unittest.TestCase):
             }
         ]
     }
+    # sample data of the REST APIs, the first one mapped to api.sitepep.com
+    rest_apis = {
+        "items": [{"id": "a1b2c3d4e5", "name": "pets"}, {"id": "f6g7h8i9j0", "name": "users"}]
+    }
+    base_path_mappings = {
+        "items": [{"basePath": "(none)", "restApiId": "a1b2c3d4e5", "stage": "prod"}]
+    }
 
+    def setUp(self):
+        APIGW_CLIENT_MOCK.get_rest_apis = MagicMock(return_value={"items": []})
+        APIGW_CLIENT_MOCK.get_base_path_mappings = MagicMock(return_value={"items": []})
 
     def test_apigw_no_customdomain(self):
         RULE.ASSUME_ROLE_MODE = False
@@ -90,6 +102,27 @@ class ComplianceTest(unittest.TestCase):
         resp_expected.append(build_expected_response('COMPLIANT', 'd-q4fqmhwah3.execute-api.us-east-2.amazonaws.com', DEFAULT_RESOURCE_TYPE, 'This API Gateway has a custom domain name'))
         assert_successful_evaluation(self, response, resp_expected)
 
+    def test_apigw_without_customdomain_next_to_mapped_apigw(self):
+        RULE.ASSUME_ROLE_MODE = False
+        APIGW_CLIENT_MOCK.get_domain_names = MagicMock(return_value=self.apigw_customdomain)
+        APIGW_CLIENT_MOCK.get_base_path_mappings = MagicMock(return_value=self.base_path_mappings)
+        APIGW_CLIENT_MOCK.get_rest_apis = MagicMock(return_value=self.rest_apis)
+        response = RULE.lambda_handler(build_lambda_scheduled_event('{"CustomDomainName":"sitepep.com"}'), {})
+        resp_expected = []
+        resp_expected.append(build_expected_response('COMPLIANT', 'd-q4fqmhwah3.execute-api.us-east-2.amazonaws.com', DEFAULT_RESOURCE_TYPE, 'This API Gateway has a COMPLIANT custom domain name: api.sitepep.com'))
+        resp_expected.append(build_expected_response('NON_COMPLIANT', 'f6g7h8i9j0', 'AWS::ApiGateway::RestApi', 'Your API Gateway does not have a custom domain name'))
+        assert_successful_evaluation(self, response, resp_expected, evaluations_count=2)
+        APIGW_CLIENT_MOCK.get_base_path_mappings.assert_called_once_with(domainName='api.sitepep.com', limit=500)
+
+    def test_apigw_without_customdomain_reported_as_rest_api(self):
+        RULE.ASSUME_ROLE_MODE = False
+        APIGW_CLIENT_MOCK.get_domain_names = MagicMock(return_value=self.apigw_customdomain)
+        APIGW_CLIENT_MOCK.get_rest_apis = MagicMock(return_value=self.rest_apis)
+        response = RULE.lambda_handler(build_lambda_scheduled_event('{"CustomDomainName":"sitepep.com"}'), {})
+        self.assertEqual([('a1b2c3d4e5', 'AWS::ApiGateway::RestApi'), ('f6g7h8i9j0', 'AWS::ApiGateway::RestApi')],
+                         [(evaluation['ComplianceResourceId'], evaluation['ComplianceResourceType'])
+                          for evaluation in response if evaluation['ComplianceResourceId'] in ('a1b2c3d4e5', 'f6g7h8i9j0')])
+
 
 ####################
 # Helper Functions #
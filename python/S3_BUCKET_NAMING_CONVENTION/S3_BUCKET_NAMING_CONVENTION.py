@@ -29,6 +29,8 @@ Reports on:
 Rule Parameters:
   regexPattern (Required)
     The string value provided to check with the S3 bucket name.
+  denyRegexPattern (Optional)
+    A regex pattern the S3 bucket name must not match.
 
 Scenarios:
 
@@ -46,14 +48,20 @@ Scenarios:
     And: The Bucket name does not match the regexPattern
    Then: Return NON_COMPLIANT
 
+  Scenario 4:
+  Given: Rule parameter denyRegexPattern is configured and valid
+    And: The Bucket name match the regexPattern
+    And: The Bucket name match the denyRegexPattern
+   Then: Return NON_COMPLIANT
+
 '''
 
 import json
 import sys
 import datetime
-import re
 import boto3
 import botocore
+import rule_runtime
 
 try:
     import liblogging
@@ -78,21 +86,36 @@ CONFIG_ROLE_TIMEOUT_SECONDS = 900
 #############
 
 def evaluate_compliance(event, configuration_item, valid_rule_parameters):
+    return evaluate_bucket_name(configuration_item, get_name_matcher(valid_rule_parameters), valid_rule_parameters)
 
-    s3_bucket_name = configuration_item["resourceName"]
-    pattern_str = valid_rule_parameters["regexPattern"]
-    pattern = re.compile(f"{pattern_str}")
+def evaluate_compliance_batch(events, configuration_items, valid_rule_parameters):
+    """Return the evaluation of each configuration item, with one matcher lookup for the whole batch (used by rule_runtime.snapshot)."""
+    matcher = get_name_matcher(valid_rule_parameters)
+    return [evaluate_bucket_name(configuration_item, matcher, valid_rule_parameters) for configuration_item in configuration_items]
 
-    if pattern.match(s3_bucket_name):
-        return build_evaluation_from_config_item(configuration_item, 'COMPLIANT')
+def evaluate_bucket_name(configuration_item, matcher, valid_rule_parameters):
+    s3_bucket_name = configuration_item["resourceName"]
+    if not matcher.is_allowed(s3_bucket_name):
+        return build_evaluation_from_config_item(configuration_item, 'NON_COMPLIANT', 'The regex ({}) does not match ({}).'.format(valid_rule_parameters["regexPattern"], s3_bucket_name))
+    if matcher.is_denied(s3_bucket_name):
+        return build_evaluation_from_config_item(configuration_item, 'NON_COMPLIANT', 'The denied regex ({}) matches ({}).'.format(valid_rule_parameters["denyRegexPattern"], s3_bucket_name))
+    return build_evaluation_from_config_item(configuration_item, 'COMPLIANT')
 
-    return build_evaluation_from_config_item(configuration_item, 'NON_COMPLIANT', 'The regex ({}) does not match ({}).'.format(pattern_str, s3_bucket_name))
+# The patterns are compiled once per container, see rule_runtime.matcher
+def get_name_matcher(valid_rule_parameters):
+    deny_patterns = [valid_rule_parameters['denyRegexPattern']] if valid_rule_parameters.get('denyRegexPattern') else []
+    return rule_runtime.get_name_matcher([valid_rule_parameters['regexPattern']], deny_patterns)
 
 def evaluate_parameters(rule_parameters):
     try:
-        re.compile(rule_parameters['regexPattern'])
-    except:
+        rule_runtime.get_name_matcher([rule_parameters['regexPattern']])
+    except (KeyError, ValueError):
         raise ValueError('This Config Rule must have a validate regex value specified for the parameter "regexPattern".')
+    if rule_parameters.get('denyRegexPattern'):
+        try:
+            get_name_matcher(rule_parameters)
+        except ValueError:
+            raise ValueError('The optional parameter "denyRegexPattern" must be a valid regex.')
 
     return rule_parameters
 
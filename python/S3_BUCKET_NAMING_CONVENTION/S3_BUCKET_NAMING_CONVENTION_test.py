@@ -9,6 +9,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for
 # the specific language governing permissions and limitations under the License.
 
+import os
 import sys
 import unittest
 try:
@@ -40,6 +41,7 @@ class Boto3Mock():
         raise Exception("Attempting to create an unknown client")
 
 sys.modules['boto3'] = Boto3Mock()
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
 RULE = __import__('S3_BUCKET_NAMING_CONVENTION')
 
@@ -73,6 +75,20 @@ class ComplianceTest(unittest.TestCase):
         resp_expected.append(build_expected_response('COMPLIANT', "apps-test-us-east-1"))
         assert_successful_evaluation(self, response, resp_expected)
 
+    def test_scenario_4_denied(self):
+        invoking_event = self.invoking_event_bucket_compliant
+        lambda_event = build_lambda_configurationchange_event(invoking_event, rule_parameters="{\"regexPattern\":\".*test.*\",\"denyRegexPattern\":\".*-us-east-1$\"}")
+        response = RULE.lambda_handler(lambda_event, {})
+        resp_expected = []
+        resp_expected.append(build_expected_response('NON_COMPLIANT', "apps-test-us-east-1", annotation='The denied regex (.*-us-east-1$) matches (apps-test-us-east-1).'))
+        assert_successful_evaluation(self, response, resp_expected)
+
+    def test_invalid_deny_pattern(self):
+        invoking_event = self.invoking_event_bucket_compliant
+        lambda_event = build_lambda_configurationchange_event(invoking_event, rule_parameters="{\"regexPattern\":\".*test.*\",\"denyRegexPattern\":\"[bad\"}")
+        response = RULE.lambda_handler(lambda_event, {})
+        assert_customer_error_response(self, response, "InvalidParameterValueException")
+
 ####################
 # Helper Functions #
 ####################
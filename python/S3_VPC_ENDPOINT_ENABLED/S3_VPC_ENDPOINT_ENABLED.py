@@ -48,6 +48,7 @@ import sys
 import datetime
 import boto3
 import botocore
+import rule_runtime
 
 
 try:
@@ -72,23 +73,14 @@ CONFIG_ROLE_TIMEOUT_SECONDS = 900
 # Main Code #
 #############
 
-def get_vpcendpoints(vpc_id, event):
+def get_vpcendpoints(vpc_id, event, network_inventory):
     compliance_results = {}
-    ec2_client = get_client('ec2', event)
     compliance = 'NON_COMPLIANT'
     region = get_region_from_config_arn(event)
     annotate = 'There are no Amazon S3 VPC endpoints present in '+ vpc_id+'.'
-    response = ec2_client.describe_vpc_endpoints(Filters=[
-                {
-                    'Name':'vpc-id',
-                    'Values':[vpc_id]
-                },
-                {
-                    'Name':'service-name',
-                    'Values': ['com.amazonaws.'+region+'.s3']
-                }])
-    if response['VpcEndpoints'] != []:
-        for vpce in response['VpcEndpoints']:
+    endpoints = network_inventory.get_endpoints(vpc_id=vpc_id, service_name='com.amazonaws.'+region+'.s3')
+    if endpoints != []:
+        for vpce in endpoints:
             endpoint_state = vpce['State']
             annotate = 'The Amazon S3 VPC endpoint is not in Available state '+vpc_id+'.'
             if is_available(endpoint_state):
@@ -105,13 +97,13 @@ def is_available(endpointstate):
 
 def evaluate_compliance(event, configuration_item, valid_rule_parameters):
     evaluations = []
-    ec2_client = get_client('ec2', event)
-    vpc_response = ec2_client.describe_vpcs()
-    if not vpc_response['Vpcs']:
+    # One describe of the VPCs and VPC endpoints, then a lookup per VPC, see rule_runtime.network
+    network_inventory = rule_runtime.get_network_inventory(get_client('ec2', event), event['accountId'])
+    if not network_inventory.vpcs():
         evaluations.append(build_evaluation(event['accountId'], 'NOT_APPLICABLE', event))
         return evaluations
-    for vpc in vpc_response['Vpcs']:
-        evaluation_payload = get_vpcendpoints(vpc['VpcId'], event)
+    for vpc in network_inventory.vpcs():
+        evaluation_payload = get_vpcendpoints(vpc['VpcId'], event, network_inventory)
         evaluations.append(build_evaluation(vpc['VpcId'], evaluation_payload[vpc['VpcId']][1], event, annotation=evaluation_payload[vpc['VpcId']][0]))
     return evaluations
 
@@ -9,6 +9,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for
 # the specific language governing permissions and limitations under the License.
 
+import os
 import sys
 import unittest
 try:
@@ -45,6 +46,8 @@ class Boto3Mock():
 
 sys.modules['boto3'] = Boto3Mock()
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
 RULE = __import__('SQS_ENCRYPTION_CHECK')
 
 class ComplianceTest(unittest.TestCase):
@@ -41,6 +41,7 @@ import sys
 import datetime
 import boto3
 import botocore
+import rule_runtime
 
 
 try:
@@ -65,24 +66,14 @@ CONFIG_ROLE_TIMEOUT_SECONDS = 900
 # Main Code #
 #############
 
-def get_vpcendpoints(vpc_id, event):
+def get_vpcendpoints(vpc_id, iam_client, network_inventory):
     # Get a list of the VPC Endpoints in a VPC and evaluate each for compliance
     compliance_results = {}
-    ec2_client = get_client('ec2', event)
-    iam_client = get_client('iam', event)
     compliance = 'NON_COMPLIANT'
     annotate = 'There are no VPC interface endpoints present in '+ vpc_id+'.'
-    response = ec2_client.describe_vpc_endpoints(Filters=[
-                {
-                    'Name':'vpc-id',
-                    'Values':[vpc_id]
-                },
-                {
-                    'Name':'vpc-endpoint-type',
-                    'Values':['Interface','Gateway']
-                }])
-    if response['VpcEndpoints'] != []:
-        for vpce in response['VpcEndpoints']:
+    endpoints = network_inventory.get_endpoints(vpc_id=vpc_id, endpoint_types=('Interface', 'Gateway'))
+    if endpoints != []:
+        for vpce in endpoints:
             policy_document = vpce['PolicyDocument']
             annotate = 'The interface VPC endpoint ('+vpce['VpcEndpointId']+') is using the default open policy in VPC '+vpc_id+'.'
             if not is_open(iam_client,policy_document,get_service_name(vpce['ServiceName'])):
@@ -148,13 +139,14 @@ def is_open_basic(policy_document):
 # Main entry function
 def evaluate_compliance(event, configuration_item, valid_rule_parameters):
     evaluations = []
-    ec2_client = get_client('ec2', event)
-    vpc_response = ec2_client.describe_vpcs()
-    if not vpc_response['Vpcs']:
+    iam_client = get_client('iam', event)
+    # One describe of the VPCs and VPC endpoints, then a lookup per VPC, see rule_runtime.network
+    network_inventory = rule_runtime.get_network_inventory(get_client('ec2', event), event['accountId'])
+    if not network_inventory.vpcs():
         evaluations.append(build_evaluation(event['accountId'], 'NOT_APPLICABLE', event))
         return evaluations
-    for vpc in vpc_response['Vpcs']:
-        evaluation_payload = get_vpcendpoints(vpc['VpcId'], event)
+    for vpc in network_inventory.vpcs():
+        evaluation_payload = get_vpcendpoints(vpc['VpcId'], iam_client, network_inventory)
         evaluations.append(build_evaluation(vpc['VpcId'], evaluation_payload[vpc['VpcId']][1], event, annotation=evaluation_payload[vpc['VpcId']][0]))
     return evaluations
 
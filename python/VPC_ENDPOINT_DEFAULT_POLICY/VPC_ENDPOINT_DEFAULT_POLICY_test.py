@@ -8,6 +8,7 @@
 # or in the "license" file accompanying this file. This file is distributed on an "AS IS" BASIS,
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for
 # the specific language governing permissions and limitations under the License.
+import os
 import sys
 import unittest
 from botocore.exceptions import ClientError
@@ -47,6 +48,7 @@ class Boto3Mock():
         raise Exception("Attempting to create an unknown client")
 
 sys.modules['boto3'] = Boto3Mock()
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
 RULE = __import__('VPC_ENDPOINT_DEFAULT_POLICY')
 
@@ -86,7 +88,7 @@ class ComplianceTest(unittest.TestCase):
                 {
                     "VpcEndpointId": "vpce-06e48c97f0bc5d501",
                     "VpcEndpointType": "Interface",
-                    "VpcId": "vpc-0056487b",
+                    "VpcId": "vpc-1234567",
                     "ServiceName": "com.amazonaws.us-east-1.s3",
                     "State": "pending",
                     "PolicyDocument": "{\"Version\":\"2008-10-17\",\"Statement\":[{\"Effect\":\"Allow\",\"Principal\":\"*\",\"Action\":\"*\",\"Resource\":\"*\"}]}",
@@ -127,7 +129,7 @@ class ComplianceTest(unittest.TestCase):
                 {
                     "VpcEndpointId": "vpce-06e48c97f0bc5d501",
                     "VpcEndpointType": "Gateway",
-                    "VpcId": "vpc-0056487b",
+                    "VpcId": "vpc-1234567",
                     "ServiceName": "com.amazonaws.us-east-1.s3",
                     "State": "available",
                     "PolicyDocument": "{\"Version\":\"2008-10-17\",\"Statement\":[{\"Effect\":\"Deny\",\"Principal\":\"*\",\"Action\":\"*\",\"Resource\":\"*\"}]}",
@@ -138,7 +140,7 @@ class ComplianceTest(unittest.TestCase):
                 {
                     "VpcEndpointId": "vpce-03ff48d1f2709aa88",
                     "VpcEndpointType": "Interface",
-                    "VpcId": "vpc-0056487b",
+                    "VpcId": "vpc-1234567",
                     "ServiceName": "com.amazonaws.us-east-1.secretsmanager",
                     "State": "available",
                     "PolicyDocument": "{\n  \"Statement\": [\n    {\n      \"Action\": \"*\", \n      \"Effect\": \"Deny\", \n      \"Principal\": \"*\", \n      \"Resource\": \"*\"\n    }\n  ]\n}",
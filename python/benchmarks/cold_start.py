@@ -0,0 +1,192 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+'''
+Cold-start benchmark of the rules.
+
+Each run happens in a fresh Python process, like a new Lambda container, and measures:
+ - import: the time to import the rule module (the Lambda init phase)
+ - invoke: the time of the first lambda_handler() call, including the import of boto3 when the
+           rule defers it
+No AWS call leaves the process: every API call is answered with an empty response built from the
+botocore output shape of the operation.
+
+The rules of the working tree ("after") are compared with the same rules at a git revision
+("before", HEAD by default):
+
+    python benchmarks/cold_start.py IAM_ACCESS_KEY_ROTATED REDSHIFT_SSL_REQUIRED --runs 10
+    python benchmarks/cold_start.py IAM_ACCESS_KEY_ROTATED --baseline-ref baseline --json
+'''
+
+import argparse
+import importlib
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+PYTHON_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+RUNTIME_DIR_NAME = 'rule_runtime'
+MAX_SHAPE_DEPTH = 3
+
+SCHEDULED_INVOKING_EVENT = {'messageType': 'ScheduledNotification', 'notificationCreationTime': '2017-12-23T22:11:18.158Z'}
+
+def build_scheduled_event():
+    return {
+        'configRuleName': 'cold-start-benchmark',
+        'executionRoleArn': 'arn:aws:iam::123456789012:role/config-role',
+        'eventLeftScope': False,
+        'invokingEvent': json.dumps(SCHEDULED_INVOKING_EVENT),
+        'ruleParameters': '{}',
+        'accountId': '123456789012',
+        'configRuleArn': 'arn:aws:config:us-east-1:123456789012:config-rule/config-rule-benchmark',
+        'resultToken': 'TESTMODE'
+    }
+
+class FakeContext():
+    @staticmethod
+    def get_remaining_time_in_millis():
+        return 900000
+
+################
+# Child process #
+################
+
+def build_empty_response(shape, depth=0):
+    """Return the smallest parsed response of an output shape: lists, maps and structures only.
+
+    Scalar members are left out so that pagination tokens (NextToken, Marker...) are never set.
+    """
+    if shape is None:
+        return {}
+    if shape.type_name == 'list':
+        return []
+    if shape.type_name == 'map':
+        return {}
+    if shape.type_name != 'structure' or depth > MAX_SHAPE_DEPTH:
+        return None
+    response = {}
+    for member_name, member_shape in shape.members.items():
+        member = build_empty_response(member_shape, depth + 1)
+        if member is not None:
+            response[member_name] = member
+    return response
+
+def answer_offline(model, **kwargs):
+    from botocore.awsrequest import AWSResponse
+    return AWSResponse('https://benchmark.invalid', 200, {}, None), build_empty_response(model.output_shape)
+
+def run_child(rule_dir, rule_name, event_path):
+    sys.path.insert(0, rule_dir)
+    sys.path.insert(1, os.path.dirname(rule_dir))
+    event = build_scheduled_event()
+    if event_path:
+        with open(event_path) as event_file:
+            event = json.load(event_file)
+
+    start = time.perf_counter()
+    rule = importlib.import_module(rule_name)
+    imported = time.perf_counter()
+
+    # boto3 is imported here when the rule defers it, so this cost lands in the invocation time.
+    import boto3
+    boto3.setup_default_session(region_name='us-east-1', aws_access_key_id='benchmark', aws_secret_access_key='benchmark')
+    boto3.DEFAULT_SESSION.events.register('before-call', answer_offline)
+    error = None
+    try:
+        rule.lambda_handler(event, FakeContext())
+    except Exception as ex:
+        error = '{}: {}'.format(type(ex).__name__, ex)
+    invoked = time.perf_counter()
+
+    print(json.dumps({'import_ms': (imported - start) * 1000, 'invoke_ms': (invoked - imported) * 1000, 'error': error}))
+
+#################
+# Parent process #
+#################
+
+def extract_revision(ref, rule_names, destination):
+    """Extract the rules (and the shared runtime, if it exists) at a git revision."""
+    paths = ['python/' + name for name in rule_names]
+    if subprocess.call(['git', 'cat-file', '-e', '{}:python/{}'.format(ref, RUNTIME_DIR_NAME)], cwd=PYTHON_DIR, stderr=subprocess.DEVNULL) == 0:
+        paths.append('python/' + RUNTIME_DIR_NAME)
+    archive_path = os.path.join(destination, 'revision.tar')
+    repository_root = subprocess.check_output(['git', 'rev-parse', '--show-toplevel'], cwd=PYTHON_DIR).decode().strip()
+    subprocess.check_call(['git', 'archive', '--format=tar', '-o', archive_path, ref, '--'] + paths, cwd=repository_root)
+    with tarfile.open(archive_path) as archive:
+        archive.extractall(destination)
+    return os.path.join(destination, 'python')
+
+def measure(python_dir, rule_name, runs, event_path):
+    samples = []
+    env = dict(os.environ, AWS_DEFAULT_REGION='us-east-1', AWS_ACCESS_KEY_ID='benchmark', AWS_SECRET_ACCESS_KEY='benchmark')
+    for _ in range(runs):
+        command = [sys.executable, os.path.abspath(__file__), '--child', os.path.join(python_dir, rule_name), rule_name]
+        if event_path:
+            command += ['--event', os.path.abspath(event_path)]
+        output = subprocess.check_output(command, cwd=os.path.join(python_dir, rule_name), env=env)
+        samples.append(json.loads(output.decode().strip().splitlines()[-1]))
+    import_ms = statistics.median([sample['import_ms'] for sample in samples])
+    invoke_ms = statistics.median([sample['invoke_ms'] for sample in samples])
+    return {'import_ms': round(import_ms, 2),
+            'invoke_ms': round(invoke_ms, 2),
+            'total_ms': round(import_ms + invoke_ms, 2),
+            'error': samples[-1]['error']}
+
+def print_report(results):
+    print('{:<45} {:<7} {:>10} {:>10} {:>10}'.format('rule', 'version', 'import ms', 'invoke ms', 'total ms'))
+    for result in results:
+        for version in ('before', 'after'):
+            if version not in result:
+                continue
+            timing = result[version]
+            print('{:<45} {:<7} {:>10.2f} {:>10.2f} {:>10.2f}{}'.format(
+                result['rule'], version, timing['import_ms'], timing['invoke_ms'], timing['total_ms'],
+                '  ({})'.format(timing['error']) if timing['error'] else ''))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure the import and first-invocation latency of rules.')
+    parser.add_argument('rules', nargs='*', help='names of the rule directories to benchmark')
+    parser.add_argument('--runs', type=int, default=5, help='number of fresh processes per rule and version (default: 5)')
+    parser.add_argument('--baseline-ref', default='HEAD', help='git revision of the "before" version (default: HEAD)')
+    parser.add_argument('--no-baseline', action='store_true', help='only measure the working tree')
+    parser.add_argument('--event', help='JSON file with the lambda event to use instead of a scheduled notification')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    parser.add_argument('--child', nargs=2, metavar=('RULE_DIR', 'RULE_NAME'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        run_child(args.child[0], args.child[1], args.event)
+        return 0
+    if not args.rules:
+        parser.error('at least one rule is required')
+
+    results = []
+    baseline_dir = None
+    try:
+        if not args.no_baseline:
+            baseline_dir = tempfile.mkdtemp(prefix='cold_start_')
+            baseline_python_dir = extract_revision(args.baseline_ref, args.rules, baseline_dir)
+        for rule_name in args.rules:
+            result = {'rule': rule_name}
+            if baseline_dir:
+                result['before'] = measure(baseline_python_dir, rule_name, args.runs, args.event)
+            result['after'] = measure(PYTHON_DIR, rule_name, args.runs, args.event)
+            results.append(result)
+    finally:
+        if baseline_dir:
+            shutil.rmtree(baseline_dir)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,324 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+'''
+Scaling benchmark of the rules, on synthetic accounts replayed through botocore's Stubber.
+
+Each scenario of benchmarks/cassettes.py (e.g. IAM_ACCESS_KEY_ROTATED on 10k users) and every
+other periodic rule, on the generic cassette, runs in a fresh Python process. Every boto3 client
+created by the rule is a real botocore client with a CassetteStubber activated: the API parameters
+are validated by botocore, the responses are computed by the cassette and validated against the
+output shape of the operation, and no call leaves the process. The benchmark measures:
+ - wall_ms: the median time of lambda_handler() on a scheduled notification, after a warm-up run
+ - api_calls: the number of API calls of one invocation, AWS Config calls included
+ - peak_memory_kb: the peak of the memory allocated by Python during one invocation (tracemalloc)
+
+The results are compared with benchmarks/scaling_baseline.json and the command fails (exit code 1)
+on a regression: more API calls, a wall time or a peak memory above the tolerance, or a new error.
+Wall times depend on the machine, so the baseline should be updated on the machine which checks it:
+
+    python benchmarks/scaling.py
+    python benchmarks/scaling.py IAM_ACCESS_KEY_ROTATED LAMBDA_CODE_IS_VERSIONED --runs 5
+    python benchmarks/scaling.py --update-baseline
+    python benchmarks/scaling.py --no-generic --scale 0.1 --json
+
+The IAM, API Gateway and Redshift calls are not paced by default, so the wall times measure the
+rules rather than the sleeps of their rate limiters. Setting the pace in the environment measures
+the time of an invocation against AWS, e.g. the Lambda timeout a rule needs:
+
+    APIGATEWAY_CALLS_PER_SECOND=10 python benchmarks/scaling.py REST_API_GW_CUSTOMDOMAIN_CHECK --no-generic
+'''
+
+import argparse
+import collections
+import contextlib
+import importlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from botocore.awsrequest import AWSResponse
+from botocore.stub import Stubber
+
+from cassettes import SCENARIOS, CassetteError, Scenario, build_config_cassette, build_synthetic_response
+
+PYTHON_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scaling_baseline.json')
+GENERIC_SIZE = 50
+CHILD_TIMEOUT_SECONDS = 600
+# Rules slower than this (e.g. sleeping between calls) are timed on a single run
+LONG_RUN_MS = 10000
+# Context key of the API parameters, from the before-parameter-build event to the before-call event
+API_PARAMS_CONTEXT_KEY = 'cassette_api_params'
+
+# A regression is a relative increase above the tolerance and an absolute increase above the floor
+WALL_TIME_TOLERANCE = 0.25
+WALL_TIME_FLOOR_MS = 50
+PEAK_MEMORY_TOLERANCE = 0.2
+PEAK_MEMORY_FLOOR_KB = 512
+
+SCHEDULED_INVOKING_EVENT = {'messageType': 'ScheduledNotification', 'notificationCreationTime': '2017-12-23T22:11:18.158Z'}
+
+def build_scheduled_event(rule_parameters):
+    return {
+        'configRuleName': 'scaling-benchmark',
+        'executionRoleArn': 'arn:aws:iam::123456789012:role/config-role',
+        'eventLeftScope': False,
+        'invokingEvent': json.dumps(SCHEDULED_INVOKING_EVENT),
+        'ruleParameters': json.dumps(rule_parameters),
+        'accountId': '123456789012',
+        'configRuleArn': 'arn:aws:config:us-east-1:123456789012:config-rule/config-rule-benchmark',
+        'resultToken': 'TESTMODE'
+    }
+
+class FakeContext():
+    invoked_function_arn = 'arn:aws:lambda:us-east-1:123456789012:function:scaling-benchmark'
+
+    @staticmethod
+    def get_remaining_time_in_millis():
+        return 900000
+
+def load_rule_parameters(rule_name):
+    with open(os.path.join(PYTHON_DIR, rule_name, 'parameters.json')) as parameters_file:
+        parameters = json.load(parameters_file)['Parameters']
+    return parameters, json.loads(parameters.get('InputParameters') or '{}')
+
+def list_scenarios(include_generic=True):
+    """Return the scenarios of the cassettes, followed by the generic scenarios of the other periodic rules."""
+    scenarios = list(SCENARIOS)
+    if not include_generic:
+        return scenarios
+    specific_rules = {scenario.rule for scenario in SCENARIOS}
+    for rule_name in sorted(os.listdir(PYTHON_DIR)):
+        if rule_name in specific_rules or not os.path.isfile(os.path.join(PYTHON_DIR, rule_name, 'parameters.json')):
+            continue
+        parameters, input_parameters = load_rule_parameters(rule_name)
+        if 'SourcePeriodic' in parameters:
+            scenarios.append(Scenario('{}-generic'.format(rule_name), rule_name, GENERIC_SIZE, None, input_parameters))
+    return scenarios
+
+################
+# Child process #
+################
+
+class CassetteStubber(Stubber):
+    """Stubber answering every call of the client with its cassette, instead of a queue of expected responses.
+
+    Keyword arguments:
+    client -- the botocore client to stub
+    cassette -- the handlers of the operations of the service, by operation name
+    size -- the size of the generic responses of the operations without a handler
+    api_calls -- the Counter of the calls, by service and operation name
+    """
+
+    def __init__(self, client, cassette, size, api_calls):
+        super().__init__(client)
+        self.cassette = cassette
+        self.size = size
+        self.api_calls = api_calls
+        self.service_name = client.meta.service_model.service_name
+        self.validated_operations = set()
+
+    def _assert_expected_params(self, model, params, context, **kwargs):
+        context[API_PARAMS_CONTEXT_KEY] = params
+
+    def _get_response_handler(self, model, params, context, **kwargs):
+        self.api_calls['{}.{}'.format(self.service_name, model.name)] += 1
+        handler = self.cassette.get(model.name)
+        try:
+            if handler:
+                response = handler(context.pop(API_PARAMS_CONTEXT_KEY, {}))
+            else:
+                response = build_synthetic_response(model.output_shape, self.size)
+        except CassetteError as ex:
+            return AWSResponse(None, ex.http_status_code, {}, None), {
+                'ResponseMetadata': {'HTTPStatusCode': ex.http_status_code},
+                'Error': {'Code': ex.code, 'Message': ex.message}}
+        # Validating every response would dominate the measure, the first one of each operation checks the cassette
+        if model.name not in self.validated_operations:
+            self._validate_operation_response(model.name, response)
+            self.validated_operations.add(model.name)
+        response['ResponseMetadata'] = {'HTTPStatusCode': 200}
+        return AWSResponse(None, 200, {}, None), response
+
+def install_cassette(cassette, size, api_calls):
+    """Make boto3.client() return stubbed clients, answered by the cassette."""
+    import boto3
+    session = boto3.session.Session(aws_access_key_id='benchmark', aws_secret_access_key='benchmark', region_name='us-east-1')
+
+    def client(service_name, *args, **kwargs):
+        stubbed_client = session.client(service_name, *args, **kwargs)
+        CassetteStubber(stubbed_client, cassette.get(service_name, {}), size, api_calls).activate()
+        return stubbed_client
+
+    boto3.client = client
+    boto3.DEFAULT_SESSION = session
+
+def invoke(rule, event):
+    """Return the duration in milliseconds and the error of one lambda_handler() call, the rule output being discarded."""
+    error = None
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        try:
+            response = rule.lambda_handler(event, FakeContext())
+            if isinstance(response, dict) and 'customerErrorCode' in response:
+                error = '{}: {}'.format(response['customerErrorCode'], response.get('customerErrorMessage'))
+        except Exception as ex:
+            error = '{}: {}'.format(type(ex).__name__, ex)
+        duration_ms = (time.perf_counter() - start) * 1000
+    if error:
+        # The first lines are enough to compare, a validation error lists every invalid item
+        error = ' '.join(error.splitlines()[:2])
+    return duration_ms, error
+
+def run_child(scenario_name, runs, scale, include_generic):
+    scenario = {scenario.name: scenario for scenario in list_scenarios(include_generic)}[scenario_name]
+    size = max(1, int(scenario.size * scale))
+    sys.path.insert(0, os.path.join(PYTHON_DIR, scenario.rule))
+    sys.path.insert(1, PYTHON_DIR)
+
+    cassette = build_config_cassette()
+    if scenario.build_cassette:
+        cassette.update(scenario.build_cassette(size))
+    api_calls = collections.Counter()
+    install_cassette(cassette, size, api_calls)
+    rule = importlib.import_module(scenario.rule)
+    event = build_scheduled_event(scenario.rule_parameters)
+
+    # The warm-up run creates the clients and loads the service models, which do not depend on the size
+    warm_up_ms, _ = invoke(rule, event)
+    if warm_up_ms > LONG_RUN_MS:
+        runs = 1
+    api_calls.clear()
+    tracemalloc.start()
+    _, error = invoke(rule, event)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    calls = dict(api_calls)
+    durations = [invoke(rule, event)[0] for _ in range(runs)]
+
+    print(json.dumps({'size': size,
+                      'wall_ms': round(statistics.median(durations), 2),
+                      'api_calls': sum(calls.values()),
+                      'api_calls_by_operation': calls,
+                      'peak_memory_kb': round(peak_memory / 1024.0, 1),
+                      'error': error}))
+
+#################
+# Parent process #
+#################
+
+def measure(scenario, runs, scale, include_generic):
+    command = [sys.executable, os.path.abspath(__file__), '--child', scenario.name, '--runs', str(runs), '--scale', str(scale)]
+    if not include_generic:
+        command.append('--no-generic')
+    env = dict(os.environ, AWS_DEFAULT_REGION='us-east-1', AWS_ACCESS_KEY_ID='benchmark', AWS_SECRET_ACCESS_KEY='benchmark')
+    # The cassettes answer without latency: pacing the IAM, API Gateway and Redshift calls would only measure the sleeps of the rate limiter
+    env.setdefault('IAM_CALLS_PER_SECOND', '1000000')
+    env.setdefault('APIGATEWAY_CALLS_PER_SECOND', '1000000')
+    env.setdefault('REDSHIFT_CALLS_PER_SECOND', '1000000')
+    # Every timed run lists the methods again: the cost measured is the one of a cold container
+    env.setdefault('APIGATEWAY_INVENTORY_TTL_SECONDS', '0')
+    result = {'scenario': scenario.name, 'rule': scenario.rule}
+    try:
+        process = subprocess.run(command, cwd=os.path.join(PYTHON_DIR, scenario.rule), env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                 timeout=CHILD_TIMEOUT_SECONDS)
+    except subprocess.TimeoutExpired:
+        result['error'] = 'Timeout after {} seconds'.format(CHILD_TIMEOUT_SECONDS)
+        return result
+    if process.returncode != 0:
+        lines = process.stderr.decode(errors='replace').strip().splitlines()
+        result['error'] = lines[-1] if lines else 'Exit code {}'.format(process.returncode)
+        return result
+    result.update(json.loads(process.stdout.decode().strip().splitlines()[-1]))
+    return result
+
+def find_regressions(result, baseline):
+    """Return the regressions of a result against its baseline entry."""
+    if baseline is None or result.get('size') != baseline.get('size'):
+        return []
+    if result.get('error'):
+        return [] if baseline.get('error') else ['new error: {}'.format(result['error'])]
+    if baseline.get('error'):
+        return []
+    regressions = []
+    if result['api_calls'] > baseline['api_calls']:
+        regressions.append('api_calls {} > {}'.format(result['api_calls'], baseline['api_calls']))
+    if result['wall_ms'] > baseline['wall_ms'] * (1 + WALL_TIME_TOLERANCE) and result['wall_ms'] - baseline['wall_ms'] > WALL_TIME_FLOOR_MS:
+        regressions.append('wall_ms {:.2f} > {:.2f}'.format(result['wall_ms'], baseline['wall_ms']))
+    if result['peak_memory_kb'] > baseline['peak_memory_kb'] * (1 + PEAK_MEMORY_TOLERANCE) and \
+            result['peak_memory_kb'] - baseline['peak_memory_kb'] > PEAK_MEMORY_FLOOR_KB:
+        regressions.append('peak_memory_kb {:.1f} > {:.1f}'.format(result['peak_memory_kb'], baseline['peak_memory_kb']))
+    return regressions
+
+def load_baseline(path):
+    if not os.path.isfile(path):
+        return {}
+    with open(path) as baseline_file:
+        return json.load(baseline_file)
+
+def write_baseline(path, baseline, results):
+    for result in results:
+        baseline[result['scenario']] = {key: result.get(key) for key in ('rule', 'size', 'wall_ms', 'api_calls', 'peak_memory_kb', 'error')}
+    with open(path, 'w') as baseline_file:
+        json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+        baseline_file.write('\n')
+
+def format_baseline(value, format_spec):
+    return format(value, format_spec) if value is not None else '-'
+
+def print_report(results, baseline):
+    print('{:<55} {:>7} {:>10} {:>10} {:>9} {:>9} {:>12} {:>12}'.format(
+        'scenario', 'size', 'wall ms', 'baseline', 'calls', 'baseline', 'peak KB', 'baseline'))
+    for result in results:
+        previous = baseline.get(result['scenario']) or {}
+        if result.get('wall_ms') is None:
+            print('{:<55} {:>7}  ({})'.format(result['scenario'], '-', result['error']))
+            continue
+        print('{:<55} {:>7} {:>10.2f} {:>10} {:>9} {:>9} {:>12.1f} {:>12}{}{}'.format(
+            result['scenario'], result['size'], result['wall_ms'], format_baseline(previous.get('wall_ms'), '.2f'),
+            result['api_calls'], format_baseline(previous.get('api_calls'), 'd'),
+            result['peak_memory_kb'], format_baseline(previous.get('peak_memory_kb'), '.1f'),
+            '  ({})'.format(result['error']) if result['error'] else '',
+            '  REGRESSION: {}'.format(', '.join(result['regressions'])) if result['regressions'] else ''))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure how the rules scale on synthetic accounts and check for regressions.')
+    parser.add_argument('rules', nargs='*', help='names of the rules to benchmark (default: every scenario)')
+    parser.add_argument('--runs', type=int, default=3, help='number of timed invocations per scenario, after the warm-up (default: 3)')
+    parser.add_argument('--scale', type=float, default=1.0, help='factor applied to the size of the scenarios; a scaled run is not compared (default: 1)')
+    parser.add_argument('--no-generic', action='store_true', help='only run the scenarios with a specific cassette')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_PATH, help='path of the baseline (default: benchmarks/scaling_baseline.json)')
+    parser.add_argument('--update-baseline', action='store_true', help='write the results to the baseline instead of checking them')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    parser.add_argument('--child', metavar='SCENARIO', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        run_child(args.child, args.runs, args.scale, not args.no_generic)
+        return 0
+
+    scenarios = [scenario for scenario in list_scenarios(not args.no_generic) if not args.rules or scenario.rule in args.rules]
+    if not scenarios:
+        parser.error('no scenario for the rules {}'.format(', '.join(args.rules)))
+    baseline = load_baseline(args.baseline)
+    results = []
+    for scenario in scenarios:
+        result = measure(scenario, args.runs, args.scale, not args.no_generic)
+        result['regressions'] = [] if args.update_baseline else find_regressions(result, baseline.get(scenario.name))
+        results.append(result)
+
+    if args.update_baseline:
+        write_baseline(args.baseline, baseline, results)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results, baseline)
+    return 1 if any(result['regressions'] for result in results) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,47 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+'''
+Shared runtime for the RDK rules of this repository.
+
+Deploy this directory as a Lambda layer (under python/rule_runtime in the layer archive) and
+delegate the boilerplate of a rule to it:
+
+    import rule_runtime
+
+    def get_client(service, event, region=None):
+        return rule_runtime.get_client(service, event, region, assume_role_mode=ASSUME_ROLE_MODE)
+
+    def lambda_handler(event, context):
+        return rule_runtime.lambda_handler(event, context, evaluate_compliance,
+                                           evaluate_parameters=evaluate_parameters,
+                                           default_resource_type=DEFAULT_RESOURCE_TYPE,
+                                           assume_role_mode=ASSUME_ROLE_MODE)
+
+Importing the runtime does not import boto3, botocore or dateutil.
+'''
+
+from rule_runtime.access_keys import IAM_RATE_LIMITER, AccessKeyUsageResolver
+from rule_runtime.apigateway import API_METHOD_INVENTORY, APIGATEWAY_RATE_LIMITER, DomainIndex, MethodInventory, iter_apigateway_items
+from rule_runtime.authorization import AuthorizationSnapshot, get_authorization_snapshot
+from rule_runtime.cidr import CidrSet, clear_cidr_sets, get_cidr_set
+from rule_runtime.checkpoint import CheckpointError, DynamoDBStore, LocalFileStore, iter_resumable_items
+from rule_runtime.clients import (account_scope, clear_client_cache, current_region, current_role_arn, get_cached_client, get_client,
+                                  get_execution_role_arn, region_scope)
+from rule_runtime.credential_report import CredentialReport, CredentialReportError, get_credential_report
+from rule_runtime.credentials import CREDENTIAL_CACHE, CredentialCache, get_assume_role_credentials
+from rule_runtime.errors import build_error_response, build_internal_error_response, build_parameters_value_error_response, is_internal_error
+from rule_runtime.evaluations import build_annotation, build_evaluation, build_evaluation_from_config_item, clean_up_old_evaluations
+from rule_runtime.handler import convert_api_configuration, lambda_handler
+from rule_runtime.incremental import (IncrementalEvaluations, IncrementalState, build_fingerprint, get_configuration_state_ids,
+                                      get_incremental_state)
+from rule_runtime.matcher import NameMatcher, clear_name_matchers, get_name_matcher
+from rule_runtime.network import NetworkInventory, clear_network_inventories, get_network_inventory
+from rule_runtime.policy_cache import POLICY_DOCUMENT_CACHE, PolicyDocumentCache, get_managed_policy_document
+from rule_runtime.policy_engine import (CompiledPolicy, CompiledStatement, SourceIpVerdict, clear_compiled_policies, combine_source_ip_verdicts,
+                                          compile_policy)
+from rule_runtime.principal_graph import PRINCIPAL_GRAPH, PrincipalGraph, PrincipalNode
+from rule_runtime.rate_limit import RateLimiter
+from rule_runtime.redshift import REDSHIFT_RATE_LIMITER, RedshiftPostureCollector, get_redshift_posture
+from rule_runtime.regions import get_enabled_regions
+from rule_runtime.submitter import EvaluationSubmitter, submit_evaluations
@@ -0,0 +1,80 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+'''
+Concurrent resolution of the last use of the access keys of many users.
+
+Without a credential report, finding whether a user used an access key recently takes a
+list_access_keys() call and a get_access_key_last_used() call per key. AccessKeyUsageResolver
+spreads the users over a bounded pool of threads, stops at the first key of a user used recently,
+and paces every call on a RateLimiter shared by the resolvers of the container, so the IAM quota
+is not exceeded whatever the number of workers:
+
+    resolver = rule_runtime.AccessKeyUsageResolver(iam_client)
+    used_recently = resolver.resolve(user_names, lambda last_used_date: last_used_date > limit)
+    print(resolver.stats())
+
+The pace defaults to DEFAULT_IAM_CALLS_PER_SECOND and can be set with the IAM_CALLS_PER_SECOND
+environment variable of the Lambda function.
+'''
+
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from rule_runtime.rate_limit import RateLimiter
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_IAM_CALLS_PER_SECOND = 100
+
+IAM_RATE_LIMITER = RateLimiter(float(os.environ.get("IAM_CALLS_PER_SECOND", DEFAULT_IAM_CALLS_PER_SECOND)))
+
+
+class AccessKeyUsageResolver():
+    """Find, for many users at once, whether one of their access keys was used recently.
+
+    Keyword arguments:
+    iam_client -- the IAM boto client (boto clients are thread safe)
+    max_workers -- the number of users resolved at the same time (default DEFAULT_MAX_WORKERS)
+    rate_limiter -- the RateLimiter pacing the IAM calls (default IAM_RATE_LIMITER)
+    """
+
+    def __init__(self, iam_client, max_workers=DEFAULT_MAX_WORKERS, rate_limiter=None):
+        self.iam_client = iam_client
+        self.max_workers = max_workers
+        self.rate_limiter = rate_limiter or IAM_RATE_LIMITER
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def _call(self, operation_name, **kwargs):
+        self.rate_limiter.acquire()
+        with self._lock:
+            self.calls[operation_name] += 1
+        return getattr(self.iam_client, operation_name)(**kwargs)
+
+    def is_used_recently(self, user_name, is_recent):
+        """Return True as soon as an access key of the user has a LastUsedDate for which is_recent() is True."""
+        for access_key in self._call("list_access_keys", UserName=user_name)["AccessKeyMetadata"]:
+            last_used = self._call("get_access_key_last_used", AccessKeyId=access_key["AccessKeyId"])["AccessKeyLastUsed"]
+            if "LastUsedDate" in last_used and is_recent(last_used["LastUsedDate"]):
+                return True
+        return False
+
+    def resolve(self, user_names, is_recent):
+        """Return {user name: True if an access key of the user was used recently}; the first error of a user is raised.
+
+        Keyword arguments:
+        user_names -- the names of the users
+        is_recent -- a function of the LastUsedDate of a key, True when the use is recent enough
+        """
+        user_names = list(user_names)
+        if not user_names:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(user_names))) as executor:
+            futures = [(user_name, executor.submit(self.is_used_recently, user_name, is_recent)) for user_name in user_names]
+            return {user_name: future.result() for user_name, future in futures}
+
+    def stats(self):
+        with self._lock:
+            return dict(self.calls)
@@ -0,0 +1,37 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+import datetime
+import unittest
+try:
+    from unittest.mock import MagicMock
+except ImportError:
+    from mock import MagicMock
+
+import rule_runtime
+
+NOW = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+LAST_USED_DATES = {'AKIAOLD': NOW - datetime.timedelta(days=200), 'AKIARECENT': NOW - datetime.timedelta(days=2)}
+ACCESS_KEYS = {'alice': ['AKIARECENT', 'AKIAOLD'], 'bob': ['AKIAOLD', 'AKIANEVER'], 'carol': []}
+
+def build_iam_client():
+    iam_client = MagicMock()
+    iam_client.list_access_keys = MagicMock(side_effect=lambda UserName: {'AccessKeyMetadata': [{'AccessKeyId': key} for key in ACCESS_KEYS[UserName]]})
+    iam_client.get_access_key_last_used = MagicMock(side_effect=lambda AccessKeyId: {
+        'AccessKeyLastUsed': {'LastUsedDate': LAST_USED_DATES[AccessKeyId]} if AccessKeyId in LAST_USED_DATES else {'ServiceName': 'N/A'}})
+    return iam_client
+
+class TestAccessKeyUsageResolver(unittest.TestCase):
+    def test_resolve(self):
+        iam_client = build_iam_client()
+        resolver = rule_runtime.AccessKeyUsageResolver(iam_client, max_workers=3, rate_limiter=rule_runtime.RateLimiter(1000))
+        used_recently = resolver.resolve(['alice', 'bob', 'carol'], lambda last_used_date: NOW - last_used_date < datetime.timedelta(days=90))
+        self.assertEqual({'alice': True, 'bob': False, 'carol': False}, used_recently)
+        # The second key of alice is not looked up once the first one is found recent
+        self.assertEqual({'list_access_keys': 3, 'get_access_key_last_used': 3}, resolver.stats())
+        self.assertEqual({}, resolver.resolve([], lambda last_used_date: True))
+
+    def test_error_of_a_user_is_raised(self):
+        iam_client = build_iam_client()
+        resolver = rule_runtime.AccessKeyUsageResolver(iam_client, rate_limiter=rule_runtime.RateLimiter(1000))
+        self.assertRaises(KeyError, resolver.resolve, ['alice', 'unknown'], lambda last_used_date: True)
@@ -0,0 +1,241 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+'''
+Inventory of the methods of the REST APIs of API Gateway, shared by the invocations of a warm container.
+
+Probing each resource with get_method() for every HTTP verb costs 8 calls per resource, most of
+them NotFoundException. get_resources() embeds the methods of each resource when asked to, so the
+inventory lists every method of an API with one call per 500 resources, and scans several APIs at
+once, every call paced by a RateLimiter shared by the threads of the container:
+
+    for rest_api, methods in rule_runtime.API_METHOD_INVENTORY.iter_methods(apigw_client, rest_apis):
+        unauthorized = [method for method in methods if method.get("authorizationType") == "NONE"]
+
+The methods of an API are kept by (region, API id, createdDate) for APIGATEWAY_INVENTORY_TTL_SECONDS,
+so the next invocations of a warm container do not list them again. Editing a method or an
+authorizer leaves createdDate unchanged: a rule evaluating the change notification of an API calls
+invalidate() before reading its methods. The pace defaults to
+DEFAULT_APIGATEWAY_CALLS_PER_SECOND, after a burst of DEFAULT_APIGATEWAY_BURST calls, the quota of
+the API Gateway management API of an account: a faster pace would only be throttled, and botocore
+retries the calls throttled by the other clients of the account. They can be set with the
+APIGATEWAY_CALLS_PER_SECOND and APIGATEWAY_BURST environment variables of the Lambda function.
+
+The custom domain names are joined with the REST APIs they serve the same way: a DomainIndex lists
+the base path mappings of several domains at once, while get_domain_names() is still paging, and
+answers the domains of an API by lookup. The REST APIs are then streamed page by page:
+
+    domain_index = rule_runtime.DomainIndex.build(apigw_client)
+    for rest_api in rule_runtime.iter_apigateway_items(apigw_client.get_rest_apis):
+        if not domain_index.get_domains(rest_api["id"]):
+            ...
+
+The index costs one call per domain: about 100 seconds for 1000 domains at the default pace, so a
+rule building it needs a Lambda timeout above the default one (LambdaTimeout in its parameters.json).
+'''
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from rule_runtime.rate_limit import RateLimiter
+
+DEFAULT_APIGATEWAY_CALLS_PER_SECOND = 10
+DEFAULT_APIGATEWAY_BURST = 40
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_TTL_SECONDS = 300
+RESOURCES_PAGE_SIZE = 500
+
+APIGATEWAY_RATE_LIMITER = RateLimiter(float(os.environ.get("APIGATEWAY_CALLS_PER_SECOND", DEFAULT_APIGATEWAY_CALLS_PER_SECOND)),
+                                      float(os.environ.get("APIGATEWAY_BURST", DEFAULT_APIGATEWAY_BURST)))
+
+
+def iter_apigateway_items(list_items, rate_limiter=None, **kwargs):
+    """Yield the items of every page of a get_* call of API Gateway, one page in memory at a time.
+
+    Keyword arguments:
+    list_items -- the method of the boto client, e.g. apigw_client.get_rest_apis
+    rate_limiter -- the RateLimiter pacing the calls (default None, not paced)
+    kwargs -- the parameters of the call, e.g. domainName
+    """
+    kwargs.setdefault("limit", RESOURCES_PAGE_SIZE)
+    while True:
+        if rate_limiter:
+            rate_limiter.acquire()
+        page = list_items(**kwargs)
+        for item in page.get("items", []):
+            yield item
+        if not page.get("position"):
+            return
+        kwargs["position"] = page["position"]
+
+
+# The members of an embedded method kept by the inventory; the integration and the models are left out
+METHOD_SUMMARY_KEYS = ("authorizationType", "authorizerId", "authorizationScopes", "apiKeyRequired", "operationName")
+
+
+def build_method_summary(resource, http_method, method):
+    summary = {key: method[key] for key in METHOD_SUMMARY_KEYS if key in method}
+    summary.update(httpMethod=http_method, resourceId=resource["id"], path=resource.get("path"))
+    return summary
+
+
+class MethodInventory():
+    """The methods of the REST APIs, keyed by (region, API id, createdDate), with hit and miss counters.
+
+    Keyword arguments:
+    ttl_seconds -- how long the methods of an API are trusted before listing them again (default DEFAULT_TTL_SECONDS)
+    max_workers -- the number of APIs listed at the same time (default DEFAULT_MAX_WORKERS)
+    rate_limiter -- the RateLimiter pacing the API Gateway calls (default APIGATEWAY_RATE_LIMITER)
+    """
+
+    def __init__(self, ttl_seconds=DEFAULT_TTL_SECONDS, max_workers=DEFAULT_MAX_WORKERS, rate_limiter=None):
+        self.ttl_seconds = ttl_seconds
+        self.max_workers = max_workers
+        self.rate_limiter = rate_limiter or APIGATEWAY_RATE_LIMITER
+        self.hits = 0
+        self.misses = 0
+        self.calls = 0
+        self._methods = {}
+        self._lock = threading.Lock()
+
+    def list_methods(self, apigw_client, rest_api_id):
+        """Return a summary of each method of an API (authorizationType, httpMethod, path...), from get_resources() with the embedded methods."""
+        methods = []
+        kwargs = {"restApiId": rest_api_id, "embed": ["methods"], "limit": RESOURCES_PAGE_SIZE}
+        while True:
+            self.rate_limiter.acquire()
+            with self._lock:
+                self.calls += 1
+            page = apigw_client.get_resources(**kwargs)
+            for resource in page.get("items", []):
+                for http_method, method in resource.get("resourceMethods", {}).items():
+                    methods.append(build_method_summary(resource, http_method, method))
+            if not page.get("position"):
+                return methods
+            kwargs["position"] = page["position"]
+
+    def get_methods(self, apigw_client, rest_api):
+        """Return the methods of an API, listing them only on a cache miss.
+
+        Keyword arguments:
+        apigw_client -- the API Gateway boto client
+        rest_api -- the API, as returned by get_rest_apis()
+        """
+        key = (apigw_client.meta.region_name, rest_api["id"], str(rest_api.get("createdDate")))
+        now = time.monotonic()
+        with self._lock:
+            methods, expires_at = self._methods.get(key, (None, 0))
+            if now < expires_at:
+                self.hits += 1
+                return methods
+            self.misses += 1
+        methods = self.list_methods(apigw_client, rest_api["id"])
+        if self.ttl_seconds > 0:
+            with self._lock:
+                self._methods[key] = (methods, now + self.ttl_seconds)
+        return methods
+
+    def iter_methods(self, apigw_client, items, get_rest_api=None):
+        """Yield (item, methods of its API) in the order of the items, listing up to max_workers APIs at the same time.
+
+        The first error listing an API is raised when its item is reached.
+
+        Keyword arguments:
+        apigw_client -- the API Gateway boto client (boto clients are thread safe)
+        items -- an iterable of APIs, or of anything holding an API
+        get_rest_api -- a function returning the API of an item (default None, the items are the APIs)
+        """
+        get_rest_api = get_rest_api or (lambda item: item)
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        # A bounded window of APIs in flight: an invocation stopping early does not list every API
+        pending = deque()
+        try:
+            for item in items:
+                pending.append((item, executor.submit(self.get_methods, apigw_client, get_rest_api(item))))
+                if len(pending) >= 2 * self.max_workers:
+                    item, future = pending.popleft()
+                    yield item, future.result()
+            while pending:
+                item, future = pending.popleft()
+                yield item, future.result()
+        finally:
+            for _, future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def invalidate(self, region, rest_api_id):
+        """Drop the methods kept for an API, e.g. the API of a change notification: createdDate does not change when its methods do."""
+        with self._lock:
+            for key in [key for key in self._methods if key[:2] == (region, rest_api_id)]:
+                del self._methods[key]
+
+    def clear(self):
+        """Drop every API kept and reset the counters."""
+        with self._lock:
+            self._methods.clear()
+            self.hits = 0
+            self.misses = 0
+            self.calls = 0
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "calls": self.calls, "apis": len(self._methods)}
+
+
+class DomainIndex():
+    """The custom domain names of API Gateway, and the domains of each REST API from their base path mappings.
+
+    Keyword arguments:
+    domains -- the domain names, as returned by get_domain_names()
+    mappings -- pairs of (domainName, base path mapping), as returned by get_base_path_mappings()
+    """
+
+    def __init__(self, domains=(), mappings=()):
+        self._domains = {domain["domainName"]: domain for domain in domains}
+        self._domains_by_api = {}
+        for domain_name, mapping in mappings:
+            api_domains = self._domains_by_api.setdefault(mapping.get("restApiId"), [])
+            if domain_name not in api_domains:
+                api_domains.append(domain_name)
+
+    @classmethod
+    def build(cls, apigw_client, max_workers=DEFAULT_MAX_WORKERS, rate_limiter=None):
+        """Return the index of the domains of an API Gateway boto client, listing up to max_workers base path mappings at the same time.
+
+        Keyword arguments:
+        apigw_client -- the API Gateway boto client (boto clients are thread safe)
+        max_workers -- the number of domains whose mappings are listed at the same time (default DEFAULT_MAX_WORKERS)
+        rate_limiter -- the RateLimiter pacing the API Gateway calls (default APIGATEWAY_RATE_LIMITER)
+        """
+        rate_limiter = rate_limiter or APIGATEWAY_RATE_LIMITER
+
+        def list_mappings(domain_name):
+            return [(domain_name, mapping)
+                    for mapping in iter_apigateway_items(apigw_client.get_base_path_mappings, rate_limiter, domainName=domain_name)]
+
+        domains = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # The mappings of the first domains are listed while the next pages of domains are fetched
+            futures = []
+            for domain in iter_apigateway_items(apigw_client.get_domain_names, rate_limiter):
+                domains.append(domain)
+                futures.append(executor.submit(list_mappings, domain["domainName"]))
+            mappings = [mapping for future in futures for mapping in future.result()]
+        return cls(domains, mappings)
+
+    def domains(self):
+        return list(self._domains.values())
+
+    def get_domain(self, domain_name):
+        return self._domains.get(domain_name)
+
+    def get_domains(self, rest_api_id):
+        """Return the domain names mapped to a REST API, in the order of get_domain_names(); an empty list when it has none."""
+        return [self._domains[domain_name] for domain_name in self._domains_by_api.get(rest_api_id, [])]
+
+
+API_METHOD_INVENTORY = MethodInventory(int(os.environ.get("APIGATEWAY_INVENTORY_TTL_SECONDS", DEFAULT_TTL_SECONDS)),
+                                       int(os.environ.get("APIGATEWAY_INVENTORY_MAX_WORKERS", DEFAULT_MAX_WORKERS)))
@@ -0,0 +1,117 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+import unittest
+try:
+    from unittest.mock import MagicMock, patch
+except ImportError:
+    from mock import MagicMock, patch
+
+import rule_runtime
+from rule_runtime import apigateway
+
+def build_resource(resource_id, **methods):
+    return {'id': resource_id, 'path': '/' + resource_id,
+            'resourceMethods': {http_method: {'httpMethod': http_method, 'authorizationType': authorization_type,
+                                              'methodIntegration': {'type': 'AWS'}}
+                                for http_method, authorization_type in methods.items()}}
+
+def build_apigw_client(resources_by_api):
+    apigw_client = MagicMock()
+    apigw_client.meta.region_name = 'us-east-1'
+
+    def get_resources(restApiId, embed, limit, position=None):
+        resources = resources_by_api[restApiId]
+        start = int(position or 0)
+        page = {'items': resources[start:start + 1]}
+        if start + 1 < len(resources):
+            page['position'] = str(start + 1)
+        return page
+    apigw_client.get_resources = MagicMock(side_effect=get_resources)
+    return apigw_client
+
+class NoLimit():
+    def acquire(self):
+        pass
+
+class TestMethodInventory(unittest.TestCase):
+    def setUp(self):
+        self.inventory = rule_runtime.MethodInventory(ttl_seconds=60, max_workers=2, rate_limiter=NoLimit())
+
+    def test_methods_listed_from_the_embedded_resources(self):
+        apigw_client = build_apigw_client({'api1': [build_resource('pets', GET='NONE', POST='AWS_IAM'), build_resource('users', GET='COGNITO_USER_POOLS')]})
+        methods = self.inventory.get_methods(apigw_client, {'id': 'api1', 'createdDate': '2019-01-01'})
+        self.assertEqual([('pets', 'GET', 'NONE'), ('pets', 'POST', 'AWS_IAM'), ('users', 'GET', 'COGNITO_USER_POOLS')],
+                         [(method['resourceId'], method['httpMethod'], method['authorizationType']) for method in methods])
+        self.assertNotIn('methodIntegration', methods[0])
+        self.assertEqual(['methods'], apigw_client.get_resources.call_args[1]['embed'])
+        apigw_client.get_method.assert_not_called()
+
+    def test_methods_kept_per_api_version(self):
+        apigw_client = build_apigw_client({'api1': [build_resource('pets', GET='NONE')]})
+        self.inventory.get_methods(apigw_client, {'id': 'api1', 'createdDate': '2019-01-01'})
+        self.inventory.get_methods(apigw_client, {'id': 'api1', 'createdDate': '2019-01-01'})
+        self.assertEqual({'hits': 1, 'misses': 1, 'calls': 1, 'apis': 1}, self.inventory.stats())
+        # A new API with the same id
+        self.inventory.get_methods(apigw_client, {'id': 'api1', 'createdDate': '2020-01-01'})
+        with patch.object(apigateway.time, 'monotonic', MagicMock(return_value=apigateway.time.monotonic() + 60)):
+            self.inventory.get_methods(apigw_client, {'id': 'api1', 'createdDate': '2019-01-01'})
+        self.assertEqual(3, apigw_client.get_resources.call_count)
+
+    def test_invalidated_api_listed_again(self):
+        apigw_client = build_apigw_client({'api1': [build_resource('pets', GET='NONE')], 'api2': [build_resource('users', GET='NONE')]})
+        for api_id in ('api1', 'api2'):
+            self.inventory.get_methods(apigw_client, {'id': api_id, 'createdDate': '2019-01-01'})
+        self.inventory.invalidate('us-east-1', 'api1')
+        self.assertEqual({'hits': 0, 'misses': 2, 'calls': 2, 'apis': 1}, self.inventory.stats())
+        self.inventory.get_methods(apigw_client, {'id': 'api1', 'createdDate': '2019-01-01'})
+        self.inventory.get_methods(apigw_client, {'id': 'api2', 'createdDate': '2019-01-01'})
+        self.assertEqual(3, apigw_client.get_resources.call_count)
+
+    def test_apis_listed_concurrently_and_yielded_in_order(self):
+        resources_by_api = {'api{}'.format(index): [build_resource('r{}'.format(index), GET='NONE')] * (index % 3 + 1) for index in range(7)}
+        apigw_client = build_apigw_client(resources_by_api)
+        items = [({'id': 'api{}'.format(index)}, 'cursor{}'.format(index)) for index in range(7)]
+        results = list(self.inventory.iter_methods(apigw_client, items, lambda item: item[0]))
+        self.assertEqual(items, [item for item, _ in results])
+        self.assertEqual([index % 3 + 1 for index in range(7)], [len(methods) for _, methods in results])
+
+    def test_error_raised_at_its_api(self):
+        apigw_client = build_apigw_client({'api0': [build_resource('pets', GET='NONE')]})
+        results = self.inventory.iter_methods(apigw_client, [{'id': 'api0'}, {'id': 'missing'}])
+        self.assertEqual('api0', next(results)[0]['id'])
+        self.assertRaises(KeyError, next, results)
+
+def build_domain_client(mappings_by_domain):
+    apigw_client = MagicMock()
+
+    def get_domain_names(limit, position=None):
+        # One domain per page
+        domain_names = sorted(mappings_by_domain)
+        start = int(position or 0)
+        page = {'items': [{'domainName': domain_name} for domain_name in domain_names[start:start + 1]]}
+        if start + 1 < len(domain_names):
+            page['position'] = str(start + 1)
+        return page
+    apigw_client.get_domain_names = MagicMock(side_effect=get_domain_names)
+    apigw_client.get_base_path_mappings = MagicMock(
+        side_effect=lambda domainName, limit: {'items': [{'restApiId': api_id, 'basePath': str(index)} for index, api_id in enumerate(mappings_by_domain[domainName])]})
+    return apigw_client
+
+class TestDomainIndex(unittest.TestCase):
+    def test_domains_of_each_api(self):
+        apigw_client = build_domain_client({'a.example.com': ['api1', 'api1', 'api2'], 'b.example.com': ['api1'], 'c.example.com': []})
+        domain_index = rule_runtime.DomainIndex.build(apigw_client, max_workers=2, rate_limiter=NoLimit())
+        self.assertEqual(['a.example.com', 'b.example.com', 'c.example.com'], [domain['domainName'] for domain in domain_index.domains()])
+        self.assertEqual(['a.example.com', 'b.example.com'], [domain['domainName'] for domain in domain_index.get_domains('api1')])
+        self.assertEqual(['a.example.com'], [domain['domainName'] for domain in domain_index.get_domains('api2')])
+        self.assertEqual([], domain_index.get_domains('api3'))
+        self.assertEqual(3, apigw_client.get_domain_names.call_count)
+        self.assertEqual(3, apigw_client.get_base_path_mappings.call_count)
+
+    def test_items_streamed_page_by_page(self):
+        apigw_client = build_apigw_client({'api1': [build_resource('pets'), build_resource('users')]})
+        items = rule_runtime.iter_apigateway_items(apigw_client.get_resources, restApiId='api1', embed=[])
+        self.assertEqual('pets', next(items)['id'])
+        self.assertEqual(1, apigw_client.get_resources.call_count)
+        self.assertEqual(['users'], [item['id'] for item in items])
@@ -0,0 +1,135 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+'''
+Snapshot of the IAM users, groups, roles and managed policies of the account.
+
+get_account_authorization_details() returns, 1000 principals per page, every principal with its
+inline policy documents, attached managed policies and group memberships, and every managed
+policy with its versions. A rule walking list_*_policies(), get_*_policy(), get_policy() and
+get_policy_version() per principal can read the same data from memory:
+
+    snapshot = rule_runtime.get_authorization_snapshot(iam_client, filters=["Role", "LocalManagedPolicy"])
+    for role in snapshot.roles():
+        for policy_name, document in snapshot.get_inline_policies(role):
+            ...
+        for attached_policy in snapshot.get_attached_policies(role):
+            document = snapshot.get_policy_document(attached_policy["PolicyArn"])
+
+A managed policy left out of the snapshot by the filters (e.g. an AWS managed policy) is read from
+the shared POLICY_DOCUMENT_CACHE the first time it is needed, then kept.
+'''
+
+from rule_runtime.policy_cache import POLICY_DOCUMENT_CACHE, decode_policy_document
+
+AUTHORIZATION_DETAILS_PAGE_SIZE = 1000
+INLINE_POLICY_LIST_KEYS = ("UserPolicyList", "GroupPolicyList", "RolePolicyList")
+
+
+def get_default_version_document(policy):
+    for version in policy.get("PolicyVersionList", []):
+        if version.get("IsDefaultVersion") or version.get("VersionId") == policy.get("DefaultVersionId"):
+            return decode_policy_document(version["Document"])
+    return None
+
+
+class AuthorizationSnapshot():
+    """The principals and managed policies of get_account_authorization_details(), indexed by name and ARN.
+
+    Keyword arguments:
+    users -- the UserDetailList entries
+    groups -- the GroupDetailList entries
+    roles -- the RoleDetailList entries
+    policies -- the Policies entries
+    iam_client -- the IAM boto client fetching the managed policies missing from the snapshot (default None)
+    """
+
+    def __init__(self, users=(), groups=(), roles=(), policies=(), iam_client=None):
+        self.iam_client = iam_client
+        self._users = {user["UserName"]: user for user in users}
+        self._groups = {group["GroupName"]: group for group in groups}
+        self._roles = {role["RoleName"]: role for role in roles}
+        self._by_arn = {}
+        for principals in (self._users, self._groups, self._roles):
+            for principal in principals.values():
+                self._by_arn[principal["Arn"]] = principal
+        self._policy_documents = {}
+        for policy in policies:
+            self._by_arn[policy["Arn"]] = policy
+            self._policy_documents[policy["Arn"]] = get_default_version_document(policy)
+
+    def users(self):
+        return list(self._users.values())
+
+    def groups(self):
+        return list(self._groups.values())
+
+    def roles(self):
+        return list(self._roles.values())
+
+    def get_user(self, user_name):
+        return self._users.get(user_name)
+
+    def get_group(self, group_name):
+        return self._groups.get(group_name)
+
+    def get_role(self, role_name):
+        return self._roles.get(role_name)
+
+    def get_by_arn(self, arn):
+        """Return the user, group, role or managed policy of an ARN, or None."""
+        return self._by_arn.get(arn)
+
+    def get_groups_for_user(self, user):
+        """Return the group details of a user detail; groups left out of the snapshot are skipped."""
+        return [self._groups[group_name] for group_name in user.get("GroupList", []) if group_name in self._groups]
+
+    @staticmethod
+    def get_inline_policies(principal):
+        """Return the (PolicyName, document) of the inline policies of a user, group or role detail."""
+        for key in INLINE_POLICY_LIST_KEYS:
+            if key in principal:
+                return [(policy["PolicyName"], decode_policy_document(policy["PolicyDocument"])) for policy in principal[key]]
+        return []
+
+    @staticmethod
+    def get_attached_policies(principal):
+        """Return the AttachedManagedPolicies (PolicyName and PolicyArn) of a user, group or role detail."""
+        return principal.get("AttachedManagedPolicies", [])
+
+    def get_policy_document(self, policy_arn):
+        """Return the document of the default version of a managed policy."""
+        if policy_arn not in self._policy_documents:
+            if self.iam_client is None:
+                raise KeyError("The managed policy {} is not in the authorization snapshot.".format(policy_arn))
+            self._policy_documents[policy_arn] = POLICY_DOCUMENT_CACHE.get(self.iam_client, policy_arn)
+        return self._policy_documents[policy_arn]
+
+
+def get_authorization_snapshot(iam_client, filters=None):
+    """Return the AuthorizationSnapshot of the account, or None when the role is not allowed to get it.
+
+    Keyword arguments:
+    iam_client -- the IAM boto client
+    filters -- the entity types to get: User, Role, Group, LocalManagedPolicy and/or AWSManagedPolicy (default None, all of them)
+    """
+    from botocore.exceptions import ClientError
+    request = {"MaxItems": AUTHORIZATION_DETAILS_PAGE_SIZE}
+    if filters:
+        request["Filter"] = list(filters)
+    details = {"UserDetailList": [], "GroupDetailList": [], "RoleDetailList": [], "Policies": []}
+    try:
+        while True:
+            response = iam_client.get_account_authorization_details(**request)
+            for key, entries in details.items():
+                entries.extend(response.get(key, []))
+            if not response.get("IsTruncated"):
+                break
+            request["Marker"] = response["Marker"]
+    except ClientError as ex:
+        if ex.response["Error"]["Code"] != "AccessDenied":
+            raise
+        print("Not allowed to get the IAM authorization details, falling back to per-principal calls.")
+        return None
+    return AuthorizationSnapshot(details["UserDetailList"], details["GroupDetailList"], details["RoleDetailList"], details["Policies"],
+                                 iam_client=iam_client)
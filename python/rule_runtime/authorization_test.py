@@ -0,0 +1,80 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+import json
+import unittest
+from urllib.parse import quote
+try:
+    from unittest.mock import MagicMock
+except ImportError:
+    from mock import MagicMock
+from botocore.exceptions import ClientError
+
+import rule_runtime
+
+FULL_STAR_DOCUMENT = {'Version': '2012-10-17', 'Statement': [{'Effect': 'Allow', 'Action': '*', 'Resource': '*'}]}
+READ_ONLY_DOCUMENT = {'Version': '2012-10-17', 'Statement': [{'Effect': 'Allow', 'Action': 's3:Get*', 'Resource': '*'}]}
+
+FIRST_PAGE = {
+    'UserDetailList': [{'UserName': 'alice', 'UserId': 'AIDAALICE', 'Arn': 'arn:aws:iam::123456789012:user/alice',
+                        'GroupList': ['admins', 'deleted-group'],
+                        'UserPolicyList': [{'PolicyName': 'alice-inline', 'PolicyDocument': quote(json.dumps(READ_ONLY_DOCUMENT))}],
+                        'AttachedManagedPolicies': [{'PolicyName': 'ReadOnlyAccess', 'PolicyArn': 'arn:aws:iam::aws:policy/ReadOnlyAccess'}]}],
+    'GroupDetailList': [{'GroupName': 'admins', 'GroupId': 'AGPAADMINS', 'Arn': 'arn:aws:iam::123456789012:group/admins',
+                         'GroupPolicyList': [],
+                         'AttachedManagedPolicies': [{'PolicyName': 'local-admin', 'PolicyArn': 'arn:aws:iam::123456789012:policy/local-admin'}]}],
+    'RoleDetailList': [],
+    'Policies': [],
+    'IsTruncated': True,
+    'Marker': 'page-2'}
+SECOND_PAGE = {
+    'UserDetailList': [],
+    'GroupDetailList': [],
+    'RoleDetailList': [{'RoleName': 'ops', 'RoleId': 'AROAOPS', 'Arn': 'arn:aws:iam::123456789012:role/ops',
+                        'RolePolicyList': [{'PolicyName': 'ops-inline', 'PolicyDocument': FULL_STAR_DOCUMENT}],
+                        'AttachedManagedPolicies': []}],
+    'Policies': [{'PolicyName': 'local-admin', 'Arn': 'arn:aws:iam::123456789012:policy/local-admin', 'DefaultVersionId': 'v2',
+                  'PolicyVersionList': [{'VersionId': 'v2', 'IsDefaultVersion': True, 'Document': FULL_STAR_DOCUMENT},
+                                        {'VersionId': 'v1', 'IsDefaultVersion': False, 'Document': READ_ONLY_DOCUMENT}]}],
+    'IsTruncated': False}
+
+class TestAuthorizationSnapshot(unittest.TestCase):
+    def setUp(self):
+        rule_runtime.POLICY_DOCUMENT_CACHE.clear()
+
+    def test_pages_are_indexed(self):
+        iam_client = MagicMock()
+        iam_client.get_account_authorization_details = MagicMock(side_effect=[FIRST_PAGE, SECOND_PAGE])
+        snapshot = rule_runtime.get_authorization_snapshot(iam_client, filters=['User', 'Group', 'Role', 'LocalManagedPolicy'])
+        iam_client.get_account_authorization_details.assert_any_call(MaxItems=1000, Filter=['User', 'Group', 'Role', 'LocalManagedPolicy'], Marker='page-2')
+        self.assertEqual(2, iam_client.get_account_authorization_details.call_count)
+
+        alice = snapshot.get_user('alice')
+        self.assertEqual([alice], snapshot.users())
+        self.assertIs(alice, snapshot.get_by_arn('arn:aws:iam::123456789012:user/alice'))
+        self.assertEqual([('alice-inline', READ_ONLY_DOCUMENT)], snapshot.get_inline_policies(alice))
+        self.assertEqual(['admins'], [group['GroupName'] for group in snapshot.get_groups_for_user(alice)])
+        self.assertEqual([('ops-inline', FULL_STAR_DOCUMENT)], snapshot.get_inline_policies(snapshot.get_role('ops')))
+        self.assertIsNone(snapshot.get_role('alice'))
+
+        admins = snapshot.get_group('admins')
+        policy_arn = snapshot.get_attached_policies(admins)[0]['PolicyArn']
+        self.assertEqual(FULL_STAR_DOCUMENT, snapshot.get_policy_document(policy_arn))
+        iam_client.get_policy.assert_not_called()
+
+    def test_missing_policy_is_fetched_once(self):
+        iam_client = MagicMock()
+        iam_client.get_policy = MagicMock(return_value={'Policy': {'DefaultVersionId': 'v7'}})
+        iam_client.get_policy_version = MagicMock(return_value={'PolicyVersion': {'Document': READ_ONLY_DOCUMENT}})
+        snapshot = rule_runtime.AuthorizationSnapshot(iam_client=iam_client)
+        for _ in range(2):
+            self.assertEqual(READ_ONLY_DOCUMENT, snapshot.get_policy_document('arn:aws:iam::aws:policy/ReadOnlyAccess'))
+        iam_client.get_policy_version.assert_called_once_with(PolicyArn='arn:aws:iam::aws:policy/ReadOnlyAccess', VersionId='v7')
+        self.assertRaises(KeyError, rule_runtime.AuthorizationSnapshot().get_policy_document, 'arn:aws:iam::aws:policy/ReadOnlyAccess')
+
+    def test_access_denied_falls_back(self):
+        iam_client = MagicMock()
+        iam_client.get_account_authorization_details = MagicMock(side_effect=ClientError({'Error': {'Code': 'AccessDenied', 'Message': 'denied'}}, 'GetAccountAuthorizationDetails'))
+        self.assertIsNone(rule_runtime.get_authorization_snapshot(iam_client))
+        iam_client.get_account_authorization_details = MagicMock(side_effect=ClientError({'Error': {'Code': 'Throttling', 'Message': 'slow down'}}, 'GetAccountAuthorizationDetails'))
+        self.assertRaises(ClientError, rule_runtime.get_authorization_snapshot, iam_client)
@@ -0,0 +1,283 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+'''
+Timeout-aware evaluation of periodic rules, in resumable slices.
+
+A rule iterating every resource of the account can give lambda_handler() an iter_evaluations()
+generator instead of computing the whole list in evaluate_compliance():
+
+    def iter_evaluations(event, valid_rule_parameters, cursor):
+        for function, function_cursor in rule_runtime.iter_resumable_items(list_functions_page, "Functions", "NextMarker", "FunctionName", cursor):
+            yield [build_evaluation(function["FunctionName"], ...)], function_cursor
+
+Each slice is the list of evaluations of one resource and the cursor (a JSON-serialisable
+dictionary, e.g. the pagination token and the last resource id) to resume after it. On a
+ScheduledNotification, evaluate_resumable() streams the slices to AWS Config and watches
+context.get_remaining_time_in_millis(). When less than the safety margin is left, it flushes the
+evaluations sent so far, saves the cursor in a CheckpointStore and invokes the Lambda function
+again, asynchronously, with the same event. The next invocation resumes from the cursor. The old
+evaluations are only cleaned up by the last slice, once every resource has been evaluated.
+
+The checkpoints are saved in the DynamoDB table of the CHECKPOINT_TABLE environment variable. The
+ids of the evaluated resources, needed by the clean-up of the last slice, are split over items of
+MAX_RESOURCE_IDS_PER_ITEM ids. A Lambda container does not share its /tmp with the others, so
+without a table an evaluation running out of time stops with an error at its first checkpoint,
+and a resumed invocation which does not find its checkpoint stops with an error rather than
+starting over.
+'''
+
+import hashlib
+import json
+import os
+import time
+
+from rule_runtime.clients import current_region, get_cached_client
+from rule_runtime.evaluations import build_evaluation, iter_stale_evaluations
+from rule_runtime.submitter import MAX_EVALUATIONS_PER_CALL, EvaluationSubmitter
+
+DEFAULT_SAFETY_MARGIN_MILLIS = int(os.environ.get("CHECKPOINT_SAFETY_MARGIN_MILLIS", 60000))
+DEFAULT_CHECKPOINT_DIRECTORY = "/tmp/rule_checkpoints"
+DEFAULT_CHECKPOINT_TTL_SECONDS = 86400
+# Resource ids per item of a checkpoint, far below the 400 KB of a DynamoDB item
+MAX_RESOURCE_IDS_PER_ITEM = 2000
+# Key added to the event of the invocations resuming a checkpoint
+CHECKPOINT_EVENT_KEY = "checkpointKey"
+
+
+class CheckpointError(Exception):
+    pass
+
+
+class LocalFileStore():
+    """Checkpoints saved as JSON files of a local directory."""
+
+    def __init__(self, directory=DEFAULT_CHECKPOINT_DIRECTORY):
+        self.directory = directory
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json")
+
+    def load(self, key):
+        try:
+            with open(self._path(key)) as checkpoint_file:
+                return json.load(checkpoint_file)
+        except FileNotFoundError:
+            return None
+
+    def save(self, key, state):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        with open(path + ".tmp", "w") as checkpoint_file:
+            json.dump(state, checkpoint_file)
+        os.replace(path + ".tmp", path)
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class DynamoDBStore():
+    """Checkpoints saved in a DynamoDB table (or any DynamoDB-compatible endpoint) whose partition key is the CheckpointKey string.
+
+    Keyword arguments:
+    table_name -- the name of the table
+    ttl_seconds -- the ExpiresAt attribute of the items, to be used as the TTL attribute of the table (default DEFAULT_CHECKPOINT_TTL_SECONDS)
+    """
+
+    def __init__(self, table_name, ttl_seconds=DEFAULT_CHECKPOINT_TTL_SECONDS):
+        self.table_name = table_name
+        self.ttl_seconds = ttl_seconds
+
+    def load(self, key):
+        response = get_cached_client("dynamodb").get_item(TableName=self.table_name, Key={"CheckpointKey": {"S": key}}, ConsistentRead=True)
+        if "Item" not in response:
+            return None
+        return json.loads(response["Item"]["State"]["S"])
+
+    def save(self, key, state):
+        get_cached_client("dynamodb").put_item(TableName=self.table_name, Item={
+            "CheckpointKey": {"S": key},
+            "State": {"S": json.dumps(state)},
+            "ExpiresAt": {"N": str(int(time.time()) + self.ttl_seconds)},
+        })
+
+    def delete(self, key):
+        get_cached_client("dynamodb").delete_item(TableName=self.table_name, Key={"CheckpointKey": {"S": key}})
+
+
+def get_default_store():
+    """Return the DynamoDBStore of the CHECKPOINT_TABLE environment variable if set, a LocalFileStore otherwise."""
+    return get_resumable_store() or LocalFileStore()
+
+
+def get_resumable_store():
+    """Return the DynamoDBStore of the CHECKPOINT_TABLE environment variable, or None when not set.
+
+    The checkpoints of a resumable evaluation are never saved under /tmp: the next invocation may run in another container.
+    """
+    if os.environ.get("CHECKPOINT_TABLE"):
+        return DynamoDBStore(os.environ["CHECKPOINT_TABLE"])
+    return None
+
+
+def iter_resumable_items(list_page, items_key, next_token_key, resource_id_key, cursor=None):
+    """Yield (item, cursor) for each item of a paginated list, starting after the item of the given cursor.
+
+    Keyword arguments:
+    list_page -- a function of the pagination token (None for the first page) returning one page of the list
+    items_key -- the key of the items in a page, e.g. Functions
+    next_token_key -- the key of the token of the next page, e.g. NextMarker
+    resource_id_key -- the key of the unique id of an item, e.g. FunctionName
+    cursor -- the cursor of the last item already evaluated (default None, from the first item)
+    """
+    cursor = cursor or {}
+    page_token = cursor.get("PageToken")
+    last_resource_id = cursor.get("LastResourceId")
+    while True:
+        page = list_page(page_token)
+        items = page.get(items_key, [])
+        if last_resource_id is not None:
+            resource_ids = [item[resource_id_key] for item in items]
+            # A resource deleted since the checkpoint makes the page start over, which is harmless
+            if last_resource_id in resource_ids:
+                items = items[resource_ids.index(last_resource_id) + 1:]
+            last_resource_id = None
+        for item in items:
+            yield item, {"PageToken": page_token, "LastResourceId": item[resource_id_key]}
+        page_token = page.get(next_token_key)
+        if not page_token:
+            return
+
+
+def get_remaining_millis(context):
+    """Return the remaining time of the invocation, or None when the context does not tell it."""
+    if hasattr(context, "get_remaining_time_in_millis"):
+        return context.get_remaining_time_in_millis()
+    return None
+
+
+def build_checkpoint_key(event):
+    return "{}/{}/{}".format(event["configRuleName"], event["accountId"], current_region() or os.environ.get("AWS_REGION", ""))
+
+
+def hash_result_token(result_token):
+    return hashlib.sha256(result_token.encode("utf-8")).hexdigest()
+
+
+def invoke_next_slice(context, event):
+    """Invoke the Lambda function again, asynchronously, with the given event."""
+    get_cached_client("lambda").invoke(FunctionName=context.invoked_function_arn, InvocationType="Event", Payload=json.dumps(event))
+
+
+def build_item_key(checkpoint_key, number):
+    return "{}#{}".format(checkpoint_key, number)
+
+
+def save_checkpoint(store, checkpoint_key, state, resource_ids):
+    """Save the resources evaluated by an invocation in new items of MAX_RESOURCE_IDS_PER_ITEM ids, then the state of the checkpoint."""
+    resource_ids = sorted(resource_ids)
+    for start in range(0, len(resource_ids), MAX_RESOURCE_IDS_PER_ITEM):
+        store.save(build_item_key(checkpoint_key, state["Items"]), {"ResourceIds": resource_ids[start:start + MAX_RESOURCE_IDS_PER_ITEM]})
+        state["Items"] += 1
+    # The state is saved last: it only points to complete items
+    store.save(checkpoint_key, state)
+
+
+def delete_checkpoint(store, checkpoint_key, state):
+    store.delete(checkpoint_key)
+    for number in range(state["Items"]):
+        store.delete(build_item_key(checkpoint_key, number))
+
+
+def evaluate_resumable(event, context, config_client, iter_slices, default_resource_type, result_token, test_mode=False,
+                       store=None, safety_margin_millis=DEFAULT_SAFETY_MARGIN_MILLIS, is_valid_evaluation=None):
+    """Send the evaluations of the slices to AWS Config, checkpointing and invoking the function again before the timeout.
+
+    Return the evaluations sent by this invocation (preceded by the stale ones on the last slice, in test mode only).
+
+    Keyword arguments:
+    event -- the event variable given in the lambda handler
+    context -- the context variable given in the lambda handler
+    config_client -- the AWS Config boto client
+    iter_slices -- a function of the cursor (None on the first invocation) yielding (evaluations, cursor) tuples
+    default_resource_type -- the DEFAULT_RESOURCE_TYPE of the rule
+    result_token -- the resultToken of the event
+    test_mode -- the TestMode of PutEvaluations (default False)
+    store -- the CheckpointStore (default None, get_resumable_store())
+    safety_margin_millis -- the remaining time under which the invocation checkpoints (default DEFAULT_SAFETY_MARGIN_MILLIS)
+    is_valid_evaluation -- a filter applied on the evaluations of the slices (default None)
+    """
+    store = store or get_resumable_store()
+    checkpoint_key = event.get(CHECKPOINT_EVENT_KEY) or build_checkpoint_key(event)
+    state = None
+    if CHECKPOINT_EVENT_KEY in event:
+        state = store.load(checkpoint_key) if store else None
+        if not state or state["ResultToken"] != hash_result_token(result_token):
+            raise CheckpointError("The checkpoint {} of this resumed evaluation is missing from the store.".format(checkpoint_key))
+    state = state or {"ResultToken": hash_result_token(result_token), "Cursor": None, "Items": 0, "Invocations": 0}
+    state["Invocations"] += 1
+
+    # The resources evaluated by this invocation, those of the previous ones are in the items of the checkpoint
+    resource_ids = set()
+    evaluations = []
+    unsent_evaluations = []
+    interrupted = False
+    with EvaluationSubmitter(config_client, result_token, test_mode) as submitter:
+        slices = 0
+        for slice_evaluations, cursor in iter_slices(state["Cursor"]):
+            slice_evaluations = [evaluation for evaluation in slice_evaluations or [] if not is_valid_evaluation or is_valid_evaluation(evaluation)]
+            evaluations.extend(slice_evaluations)
+            # Slices are sent by full chunks of PutEvaluations
+            unsent_evaluations.extend(slice_evaluations)
+            if len(unsent_evaluations) >= MAX_EVALUATIONS_PER_CALL:
+                submitter.submit(unsent_evaluations)
+                unsent_evaluations = []
+            resource_ids.update(evaluation["ComplianceResourceId"] for evaluation in slice_evaluations)
+            state["Cursor"] = cursor
+            slices += 1
+            remaining_millis = get_remaining_millis(context)
+            if remaining_millis is not None and remaining_millis < safety_margin_millis:
+                interrupted = True
+                break
+        submitter.submit(unsent_evaluations)
+
+    if interrupted:
+        if not store:
+            raise CheckpointError("The evaluation ran out of time after {} slices: set the CHECKPOINT_TABLE environment variable "
+                                  "to resume it from a checkpoint.".format(slices))
+        save_checkpoint(store, checkpoint_key, state, resource_ids)
+        print("Checkpoint {} saved after {} slices in invocation {}, {} resources evaluated by this invocation.".format(
+            checkpoint_key, slices, state["Invocations"], len(resource_ids)))
+        next_event = dict(event)
+        next_event[CHECKPOINT_EVENT_KEY] = checkpoint_key
+        invoke_next_slice(context, next_event)
+        return evaluations
+
+    for number in range(state["Items"]):
+        item = store.load(build_item_key(checkpoint_key, number))
+        if item is None:
+            raise CheckpointError("The item {} of the checkpoint {} is missing from the store.".format(number, checkpoint_key))
+        resource_ids.update(item["ResourceIds"])
+    latest_evaluations = [{"ComplianceResourceId": resource_id} for resource_id in resource_ids]
+    final_evaluations = []
+    if not resource_ids:
+        final_evaluations.append(build_evaluation(event["accountId"], "NOT_APPLICABLE", event, "AWS::::Account"))
+        latest_evaluations = final_evaluations[:]
+    # Every slice is sent: the old results are paged to completion before the first NOT_APPLICABLE is put
+    stale_evaluations = iter_stale_evaluations(config_client, latest_evaluations, event, default_resource_type)
+    if test_mode:
+        # Used solely for RDK test to also return the stale evaluations
+        stale_evaluations = list(stale_evaluations)
+    with EvaluationSubmitter(config_client, result_token, test_mode) as submitter:
+        submitter.submit(final_evaluations)
+        submitter.submit(stale_evaluations)
+    if test_mode:
+        final_evaluations = final_evaluations + stale_evaluations
+    if CHECKPOINT_EVENT_KEY in event:
+        delete_checkpoint(store, checkpoint_key, state)
+        print("Evaluation resumed from checkpoint {} completed in {} invocations, {} resources evaluated.".format(
+            checkpoint_key, state["Invocations"], len(resource_ids)))
+    return final_evaluations + evaluations
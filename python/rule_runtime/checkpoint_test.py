@@ -0,0 +1,179 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+import json
+import shutil
+import sys
+import tempfile
+import unittest
+try:
+    from unittest.mock import MagicMock, patch
+except ImportError:
+    from mock import MagicMock, patch
+
+import rule_runtime
+from rule_runtime import checkpoint
+
+DEFAULT_RESOURCE_TYPE = 'AWS::Lambda::Function'
+
+CONFIG_CLIENT_MOCK = MagicMock()
+LAMBDA_CLIENT_MOCK = MagicMock()
+DYNAMODB_CLIENT_MOCK = MagicMock()
+
+class Boto3Mock():
+    @staticmethod
+    def client(client_name, *args, **kwargs):
+        if client_name == 'config':
+            return CONFIG_CLIENT_MOCK
+        if client_name == 'lambda':
+            return LAMBDA_CLIENT_MOCK
+        if client_name == 'dynamodb':
+            return DYNAMODB_CLIENT_MOCK
+        raise Exception("Attempting to create an unknown client")
+
+class FakeContext():
+    invoked_function_arn = 'arn:aws:lambda:us-east-1:123456789012:function:rule'
+
+    def __init__(self, remaining_millis):
+        self.remaining_millis = list(remaining_millis)
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_millis.pop(0) if len(self.remaining_millis) > 1 else self.remaining_millis[0]
+
+# 5 functions on 3 pages
+PAGES = {None: {'Functions': [{'Name': 'f1'}, {'Name': 'f2'}], 'NextMarker': 'm1'},
+         'm1': {'Functions': [{'Name': 'f3'}, {'Name': 'f4'}], 'NextMarker': 'm2'},
+         'm2': {'Functions': [{'Name': 'f5'}]}}
+
+def iter_evaluations(event, valid_rule_parameters, cursor):
+    for function, function_cursor in rule_runtime.iter_resumable_items(lambda marker: PAGES[marker], 'Functions', 'NextMarker', 'Name', cursor):
+        yield [rule_runtime.build_evaluation(function['Name'], 'COMPLIANT', event, DEFAULT_RESOURCE_TYPE)], function_cursor
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        CONFIG_CLIENT_MOCK.reset_mock()
+        LAMBDA_CLIENT_MOCK.reset_mock()
+        CONFIG_CLIENT_MOCK.get_compliance_details_by_config_rule = MagicMock(return_value={'EvaluationResults': [build_old_result('deleted')]})
+        CONFIG_CLIENT_MOCK.put_evaluations = MagicMock()
+        self.boto3_patch = patch.dict(sys.modules, {'boto3': Boto3Mock()})
+        self.boto3_patch.start()
+        rule_runtime.clear_client_cache()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.store = rule_runtime.LocalFileStore(self.directory)
+
+    def tearDown(self):
+        self.boto3_patch.stop()
+
+    def run_handler(self, event, context, store=None):
+        return rule_runtime.lambda_handler(event, context, MagicMock(), evaluate_parameters=lambda params: params, default_resource_type=DEFAULT_RESOURCE_TYPE,
+                                           iter_evaluations=iter_evaluations, checkpoint_store=store or self.store)
+
+    def test_resume_from_cursor(self):
+        items = [(item['Name'], cursor) for item, cursor in rule_runtime.iter_resumable_items(lambda marker: PAGES[marker], 'Functions', 'NextMarker', 'Name')]
+        self.assertEqual(['f1', 'f2', 'f3', 'f4', 'f5'], [name for name, _ in items])
+        self.assertEqual({'PageToken': 'm1', 'LastResourceId': 'f3'}, items[2][1])
+        resumed = [item['Name'] for item, _ in rule_runtime.iter_resumable_items(lambda marker: PAGES[marker], 'Functions', 'NextMarker', 'Name', items[2][1])]
+        self.assertEqual(['f4', 'f5'], resumed)
+        resumed = [item['Name'] for item, _ in rule_runtime.iter_resumable_items(lambda marker: PAGES[marker], 'Functions', 'NextMarker', 'Name', items[1][1])]
+        self.assertEqual(['f3', 'f4', 'f5'], resumed)
+
+    def test_no_deadline_runs_to_completion(self):
+        response = self.run_handler(build_lambda_scheduled_event(), {})
+        self.assertEqual(['f1', 'f2', 'f3', 'f4', 'f5'], [evaluation['ComplianceResourceId'] for evaluation in response])
+        self.assertEqual([('deleted', 'NOT_APPLICABLE')], [(evaluation['ComplianceResourceId'], evaluation['ComplianceType'])
+                                                           for evaluation in CONFIG_CLIENT_MOCK.put_evaluations.call_args[1]['Evaluations']])
+        LAMBDA_CLIENT_MOCK.invoke.assert_not_called()
+
+    def test_checkpoint_and_resume(self):
+        # 2 slices fit in the first invocation, 3 in the second one
+        response = self.run_handler(build_lambda_scheduled_event(), FakeContext([300000, 1000]))
+        self.assertEqual(['f1', 'f2'], [evaluation['ComplianceResourceId'] for evaluation in response])
+        CONFIG_CLIENT_MOCK.get_compliance_details_by_config_rule.assert_not_called()
+        self.assertEqual(2, sum(len(call[1]['Evaluations']) for call in CONFIG_CLIENT_MOCK.put_evaluations.call_args_list))
+        invoke_kwargs = LAMBDA_CLIENT_MOCK.invoke.call_args[1]
+        self.assertEqual(('arn:aws:lambda:us-east-1:123456789012:function:rule', 'Event'), (invoke_kwargs['FunctionName'], invoke_kwargs['InvocationType']))
+        next_event = json.loads(invoke_kwargs['Payload'])
+        state = self.store.load(next_event['checkpointKey'])
+        self.assertEqual({'PageToken': None, 'LastResourceId': 'f2'}, state['Cursor'])
+        self.assertEqual({'ResourceIds': ['f1', 'f2']}, self.store.load(next_event['checkpointKey'] + '#0'))
+        self.assertNotIn('token', json.dumps(state))
+
+        response = self.run_handler(next_event, FakeContext([300000]))
+        self.assertEqual(['f3', 'f4', 'f5'], [evaluation['ComplianceResourceId'] for evaluation in response])
+        # Only the resource evaluated by neither invocation is stale
+        self.assertEqual(['deleted'], [evaluation['ComplianceResourceId'] for evaluation in CONFIG_CLIENT_MOCK.put_evaluations.call_args[1]['Evaluations']])
+        self.assertEqual(1, LAMBDA_CLIENT_MOCK.invoke.call_count)
+        self.assertIsNone(self.store.load(next_event['checkpointKey']))
+        self.assertIsNone(self.store.load(next_event['checkpointKey'] + '#0'))
+
+    def test_resource_ids_split_over_items(self):
+        with patch.object(checkpoint, 'MAX_RESOURCE_IDS_PER_ITEM', 1):
+            self.run_handler(build_lambda_scheduled_event(), FakeContext([300000, 1000]))
+            next_event = json.loads(LAMBDA_CLIENT_MOCK.invoke.call_args[1]['Payload'])
+            self.assertEqual(2, self.store.load(next_event['checkpointKey'])['Items'])
+            self.run_handler(next_event, FakeContext([300000, 1000]))
+            next_event = json.loads(LAMBDA_CLIENT_MOCK.invoke.call_args[1]['Payload'])
+            self.assertEqual(4, self.store.load(next_event['checkpointKey'])['Items'])
+            self.assertEqual({'ResourceIds': ['f4']}, self.store.load(next_event['checkpointKey'] + '#3'))
+            CONFIG_CLIENT_MOCK.put_evaluations.reset_mock()
+            self.run_handler(next_event, FakeContext([300000]))
+        self.assertEqual(['deleted'], [evaluation['ComplianceResourceId'] for evaluation in CONFIG_CLIENT_MOCK.put_evaluations.call_args[1]['Evaluations']])
+
+    def test_stale_resources_collected_before_any_put(self):
+        CONFIG_CLIENT_MOCK.get_compliance_details_by_config_rule = MagicMock(side_effect=[
+            {'EvaluationResults': [build_old_result('deleted-1')], 'NextToken': 'next'},
+            {'EvaluationResults': [build_old_result('deleted-2')]}])
+        pages_read_at_put = []
+
+        def put_evaluations(Evaluations, **kwargs):
+            if any(evaluation['ComplianceType'] == 'NOT_APPLICABLE' for evaluation in Evaluations):
+                pages_read_at_put.append(CONFIG_CLIENT_MOCK.get_compliance_details_by_config_rule.call_count)
+            return {'FailedEvaluations': []}
+        CONFIG_CLIENT_MOCK.put_evaluations = MagicMock(side_effect=put_evaluations)
+        self.run_handler(build_lambda_scheduled_event(), {})
+        # A put made while paging would change the result set being paged
+        self.assertEqual([2], pages_read_at_put)
+        self.assertEqual(['deleted-1', 'deleted-2'], [evaluation['ComplianceResourceId'] for evaluation in CONFIG_CLIENT_MOCK.put_evaluations.call_args[1]['Evaluations']])
+
+    def test_checkpoint_without_table_is_an_error(self):
+        with patch.dict(checkpoint.os.environ, {'CHECKPOINT_TABLE': ''}):
+            response = rule_runtime.lambda_handler(build_lambda_scheduled_event(), FakeContext([300000, 1000]), MagicMock(),
+                                                   evaluate_parameters=lambda params: params, default_resource_type=DEFAULT_RESOURCE_TYPE,
+                                                   iter_evaluations=iter_evaluations)
+        self.assertEqual('InternalError', response['customerErrorCode'])
+        # The evaluations sent before the deadline stand, but no invocation resumes from /tmp
+        self.assertEqual(2, sum(len(call[1]['Evaluations']) for call in CONFIG_CLIENT_MOCK.put_evaluations.call_args_list))
+        LAMBDA_CLIENT_MOCK.invoke.assert_not_called()
+
+    def test_missing_checkpoint_is_an_error(self):
+        event = build_lambda_scheduled_event()
+        event['checkpointKey'] = 'myrule/123456789012/us-east-1'
+        response = self.run_handler(event, FakeContext([300000]))
+        self.assertEqual('InternalError', response['customerErrorCode'])
+        CONFIG_CLIENT_MOCK.put_evaluations.assert_not_called()
+
+    def test_dynamodb_store(self):
+        store = rule_runtime.DynamoDBStore('checkpoints', ttl_seconds=60)
+        store.save('key', {'Cursor': {'PageToken': 'm1'}})
+        item = DYNAMODB_CLIENT_MOCK.put_item.call_args[1]['Item']
+        self.assertEqual({'S': 'key'}, item['CheckpointKey'])
+        DYNAMODB_CLIENT_MOCK.get_item = MagicMock(return_value={'Item': item})
+        self.assertEqual({'Cursor': {'PageToken': 'm1'}}, store.load('key'))
+        DYNAMODB_CLIENT_MOCK.get_item = MagicMock(return_value={})
+        self.assertIsNone(store.load('key'))
+
+def build_old_result(resource_id):
+    return {'EvaluationResultIdentifier': {'EvaluationResultQualifier': {'ResourceId': resource_id, 'ResourceType': DEFAULT_RESOURCE_TYPE}}}
+
+def build_lambda_scheduled_event():
+    invoking_event = '{"messageType":"ScheduledNotification","notificationCreationTime":"2017-12-23T22:11:18.158Z"}'
+    return {
+        'configRuleName':'myrule',
+        'executionRoleArn':'roleArn',
+        'eventLeftScope': False,
+        'invokingEvent': invoking_event,
+        'accountId': '123456789012',
+        'configRuleArn': 'arn:aws:config:us-east-1:123456789012:config-rule/config-rule-8fngan',
+        'resultToken':'token'
+    }
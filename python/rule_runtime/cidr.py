@@ -0,0 +1,102 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+'''
+Sets of IPv4 and IPv6 CIDRs, answering containment by binary search.
+
+A CidrSet merges its CIDRs into sorted, disjoint ranges of integers, one list per IP version. A
+network is inside the set when one range holds its first and last address, which also holds for a
+network spanning adjacent CIDRs of the set (10.0.0.0/24 is inside 10.0.0.0/25,10.0.0.128/25):
+
+    whitelist = rule_runtime.get_cidr_set(valid_rule_parameters)
+    if not whitelist.contains_all(statement_cidrs):
+        ...
+    allowed_addresses = rule_runtime.CidrSet(source_ip_cidrs).num_addresses
+
+get_cidr_set() builds the set of a list of CIDRs once per container: the rules parse their
+parameter once, whatever the number of resources and statements compared with it.
+'''
+
+import ipaddress
+from bisect import bisect_right
+from functools import lru_cache
+
+CIDR_SET_CACHE_SIZE = 64
+
+
+def to_network(cidr):
+    """Return the ip_network of a CIDR or an address (a /32 or /128), the host bits being ignored. Raise a ValueError when invalid."""
+    if isinstance(cidr, (ipaddress.IPv4Network, ipaddress.IPv6Network)):
+        return cidr
+    return ipaddress.ip_network(cidr, strict=False)
+
+
+def merge_ranges(ranges):
+    """Return the sorted, disjoint ranges covering the (first, last) ranges of integers; adjacent ranges are merged."""
+    merged = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + 1:
+            if last > merged[-1][1]:
+                merged[-1][1] = last
+        else:
+            merged.append([first, last])
+    return merged
+
+
+class CidrSet():
+    """The union of IPv4 and IPv6 CIDRs.
+
+    Keyword arguments:
+    cidrs -- an iterable of CIDRs, addresses or ip_network objects
+    """
+
+    def __init__(self, cidrs=()):
+        ranges = {4: [], 6: []}
+        for cidr in cidrs:
+            network = to_network(cidr)
+            ranges[network.version].append((int(network.network_address), int(network.broadcast_address)))
+        self._firsts = {}
+        self._lasts = {}
+        for version, version_ranges in ranges.items():
+            merged = merge_ranges(version_ranges)
+            self._firsts[version] = [first for first, _ in merged]
+            self._lasts[version] = [last for _, last in merged]
+
+    def contains(self, cidr):
+        """Return True if every address of the CIDR (or address) is in the set."""
+        network = to_network(cidr)
+        firsts = self._firsts[network.version]
+        index = bisect_right(firsts, int(network.network_address)) - 1
+        return index >= 0 and self._lasts[network.version][index] >= int(network.broadcast_address)
+
+    def contains_all(self, cidrs):
+        """Return True if every CIDR (or address) of the iterable is in the set."""
+        return all(self.contains(cidr) for cidr in cidrs)
+
+    @property
+    def num_addresses(self):
+        """The number of distinct addresses of the set."""
+        return sum(last - first + 1
+                   for version in self._firsts
+                   for first, last in zip(self._firsts[version], self._lasts[version]))
+
+    def __bool__(self):
+        return any(self._firsts.values())
+
+
+@lru_cache(maxsize=CIDR_SET_CACHE_SIZE)
+def _get_cidr_set(cidrs):
+    return CidrSet(cidrs)
+
+
+def get_cidr_set(cidrs):
+    """Return the CidrSet of a list of CIDRs, built once per list. Raise a ValueError on an invalid CIDR.
+
+    Keyword arguments:
+    cidrs -- an iterable of CIDR or address strings
+    """
+    return _get_cidr_set(tuple(cidrs))
+
+
+def clear_cidr_sets():
+    _get_cidr_set.cache_clear()
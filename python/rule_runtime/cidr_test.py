@@ -0,0 +1,38 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+import ipaddress
+import unittest
+
+import rule_runtime
+
+class TestCidrSet(unittest.TestCase):
+    def test_contains(self):
+        cidr_set = rule_runtime.CidrSet(['10.1.1.1', '10.1.2.0/24', '192.168.0.0/16', '2001:db8::/32'])
+        for cidr in ('10.1.1.1', '10.1.1.1/32', '10.1.2.128/25', '192.168.255.0/24', '2001:db8:1::/48', ipaddress.ip_network('10.1.2.0/24')):
+            self.assertTrue(cidr_set.contains(cidr), cidr)
+        for cidr in ('10.1.1.2', '10.1.2.0/23', '10.0.0.0/8', '0.0.0.0/0', '::/0', '2001:db9::/32'):
+            self.assertFalse(cidr_set.contains(cidr), cidr)
+
+    def test_adjacent_and_overlapping_cidrs_merged(self):
+        cidr_set = rule_runtime.CidrSet(['10.0.0.128/25', '10.0.0.0/25', '10.0.0.0/26', '10.0.1.0/24'])
+        self.assertTrue(cidr_set.contains('10.0.0.0/23'))
+        self.assertFalse(cidr_set.contains('10.0.0.0/22'))
+        self.assertEqual(512, cidr_set.num_addresses)
+        self.assertTrue(cidr_set.contains_all(['10.0.0.1', '10.0.1.0/30']))
+        self.assertFalse(cidr_set.contains_all(['10.0.0.1', '10.0.2.0']))
+
+    def test_empty_set(self):
+        self.assertFalse(rule_runtime.CidrSet())
+        self.assertFalse(rule_runtime.CidrSet().contains('10.0.0.1'))
+        self.assertTrue(rule_runtime.CidrSet(['::1']))
+
+    def test_invalid_cidr(self):
+        self.assertRaises(ValueError, rule_runtime.CidrSet, ['10.1.1.1/92'])
+
+    def test_same_cidrs_built_once(self):
+        rule_runtime.clear_cidr_sets()
+        cidr_set = rule_runtime.get_cidr_set(['10.0.0.0/8'])
+        self.assertIs(cidr_set, rule_runtime.get_cidr_set(('10.0.0.0/8',)))
+        rule_runtime.clear_cidr_sets()
+        self.assertIsNot(cidr_set, rule_runtime.get_cidr_set(['10.0.0.0/8']))
@@ -0,0 +1,149 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+'''
+Client factory shared by the rules.
+
+boto3 and botocore are only imported the first time a client is requested, so importing a rule
+(and this runtime) does not pay for them during the Lambda init phase.
+
+Clients are cached at module level, keyed by service, region and assumed role, so the invocations
+of a warm Lambda container reuse their endpoints, credentials and connection pools. A client built
+from assumed-role credentials is renewed with them, see rule_runtime.credentials.
+'''
+
+import json
+import threading
+from contextlib import contextmanager
+
+from rule_runtime import credentials as credential_cache
+
+_CLIENT_CACHE = {}
+_CLIENT_CACHE_LOCK = threading.Lock()
+_SCOPE_CONTEXT = threading.local()
+
+
+class CachedClient():
+    """A boto client and the expiration of the credentials it was built with (None if they do not expire)."""
+
+    def __init__(self, client, expiration=None):
+        self.client = client
+        self.expiration = expiration
+
+    def is_expired(self):
+        if self.expiration is None:
+            return False
+        return not credential_cache.CREDENTIAL_CACHE.is_valid(self.expiration)
+
+
+@contextmanager
+def region_scope(region):
+    """Make get_client() default to region in the current thread while the context is active."""
+    previous_region = current_region()
+    _SCOPE_CONTEXT.region = region
+    try:
+        yield region
+    finally:
+        _SCOPE_CONTEXT.region = previous_region
+
+
+def current_region():
+    """Return the region set by region_scope() in the current thread, or None."""
+    return getattr(_SCOPE_CONTEXT, "region", None)
+
+
+@contextmanager
+def account_scope(role_arn):
+    """Make get_client() assume role_arn in the current thread while the context is active, whatever the assume_role_mode."""
+    previous_role_arn = current_role_arn()
+    _SCOPE_CONTEXT.role_arn = role_arn
+    try:
+        yield role_arn
+    finally:
+        _SCOPE_CONTEXT.role_arn = previous_role_arn
+
+
+def current_role_arn():
+    """Return the role set by account_scope() in the current thread, or None."""
+    return getattr(_SCOPE_CONTEXT, "role_arn", None)
+
+
+def clear_client_cache(role_arn=None):
+    """Drop every cached client, or only the clients built on the credentials of role_arn."""
+    with _CLIENT_CACHE_LOCK:
+        if role_arn is None:
+            _CLIENT_CACHE.clear()
+            return
+        for cache_key in [cache_key for cache_key in _CLIENT_CACHE if cache_key[2] == role_arn]:
+            del _CLIENT_CACHE[cache_key]
+
+
+# This gets the client after assuming the Config service role
+# either in the same AWS account or cross-account.
+def get_client(service, event, region=None, assume_role_mode=False):
+    """Return the service boto client. It should be used instead of directly calling the client.
+
+    Keyword arguments:
+    service -- the service name used for calling the boto.client()
+    event -- the event variable given in the lambda handler
+    region -- the region where the client is called (default: None, the region of region_scope() if any)
+    assume_role_mode -- assume the execution role of the event before building the client (default: False)
+    """
+    role_arn = current_role_arn()
+    if not role_arn and assume_role_mode:
+        role_arn = get_execution_role_arn(event)
+    return get_cached_client(service, region or current_region(), role_arn)
+
+
+# Get execution role for Lambda function
+def get_execution_role_arn(event):
+    """Return the executionRoleArn of the event, or the role named by the ExecutionRoleName rule parameter in the same account."""
+    role_arn = None
+    if "ruleParameters" in event:
+        rule_params = json.loads(event["ruleParameters"])
+        role_name = rule_params.get("ExecutionRoleName")
+        if role_name:
+            execution_role_prefix = event["executionRoleArn"].split("/")[0]
+            role_arn = "{}/{}".format(execution_role_prefix, role_name)
+
+    if not role_arn:
+        role_arn = event["executionRoleArn"]
+
+    return role_arn
+
+
+def get_cached_client(service, region=None, role_arn=None):
+    """Return the cached client of the service, region and role, building it if missing or expired.
+
+    Keyword arguments:
+    service -- the service name used for calling the boto.client()
+    region -- the region where the client is called (default: None)
+    role_arn -- the role to assume to build the client, None to use the Lambda credentials (default: None)
+    """
+    cache_key = (service, region, role_arn)
+    with _CLIENT_CACHE_LOCK:
+        cached_client = _CLIENT_CACHE.get(cache_key)
+    if cached_client and not cached_client.is_expired():
+        return cached_client.client
+
+    cached_client = build_client(service, region, role_arn)
+    with _CLIENT_CACHE_LOCK:
+        _CLIENT_CACHE[cache_key] = cached_client
+    return cached_client.client
+
+
+def build_client(service, region=None, role_arn=None):
+    """Return a new CachedClient, built on the credentials of role_arn if given."""
+    import boto3
+    if not role_arn:
+        return CachedClient(boto3.client(service, region))
+    credentials = credential_cache.get_assume_role_credentials(role_arn, region)
+    client = boto3.client(
+        service,
+        aws_access_key_id=credentials["AccessKeyId"],
+        aws_secret_access_key=credentials["SecretAccessKey"],
+        aws_session_token=credentials["SessionToken"],
+        region_name=region,
+    )
+    # An unknown expiration (False) makes the client valid for this call only
+    return CachedClient(client, credentials.get("Expiration") or False)
@@ -0,0 +1,146 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+'''
+IAM credential report of the account, as a table of the users indexed by user name.
+
+The credential report is a CSV generated by IAM with one row per user: password use, MFA, and
+the age and last use of both access keys. Two or three calls return what a rule would otherwise
+get with list_access_keys(), get_access_key_last_used() or list_mfa_devices() for every user:
+
+    report = rule_runtime.get_credential_report(iam_client)
+    for user in iam_client.list_users()["Users"]:
+        credentials = report.get(user["UserName"]) if report else None
+        if credentials is None:
+            ...  # per-user calls: no report, or a user created after the report
+        elif credentials.mfa_active:
+            ...
+
+IAM generates a new report at most every 4 hours, so a row can be up to 4 hours old. The report
+does not list the UserId or the AccessKeyId of the keys: rules reporting on the UserId still list
+the users, and a rule naming a key in an annotation gets it with a per-user call.
+'''
+
+import csv
+import io
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+ROOT_USER_NAME = "<root_account>"
+DEFAULT_REPORT_TIMEOUT_SECONDS = 60
+DEFAULT_REPORT_POLL_SECONDS = 2
+ACCESS_KEY_NUMBERS = (1, 2)
+# Values of the report for a missing field: the user has no password or key, or never used it
+MISSING_VALUES = ("", "N/A", "no_information", "not_supported")
+
+AccessKeyCredentials = namedtuple("AccessKeyCredentials", ["number", "active", "last_rotated", "last_used_date", "last_used_service"])
+UserCredentials = namedtuple("UserCredentials", ["user", "arn", "user_creation_time", "password_enabled", "password_last_used",
+                                                 "password_last_changed", "mfa_active", "access_keys"])
+
+
+class CredentialReportError(ValueError):
+    """The credential report could not be generated; a ValueError, reported as an internal error by the handlers."""
+
+
+def parse_report_value(value):
+    if value in MISSING_VALUES:
+        return None
+    if value in ("true", "false"):
+        return value == "true"
+    return value
+
+
+def parse_report_time(value):
+    """Return the UTC datetime of a report timestamp, e.g. 2019-03-17T03:37:52+00:00, or None."""
+    if value in MISSING_VALUES:
+        return None
+    return datetime.strptime(value[:19], "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc)
+
+
+def parse_user_credentials(row):
+    access_keys = []
+    for number in ACCESS_KEY_NUMBERS:
+        prefix = "access_key_{}_".format(number)
+        last_rotated = parse_report_time(row.get(prefix + "last_rotated", "N/A"))
+        # The last_rotated column is the creation date of the key, N/A when the user has no such key
+        if last_rotated is None:
+            continue
+        access_keys.append(AccessKeyCredentials(number, parse_report_value(row[prefix + "active"]) is True, last_rotated,
+                                                parse_report_time(row.get(prefix + "last_used_date", "N/A")),
+                                                parse_report_value(row.get(prefix + "last_used_service", "N/A"))))
+    return UserCredentials(user=row["user"],
+                           arn=row["arn"],
+                           user_creation_time=parse_report_time(row["user_creation_time"]),
+                           password_enabled=parse_report_value(row["password_enabled"]) is True,
+                           password_last_used=parse_report_time(row["password_last_used"]),
+                           password_last_changed=parse_report_time(row["password_last_changed"]),
+                           mfa_active=parse_report_value(row["mfa_active"]) is True,
+                           access_keys=tuple(access_keys))
+
+
+class CredentialReport():
+    """The rows of a credential report, by user name. The root user is the root attribute, not a user of the table.
+
+    Keyword arguments:
+    users -- the UserCredentials of the report
+    generated_time -- the GeneratedTime of the report (default None)
+    """
+
+    def __init__(self, users, generated_time=None):
+        self.generated_time = generated_time
+        self.root = None
+        self._users = {}
+        for user in users:
+            if user.user == ROOT_USER_NAME:
+                self.root = user
+            else:
+                self._users[user.user] = user
+
+    @classmethod
+    def parse(cls, content, generated_time=None):
+        """Return the CredentialReport of the CSV content (bytes or str) of get_credential_report()."""
+        if isinstance(content, bytes):
+            content = content.decode("utf-8")
+        return cls([parse_user_credentials(row) for row in csv.DictReader(io.StringIO(content))], generated_time)
+
+    def get(self, user_name):
+        """Return the UserCredentials of a user, or None when the user is not in the report."""
+        return self._users.get(user_name)
+
+    def __contains__(self, user_name):
+        return user_name in self._users
+
+    def __iter__(self):
+        return iter(self._users.values())
+
+    def __len__(self):
+        return len(self._users)
+
+
+def get_credential_report(iam_client, timeout_seconds=DEFAULT_REPORT_TIMEOUT_SECONDS, poll_seconds=DEFAULT_REPORT_POLL_SECONDS):
+    """Generate the credential report if needed and return it as a CredentialReport.
+
+    Return None when the role is not allowed to generate or get the report, so that the rule falls back to per-user calls.
+    Raise a CredentialReportError when the report is not generated in time.
+
+    Keyword arguments:
+    iam_client -- the IAM boto client
+    timeout_seconds -- the maximum time to wait for the generation of the report (default DEFAULT_REPORT_TIMEOUT_SECONDS)
+    poll_seconds -- the time between two checks of the state of the generation (default DEFAULT_REPORT_POLL_SECONDS)
+    """
+    from botocore.exceptions import ClientError
+    deadline = time.time() + timeout_seconds
+    try:
+        # A report younger than 4 hours is returned as COMPLETE right away
+        while iam_client.generate_credential_report()["State"] != "COMPLETE":
+            if time.time() > deadline:
+                raise CredentialReportError("The IAM credential report was not generated in {} seconds.".format(timeout_seconds))
+            time.sleep(poll_seconds)
+        response = iam_client.get_credential_report()
+    except ClientError as ex:
+        if ex.response["Error"]["Code"] != "AccessDenied":
+            raise
+        print("Not allowed to get the IAM credential report, falling back to per-user calls.")
+        return None
+    return CredentialReport.parse(response["Content"], response.get("GeneratedTime"))
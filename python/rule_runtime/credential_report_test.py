@@ -0,0 +1,63 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+import unittest
+from datetime import datetime, timezone
+try:
+    from unittest.mock import MagicMock, patch
+except ImportError:
+    from mock import MagicMock, patch
+from botocore.exceptions import ClientError
+
+import rule_runtime
+
+REPORT_CONTENT = '''user,arn,user_creation_time,password_enabled,password_last_used,password_last_changed,password_next_rotation,mfa_active,access_key_1_active,access_key_1_last_rotated,access_key_1_last_used_date,access_key_1_last_used_region,access_key_1_last_used_service,access_key_2_active,access_key_2_last_rotated,access_key_2_last_used_date,access_key_2_last_used_region,access_key_2_last_used_service,cert_1_active,cert_1_last_rotated,cert_2_active,cert_2_last_rotated
+<root_account>,arn:aws:iam::123456789012:root,2017-01-01T00:00:00+00:00,not_supported,2019-03-01T10:00:00+00:00,not_supported,not_supported,true,false,N/A,N/A,N/A,N/A,false,N/A,N/A,N/A,N/A,false,N/A,false,N/A
+alice,arn:aws:iam::123456789012:user/alice,2018-05-01T08:00:00+00:00,true,no_information,2018-05-01T08:05:00+00:00,N/A,true,true,2018-05-01T08:10:00+00:00,2019-03-16T12:00:00+00:00,us-east-1,s3,false,2018-06-01T00:00:00+00:00,N/A,N/A,N/A,false,N/A,false,N/A
+bob,arn:aws:iam::123456789012:user/bob,2018-07-01T00:00:00+00:00,false,N/A,N/A,N/A,false,false,N/A,N/A,N/A,N/A,false,N/A,N/A,N/A,N/A,false,N/A,false,N/A
+'''
+
+class TestCredentialReport(unittest.TestCase):
+    def test_parse_report(self):
+        report = rule_runtime.CredentialReport.parse(REPORT_CONTENT.encode('utf-8'))
+        self.assertEqual(2, len(report))
+        self.assertEqual(['alice', 'bob'], sorted(user.user for user in report))
+        self.assertTrue(report.root.mfa_active)
+        self.assertEqual((), report.root.access_keys)
+        self.assertNotIn('<root_account>', report)
+
+        alice = report.get('alice')
+        self.assertTrue(alice.password_enabled)
+        self.assertIsNone(alice.password_last_used)
+        self.assertEqual(datetime(2018, 5, 1, 8, 0, tzinfo=timezone.utc), alice.user_creation_time)
+        self.assertEqual([(1, True, 's3'), (2, False, None)], [(key.number, key.active, key.last_used_service) for key in alice.access_keys])
+        self.assertEqual(datetime(2019, 3, 16, 12, 0, tzinfo=timezone.utc), alice.access_keys[0].last_used_date)
+        self.assertIsNone(alice.access_keys[1].last_used_date)
+
+        bob = report.get('bob')
+        self.assertEqual((False, False, ()), (bob.password_enabled, bob.mfa_active, bob.access_keys))
+        self.assertIsNone(report.get('carol'))
+
+    @patch('rule_runtime.credential_report.time.sleep')
+    def test_wait_for_generation(self, sleep_mock):
+        iam_client = MagicMock()
+        iam_client.generate_credential_report = MagicMock(side_effect=[{'State': 'STARTED'}, {'State': 'INPROGRESS'}, {'State': 'COMPLETE'}])
+        iam_client.get_credential_report = MagicMock(return_value={'Content': REPORT_CONTENT.encode('utf-8'), 'GeneratedTime': 'now'})
+        report = rule_runtime.get_credential_report(iam_client)
+        self.assertEqual(('now', 2), (report.generated_time, len(report)))
+        self.assertEqual(2, sleep_mock.call_count)
+
+    @patch('rule_runtime.credential_report.time.sleep')
+    def test_generation_timeout(self, sleep_mock):
+        iam_client = MagicMock()
+        iam_client.generate_credential_report = MagicMock(return_value={'State': 'INPROGRESS'})
+        with self.assertRaises(rule_runtime.CredentialReportError):
+            rule_runtime.get_credential_report(iam_client, timeout_seconds=-1)
+        iam_client.get_credential_report.assert_not_called()
+
+    def test_access_denied_falls_back(self):
+        iam_client = MagicMock()
+        iam_client.generate_credential_report = MagicMock(side_effect=ClientError({'Error': {'Code': 'AccessDenied', 'Message': 'denied'}}, 'GenerateCredentialReport'))
+        self.assertIsNone(rule_runtime.get_credential_report(iam_client))
+        iam_client.generate_credential_report = MagicMock(side_effect=ClientError({'Error': {'Code': 'ServiceFailure', 'Message': 'failure'}}, 'GenerateCredentialReport'))
+        self.assertRaises(ClientError, rule_runtime.get_credential_report, iam_client)
@@ -0,0 +1,124 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+'''
+Cache of the credentials returned by sts:AssumeRole.
+
+In ASSUME_ROLE_MODE, every client built for the same executionRoleArn shares one set of
+credentials, reused until a safety margin before their Expiration. The margin defaults to
+DEFAULT_SAFETY_MARGIN_SECONDS and can be set with the CREDENTIALS_SAFETY_MARGIN_SECONDS
+environment variable of the Lambda function.
+'''
+
+import datetime
+import os
+import threading
+
+# The logging layer of the rules, when deployed next to the runtime
+try:
+    import liblogging
+except ImportError:
+    liblogging = None
+
+# Other parameters (no change needed)
+CONFIG_ROLE_TIMEOUT_SECONDS = 900
+ROLE_SESSION_NAME = "configLambdaExecution"
+DEFAULT_SAFETY_MARGIN_SECONDS = 120
+
+
+def utc_now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+class CredentialCache():
+    """Assumed-role credentials keyed by role ARN, with hit and miss counters.
+
+    Keyword arguments:
+    safety_margin_seconds -- credentials expiring in less than this margin are renewed (default DEFAULT_SAFETY_MARGIN_SECONDS)
+    """
+
+    def __init__(self, safety_margin_seconds=DEFAULT_SAFETY_MARGIN_SECONDS):
+        self.safety_margin = datetime.timedelta(seconds=safety_margin_seconds)
+        self.hits = 0
+        self.misses = 0
+        self._credentials = {}
+        self._role_locks = {}
+        self._lock = threading.Lock()
+
+    def is_valid(self, expiration, now=None):
+        """Return True if credentials expiring at expiration can still be used."""
+        if not isinstance(expiration, datetime.datetime):
+            return False
+        return expiration - (now or utc_now()) >= self.safety_margin
+
+    def get(self, role_arn, region=None):
+        """Return the credentials of role_arn, assuming the role only if no valid credentials are cached.
+
+        Keyword arguments:
+        role_arn -- the ARN of the role to assume
+        region -- the region of the STS endpoint used on a cache miss (default: None)
+        """
+        with self._lock:
+            role_lock = self._role_locks.setdefault(role_arn, threading.Lock())
+        # One AssumeRole call per role at a time: concurrent callers wait for its credentials
+        with role_lock:
+            credentials = self._credentials.get(role_arn)
+            if credentials and self.is_valid(credentials.get("Expiration")):
+                with self._lock:
+                    self.hits += 1
+                return credentials
+            with self._lock:
+                self.misses += 1
+            credentials = assume_role(role_arn, region)
+            if self.is_valid(credentials.get("Expiration")):
+                self._credentials[role_arn] = credentials
+            return credentials
+
+    def clear(self):
+        """Drop every cached credentials and reset the counters."""
+        with self._lock:
+            self._credentials.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "roles": len(self._credentials)}
+
+
+CREDENTIAL_CACHE = CredentialCache(int(os.environ.get("CREDENTIALS_SAFETY_MARGIN_SECONDS", DEFAULT_SAFETY_MARGIN_SECONDS)))
+
+
+def get_assume_role_credentials(role_arn, region=None):
+    """Return the Credentials dictionary of the given role, from CREDENTIAL_CACHE when still valid.
+
+    Keyword arguments:
+    role_arn -- the ARN of the role to assume
+    region -- the region of the STS endpoint (default: None)
+    """
+    return CREDENTIAL_CACHE.get(role_arn, region)
+
+
+def assume_role(role_arn, region=None):
+    """Return the Credentials dictionary of an assume_role call on the given role."""
+    import botocore
+    from rule_runtime.clients import get_cached_client
+    sts_client = get_cached_client("sts", region)
+    try:
+        assume_role_response = sts_client.assume_role(
+            RoleArn=role_arn,
+            RoleSessionName=ROLE_SESSION_NAME,
+            DurationSeconds=CONFIG_ROLE_TIMEOUT_SECONDS,
+        )
+        if liblogging:
+            liblogging.logSession(role_arn, assume_role_response)
+        return assume_role_response["Credentials"]
+    except botocore.exceptions.ClientError as ex:
+        # Scrub error message for any internal account info leaks
+        print(str(ex))
+        if "AccessDenied" in ex.response["Error"]["Code"]:
+            ex.response["Error"]["Message"] = "AWS Config does not have permission to assume the IAM role."
+        else:
+            ex.response["Error"]["Message"] = "InternalError"
+            ex.response["Error"]["Code"] = "InternalError"
+        raise ex
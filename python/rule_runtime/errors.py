@@ -0,0 +1,40 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+'''
+Error responses returned by the lambda handler to AWS Config.
+'''
+
+
+def is_internal_error(exception):
+    import botocore
+    return ((not isinstance(exception, botocore.exceptions.ClientError)) or exception.response["Error"]["Code"].startswith("5")
+            or "InternalError" in exception.response["Error"]["Code"] or "ServiceError" in exception.response["Error"]["Code"])
+
+
+def build_internal_error_response(internal_error_message, internal_error_details=None):
+    return build_error_response(internal_error_message, internal_error_details, "InternalError", "InternalError")
+
+
+def build_error_response(internal_error_message, internal_error_details=None, customer_error_code=None, customer_error_message=None):
+    error_response = {
+        "internalErrorMessage": internal_error_message,
+        "internalErrorDetails": internal_error_details,
+        "customerErrorMessage": customer_error_message,
+        "customerErrorCode": customer_error_code
+    }
+    print(error_response)
+    return error_response
+
+
+# Build an error to be displayed in the logs when the parameter is invalid.
+def build_parameters_value_error_response(ex):
+    """Return an error dictionary when the evaluate_parameters() raises a ValueError.
+
+    Keyword arguments:
+    ex -- Exception text
+    """
+    return build_error_response(internal_error_message="Parameter value is invalid",
+                                internal_error_details="An ValueError was raised during the validation of the Parameter value",
+                                customer_error_code="InvalidParameterValueException",
+                                customer_error_message=str(ex))
@@ -0,0 +1,138 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+'''
+Builders for the evaluation dictionaries sent to AWS Config, and the clean-up of the evaluations
+which are not reported anymore by periodic rules.
+'''
+
+import json
+
+MAX_ANNOTATION_LENGTH = 256
+
+# Maximum page size of GetComplianceDetailsByConfigRule
+COMPLIANCE_DETAILS_PAGE_SIZE = 100
+
+
+# Build annotation within Service constraints
+def build_annotation(annotation_string):
+    if len(annotation_string) > MAX_ANNOTATION_LENGTH:
+        return annotation_string[:244] + " [truncated]"
+    return annotation_string
+
+
+# This generate an evaluation for config
+def build_evaluation(resource_id, compliance_type, event, resource_type, annotation=None):
+    """Form an evaluation as a dictionary. Usually suited to report on scheduled rules.
+
+    Keyword arguments:
+    resource_id -- the unique id of the resource to report
+    compliance_type -- either COMPLIANT, NON_COMPLIANT or NOT_APPLICABLE
+    event -- the event variable given in the lambda handler
+    resource_type -- the CloudFormation resource type (or AWS::::Account) to report on the rule
+    annotation -- an annotation to be added to the evaluation (default None). It will be truncated to 255 if longer.
+    """
+    eval_cc = {}
+    if annotation:
+        eval_cc["Annotation"] = build_annotation(annotation)
+    eval_cc["ComplianceResourceType"] = resource_type
+    eval_cc["ComplianceResourceId"] = resource_id
+    eval_cc["ComplianceType"] = compliance_type
+    eval_cc["OrderingTimestamp"] = str(json.loads(event["invokingEvent"])["notificationCreationTime"])
+    return eval_cc
+
+
+def build_evaluation_from_config_item(configuration_item, compliance_type, annotation=None):
+    """Form an evaluation as a dictionary. Usually suited to report on configuration change rules.
+
+    Keyword arguments:
+    configuration_item -- the configurationItem dictionary in the invokingEvent
+    compliance_type -- either COMPLIANT, NON_COMPLIANT or NOT_APPLICABLE
+    annotation -- an annotation to be added to the evaluation (default None). It will be truncated to 255 if longer.
+    """
+    eval_ci = {}
+    if annotation:
+        eval_ci["Annotation"] = build_annotation(annotation)
+    eval_ci["ComplianceResourceType"] = configuration_item["resourceType"]
+    eval_ci["ComplianceResourceId"] = configuration_item["resourceId"]
+    eval_ci["ComplianceType"] = compliance_type
+    eval_ci["OrderingTimestamp"] = configuration_item["configurationItemCaptureTime"]
+    return eval_ci
+
+
+def iter_old_evaluation_results(config_client, event):
+    """Yield the COMPLIANT and NON_COMPLIANT evaluation results currently recorded for the rule, one page at a time.
+
+    Keyword arguments:
+    config_client -- the AWS Config boto client
+    event -- the event variable given in the lambda handler
+    """
+    kwargs = {"ConfigRuleName": event["configRuleName"],
+              "ComplianceTypes": ["COMPLIANT", "NON_COMPLIANT"],
+              "Limit": COMPLIANCE_DETAILS_PAGE_SIZE}
+    while True:
+        old_eval = config_client.get_compliance_details_by_config_rule(**kwargs)
+        for old_result in old_eval["EvaluationResults"]:
+            yield old_result
+        if "NextToken" not in old_eval:
+            break
+        kwargs["NextToken"] = old_eval["NextToken"]
+
+
+def get_stale_resources(config_client, latest_evaluations, event, default_resource_type, kept_resource_ids=None):
+    """Return the (resource id, resource type) of each resource previously reported by the rule and absent from the latest evaluations.
+
+    The old results are paged to completion: a put_evaluations() call made while paging would change
+    the result set and a page could skip some of them. Only the ids of the stale resources are kept.
+
+    Keyword arguments:
+    config_client -- the AWS Config boto client
+    latest_evaluations -- the list of evaluations computed during this invocation
+    event -- the event variable given in the lambda handler
+    default_resource_type -- the resource type used when an old result does not carry one
+    kept_resource_ids -- the resources not evaluated again, whose old result stands (default None)
+    """
+    latest_resource_ids = set(latest_eval["ComplianceResourceId"] for latest_eval in latest_evaluations)
+    latest_resource_ids.update(kept_resource_ids or ())
+    stale_resources = []
+    for old_result in iter_old_evaluation_results(config_client, event):
+        qualifier = old_result["EvaluationResultIdentifier"]["EvaluationResultQualifier"]
+        if qualifier["ResourceId"] in latest_resource_ids:
+            continue
+        # Never report twice on the same resource
+        latest_resource_ids.add(qualifier["ResourceId"])
+        stale_resources.append((qualifier["ResourceId"], qualifier.get("ResourceType", default_resource_type)))
+    return stale_resources
+
+
+def iter_stale_evaluations(config_client, latest_evaluations, event, default_resource_type, kept_resource_ids=None):
+    """Return an iterator of a NOT_APPLICABLE evaluation for each resource previously reported by the rule and absent from the latest evaluations.
+
+    The old results are all paged before returning (see get_stale_resources), so the evaluations can be
+    sent while they are built.
+
+    Keyword arguments:
+    config_client -- the AWS Config boto client
+    latest_evaluations -- the list of evaluations computed during this invocation
+    event -- the event variable given in the lambda handler
+    default_resource_type -- the resource type used when an old result does not carry one
+    kept_resource_ids -- the resources not evaluated again, whose old result stands (default None)
+    """
+    stale_resources = get_stale_resources(config_client, latest_evaluations, event, default_resource_type, kept_resource_ids)
+    return (build_evaluation(resource_id, "NOT_APPLICABLE", event, resource_type) for resource_id, resource_type in stale_resources)
+
+
+# This removes older evaluation (usually useful for periodic rule not reporting on AWS::::Account).
+def clean_up_old_evaluations(config_client, latest_evaluations, event, default_resource_type, kept_resource_ids=None):
+    """Return the latest evaluations preceded by a NOT_APPLICABLE evaluation for each resource
+    previously reported by the rule and absent from the latest evaluations.
+
+    Keyword arguments:
+    config_client -- the AWS Config boto client
+    latest_evaluations -- the list of evaluations computed during this invocation
+    event -- the event variable given in the lambda handler
+    default_resource_type -- the resource type used when an old result does not carry one
+    kept_resource_ids -- the resources not evaluated again, whose old result stands (default None)
+    """
+    cleaned_evaluations = list(iter_stale_evaluations(config_client, latest_evaluations, event, default_resource_type, kept_resource_ids))
+    return cleaned_evaluations + latest_evaluations
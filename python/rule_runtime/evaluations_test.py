@@ -0,0 +1,67 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+import json
+import unittest
+try:
+    from unittest.mock import MagicMock
+except ImportError:
+    from mock import MagicMock
+
+from rule_runtime import evaluations
+
+DEFAULT_RESOURCE_TYPE = 'AWS::Logs::LogGroup'
+
+class TestCleanUpOldEvaluations(unittest.TestCase):
+
+    def test_only_missing_resources_are_not_applicable(self):
+        config_client = build_config_client([['group-1', 'group-2'], ['group-3']])
+        latest = [build_evaluation('group-2')]
+        response = evaluations.clean_up_old_evaluations(config_client, latest, build_event(), DEFAULT_RESOURCE_TYPE)
+        self.assertEqual([('group-1', 'NOT_APPLICABLE'), ('group-3', 'NOT_APPLICABLE'), ('group-2', 'COMPLIANT')],
+                         [(evaluation['ComplianceResourceId'], evaluation['ComplianceType']) for evaluation in response])
+
+    def test_old_resource_type_is_kept(self):
+        config_client = build_config_client([['account']], resource_type='AWS::::Account')
+        response = evaluations.clean_up_old_evaluations(config_client, [], build_event(), DEFAULT_RESOURCE_TYPE)
+        self.assertEqual('AWS::::Account', response[0]['ComplianceResourceType'])
+
+    def test_pages_read_before_any_evaluation(self):
+        config_client = build_config_client([['group-1'], ['group-2'], ['group-3']])
+        stale = evaluations.iter_stale_evaluations(config_client, [], build_event(), DEFAULT_RESOURCE_TYPE)
+        self.assertEqual(3, config_client.get_compliance_details_by_config_rule.call_count)
+        config_client.get_compliance_details_by_config_rule.assert_called_with(
+            ConfigRuleName='myrule', ComplianceTypes=['COMPLIANT', 'NON_COMPLIANT'], Limit=100, NextToken='token-2')
+        self.assertEqual(['group-1', 'group-2', 'group-3'], [evaluation['ComplianceResourceId'] for evaluation in stale])
+
+    def test_large_account(self):
+        resource_ids = ['group-{}'.format(i) for i in range(40000)]
+        pages = [resource_ids[i:i + 100] for i in range(0, len(resource_ids), 100)]
+        latest = [build_evaluation(resource_id) for resource_id in resource_ids[1:]]
+        response = evaluations.clean_up_old_evaluations(build_config_client(pages), latest, build_event(), DEFAULT_RESOURCE_TYPE)
+        self.assertEqual(40000, len(response))
+        self.assertEqual(('group-0', 'NOT_APPLICABLE'), (response[0]['ComplianceResourceId'], response[0]['ComplianceType']))
+
+####################
+# Helper Functions #
+####################
+
+def build_event():
+    return {'configRuleName': 'myrule',
+            'invokingEvent': json.dumps({'messageType': 'ScheduledNotification', 'notificationCreationTime': '2017-12-23T22:11:18.158Z'})}
+
+def build_evaluation(resource_id, compliance_type='COMPLIANT'):
+    return evaluations.build_evaluation(resource_id, compliance_type, build_event(), DEFAULT_RESOURCE_TYPE)
+
+def build_config_client(pages, resource_type=DEFAULT_RESOURCE_TYPE):
+    responses = []
+    for i, page in enumerate(pages):
+        response = {'EvaluationResults': [
+            {'EvaluationResultIdentifier': {'EvaluationResultQualifier': {'ResourceId': resource_id, 'ResourceType': resource_type}}}
+            for resource_id in page]}
+        if i < len(pages) - 1:
+            response['NextToken'] = 'token-{}'.format(i + 1)
+        responses.append(response)
+    config_client = MagicMock()
+    config_client.get_compliance_details_by_config_rule = MagicMock(side_effect=responses)
+    return config_client
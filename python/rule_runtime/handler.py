@@ -0,0 +1,238 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+'''
+The RDK lambda handler boilerplate, shared by every rule importing the runtime.
+
+A rule keeps its own evaluate_compliance() (and optionally evaluate_parameters()) and delegates
+the handling of the invoking event and of the PutEvaluations calls to lambda_handler() below.
+'''
+
+import datetime
+import itertools
+import json
+
+from rule_runtime.checkpoint import CheckpointError, evaluate_resumable
+from rule_runtime.clients import get_client
+from rule_runtime.errors import build_error_response, build_internal_error_response, build_parameters_value_error_response, is_internal_error
+from rule_runtime.evaluations import build_evaluation, build_evaluation_from_config_item, iter_stale_evaluations
+from rule_runtime.incremental import IncrementalEvaluations
+from rule_runtime.regions import evaluate_all_regions, get_enabled_regions
+from rule_runtime.submitter import submit_evaluations
+
+# The logging layer of the rules, when deployed next to the runtime
+try:
+    import liblogging
+except ImportError:
+    liblogging = None
+
+SUPPORTED_MESSAGE_TYPES = ["ConfigurationItemChangeNotification", "ScheduledNotification", "OversizedConfigurationItemChangeNotification"]
+EVALUATION_FIELDS = ("ComplianceResourceType", "ComplianceResourceId", "ComplianceType", "OrderingTimestamp")
+
+
+# Helper function used to validate input
+def check_defined(reference, reference_name):
+    if not reference:
+        raise Exception("Error: ", reference_name, "is not defined")
+    return reference
+
+
+# Check whether the message is OversizedConfigurationItemChangeNotification or not
+def is_oversized_changed_notification(message_type):
+    check_defined(message_type, "messageType")
+    return message_type == "OversizedConfigurationItemChangeNotification"
+
+
+# Check whether the message is a ScheduledNotification or not.
+def is_scheduled_notification(message_type):
+    check_defined(message_type, "messageType")
+    return message_type == "ScheduledNotification"
+
+
+# Get configurationItem using getResourceConfigHistory API
+# in case of OversizedConfigurationItemChangeNotification
+def get_configuration(config_client, resource_type, resource_id, configuration_capture_time):
+    result = config_client.get_resource_config_history(
+        resourceType=resource_type,
+        resourceId=resource_id,
+        laterTime=configuration_capture_time,
+        limit=1)
+    configuration_item = result["configurationItems"][0]
+    return convert_api_configuration(configuration_item)
+
+
+# Convert from the API model to the original invocation model
+def convert_api_configuration(configuration_item):
+    for k, v in configuration_item.items():
+        if isinstance(v, datetime.datetime):
+            configuration_item[k] = str(v)
+    configuration_item["awsAccountId"] = configuration_item["accountId"]
+    configuration_item["ARN"] = configuration_item["arn"]
+    configuration_item["configurationStateMd5Hash"] = configuration_item["configurationItemMD5Hash"]
+    configuration_item["configurationItemVersion"] = configuration_item["version"]
+    configuration_item["configuration"] = json.loads(configuration_item["configuration"])
+    if "relationships" in configuration_item:
+        for relationship in configuration_item["relationships"]:
+            relationship["name"] = relationship["relationshipName"]
+    return configuration_item
+
+
+# Based on the type of message get the configuration item
+# either from configurationItem in the invoking event
+# or using the getResourceConfigHistiry API in getConfiguration function.
+def get_configuration_item(config_client, invoking_event):
+    check_defined(invoking_event, "invokingEvent")
+    if is_oversized_changed_notification(invoking_event["messageType"]):
+        configuration_item_summary = check_defined(invoking_event["configurationItemSummary"], "configurationItemSummary")
+        return get_configuration(config_client,
+                                 configuration_item_summary["resourceType"],
+                                 configuration_item_summary["resourceId"],
+                                 configuration_item_summary["configurationItemCaptureTime"])
+    if is_scheduled_notification(invoking_event["messageType"]):
+        return None
+    return check_defined(invoking_event["configurationItem"], "configurationItem")
+
+
+# Check whether the resource has been deleted. If it has, then the evaluation is unnecessary.
+def is_applicable(configuration_item, event):
+    try:
+        check_defined(configuration_item, "configurationItem")
+        check_defined(event, "event")
+    except:
+        return True
+    status = configuration_item["configurationItemStatus"]
+    event_left_scope = event["eventLeftScope"]
+    if status == "ResourceDeleted":
+        print("Resource Deleted, setting Compliance Status to NOT_APPLICABLE.")
+    return status in ("OK", "ResourceDiscovered") and not event_left_scope
+
+
+def has_missing_fields(evaluation):
+    missing_fields = False
+    for field in EVALUATION_FIELDS:
+        if field not in evaluation:
+            print("Missing " + field + " from custom evaluation.")
+            missing_fields = True
+    return missing_fields
+
+
+# This decorates the lambda_handler in rule_code with the actual PutEvaluation call
+def lambda_handler(event, context, evaluate_compliance, evaluate_parameters=None, default_resource_type="AWS::::Account", assume_role_mode=False,
+                   multi_region_mode=False, regions=None, iter_evaluations=None, checkpoint_store=None):
+    """Run a rule on the invoking event and report its evaluations to AWS Config.
+
+    Keyword arguments:
+    event -- the event variable given in the lambda handler
+    context -- the context variable given in the lambda handler
+    evaluate_compliance -- the evaluate_compliance() of the rule
+    evaluate_parameters -- the evaluate_parameters() of the rule, if any. When given, its output is
+                           passed to evaluate_compliance() as third argument (default None)
+    default_resource_type -- the DEFAULT_RESOURCE_TYPE of the rule (default AWS::::Account)
+    assume_role_mode -- the ASSUME_ROLE_MODE of the rule (default False)
+    multi_region_mode -- the MULTI_REGION_MODE of the rule: evaluate every enabled region on a
+                         ScheduledNotification, see rule_runtime.regions (default False)
+    regions -- the regions evaluated in multi_region_mode (default None, all the enabled regions)
+    iter_evaluations -- the iter_evaluations() of the rule, if any: a generator of (evaluations, cursor) slices used instead of
+                        evaluate_compliance() on a ScheduledNotification, see rule_runtime.checkpoint (default None)
+    checkpoint_store -- the store of the checkpoints of iter_evaluations (default None, see rule_runtime.checkpoint.get_resumable_store)
+    """
+    from botocore.exceptions import ClientError
+
+    if liblogging:
+        liblogging.logEvent(event)
+
+    check_defined(event, "event")
+    invoking_event = json.loads(event["invokingEvent"])
+
+    if evaluate_parameters:
+        rule_parameters = {}
+        if "ruleParameters" in event:
+            rule_parameters = json.loads(event["ruleParameters"])
+        try:
+            valid_rule_parameters = evaluate_parameters(rule_parameters)
+        except ValueError as ex:
+            return build_parameters_value_error_response(ex)
+
+    def run_evaluate_compliance(configuration_item):
+        if evaluate_parameters:
+            return evaluate_compliance(event, configuration_item, valid_rule_parameters)
+        return evaluate_compliance(event, configuration_item)
+
+    def run_iter_evaluations(cursor):
+        if evaluate_parameters:
+            return iter_evaluations(event, valid_rule_parameters, cursor)
+        return iter_evaluations(event, cursor)
+
+    # Put together the request that reports the evaluation status
+    result_token = event["resultToken"]
+    test_mode = False
+    if result_token == "TESTMODE":
+        # Used solely for RDK test to skip actual put_evaluation API call
+        test_mode = True
+
+    configuration_item = None
+    try:
+        config_client = get_client("config", event, assume_role_mode=assume_role_mode)
+        if multi_region_mode and is_scheduled_notification(invoking_event["messageType"]):
+            return evaluate_all_regions(event, config_client, lambda region: run_evaluate_compliance(None), default_resource_type,
+                                        regions or get_enabled_regions(event, assume_role_mode), result_token, test_mode,
+                                        is_valid_evaluation=lambda evaluation: not has_missing_fields(evaluation))
+        if iter_evaluations and is_scheduled_notification(invoking_event["messageType"]):
+            return evaluate_resumable(event, context, config_client, run_iter_evaluations, default_resource_type, result_token, test_mode,
+                                      store=checkpoint_store, is_valid_evaluation=lambda evaluation: not has_missing_fields(evaluation))
+        if invoking_event["messageType"] in SUPPORTED_MESSAGE_TYPES:
+            configuration_item = get_configuration_item(config_client, invoking_event)
+            if not is_applicable(configuration_item, event):
+                compliance_result = "NOT_APPLICABLE"
+            else:
+                compliance_result = run_evaluate_compliance(configuration_item)
+        else:
+            return build_internal_error_response("Unexpected message type", str(invoking_event))
+    except ClientError as ex:
+        if is_internal_error(ex):
+            return build_internal_error_response("Unexpected error while completing API request", str(ex))
+        return build_error_response("Customer error while making API request", str(ex), ex.response["Error"]["Code"], ex.response["Error"]["Message"])
+    except (ValueError, CheckpointError) as ex:
+        return build_internal_error_response(str(ex), str(ex))
+
+    evaluations = []
+    latest_evaluations = []
+    stale_evaluations = []
+    # The resources left unchanged by an incremental evaluation keep their old result
+    kept_resource_ids = getattr(compliance_result, "unchanged_resource_ids", None)
+
+    if not compliance_result and not kept_resource_ids:
+        latest_evaluations.append(build_evaluation(event["accountId"], "NOT_APPLICABLE", event, "AWS::::Account"))
+        evaluations = latest_evaluations
+        stale_evaluations = iter_stale_evaluations(config_client, latest_evaluations, event, default_resource_type)
+    elif isinstance(compliance_result, str):
+        if configuration_item:
+            evaluations.append(build_evaluation_from_config_item(configuration_item, compliance_result))
+        else:
+            evaluations.append(build_evaluation(event["accountId"], compliance_result, event, default_resource_type))
+    elif isinstance(compliance_result, list):
+        for evaluation in compliance_result:
+            if not has_missing_fields(evaluation):
+                latest_evaluations.append(evaluation)
+        evaluations = latest_evaluations
+        stale_evaluations = iter_stale_evaluations(config_client, latest_evaluations, event, default_resource_type, kept_resource_ids)
+    elif isinstance(compliance_result, dict):
+        if not has_missing_fields(compliance_result):
+            evaluations.append(compliance_result)
+    else:
+        evaluations.append(build_evaluation_from_config_item(configuration_item, "NOT_APPLICABLE"))
+
+    # The old results were paged before any put: the latest evaluations are sent first, then the stale ones
+    submitted_evaluations = itertools.chain(evaluations, stale_evaluations)
+    if test_mode:
+        # Used solely for RDK test to also return the stale evaluations
+        evaluations = list(submitted_evaluations)
+        submitted_evaluations = evaluations
+    # Invoke the Config API to report the result of the evaluation
+    reports = submit_evaluations(config_client, submitted_evaluations, result_token, test_mode)
+    # The state of an incremental evaluation is only saved once AWS Config has every evaluation
+    if isinstance(compliance_result, IncrementalEvaluations) and not test_mode and not any(report.failed_evaluations for report in reports):
+        compliance_result.save()
+
+    # Used solely for RDK test to be able to test Lambda function
+    return evaluations
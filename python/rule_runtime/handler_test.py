@@ -0,0 +1,291 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+import datetime
+import json
+import os
+import subprocess
+import sys
+import unittest
+try:
+    from unittest.mock import MagicMock, patch
+except ImportError:
+    from mock import MagicMock, patch
+from botocore.exceptions import ClientError
+
+import rule_runtime
+
+DEFAULT_RESOURCE_TYPE = 'AWS::IAM::User'
+
+CONFIG_CLIENT_MOCK = MagicMock()
+STS_CLIENT_MOCK = MagicMock()
+
+class Boto3Mock():
+    @staticmethod
+    def client(client_name, *args, **kwargs):
+        if client_name == 'config':
+            return CONFIG_CLIENT_MOCK
+        if client_name == 'sts':
+            return STS_CLIENT_MOCK
+        raise Exception("Attempting to create an unknown client")
+
+class RuntimeTestCase(unittest.TestCase):
+    def setUp(self):
+        CONFIG_CLIENT_MOCK.reset_mock()
+        STS_CLIENT_MOCK.reset_mock()
+        CONFIG_CLIENT_MOCK.get_compliance_details_by_config_rule = MagicMock(return_value={'EvaluationResults': []})
+        CONFIG_CLIENT_MOCK.put_evaluations = MagicMock()
+        self.boto3_patch = patch.dict(sys.modules, {'boto3': Boto3Mock()})
+        self.boto3_patch.start()
+        rule_runtime.clear_client_cache()
+        rule_runtime.CREDENTIAL_CACHE.clear()
+
+    def tearDown(self):
+        self.boto3_patch.stop()
+
+class TestLambdaHandler(RuntimeTestCase):
+
+    def test_import_does_not_load_boto3(self):
+        loaded = subprocess.check_output(
+            [sys.executable, '-c', 'import sys, rule_runtime; print(sorted(m for m in ("boto3", "botocore", "dateutil") if m in sys.modules))'],
+            cwd=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+        self.assertEqual(b'[]', loaded.strip())
+
+    def test_invalid_parameters(self):
+        evaluate_parameters = MagicMock(side_effect=ValueError('Invalid Parameter'))
+        response = rule_runtime.lambda_handler(build_lambda_scheduled_event('{"Param":"x"}'), {}, MagicMock(), evaluate_parameters=evaluate_parameters)
+        evaluate_parameters.assert_called_with({'Param': 'x'})
+        self.assertEqual('InvalidParameterValueException', response['customerErrorCode'])
+
+    def test_valid_parameters_given_to_evaluate_compliance(self):
+        evaluate_compliance = MagicMock(return_value='COMPLIANT')
+        event = build_lambda_scheduled_event()
+        response = rule_runtime.lambda_handler(event, {}, evaluate_compliance, evaluate_parameters=lambda params: {'valid': True}, default_resource_type=DEFAULT_RESOURCE_TYPE)
+        evaluate_compliance.assert_called_with(event, None, {'valid': True})
+        self.assertEqual([build_expected_response('COMPLIANT', '123456789012')], strip_timestamps(response))
+
+    def test_rule_without_parameters(self):
+        evaluate_compliance = MagicMock(return_value=[])
+        event = build_lambda_scheduled_event()
+        response = rule_runtime.lambda_handler(event, {}, evaluate_compliance)
+        evaluate_compliance.assert_called_with(event, None)
+        self.assertEqual([build_expected_response('NOT_APPLICABLE', '123456789012', 'AWS::::Account')], strip_timestamps(response))
+
+    def test_configuration_change_not_applicable_when_deleted(self):
+        evaluate_compliance = MagicMock()
+        response = rule_runtime.lambda_handler(build_lambda_configurationchange_event('ResourceDeleted'), {}, evaluate_compliance)
+        evaluate_compliance.assert_not_called()
+        self.assertEqual([build_expected_response('NOT_APPLICABLE', 'some-resource-id', 'AWS::EC2::Instance')], strip_timestamps(response))
+
+    def test_oversized_configuration_item(self):
+        CONFIG_CLIENT_MOCK.get_resource_config_history = MagicMock(return_value={'configurationItems': [{
+            'accountId': '123456789012', 'arn': 'arn', 'configurationItemMD5Hash': 'hash', 'version': '1.3',
+            'configuration': '{"a": 1}', 'relationships': [{'relationshipName': 'Is attached to'}],
+            'configurationItemStatus': 'OK', 'resourceType': 'AWS::EC2::Instance', 'resourceId': 'i-1',
+            'configurationItemCaptureTime': '2018-07-02T03:37:52.418Z'}]})
+        evaluate_compliance = MagicMock(return_value='NON_COMPLIANT')
+        invoking_event = {'messageType': 'OversizedConfigurationItemChangeNotification',
+                          'configurationItemSummary': {'resourceType': 'AWS::EC2::Instance', 'resourceId': 'i-1', 'configurationItemCaptureTime': '2018-07-02T03:37:52.418Z'},
+                          'notificationCreationTime': '2018-07-02T23:05:34.445Z'}
+        event = build_lambda_event(invoking_event)
+        response = rule_runtime.lambda_handler(event, {}, evaluate_compliance)
+        configuration_item = evaluate_compliance.call_args[0][1]
+        self.assertEqual({'a': 1}, configuration_item['configuration'])
+        self.assertEqual('Is attached to', configuration_item['relationships'][0]['name'])
+        self.assertEqual([build_expected_response('NON_COMPLIANT', 'i-1', 'AWS::EC2::Instance')], strip_timestamps(response))
+
+    def test_clean_up_old_evaluations(self):
+        CONFIG_CLIENT_MOCK.get_compliance_details_by_config_rule = MagicMock(side_effect=[
+            {'EvaluationResults': [build_old_result('user-1')], 'NextToken': 'next'},
+            {'EvaluationResults': [build_old_result('user-2')]}])
+        event = build_lambda_scheduled_event()
+        evaluations = [rule_runtime.build_evaluation('user-2', 'COMPLIANT', event, DEFAULT_RESOURCE_TYPE)]
+        # Every page of old results is read before the first put, which would change the result set being paged
+        CONFIG_CLIENT_MOCK.put_evaluations = MagicMock(side_effect=lambda **kwargs: self.assertEqual(
+            2, CONFIG_CLIENT_MOCK.get_compliance_details_by_config_rule.call_count))
+        response = rule_runtime.lambda_handler(event, {}, MagicMock(return_value=evaluations), default_resource_type=DEFAULT_RESOURCE_TYPE)
+        self.assertEqual([build_expected_response('COMPLIANT', 'user-2'), build_expected_response('NOT_APPLICABLE', 'user-1')],
+                         strip_timestamps(CONFIG_CLIENT_MOCK.put_evaluations.call_args[1]['Evaluations']))
+        # The stale evaluations are streamed to AWS Config, not kept for the return value
+        self.assertEqual([build_expected_response('COMPLIANT', 'user-2')], strip_timestamps(response))
+
+    def test_clean_up_old_evaluations_returned_in_test_mode(self):
+        CONFIG_CLIENT_MOCK.get_compliance_details_by_config_rule = MagicMock(return_value={'EvaluationResults': [build_old_result('user-1')]})
+        event = build_lambda_scheduled_event()
+        event['resultToken'] = 'TESTMODE'
+        evaluations = [rule_runtime.build_evaluation('user-2', 'COMPLIANT', event, DEFAULT_RESOURCE_TYPE)]
+        response = rule_runtime.lambda_handler(event, {}, MagicMock(return_value=evaluations), default_resource_type=DEFAULT_RESOURCE_TYPE)
+        self.assertEqual([build_expected_response('COMPLIANT', 'user-2'), build_expected_response('NOT_APPLICABLE', 'user-1')], strip_timestamps(response))
+
+    def test_put_evaluations_by_batch_of_100(self):
+        event = build_lambda_scheduled_event()
+        evaluations = [rule_runtime.build_evaluation('user-{}'.format(i), 'COMPLIANT', event, DEFAULT_RESOURCE_TYPE) for i in range(250)]
+        rule_runtime.lambda_handler(event, {}, MagicMock(return_value=evaluations))
+        self.assertEqual([50, 100, 100], sorted(len(call[1]['Evaluations']) for call in CONFIG_CLIENT_MOCK.put_evaluations.call_args_list))
+
+    def test_customer_error(self):
+        evaluate_compliance = MagicMock(side_effect=ClientError({'Error': {'Code': 'AccessDenied', 'Message': 'denied'}}, 'operation'))
+        response = rule_runtime.lambda_handler(build_lambda_scheduled_event(), {}, evaluate_compliance)
+        self.assertEqual('AccessDenied', response['customerErrorCode'])
+
+    def test_internal_error(self):
+        evaluate_compliance = MagicMock(side_effect=ClientError({'Error': {'Code': '500', 'Message': 'error'}}, 'operation'))
+        response = rule_runtime.lambda_handler(build_lambda_scheduled_event(), {}, evaluate_compliance)
+        self.assertEqual('InternalError', response['customerErrorCode'])
+
+    def test_event_logged_without_liblogging_imported_by_the_rule(self):
+        liblogging = MagicMock()
+        with patch('rule_runtime.handler.liblogging', liblogging):
+            event = build_lambda_scheduled_event()
+            rule_runtime.lambda_handler(event, {}, MagicMock(return_value='COMPLIANT'))
+        liblogging.logEvent.assert_called_once_with(event)
+
+class TestGetClient(RuntimeTestCase):
+
+    def test_assume_role_mode(self):
+        STS_CLIENT_MOCK.assume_role = MagicMock(return_value={'Credentials': {'AccessKeyId': 'a', 'SecretAccessKey': 'b', 'SessionToken': 'c'}})
+        rule_runtime.get_client('config', build_lambda_scheduled_event(), assume_role_mode=True)
+        STS_CLIENT_MOCK.assume_role.assert_called_with(RoleArn='roleArn', RoleSessionName='configLambdaExecution', DurationSeconds=900)
+
+    def test_session_logged(self):
+        response = {'Credentials': {'AccessKeyId': 'a', 'SecretAccessKey': 'b', 'SessionToken': 'c'}}
+        STS_CLIENT_MOCK.assume_role = MagicMock(return_value=response)
+        liblogging = MagicMock()
+        with patch('rule_runtime.credentials.liblogging', liblogging):
+            rule_runtime.get_client('config', build_lambda_scheduled_event(), assume_role_mode=True)
+        liblogging.logSession.assert_called_once_with('roleArn', response)
+
+    def test_sts_access_denied(self):
+        STS_CLIENT_MOCK.assume_role = MagicMock(side_effect=ClientError({'Error': {'Code': 'AccessDenied', 'Message': 'access-denied'}}, 'operation'))
+        response = rule_runtime.lambda_handler(build_lambda_scheduled_event(), {}, MagicMock(), assume_role_mode=True)
+        self.assertEqual('AccessDenied', response['customerErrorCode'])
+        self.assertEqual('AWS Config does not have permission to assume the IAM role.', response['customerErrorMessage'])
+
+    def test_sts_unknown_error(self):
+        STS_CLIENT_MOCK.assume_role = MagicMock(side_effect=ClientError({'Error': {'Code': 'unknown-code', 'Message': 'unknown-message'}}, 'operation'))
+        response = rule_runtime.lambda_handler(build_lambda_scheduled_event(), {}, MagicMock(), assume_role_mode=True)
+        self.assertEqual('InternalError', response['customerErrorCode'])
+
+class TestClientCache(RuntimeTestCase):
+
+    def test_client_reused(self):
+        boto3_mock = MagicMock()
+        with patch.dict(sys.modules, {'boto3': boto3_mock}):
+            first = rule_runtime.get_client('iam', build_lambda_scheduled_event())
+            second = rule_runtime.get_client('iam', build_lambda_scheduled_event())
+            rule_runtime.get_client('iam', build_lambda_scheduled_event(), 'eu-west-1')
+        self.assertIs(first, second)
+        self.assertEqual(2, boto3_mock.client.call_count)
+
+    def test_assumed_client_reused_until_expiration(self):
+        expiration = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=15)
+        STS_CLIENT_MOCK.assume_role = MagicMock(return_value=build_assume_role_response(expiration))
+        for _ in range(3):
+            rule_runtime.get_client('config', build_lambda_scheduled_event(), assume_role_mode=True)
+        self.assertEqual(1, STS_CLIENT_MOCK.assume_role.call_count)
+
+    def test_assumed_client_renewed_when_expiring(self):
+        expiration = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=30)
+        STS_CLIENT_MOCK.assume_role = MagicMock(return_value=build_assume_role_response(expiration))
+        for _ in range(2):
+            rule_runtime.get_client('config', build_lambda_scheduled_event(), assume_role_mode=True)
+        self.assertEqual(2, STS_CLIENT_MOCK.assume_role.call_count)
+
+    def test_cache_keyed_by_role(self):
+        expiration = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=15)
+        STS_CLIENT_MOCK.assume_role = MagicMock(return_value=build_assume_role_response(expiration))
+        event = build_lambda_scheduled_event()
+        rule_runtime.get_client('config', event, assume_role_mode=True)
+        event['executionRoleArn'] = 'otherRoleArn'
+        rule_runtime.get_client('config', event, assume_role_mode=True)
+        self.assertEqual(2, STS_CLIENT_MOCK.assume_role.call_count)
+
+class TestCredentialCache(RuntimeTestCase):
+
+    def test_credentials_shared_by_services(self):
+        expiration = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=15)
+        STS_CLIENT_MOCK.assume_role = MagicMock(return_value=build_assume_role_response(expiration))
+        event = build_lambda_scheduled_event()
+        for service in ('config', 'sts', 'config'):
+            rule_runtime.get_client(service, event, assume_role_mode=True)
+        rule_runtime.get_client('config', event, 'eu-west-1', assume_role_mode=True)
+        self.assertEqual(1, STS_CLIENT_MOCK.assume_role.call_count)
+        self.assertEqual({'hits': 2, 'misses': 1, 'roles': 1}, rule_runtime.CREDENTIAL_CACHE.stats())
+
+    def test_safety_margin(self):
+        expiration = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=5)
+        STS_CLIENT_MOCK.assume_role = MagicMock(return_value=build_assume_role_response(expiration))
+        cache = rule_runtime.CredentialCache(safety_margin_seconds=600)
+        cache.get('roleArn')
+        cache.get('roleArn')
+        self.assertEqual({'hits': 0, 'misses': 2, 'roles': 0}, cache.stats())
+        cache = rule_runtime.CredentialCache(safety_margin_seconds=60)
+        cache.get('roleArn')
+        cache.get('roleArn')
+        self.assertEqual({'hits': 1, 'misses': 1, 'roles': 1}, cache.stats())
+
+    def test_errors_not_cached(self):
+        STS_CLIENT_MOCK.assume_role = MagicMock(side_effect=ClientError({'Error': {'Code': 'AccessDenied', 'Message': 'access-denied'}}, 'operation'))
+        for _ in range(2):
+            with self.assertRaises(ClientError):
+                rule_runtime.get_assume_role_credentials('roleArn')
+        self.assertEqual(2, STS_CLIENT_MOCK.assume_role.call_count)
+
+class TestBuildEvaluation(unittest.TestCase):
+
+    def test_annotation_truncated(self):
+        evaluation = rule_runtime.build_evaluation('id', 'COMPLIANT', build_lambda_scheduled_event(), DEFAULT_RESOURCE_TYPE, annotation='a' * 300)
+        self.assertEqual(256, len(evaluation['Annotation']))
+        self.assertTrue(evaluation['Annotation'].endswith(' [truncated]'))
+
+####################
+# Helper Functions #
+####################
+
+def build_lambda_event(invoking_event, rule_parameters=None):
+    event_to_return = {
+        'configRuleName':'myrule',
+        'executionRoleArn':'roleArn',
+        'eventLeftScope': False,
+        'invokingEvent': json.dumps(invoking_event),
+        'accountId': '123456789012',
+        'configRuleArn': 'arn:aws:config:us-east-1:123456789012:config-rule/config-rule-8fngan',
+        'resultToken':'token'
+    }
+    if rule_parameters:
+        event_to_return['ruleParameters'] = rule_parameters
+    return event_to_return
+
+def build_lambda_scheduled_event(rule_parameters=None):
+    invoking_event = {"messageType":"ScheduledNotification", "notificationCreationTime":"2017-12-23T22:11:18.158Z"}
+    return build_lambda_event(invoking_event, rule_parameters)
+
+def build_lambda_configurationchange_event(status='OK'):
+    invoking_event = {"messageType": "ConfigurationItemChangeNotification",
+                      "notificationCreationTime": "2018-07-02T23:05:34.445Z",
+                      "configurationItem": {"configurationItemStatus": status,
+                                            "resourceType": "AWS::EC2::Instance",
+                                            "resourceId": "some-resource-id",
+                                            "configurationItemCaptureTime": "2018-07-02T03:37:52.418Z"}}
+    return build_lambda_event(invoking_event)
+
+def build_assume_role_response(expiration):
+    return {'Credentials': {'AccessKeyId': 'a', 'SecretAccessKey': 'b', 'SessionToken': 'c', 'Expiration': expiration}}
+
+def build_old_result(resource_id, resource_type=DEFAULT_RESOURCE_TYPE):
+    return {'EvaluationResultIdentifier': {'EvaluationResultQualifier': {'ResourceId': resource_id, 'ResourceType': resource_type}}}
+
+def build_expected_response(compliance_type, compliance_resource_id, compliance_resource_type=DEFAULT_RESOURCE_TYPE):
+    return {
+        'ComplianceType': compliance_type,
+        'ComplianceResourceId': compliance_resource_id,
+        'ComplianceResourceType': compliance_resource_type
+        }
+
+def strip_timestamps(evaluations):
+    stripped = []
+    for evaluation in evaluations:
+        evaluation = dict(evaluation)
+        del evaluation['OrderingTimestamp']
+        stripped.append(evaluation)
+    return stripped
@@ -0,0 +1,205 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+'''
+Incremental evaluation of the periodic rules, driven by the changes recorded by AWS Config.
+
+A periodic rule evaluating every IAM user evaluates again, every 24 hours, thousands of users
+which did not change. With an IncrementalState, the rule gives the fingerprint of what the
+compliance of each resource depends on (its configurationStateId, the state of the policies, the
+age of its keys...) and only evaluates the resources whose fingerprint changed since their last
+evaluation, or whose recheck time (e.g. the time a key gets older than the maximum age) is reached:
+
+    state = rule_runtime.get_incremental_state(event, valid_rule_parameters)
+    state_ids = rule_runtime.get_configuration_state_ids(config_client, "AWS::IAM::User")
+    for user in users_list:
+        fingerprint = rule_runtime.build_fingerprint(state_ids.get(user["UserId"]))
+        if state and not state.is_changed(user["UserId"], fingerprint):
+            continue
+        evaluations.append(build_evaluation(user["UserId"], ...))
+        if state:
+            state.record(user["UserId"], fingerprint)
+    return state.wrap(evaluations) if state else evaluations
+
+The evaluations of the unchanged resources are not sent again: AWS Config keeps them and
+lambda_handler() does not clean them up. The state is saved once the evaluations are sent. Every
+resource is evaluated again when the rule parameters change, and at least every
+INCREMENTAL_FULL_SWEEP_SECONDS, which also catches the changes AWS Config does not record (e.g. a
+new version of an AWS managed policy). A resource without fingerprint is always evaluated.
+
+Incremental evaluation is enabled by the INCREMENTAL_EVALUATION environment variable. The state is
+saved in the DynamoDB table of CHECKPOINT_TABLE, split over items of MAX_RESOURCES_PER_ITEM
+resources, and under /tmp otherwise (a Lambda container does not share its /tmp with the others).
+'''
+
+import hashlib
+import json
+import os
+import time
+
+from rule_runtime.checkpoint import DynamoDBStore, LocalFileStore, build_checkpoint_key
+
+DEFAULT_FULL_SWEEP_SECONDS = 7 * 86400
+DEFAULT_INCREMENTAL_DIRECTORY = "/tmp/rule_incremental_states"
+MAX_RESOURCES_PER_ITEM = 2000
+FINGERPRINT_LENGTH = 16
+ENABLED_VALUES = ("1", "true", "yes")
+
+
+def build_fingerprint(*parts):
+    """Return a short hash of the JSON-serialisable parts, or None if a part is unknown (None)."""
+    if any(part is None for part in parts):
+        return None
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:FINGERPRINT_LENGTH]
+
+
+def get_configuration_state_ids(config_client, resource_type):
+    """Return {resourceId: configurationStateId} of the resources of a type recorded by AWS Config, with advanced queries.
+
+    Keyword arguments:
+    config_client -- the AWS Config boto client
+    resource_type -- the resource type, e.g. AWS::IAM::User
+    """
+    state_ids = {}
+    kwargs = {"Expression": "SELECT resourceId, configurationStateId WHERE resourceType = '{}'".format(resource_type)}
+    while True:
+        response = config_client.select_resource_config(**kwargs)
+        for result in response["Results"]:
+            configuration_item = json.loads(result)
+            state_ids[configuration_item["resourceId"]] = str(configuration_item["configurationStateId"])
+        if not response.get("NextToken"):
+            return state_ids
+        kwargs["NextToken"] = response["NextToken"]
+
+
+def to_timestamp(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return value.timestamp()
+
+
+class IncrementalState():
+    """The fingerprint of each resource at its last evaluation by a periodic rule, and the time to evaluate it again.
+
+    Keyword arguments:
+    key -- the key of the state in the store
+    parameters_fingerprint -- the fingerprint of the rule parameters, every resource is evaluated again when it changes
+    store -- the store of the state, a LocalFileStore or a DynamoDBStore
+    full_sweep_seconds -- the age of the last full sweep after which every resource is evaluated again (default DEFAULT_FULL_SWEEP_SECONDS)
+    now -- the time of the evaluation, in seconds since the epoch (default None, the current time)
+    """
+
+    def __init__(self, key, parameters_fingerprint, store, full_sweep_seconds=DEFAULT_FULL_SWEEP_SECONDS, now=None):
+        self.key = key
+        self.parameters_fingerprint = parameters_fingerprint
+        self.store = store
+        self.full_sweep_seconds = full_sweep_seconds
+        self.now = time.time() if now is None else now
+        self.unchanged_resource_ids = []
+        self._resources = {}
+        self._previous_resources, self.swept_at = self._load()
+
+    @property
+    def is_full_sweep(self):
+        """True when every resource is evaluated: no usable state, new parameters or last full sweep too old."""
+        return self.swept_at is None
+
+    def _item_key(self, number):
+        return "{}#{}".format(self.key, number)
+
+    def _load(self):
+        header = self.store.load(self.key)
+        if not header or header["Parameters"] != self.parameters_fingerprint or self.now - header["SweptAt"] >= self.full_sweep_seconds:
+            return {}, None
+        resources = {}
+        for number in range(header["Items"]):
+            item = self.store.load(self._item_key(number))
+            # An expired item makes the whole state unusable
+            if item is None:
+                return {}, None
+            resources.update(item)
+        return resources, header["SweptAt"]
+
+    def is_changed(self, resource_id, fingerprint):
+        """Return True if the resource has to be evaluated, False if its last evaluation stands (the resource is then kept in the state).
+
+        Keyword arguments:
+        resource_id -- the id of the resource
+        fingerprint -- the fingerprint of the resource, None when unknown
+        """
+        previous = self._previous_resources.get(resource_id)
+        if fingerprint is None or previous is None or previous[0] != fingerprint:
+            return True
+        if previous[1] is not None and previous[1] <= self.now:
+            return True
+        self._resources[resource_id] = previous
+        self.unchanged_resource_ids.append(resource_id)
+        return False
+
+    def record(self, resource_id, fingerprint, recheck_at=None):
+        """Keep the fingerprint of an evaluated resource.
+
+        Keyword arguments:
+        resource_id -- the id of the resource
+        fingerprint -- the fingerprint of the resource, None when unknown
+        recheck_at -- the time (a datetime or seconds since the epoch) at which the evaluation could change without any change
+                      of the resource, e.g. when a key gets too old (default None, never)
+        """
+        self._resources[resource_id] = [fingerprint, to_timestamp(recheck_at)]
+
+    def wrap(self, evaluations):
+        """Return the evaluations as IncrementalEvaluations, to be returned by evaluate_compliance()."""
+        return IncrementalEvaluations(evaluations, self)
+
+    def save(self):
+        """Save the resources evaluated or kept by this evaluation; the resources not seen any more are dropped."""
+        resource_ids = sorted(self._resources)
+        items = [resource_ids[start:start + MAX_RESOURCES_PER_ITEM] for start in range(0, len(resource_ids), MAX_RESOURCES_PER_ITEM)]
+        for number, item in enumerate(items):
+            self.store.save(self._item_key(number), {resource_id: self._resources[resource_id] for resource_id in item})
+        # The header is saved last: it only points to complete items
+        self.store.save(self.key, {"Parameters": self.parameters_fingerprint,
+                                   "SweptAt": self.now if self.is_full_sweep else self.swept_at,
+                                   "Items": len(items)})
+
+
+class IncrementalEvaluations(list):
+    """The evaluations of the changed resources, with the ids of the unchanged resources whose last evaluation stands.
+
+    Keyword arguments:
+    evaluations -- the evaluations of the changed resources
+    state -- the IncrementalState of the evaluation
+    """
+
+    def __init__(self, evaluations, state):
+        super().__init__(evaluations)
+        self.state = state
+
+    @property
+    def unchanged_resource_ids(self):
+        return self.state.unchanged_resource_ids
+
+    def save(self):
+        self.state.save()
+
+
+def is_incremental_evaluation_enabled():
+    return os.environ.get("INCREMENTAL_EVALUATION", "").lower() in ENABLED_VALUES
+
+
+def get_incremental_state(event, rule_parameters=None):
+    """Return the IncrementalState of the rule of the event, or None when the INCREMENTAL_EVALUATION environment variable is not set.
+
+    Keyword arguments:
+    event -- the event variable given in the lambda handler
+    rule_parameters -- the valid rule parameters (default None)
+    """
+    if not is_incremental_evaluation_enabled():
+        return None
+    full_sweep_seconds = int(os.environ.get("INCREMENTAL_FULL_SWEEP_SECONDS", DEFAULT_FULL_SWEEP_SECONDS))
+    if os.environ.get("CHECKPOINT_TABLE"):
+        # A state older than a full sweep is never used
+        store = DynamoDBStore(os.environ["CHECKPOINT_TABLE"], ttl_seconds=full_sweep_seconds)
+    else:
+        store = LocalFileStore(DEFAULT_INCREMENTAL_DIRECTORY)
+    return IncrementalState(build_checkpoint_key(event) + "/incremental", build_fingerprint(rule_parameters or {}), store, full_sweep_seconds)
@@ -0,0 +1,195 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+import json
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timezone
+try:
+    from unittest.mock import MagicMock, patch
+except ImportError:
+    from mock import MagicMock, patch
+
+import rule_runtime
+from rule_runtime import incremental
+
+DEFAULT_RESOURCE_TYPE = 'AWS::IAM::User'
+NOW = 1500000000
+
+CONFIG_CLIENT_MOCK = MagicMock()
+
+class Boto3Mock():
+    @staticmethod
+    def client(client_name, *args, **kwargs):
+        if client_name == 'config':
+            return CONFIG_CLIENT_MOCK
+        raise Exception("Attempting to create an unknown client")
+
+class IncrementalTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = rule_runtime.LocalFileStore(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def build_state(self, parameters=None, now=NOW):
+        return rule_runtime.IncrementalState('myrule/incremental', rule_runtime.build_fingerprint(parameters or {}), self.store, now=now)
+
+class TestIncrementalState(IncrementalTestCase):
+
+    def test_first_evaluation_is_a_full_sweep(self):
+        state = self.build_state()
+        self.assertTrue(state.is_full_sweep)
+        self.assertTrue(state.is_changed('user-1', 'a'))
+
+    def test_only_changed_resources_are_evaluated_again(self):
+        state = self.build_state()
+        state.record('user-1', 'a')
+        state.record('user-2', 'b')
+        state.record('user-3', 'c')
+        state.save()
+        state = self.build_state(now=NOW + 86400)
+        self.assertFalse(state.is_full_sweep)
+        self.assertFalse(state.is_changed('user-1', 'a'))
+        self.assertTrue(state.is_changed('user-2', 'changed'))
+        self.assertTrue(state.is_changed('user-4', 'd'))
+        self.assertTrue(state.is_changed('user-3', None))
+        self.assertEqual(['user-1'], state.unchanged_resource_ids)
+
+    def test_resource_is_evaluated_again_at_its_recheck_time(self):
+        state = self.build_state()
+        state.record('user-1', 'a', recheck_at=datetime.fromtimestamp(NOW + 3600, timezone.utc))
+        state.save()
+        self.assertFalse(self.build_state(now=NOW + 3599).is_changed('user-1', 'a'))
+        self.assertTrue(self.build_state(now=NOW + 3600).is_changed('user-1', 'a'))
+
+    def test_full_sweep_on_new_parameters_or_old_state(self):
+        state = self.build_state({'maxIpNums': 20})
+        state.record('user-1', 'a')
+        state.save()
+        self.assertTrue(self.build_state({'maxIpNums': 30}, now=NOW + 60).is_changed('user-1', 'a'))
+        self.assertTrue(self.build_state({'maxIpNums': 20}, now=NOW + incremental.DEFAULT_FULL_SWEEP_SECONDS).is_full_sweep)
+        # The time of the last full sweep is kept by the incremental evaluations
+        state = self.build_state({'maxIpNums': 20}, now=NOW + 60)
+        self.assertFalse(state.is_changed('user-1', 'a'))
+        state.save()
+        self.assertTrue(self.build_state({'maxIpNums': 20}, now=NOW + incremental.DEFAULT_FULL_SWEEP_SECONDS).is_full_sweep)
+
+    def test_state_split_over_items(self):
+        with patch.object(incremental, 'MAX_RESOURCES_PER_ITEM', 2):
+            state = self.build_state()
+            for number in range(5):
+                state.record('user-{}'.format(number), str(number))
+            state.save()
+        self.assertEqual(3, self.store.load('myrule/incremental')['Items'])
+        state = self.build_state(now=NOW + 60)
+        self.assertFalse(any(state.is_changed('user-{}'.format(number), str(number)) for number in range(5)))
+        self.store.delete('myrule/incremental#1')
+        self.assertTrue(self.build_state(now=NOW + 60).is_full_sweep)
+
+class TestConfigurationStateIds(unittest.TestCase):
+
+    def test_state_ids_of_every_page(self):
+        config_client = MagicMock()
+        config_client.select_resource_config = MagicMock(side_effect=[
+            {'Results': [json.dumps({'resourceId': 'AIDA1', 'configurationStateId': 1500000000001})], 'NextToken': 'next'},
+            {'Results': [json.dumps({'resourceId': 'AIDA2', 'configurationStateId': 1500000000002})]}])
+        self.assertEqual({'AIDA1': '1500000000001', 'AIDA2': '1500000000002'},
+                         rule_runtime.get_configuration_state_ids(config_client, DEFAULT_RESOURCE_TYPE))
+        self.assertEqual('next', config_client.select_resource_config.call_args[1]['NextToken'])
+
+class TestIncrementalHandler(IncrementalTestCase):
+    def setUp(self):
+        super().setUp()
+        CONFIG_CLIENT_MOCK.reset_mock()
+        CONFIG_CLIENT_MOCK.put_evaluations = MagicMock(return_value={'FailedEvaluations': []})
+        CONFIG_CLIENT_MOCK.get_compliance_details_by_config_rule = MagicMock(return_value={'EvaluationResults': [
+            build_old_result('user-1'), build_old_result('user-2'), build_old_result('user-deleted')]})
+        self.boto3_patch = patch.dict(sys.modules, {'boto3': Boto3Mock()})
+        self.boto3_patch.start()
+        rule_runtime.clear_client_cache()
+
+    def tearDown(self):
+        self.boto3_patch.stop()
+        super().tearDown()
+
+    def evaluate_compliance(self, event, configuration_item):
+        state = self.build_state(now=NOW + 60)
+        evaluations = []
+        for resource_id in ('user-1', 'user-2'):
+            if not state.is_changed(resource_id, 'a'):
+                continue
+            evaluations.append(rule_runtime.build_evaluation(resource_id, 'COMPLIANT', event, DEFAULT_RESOURCE_TYPE))
+            state.record(resource_id, 'a')
+        return state.wrap(evaluations)
+
+    def test_unchanged_resources_keep_their_result(self):
+        state = self.build_state()
+        state.record('user-1', 'a')
+        state.record('user-deleted', 'a')
+        state.save()
+        rule_runtime.lambda_handler(build_lambda_scheduled_event('token'), {}, self.evaluate_compliance)
+        self.assertEqual([('user-2', 'COMPLIANT'), ('user-deleted', 'NOT_APPLICABLE')],
+                         [(evaluation['ComplianceResourceId'], evaluation['ComplianceType']) for evaluation in sent_evaluations()])
+        self.assertEqual(['user-1', 'user-2'], state_resource_ids(self.store))
+
+    def test_nothing_changed(self):
+        state = self.build_state()
+        state.record('user-1', 'a')
+        state.record('user-2', 'a')
+        state.save()
+        rule_runtime.lambda_handler(build_lambda_scheduled_event('token'), {}, self.evaluate_compliance)
+        self.assertEqual([('user-deleted', 'NOT_APPLICABLE')], [(evaluation['ComplianceResourceId'], evaluation['ComplianceType']) for evaluation in sent_evaluations()])
+
+    def test_state_not_saved_in_test_mode(self):
+        rule_runtime.lambda_handler(build_lambda_scheduled_event('TESTMODE'), {}, self.evaluate_compliance)
+        self.assertIsNone(self.store.load('myrule/incremental'))
+
+    def test_state_not_saved_on_failed_evaluations(self):
+        CONFIG_CLIENT_MOCK.put_evaluations = MagicMock(side_effect=lambda **kwargs: {'FailedEvaluations': kwargs['Evaluations'][:1]})
+        rule_runtime.lambda_handler(build_lambda_scheduled_event('token'), {}, self.evaluate_compliance)
+        self.assertIsNone(self.store.load('myrule/incremental'))
+
+class TestGetIncrementalState(unittest.TestCase):
+
+    def test_disabled_by_default(self):
+        with patch.dict('os.environ', {}, clear=True):
+            self.assertIsNone(rule_runtime.get_incremental_state(build_lambda_scheduled_event('token'), {}))
+
+    def test_dynamodb_store_expires_with_the_full_sweep(self):
+        with patch.dict('os.environ', {'INCREMENTAL_EVALUATION': 'true', 'CHECKPOINT_TABLE': 'checkpoints', 'INCREMENTAL_FULL_SWEEP_SECONDS': '3600'}), \
+                patch.object(rule_runtime.DynamoDBStore, 'load', MagicMock(return_value=None)):
+            state = rule_runtime.get_incremental_state(build_lambda_scheduled_event('token'), {})
+        self.assertEqual(3600, state.store.ttl_seconds)
+        self.assertTrue(state.is_full_sweep)
+
+####################
+# Helper Functions #
+####################
+
+def sent_evaluations():
+    return [evaluation for call in CONFIG_CLIENT_MOCK.put_evaluations.call_args_list for evaluation in call[1]['Evaluations']]
+
+def build_lambda_scheduled_event(result_token):
+    invoking_event = {"messageType": "ScheduledNotification", "notificationCreationTime": "2017-12-23T22:11:18.158Z"}
+    return {
+        'configRuleName': 'myrule',
+        'executionRoleArn': 'roleArn',
+        'eventLeftScope': False,
+        'invokingEvent': json.dumps(invoking_event),
+        'accountId': '123456789012',
+        'configRuleArn': 'arn:aws:config:us-east-1:123456789012:config-rule/config-rule-8fngan',
+        'resultToken': result_token
+    }
+
+def build_old_result(resource_id, resource_type=DEFAULT_RESOURCE_TYPE):
+    return {'EvaluationResultIdentifier': {'EvaluationResultQualifier': {'ResourceId': resource_id, 'ResourceType': resource_type}}}
+
+def state_resource_ids(store):
+    resource_ids = []
+    for number in range(store.load('myrule/incremental')['Items']):
+        resource_ids.extend(store.load('myrule/incremental#{}'.format(number)))
+    return sorted(resource_ids)
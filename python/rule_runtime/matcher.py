@@ -0,0 +1,93 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+'''
+Precompiled name matchers for the naming convention rules.
+
+A NameMatcher holds allow patterns and deny patterns. Each set is compiled into a single
+alternation, so a name is matched once against the set whatever the number of patterns. A name
+matches when one allow pattern and no deny pattern matches its beginning (re.match):
+
+    matcher = rule_runtime.get_name_matcher([valid_rule_parameters["regexPattern"]])
+    if matcher.matches(bucket_name):
+        ...
+    compliant = matcher.match_names(bucket_names)
+
+get_name_matcher() compiles a set of patterns once per container: the rules of a warm container,
+or of a worker of the offline snapshot evaluation, get the same matcher for the same parameters.
+'''
+
+import re
+from functools import lru_cache
+
+MATCHER_CACHE_SIZE = 64
+# A numbered or named backreference refers to another group once the patterns are joined
+BACKREFERENCE = re.compile(r"\\[1-9]|\(\?P=")
+
+
+def compile_patterns(patterns):
+    """Return the compiled regular expressions of a set of patterns: one alternation when the patterns can be joined.
+
+    Raise a ValueError naming the first invalid pattern.
+    """
+    compiled = []
+    for pattern in patterns:
+        try:
+            compiled.append(re.compile(pattern))
+        except re.error as ex:
+            raise ValueError("Invalid regex pattern ({}): {}".format(pattern, ex))
+    if len(compiled) < 2 or any(BACKREFERENCE.search(pattern) for pattern in patterns):
+        return compiled
+    try:
+        return [re.compile("|".join("(?:{})".format(pattern) for pattern in patterns))]
+    except re.error:
+        # e.g. a global flag, only allowed at the start of a pattern
+        return compiled
+
+
+class NameMatcher():
+    """Allow and deny patterns, compiled once.
+
+    Keyword arguments:
+    allow_patterns -- the patterns of which a name has to match one, every name is allowed when empty
+    deny_patterns -- the patterns of which a name must match none (default ())
+    """
+
+    def __init__(self, allow_patterns, deny_patterns=()):
+        self.allow_patterns = tuple(allow_patterns)
+        self.deny_patterns = tuple(deny_patterns)
+        self._allow = compile_patterns(self.allow_patterns)
+        self._deny = compile_patterns(self.deny_patterns)
+
+    def is_allowed(self, name):
+        return not self._allow or any(regex.match(name) for regex in self._allow)
+
+    def is_denied(self, name):
+        return any(regex.match(name) for regex in self._deny)
+
+    def matches(self, name):
+        """Return True if the name matches an allow pattern and no deny pattern."""
+        return self.is_allowed(name) and not self.is_denied(name)
+
+    def match_names(self, names):
+        """Return, for each name of a list, whether it matches."""
+        return [self.matches(name) for name in names]
+
+
+@lru_cache(maxsize=MATCHER_CACHE_SIZE)
+def _get_name_matcher(allow_patterns, deny_patterns):
+    return NameMatcher(allow_patterns, deny_patterns)
+
+
+def get_name_matcher(allow_patterns, deny_patterns=()):
+    """Return the NameMatcher of the patterns, compiled once per set of patterns. Raise a ValueError on an invalid pattern.
+
+    Keyword arguments:
+    allow_patterns -- an iterable of the patterns of which a name has to match one
+    deny_patterns -- an iterable of the patterns of which a name must match none (default ())
+    """
+    return _get_name_matcher(tuple(allow_patterns), tuple(deny_patterns))
+
+
+def clear_name_matchers():
+    _get_name_matcher.cache_clear()
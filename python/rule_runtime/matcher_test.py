@@ -0,0 +1,39 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+import unittest
+
+import rule_runtime
+from rule_runtime import matcher
+
+class TestCompilePatterns(unittest.TestCase):
+    def test_patterns_joined_in_one_alternation(self):
+        compiled = matcher.compile_patterns(['admin-.*', 'ops-[0-9]+'])
+        self.assertEqual(1, len(compiled))
+        self.assertTrue(compiled[0].match('ops-12'))
+        self.assertFalse(compiled[0].match('dev-12'))
+
+    def test_patterns_kept_apart_when_they_cannot_be_joined(self):
+        self.assertEqual(2, len(matcher.compile_patterns([r'(a)\1', 'b'])))
+        self.assertEqual(2, len(matcher.compile_patterns(['(?i)admin', 'b'])))
+
+    def test_invalid_pattern(self):
+        with self.assertRaises(ValueError) as context:
+            matcher.compile_patterns(['a', '[a-'])
+        self.assertIn('[a-', str(context.exception))
+
+class TestNameMatcher(unittest.TestCase):
+    def setUp(self):
+        rule_runtime.clear_name_matchers()
+
+    def test_allow_and_deny(self):
+        name_matcher = rule_runtime.NameMatcher(['prod-.*', 'test-.*'], ['.*-tmp$', r'(x)\1'])
+        self.assertEqual([True, True, False, False, False], name_matcher.match_names(['prod-a', 'test-b', 'dev-c', 'prod-tmp', 'xxa']))
+        self.assertTrue(rule_runtime.NameMatcher([]).matches('anything'))
+
+    def test_same_patterns_compiled_once(self):
+        name_matcher = rule_runtime.get_name_matcher(['prod-.*'], ['.*-tmp$'])
+        self.assertIs(name_matcher, rule_runtime.get_name_matcher(('prod-.*',), ('.*-tmp$',)))
+        self.assertIsNot(name_matcher, rule_runtime.get_name_matcher(['prod-.*']))
+        rule_runtime.clear_name_matchers()
+        self.assertIsNot(name_matcher, rule_runtime.get_name_matcher(['prod-.*'], ['.*-tmp$']))
@@ -0,0 +1,140 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+'''
+Inventory of the VPCs and VPC endpoints of an account and region, indexed for the rules.
+
+Asking describe_vpc_endpoints() once per VPC, or searching the list of every VPC and endpoint for
+each ID of a policy, makes the cost of a rule grow with the product of both. The inventory pages
+describe_vpcs() and describe_vpc_endpoints() once, then answers by dictionary lookups:
+
+    inventory = rule_runtime.get_network_inventory(ec2_client, event['accountId'])
+    for vpc in inventory.vpcs():
+        endpoints = inventory.get_endpoints(vpc_id=vpc['VpcId'], service_name='com.amazonaws.us-east-1.s3')
+    if not inventory.has_endpoints(statement_vpce_ids):
+        ...
+
+The inventory is built once per invocation. When the NETWORK_INVENTORY_TTL_SECONDS environment
+variable of the Lambda function is set, it is also kept by (region, account) for that many seconds,
+so the invocations of the rules of a warm container share it.
+'''
+
+import os
+import threading
+import time
+
+DEFAULT_TTL_SECONDS = 0
+DESCRIBE_PAGE_SIZE = 1000
+
+
+def describe_all(describe, items_key):
+    """Yield the items of every page of a describe_* call of EC2."""
+    kwargs = {"MaxResults": DESCRIBE_PAGE_SIZE}
+    while True:
+        page = describe(**kwargs)
+        for item in page.get(items_key, []):
+            yield item
+        if not page.get("NextToken"):
+            return
+        kwargs["NextToken"] = page["NextToken"]
+
+
+class NetworkInventory():
+    """The VPCs by ID, and the VPC endpoints by ID, by VPC and by service name.
+
+    Keyword arguments:
+    vpcs -- the Vpcs entries of describe_vpcs()
+    endpoints -- the VpcEndpoints entries of describe_vpc_endpoints()
+    """
+
+    def __init__(self, vpcs=(), endpoints=()):
+        self._vpcs = {vpc["VpcId"]: vpc for vpc in vpcs}
+        self._endpoints = {}
+        self._endpoints_by_vpc = {}
+        self._endpoints_by_service = {}
+        for endpoint in endpoints:
+            self._endpoints[endpoint["VpcEndpointId"]] = endpoint
+            self._endpoints_by_vpc.setdefault(endpoint.get("VpcId"), []).append(endpoint)
+            self._endpoints_by_service.setdefault(endpoint.get("ServiceName"), []).append(endpoint)
+
+    @classmethod
+    def describe(cls, ec2_client):
+        """Return the inventory of the account and region of an EC2 boto client, paging every VPC and VPC endpoint."""
+        vpcs = list(describe_all(ec2_client.describe_vpcs, "Vpcs"))
+        # An endpoint lives in a VPC: without VPC, there is no endpoint to describe
+        if not vpcs:
+            return cls()
+        return cls(vpcs, describe_all(ec2_client.describe_vpc_endpoints, "VpcEndpoints"))
+
+    def vpcs(self):
+        return list(self._vpcs.values())
+
+    def endpoints(self):
+        return list(self._endpoints.values())
+
+    def get_vpc(self, vpc_id):
+        return self._vpcs.get(vpc_id)
+
+    def get_endpoint(self, endpoint_id):
+        return self._endpoints.get(endpoint_id)
+
+    def get_endpoints(self, vpc_id=None, service_name=None, endpoint_types=None):
+        """Return the endpoints matching every given criterion, like the vpc-id, service-name and vpc-endpoint-type filters.
+
+        Keyword arguments:
+        vpc_id -- the VPC of the endpoints (default None, any VPC)
+        service_name -- the service of the endpoints, e.g. com.amazonaws.us-east-1.s3 (default None, any service)
+        endpoint_types -- the VpcEndpointType of the endpoints, e.g. ("Interface", "Gateway") (default None, any type)
+        """
+        if vpc_id is not None:
+            endpoints = self._endpoints_by_vpc.get(vpc_id, [])
+            if service_name is not None:
+                endpoints = [endpoint for endpoint in endpoints if endpoint.get("ServiceName") == service_name]
+        elif service_name is not None:
+            endpoints = self._endpoints_by_service.get(service_name, [])
+        else:
+            endpoints = self.endpoints()
+        if endpoint_types is not None:
+            endpoints = [endpoint for endpoint in endpoints if endpoint.get("VpcEndpointType") in endpoint_types]
+        return list(endpoints)
+
+    def has_vpcs(self, vpc_ids):
+        """Return True if every VPC ID of the iterable is in the inventory."""
+        return all(str(vpc_id) in self._vpcs for vpc_id in vpc_ids)
+
+    def has_endpoints(self, endpoint_ids):
+        """Return True if every VPC endpoint ID of the iterable is in the inventory."""
+        return all(str(endpoint_id) in self._endpoints for endpoint_id in endpoint_ids)
+
+
+_INVENTORIES = {}
+_INVENTORIES_LOCK = threading.Lock()
+
+
+def get_network_inventory(ec2_client, account_id=None, ttl_seconds=None):
+    """Return the NetworkInventory of an account and region, described again once its TTL is over.
+
+    Keyword arguments:
+    ec2_client -- the EC2 boto client of the account and region
+    account_id -- the account of the client, part of the cache key (default None)
+    ttl_seconds -- how long the inventory is kept (default None, the NETWORK_INVENTORY_TTL_SECONDS environment variable or 0, not kept)
+    """
+    if ttl_seconds is None:
+        ttl_seconds = int(os.environ.get("NETWORK_INVENTORY_TTL_SECONDS", DEFAULT_TTL_SECONDS))
+    if ttl_seconds <= 0:
+        return NetworkInventory.describe(ec2_client)
+    key = (ec2_client.meta.region_name, account_id)
+    now = time.monotonic()
+    with _INVENTORIES_LOCK:
+        inventory, expires_at = _INVENTORIES.get(key, (None, 0))
+    if now < expires_at:
+        return inventory
+    inventory = NetworkInventory.describe(ec2_client)
+    with _INVENTORIES_LOCK:
+        _INVENTORIES[key] = (inventory, now + ttl_seconds)
+    return inventory
+
+
+def clear_network_inventories():
+    with _INVENTORIES_LOCK:
+        _INVENTORIES.clear()
@@ -0,0 +1,60 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+import unittest
+try:
+    from unittest.mock import MagicMock
+except ImportError:
+    from mock import MagicMock
+
+import rule_runtime
+
+def build_endpoint(endpoint_id, vpc_id, service, endpoint_type='Gateway'):
+    return {'VpcEndpointId': endpoint_id, 'VpcId': vpc_id, 'ServiceName': 'com.amazonaws.us-east-1.' + service, 'VpcEndpointType': endpoint_type}
+
+def build_ec2_client(vpc_ids, endpoints):
+    ec2_client = MagicMock()
+    ec2_client.meta.region_name = 'us-east-1'
+    ec2_client.describe_vpcs = MagicMock(side_effect=[{'Vpcs': [{'VpcId': vpc_ids[0]}], 'NextToken': 'vpcs'},
+                                                      {'Vpcs': [{'VpcId': vpc_id} for vpc_id in vpc_ids[1:]]}])
+    ec2_client.describe_vpc_endpoints = MagicMock(return_value={'VpcEndpoints': endpoints})
+    return ec2_client
+
+class TestNetworkInventory(unittest.TestCase):
+    def setUp(self):
+        rule_runtime.clear_network_inventories()
+        self.ec2_client = build_ec2_client(['vpc-1', 'vpc-2'], [build_endpoint('vpce-1', 'vpc-1', 's3'),
+                                                                 build_endpoint('vpce-2', 'vpc-1', 'execute-api', 'Interface'),
+                                                                 build_endpoint('vpce-3', 'vpc-2', 's3', 'GatewayLoadBalancer')])
+
+    def test_every_page_indexed(self):
+        inventory = rule_runtime.get_network_inventory(self.ec2_client)
+        self.assertEqual(['vpc-1', 'vpc-2'], [vpc['VpcId'] for vpc in inventory.vpcs()])
+        self.assertEqual('vpcs', self.ec2_client.describe_vpcs.call_args[1]['NextToken'])
+        self.assertTrue(inventory.has_vpcs(['vpc-1', 'vpc-2']))
+        self.assertFalse(inventory.has_vpcs(['vpc-1', 'vpc-3']))
+        self.assertTrue(inventory.has_endpoints(['vpce-3']))
+        self.assertEqual('vpc-2', inventory.get_endpoint('vpce-3')['VpcId'])
+
+    def test_endpoints_filtered(self):
+        inventory = rule_runtime.get_network_inventory(self.ec2_client)
+        self.assertEqual(['vpce-1', 'vpce-2'], [endpoint['VpcEndpointId'] for endpoint in inventory.get_endpoints(vpc_id='vpc-1')])
+        self.assertEqual(['vpce-1'], [endpoint['VpcEndpointId'] for endpoint in inventory.get_endpoints('vpc-1', 'com.amazonaws.us-east-1.s3')])
+        self.assertEqual(['vpce-1', 'vpce-3'], [endpoint['VpcEndpointId'] for endpoint in inventory.get_endpoints(service_name='com.amazonaws.us-east-1.s3')])
+        self.assertEqual(['vpce-1', 'vpce-2'], [endpoint['VpcEndpointId'] for endpoint in inventory.get_endpoints(endpoint_types=('Interface', 'Gateway'))])
+        self.assertEqual([], inventory.get_endpoints(vpc_id='vpc-3'))
+
+    def test_inventory_kept_per_account_with_a_ttl(self):
+        self.ec2_client.describe_vpcs = MagicMock(return_value={'Vpcs': [{'VpcId': 'vpc-1'}]})
+        inventory = rule_runtime.get_network_inventory(self.ec2_client, '111111111111', ttl_seconds=60)
+        self.assertIs(inventory, rule_runtime.get_network_inventory(self.ec2_client, '111111111111', ttl_seconds=60))
+        self.assertIsNot(inventory, rule_runtime.get_network_inventory(self.ec2_client, '222222222222', ttl_seconds=60))
+        self.assertEqual(2, self.ec2_client.describe_vpc_endpoints.call_count)
+        # Without a TTL, every invocation describes the network again
+        rule_runtime.get_network_inventory(self.ec2_client, '111111111111', ttl_seconds=0)
+        self.assertEqual(3, self.ec2_client.describe_vpc_endpoints.call_count)
+
+    def test_no_endpoint_described_without_vpc(self):
+        self.ec2_client.describe_vpcs = MagicMock(return_value={'Vpcs': []})
+        self.assertEqual([], rule_runtime.get_network_inventory(self.ec2_client).get_endpoints())
+        self.ec2_client.describe_vpc_endpoints.assert_not_called()
@@ -0,0 +1,243 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+'''
+Batch evaluation of a periodic rule across the accounts of an organization.
+
+Instead of one copy of the rule per account, each woken up by its own schedule, a single
+long-running job assumes a role in every account, with a bounded number of accounts evaluated
+concurrently, and runs the evaluate_compliance() of the rule inside account_scope(role_arn).
+Every client the rule builds with rule_runtime.get_client() then uses the credentials of that
+account, so only the rules delegating to the runtime can be batched.
+
+The evaluations of each account are written to <output-dir>/<account-id>.json, and a timing line
+is printed per account. No PutEvaluations call is made: AWS Config only accepts evaluations with
+the resultToken of one of its own invocations.
+
+Run from the python directory of this repository, with credentials allowed to assume the role:
+
+    python -m rule_runtime.organization SQS_ENCRYPTION_CHECK --accounts accounts.txt \\
+        --role-name ConfigBatchEvaluationRole --output-dir evaluations --max-workers 32
+
+accounts.txt holds one account id or role ARN per line.
+'''
+
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from rule_runtime.clients import account_scope, clear_client_cache, region_scope
+from rule_runtime.evaluations import build_evaluation
+from rule_runtime.handler import has_missing_fields
+
+DEFAULT_ACCOUNT_WORKERS = 16
+DEFAULT_PARTITION = "aws"
+BATCH_RESULT_TOKEN = "BATCH"
+
+
+class AccountResult():
+    """Outcome of the evaluation of one account."""
+
+    def __init__(self, account_id, role_arn):
+        self.account_id = account_id
+        self.role_arn = role_arn
+        self.evaluations = []
+        self.error = None
+        self.duration_ms = 0.0
+
+    def to_dict(self):
+        return {
+            "AccountId": self.account_id,
+            "RoleArn": self.role_arn,
+            "DurationMs": round(self.duration_ms, 1),
+            "Error": str(self.error) if self.error else None,
+            "Evaluations": self.evaluations,
+        }
+
+    def __repr__(self):
+        if self.error:
+            return "{} ERROR {:.1f} ms: {}".format(self.account_id, self.duration_ms, self.error)
+        return "{} OK {} evaluations {:.1f} ms".format(self.account_id, len(self.evaluations), self.duration_ms)
+
+
+def parse_target(target, role_name=None, partition=DEFAULT_PARTITION):
+    """Return the (account_id, role_arn) of an account id or of a role ARN.
+
+    Keyword arguments:
+    target -- a 12-digit account id or the ARN of the role to assume in the account
+    role_name -- the name of the role assumed in the accounts given by id (default None)
+    partition -- the partition of the role ARNs built from account ids (default aws)
+    """
+    target = target.strip()
+    if target.startswith("arn:"):
+        return target.split(":")[4], target
+    if len(target) != 12 or not target.isdigit():
+        raise ValueError("Invalid account id or role ARN: {}".format(target))
+    if not role_name:
+        raise ValueError("A role name is required to evaluate the account {}.".format(target))
+    return target, "arn:{}:iam::{}:role/{}".format(partition, target, role_name)
+
+
+def build_scheduled_event(rule_name, account_id, role_arn, rule_parameters):
+    """Return a ScheduledNotification event of the rule for the account."""
+    invoking_event = {
+        "messageType": "ScheduledNotification",
+        "notificationCreationTime": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime()),
+    }
+    return {
+        "configRuleName": rule_name,
+        "executionRoleArn": role_arn,
+        "eventLeftScope": False,
+        "invokingEvent": json.dumps(invoking_event),
+        "ruleParameters": json.dumps(rule_parameters),
+        "accountId": account_id,
+        "resultToken": BATCH_RESULT_TOKEN,
+    }
+
+
+def to_account_evaluations(compliance_result, event, default_resource_type):
+    """Return the evaluations of an account from the output of evaluate_compliance(), like lambda_handler() does."""
+    if not compliance_result:
+        return [build_evaluation(event["accountId"], "NOT_APPLICABLE", event, "AWS::::Account")]
+    if isinstance(compliance_result, str):
+        return [build_evaluation(event["accountId"], compliance_result, event, default_resource_type)]
+    if isinstance(compliance_result, dict):
+        compliance_result = [compliance_result]
+    return [evaluation for evaluation in compliance_result if not has_missing_fields(evaluation)]
+
+
+def evaluate_account(rule, event, valid_rule_parameters=None, regions=None):
+    """Return the evaluations of the rule in the account of the event, with the clients of its role.
+
+    Keyword arguments:
+    rule -- the rule module
+    event -- the scheduled event of the account, see build_scheduled_event()
+    valid_rule_parameters -- the output of the evaluate_parameters() of the rule, if any (default None)
+    regions -- the regions to evaluate (default None, the region of the environment)
+    """
+    default_resource_type = getattr(rule, "DEFAULT_RESOURCE_TYPE", "AWS::::Account")
+    evaluations = []
+    with account_scope(event["executionRoleArn"]):
+        try:
+            for region in regions or [None]:
+                with region_scope(region):
+                    if hasattr(rule, "evaluate_parameters"):
+                        compliance_result = rule.evaluate_compliance(event, None, valid_rule_parameters)
+                    else:
+                        compliance_result = rule.evaluate_compliance(event, None)
+                evaluations.extend(to_account_evaluations(compliance_result, event, default_resource_type))
+        finally:
+            # The clients of an account are not reused by the next accounts
+            clear_client_cache(event["executionRoleArn"])
+    return evaluations
+
+
+def evaluate_accounts(rule, targets, rule_name, rule_parameters=None, role_name=None, regions=None,
+                      max_workers=DEFAULT_ACCOUNT_WORKERS, partition=DEFAULT_PARTITION):
+    """Evaluate the rule in every account and yield an AccountResult as each account finishes.
+
+    The rule parameters are validated once, before any account is evaluated. The error of an
+    account is reported in its AccountResult and does not stop the other accounts.
+
+    Keyword arguments:
+    rule -- the rule module, delegating its clients to rule_runtime.get_client()
+    targets -- account ids or role ARNs, see parse_target()
+    rule_name -- the configRuleName of the events
+    rule_parameters -- the rule parameters dictionary (default None, no parameter)
+    role_name -- the name of the role assumed in the accounts given by id (default None)
+    regions -- the regions to evaluate in every account (default None, the region of the environment)
+    max_workers -- the number of accounts evaluated concurrently (default DEFAULT_ACCOUNT_WORKERS)
+    partition -- the partition of the role ARNs built from account ids (default aws)
+    """
+    rule_parameters = rule_parameters or {}
+    valid_rule_parameters = rule.evaluate_parameters(rule_parameters) if hasattr(rule, "evaluate_parameters") else None
+    accounts = [parse_target(target, role_name, partition) for target in targets if target.strip()]
+
+    def run_account(account_id, role_arn):
+        result = AccountResult(account_id, role_arn)
+        start = time.perf_counter()
+        try:
+            event = build_scheduled_event(rule_name, account_id, role_arn, rule_parameters)
+            result.evaluations = evaluate_account(rule, event, valid_rule_parameters, regions)
+        except Exception as ex:
+            result.error = ex
+        result.duration_ms = (time.perf_counter() - start) * 1000
+        return result
+
+    if not accounts:
+        return
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(accounts))) as executor:
+        futures = [executor.submit(run_account, account_id, role_arn) for account_id, role_arn in accounts]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def write_account_result(output_dir, result):
+    """Write the AccountResult to <output_dir>/<account_id>.json and return the path of the file."""
+    path = os.path.join(output_dir, "{}.json".format(result.account_id))
+    with open(path, "w") as output_file:
+        json.dump(result.to_dict(), output_file, indent=2, default=str)
+    return path
+
+
+def load_rule(rule_dir):
+    """Return the rule module of rule_dir and the Parameters of its parameters.json."""
+    rule_dir = os.path.abspath(rule_dir)
+    rule_name = os.path.basename(rule_dir)
+    with open(os.path.join(rule_dir, "parameters.json")) as parameters_file:
+        parameters = json.load(parameters_file)["Parameters"]
+    if "SourcePeriodic" not in parameters:
+        raise ValueError("{} is not a periodic rule.".format(rule_name))
+    if rule_dir not in sys.path:
+        sys.path.insert(0, rule_dir)
+    rule = importlib.import_module(rule_name)
+    if getattr(rule, "rule_runtime", None) is None:
+        raise ValueError("{} does not delegate its clients to rule_runtime and cannot be evaluated in batch.".format(rule_name))
+    return rule, parameters
+
+
+def read_targets(path):
+    if path == "-":
+        return [line for line in sys.stdin.read().splitlines() if line.strip()]
+    with open(path) as targets_file:
+        return [line for line in targets_file.read().splitlines() if line.strip() and not line.startswith("#")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate a periodic rule in many accounts from a single process.")
+    parser.add_argument("rule_dir", help="the directory of the rule, e.g. SQS_ENCRYPTION_CHECK")
+    parser.add_argument("--accounts", required=True, help="a file with one account id or role ARN per line, - for stdin")
+    parser.add_argument("--role-name", help="the role assumed in the accounts given by id")
+    parser.add_argument("--partition", default=DEFAULT_PARTITION)
+    parser.add_argument("--parameters", help="the rule parameters as JSON (default: the InputParameters of parameters.json)")
+    parser.add_argument("--region", action="append", dest="regions", help="a region to evaluate, repeatable (default: the region of the environment)")
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_ACCOUNT_WORKERS)
+    parser.add_argument("--output-dir", default="evaluations")
+    args = parser.parse_args(argv)
+
+    rule, parameters = load_rule(args.rule_dir)
+    rule_parameters = json.loads(args.parameters or parameters.get("InputParameters") or "{}")
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    results = []
+    for result in evaluate_accounts(rule, read_targets(args.accounts), parameters.get("RuleName", os.path.basename(args.rule_dir)),
+                                    rule_parameters, args.role_name, args.regions, args.max_workers, args.partition):
+        write_account_result(args.output_dir, result)
+        print(result)
+        results.append(result)
+
+    failed = [result for result in results if result.error]
+    durations = sorted(result.duration_ms for result in results) or [0.0]
+    print("{} accounts, {} failed, {} evaluations in {:.1f} s, account ms median/max: {:.1f}/{:.1f}".format(
+        len(results), len(failed), sum(len(result.evaluations) for result in results), time.perf_counter() - start,
+        durations[len(durations) // 2], durations[-1]))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
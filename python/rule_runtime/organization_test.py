@@ -0,0 +1,121 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+import datetime
+import json
+import os
+import shutil
+import sys
+import tempfile
+import types
+import unittest
+try:
+    from unittest.mock import MagicMock, patch
+except ImportError:
+    from mock import MagicMock, patch
+from botocore.exceptions import ClientError
+
+import rule_runtime
+from rule_runtime import organization
+
+STS_CLIENT_MOCK = MagicMock()
+
+class Boto3Mock():
+    @staticmethod
+    def client(client_name, *args, **kwargs):
+        if client_name == 'sts':
+            return STS_CLIENT_MOCK
+        # The clients of the rule tell which credentials they were built with
+        return MagicMock(access_key=kwargs.get('aws_access_key_id'), region=kwargs.get('region_name'))
+
+def assume_role(RoleArn, **kwargs):
+    if RoleArn.startswith('arn:aws:iam::222222222222'):
+        raise ClientError({'Error': {'Code': 'AccessDenied', 'Message': 'denied'}}, 'AssumeRole')
+    return {'Credentials': {'AccessKeyId': 'key-' + RoleArn.split(':')[4], 'SecretAccessKey': 'secret', 'SessionToken': 'token',
+                            'Expiration': datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)}}
+
+def build_rule(with_parameters=True):
+    rule = types.ModuleType('FAKE_RULE')
+    rule.DEFAULT_RESOURCE_TYPE = 'AWS::SQS::Queue'
+    def evaluate_compliance(event, configuration_item, valid_rule_parameters=None):
+        sqs_client = rule_runtime.get_client('sqs', event)
+        if event['accountId'] == '333333333333':
+            return None
+        return [rule_runtime.build_evaluation('{}-{}-{}'.format(sqs_client.access_key, sqs_client.region, valid_rule_parameters),
+                                              'COMPLIANT', event, rule.DEFAULT_RESOURCE_TYPE)]
+    rule.evaluate_compliance = MagicMock(side_effect=evaluate_compliance)
+    if with_parameters:
+        rule.evaluate_parameters = MagicMock(return_value='valid')
+    return rule
+
+class TestOrganization(unittest.TestCase):
+    def setUp(self):
+        STS_CLIENT_MOCK.reset_mock()
+        STS_CLIENT_MOCK.assume_role = MagicMock(side_effect=assume_role)
+        self.boto3_patch = patch.dict(sys.modules, {'boto3': Boto3Mock()})
+        self.boto3_patch.start()
+        rule_runtime.clear_client_cache()
+        rule_runtime.CREDENTIAL_CACHE.clear()
+
+    def tearDown(self):
+        self.boto3_patch.stop()
+
+    def test_parse_target(self):
+        self.assertEqual(('111111111111', 'arn:aws:iam::111111111111:role/batch'), organization.parse_target('111111111111', 'batch'))
+        self.assertEqual(('111111111111', 'arn:aws-cn:iam::111111111111:role/x'), organization.parse_target(' arn:aws-cn:iam::111111111111:role/x\n'))
+        self.assertRaises(ValueError, organization.parse_target, '111111111111')
+        self.assertRaises(ValueError, organization.parse_target, 'not-an-account', 'batch')
+
+    def test_each_account_uses_its_role(self):
+        rule = build_rule()
+        results = list(organization.evaluate_accounts(rule, ['111111111111', 'arn:aws:iam::444444444444:role/other'], 'FAKE_RULE',
+                                                      {'Param': 'x'}, role_name='batch', max_workers=2))
+        evaluations = sorted(evaluation['ComplianceResourceId'] for result in results for evaluation in result.evaluations)
+        self.assertEqual(['key-111111111111-None-valid', 'key-444444444444-None-valid'], evaluations)
+        rule.evaluate_parameters.assert_called_once_with({'Param': 'x'})
+        events = [call[0][0] for call in rule.evaluate_compliance.call_args_list]
+        self.assertEqual({'{"Param": "x"}'}, set(event['ruleParameters'] for event in events))
+        self.assertEqual([('sts', None, None)], list(rule_runtime.clients._CLIENT_CACHE))
+
+    def test_account_error_does_not_stop_the_batch(self):
+        results = {result.account_id: result for result in organization.evaluate_accounts(
+            build_rule(), ['111111111111', '222222222222', '333333333333'], 'FAKE_RULE', role_name='batch')}
+        self.assertEqual('AccessDenied', results['222222222222'].error.response['Error']['Code'])
+        self.assertIsNone(results['111111111111'].error)
+        self.assertEqual([('333333333333', 'AWS::::Account', 'NOT_APPLICABLE')],
+                         [(evaluation['ComplianceResourceId'], evaluation['ComplianceResourceType'], evaluation['ComplianceType'])
+                          for evaluation in results['333333333333'].evaluations])
+
+    def test_regions_and_rule_without_parameters(self):
+        rule = build_rule(with_parameters=False)
+        results = list(organization.evaluate_accounts(rule, ['111111111111'], 'FAKE_RULE', role_name='batch', regions=['eu-west-1', 'us-east-1']))
+        self.assertEqual(['key-111111111111-eu-west-1-None', 'key-111111111111-us-east-1-None'],
+                         [evaluation['ComplianceResourceId'] for evaluation in results[0].evaluations])
+        self.assertEqual(2, len(rule.evaluate_compliance.call_args_list[0][0]))
+        STS_CLIENT_MOCK.assume_role.assert_called_once()
+
+    def test_invalid_parameters_fail_before_any_account(self):
+        rule = build_rule()
+        rule.evaluate_parameters.side_effect = ValueError('Invalid Parameter')
+        with self.assertRaises(ValueError):
+            list(organization.evaluate_accounts(rule, ['111111111111'], 'FAKE_RULE', role_name='batch'))
+        STS_CLIENT_MOCK.assume_role.assert_not_called()
+
+    def test_write_account_result(self):
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir)
+        result = next(organization.evaluate_accounts(build_rule(), ['111111111111'], 'FAKE_RULE', role_name='batch'))
+        path = organization.write_account_result(output_dir, result)
+        self.assertEqual(os.path.join(output_dir, '111111111111.json'), path)
+        with open(path) as result_file:
+            written = json.load(result_file)
+        self.assertEqual('arn:aws:iam::111111111111:role/batch', written['RoleArn'])
+        self.assertEqual(1, len(written['Evaluations']))
+        self.assertIsNone(written['Error'])
+
+    def test_account_scope_overrides_assume_role_mode(self):
+        event = {'executionRoleArn': 'arn:aws:iam::999999999999:role/config-role'}
+        with rule_runtime.account_scope('arn:aws:iam::111111111111:role/batch'):
+            self.assertEqual('key-111111111111', rule_runtime.get_client('sqs', event).access_key)
+        self.assertIsNone(rule_runtime.current_role_arn())
+        self.assertIsNone(rule_runtime.get_client('sqs', event).access_key)
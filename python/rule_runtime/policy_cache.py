@@ -0,0 +1,154 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+'''
+Cache of the managed policy documents, shared by the rules and the invocations of a warm container.
+
+The same AWS managed policies (AdministratorAccess, ReadOnlyAccess...) are attached to hundreds of
+principals. Instead of get_policy() and get_policy_version() for every attachment, a rule asks the
+cache:
+
+    document = rule_runtime.get_managed_policy_document(iam_client, attached_policy["PolicyArn"])
+
+A policy version is immutable, so the documents are kept by (PolicyArn, VersionId) until the least
+recently used ones are evicted, beyond POLICY_CACHE_MAX_ENTRIES. The default version of a policy
+can change: it is kept for POLICY_CACHE_TTL_SECONDS, then asked again with get_policy(). When the
+POLICY_CACHE_DIRECTORY environment variable is set, the documents are also saved as JSON files of
+that directory and read back by the next containers or runs sharing it.
+'''
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import unquote
+
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_TTL_SECONDS = 900
+
+
+def decode_policy_document(document):
+    """Return a policy document as a dictionary; IAM returns URL-encoded JSON when the SDK does not decode it."""
+    if isinstance(document, str):
+        return json.loads(unquote(document))
+    return document
+
+
+class PolicyDocumentCache():
+    """Managed policy documents keyed by (PolicyArn, VersionId), with hit and miss counters.
+
+    Keyword arguments:
+    max_entries -- the number of documents kept in memory, the least recently used ones are evicted (default DEFAULT_MAX_ENTRIES)
+    ttl_seconds -- how long the default version of a policy is trusted before asking get_policy() again (default DEFAULT_TTL_SECONDS)
+    directory -- the directory persisting the documents, or None to keep them in memory only (default None)
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS, directory=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._documents = OrderedDict()
+        self._default_versions = {}
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256("#".join(key).encode("utf-8")).hexdigest() + ".json")
+
+    def get_default_version_id(self, iam_client, policy_arn):
+        """Return the DefaultVersionId of a managed policy, calling get_policy() once per TTL."""
+        now = time.monotonic()
+        with self._lock:
+            version_id, expires_at = self._default_versions.get(policy_arn, (None, 0))
+        if now < expires_at:
+            return version_id
+        version_id = iam_client.get_policy(PolicyArn=policy_arn)["Policy"]["DefaultVersionId"]
+        with self._lock:
+            self._default_versions[policy_arn] = (version_id, now + self.ttl_seconds)
+        return version_id
+
+    def get(self, iam_client, policy_arn, version_id=None):
+        """Return the document of a managed policy version, calling get_policy_version() only on a cache miss.
+
+        Keyword arguments:
+        iam_client -- the IAM boto client used on a cache miss
+        policy_arn -- the ARN of the managed policy
+        version_id -- the version of the document (default None, the default version of the policy)
+        """
+        key = (policy_arn, version_id or self.get_default_version_id(iam_client, policy_arn))
+        with self._lock:
+            if key in self._documents:
+                self.hits += 1
+                self._documents.move_to_end(key)
+                return self._documents[key]
+        document = self._load(key)
+        with self._lock:
+            if document is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if document is None:
+            policy_version = iam_client.get_policy_version(PolicyArn=key[0], VersionId=key[1])
+            document = decode_policy_document(policy_version["PolicyVersion"]["Document"])
+            self._save(key, document)
+        self.put(key[0], key[1], document)
+        return document
+
+    def put(self, policy_arn, version_id, document):
+        """Keep the document of a managed policy version, evicting the least recently used beyond max_entries."""
+        with self._lock:
+            self._documents[(policy_arn, version_id)] = document
+            self._documents.move_to_end((policy_arn, version_id))
+            while len(self._documents) > self.max_entries:
+                self._documents.popitem(last=False)
+
+    def _load(self, key):
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key)) as document_file:
+                return json.load(document_file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _save(self, key, document):
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        # One temporary file per thread: concurrent misses on the same version may write it together
+        temporary_path = "{}.{}.tmp".format(path, threading.get_ident())
+        with open(temporary_path, "w") as document_file:
+            json.dump(document, document_file)
+        os.replace(temporary_path, path)
+
+    def clear(self):
+        """Drop every document and default version kept in memory, and reset the counters. The files of the directory are kept."""
+        with self._lock:
+            self._documents.clear()
+            self._default_versions.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "documents": len(self._documents)}
+
+
+POLICY_DOCUMENT_CACHE = PolicyDocumentCache(int(os.environ.get("POLICY_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+                                            int(os.environ.get("POLICY_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS)),
+                                            os.environ.get("POLICY_CACHE_DIRECTORY") or None)
+
+
+def get_managed_policy_document(iam_client, policy_arn, version_id=None):
+    """Return the document of a managed policy, from POLICY_DOCUMENT_CACHE when already fetched.
+
+    Keyword arguments:
+    iam_client -- the IAM boto client
+    policy_arn -- the ARN of the managed policy
+    version_id -- the version of the document (default None, the default version of the policy)
+    """
+    return POLICY_DOCUMENT_CACHE.get(iam_client, policy_arn, version_id)
@@ -0,0 +1,59 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+import json
+import tempfile
+import unittest
+from urllib.parse import quote
+try:
+    from unittest.mock import MagicMock
+except ImportError:
+    from mock import MagicMock
+
+import rule_runtime
+
+ADMIN_ARN = 'arn:aws:iam::aws:policy/AdministratorAccess'
+READ_ONLY_ARN = 'arn:aws:iam::aws:policy/ReadOnlyAccess'
+FULL_STAR_DOCUMENT = {'Version': '2012-10-17', 'Statement': [{'Effect': 'Allow', 'Action': '*', 'Resource': '*'}]}
+
+def build_iam_client(version_id='v1', document=FULL_STAR_DOCUMENT):
+    iam_client = MagicMock()
+    iam_client.get_policy = MagicMock(return_value={'Policy': {'DefaultVersionId': version_id}})
+    iam_client.get_policy_version = MagicMock(return_value={'PolicyVersion': {'Document': quote(json.dumps(document))}})
+    return iam_client
+
+class TestPolicyDocumentCache(unittest.TestCase):
+    def test_document_is_fetched_once_per_version(self):
+        cache = rule_runtime.PolicyDocumentCache()
+        iam_client = build_iam_client()
+        for _ in range(3):
+            self.assertEqual(FULL_STAR_DOCUMENT, cache.get(iam_client, ADMIN_ARN))
+        iam_client.get_policy.assert_called_once_with(PolicyArn=ADMIN_ARN)
+        iam_client.get_policy_version.assert_called_once_with(PolicyArn=ADMIN_ARN, VersionId='v1')
+        self.assertEqual({'hits': 2, 'misses': 1, 'documents': 1}, cache.stats())
+
+    def test_default_version_expires(self):
+        cache = rule_runtime.PolicyDocumentCache(ttl_seconds=0)
+        cache.get(build_iam_client('v1'), ADMIN_ARN)
+        iam_client = build_iam_client('v1')
+        cache.get(iam_client, ADMIN_ARN)
+        iam_client.get_policy.assert_called_once_with(PolicyArn=ADMIN_ARN)
+        iam_client.get_policy_version.assert_not_called()
+        iam_client = build_iam_client('v2', {'Statement': []})
+        self.assertEqual({'Statement': []}, cache.get(iam_client, ADMIN_ARN))
+        iam_client.get_policy_version.assert_called_once_with(PolicyArn=ADMIN_ARN, VersionId='v2')
+
+    def test_least_recently_used_is_evicted(self):
+        cache = rule_runtime.PolicyDocumentCache(max_entries=2)
+        iam_client = build_iam_client()
+        for policy_arn in (ADMIN_ARN, READ_ONLY_ARN, ADMIN_ARN, 'arn:aws:iam::aws:policy/PowerUserAccess', ADMIN_ARN, READ_ONLY_ARN):
+            cache.get(iam_client, policy_arn)
+        self.assertEqual(4, iam_client.get_policy_version.call_count)
+        self.assertEqual(2, cache.stats()['documents'])
+
+    def test_documents_are_read_back_from_the_directory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            rule_runtime.PolicyDocumentCache(directory=directory).get(build_iam_client(), ADMIN_ARN)
+            iam_client = build_iam_client()
+            self.assertEqual(FULL_STAR_DOCUMENT, rule_runtime.PolicyDocumentCache(directory=directory).get(iam_client, ADMIN_ARN))
+            iam_client.get_policy_version.assert_not_called()
@@ -0,0 +1,206 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+'''
+IAM policy documents compiled once, with memoised verdicts.
+
+compile_policy() normalises a document into a CompiledPolicy: a tuple of CompiledStatement with
+the Action, NotAction, Resource and NotResource patterns as tuples and the Condition block indexed
+by operator and (case-insensitive) condition key. The same document attached to many principals is
+compiled once, keyed by the hash of its content, and each verdict is computed once per document:
+
+    policy = rule_runtime.compile_policy(policy_document)
+    if policy.allows_full_star():
+        ...
+    verdict = policy.get_source_ip_verdict(max_ip_num)
+'''
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict, namedtuple
+
+from rule_runtime.cidr import CidrSet
+from rule_runtime.policy_cache import decode_policy_document
+
+COMPILED_POLICY_CACHE_SIZE = 1024
+FULL_STAR_PATTERNS = ("*", "*:*")
+SOURCE_IP_CONDITION_KEY = "aws:SourceIp"
+DENY_SOURCE_IP_OPERATORS = ("NotIpAddress", "ForAnyValue:NotIpAddress")
+ALLOW_SOURCE_IP_OPERATORS = ("IpAddress", "ForAnyValue:IpAddress")
+
+_COMPILED_POLICIES = OrderedDict()
+_COMPILED_POLICIES_LOCK = threading.Lock()
+
+# is_denied -- a statement denies every source IP but a valid set of CIDRs
+# is_allowed -- every statement before the denying one allows a valid set of CIDRs only (None without such statement)
+# over_maximum_ip_num -- the number of addresses of the last set of CIDRs over the maximum, or None
+SourceIpVerdict = namedtuple("SourceIpVerdict", ["is_denied", "is_allowed", "over_maximum_ip_num"])
+
+
+def as_tuple(value):
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        return tuple(value)
+    return (value,)
+
+
+class CompiledStatement(namedtuple("CompiledStatement", ["effect", "actions", "not_actions", "resources", "not_resources", "conditions"])):
+    """A policy statement; an element missing from the statement is None, the conditions are {operator: {lower-case key: values}}."""
+
+    @classmethod
+    def from_statement(cls, statement):
+        conditions = {}
+        for operator, condition in (statement.get("Condition") or {}).items():
+            conditions[operator] = {key.lower(): as_tuple(values) for key, values in condition.items()}
+        return cls(statement.get("Effect"),
+                   as_tuple(statement.get("Action")), as_tuple(statement.get("NotAction")),
+                   as_tuple(statement.get("Resource")), as_tuple(statement.get("NotResource")),
+                   conditions)
+
+    def matches_every_action(self):
+        """Return True if the Action is "*", or if the NotAction leaves out some actions only: "NotAction": "iam:*" still matches ec2:*, s3:*..."""
+        if self.actions is not None:
+            return any(action in FULL_STAR_PATTERNS for action in self.actions)
+        if self.not_actions is not None:
+            return not any(action in FULL_STAR_PATTERNS for action in self.not_actions)
+        return False
+
+    def allows_full_star(self):
+        """Return True for an Allow of every action on every resource (a statement without Resource applies to every resource)."""
+        if self.effect != "Allow" or self.not_resources is not None or not self.matches_every_action():
+            return False
+        return self.resources is None or "*" in self.resources
+
+    def get_condition_values(self, operators, key):
+        """Return the values of the key under the first of the operators present in the Condition block, or ()."""
+        for operator in operators:
+            if operator in self.conditions:
+                return self.conditions[operator].get(key.lower(), ())
+        return ()
+
+    def get_source_ip_num(self, effect, operators):
+        """Return the number of addresses of the aws:SourceIp CIDRs of the first operator present, if the statement has this effect, or None."""
+        if self.effect != effect:
+            return None
+        cidrs = self.get_condition_values(operators, SOURCE_IP_CONDITION_KEY)
+        return count_ip_addresses(cidrs) if cidrs else None
+
+
+def count_ip_addresses(cidrs):
+    """Return the number of distinct addresses of a set of CIDRs; an address of overlapping CIDRs is counted once."""
+    return CidrSet(cidrs).num_addresses
+
+
+class CompiledPolicy():
+    """The compiled statements of a policy document, and the verdicts already computed on them.
+
+    Keyword arguments:
+    statements -- the CompiledStatement of the document
+    digest -- the hash of the document content
+    """
+
+    def __init__(self, statements, digest=None):
+        self.statements = tuple(statements)
+        self.digest = digest
+        self._verdicts = {}
+        self._lock = threading.Lock()
+
+    def _memoise(self, question, compute):
+        with self._lock:
+            if question in self._verdicts:
+                return self._verdicts[question]
+        verdict = compute()
+        with self._lock:
+            self._verdicts[question] = verdict
+        return verdict
+
+    def allows_full_star(self):
+        """Return True if a statement allows every action on every resource."""
+        return self._memoise(("full_star",), lambda: any(statement.allows_full_star() for statement in self.statements))
+
+    def get_source_ip_verdict(self, max_ip_num):
+        """Return the SourceIpVerdict of the document: the statements are read in order, up to the first one denying the other source IPs.
+
+        Keyword arguments:
+        max_ip_num -- the maximum number of addresses of a valid set of CIDRs
+        """
+        return self._memoise(("source_ip", max_ip_num), lambda: self._compute_source_ip_verdict(max_ip_num))
+
+    def _compute_source_ip_verdict(self, max_ip_num):
+        is_allowed = None
+        over_maximum_ip_num = None
+        for statement in self.statements:
+            denied_ip_num = statement.get_source_ip_num("Deny", DENY_SOURCE_IP_OPERATORS)
+            if denied_ip_num is not None and denied_ip_num > max_ip_num:
+                over_maximum_ip_num = denied_ip_num
+            elif denied_ip_num is not None:
+                return SourceIpVerdict(True, is_allowed, over_maximum_ip_num)
+            allowed_ip_num = statement.get_source_ip_num("Allow", ALLOW_SOURCE_IP_OPERATORS)
+            if allowed_ip_num is not None and allowed_ip_num > max_ip_num:
+                over_maximum_ip_num = allowed_ip_num
+            if allowed_ip_num is not None and allowed_ip_num <= max_ip_num:
+                if is_allowed is not False:
+                    is_allowed = True
+            else:
+                is_allowed = False
+        return SourceIpVerdict(False, is_allowed, over_maximum_ip_num)
+
+
+def combine_source_ip_verdicts(verdicts):
+    """Return the SourceIpVerdict of documents read in order, up to the first one denying the other source IPs.
+
+    The verdicts are consumed lazily: the documents after a denying one need not be fetched.
+
+    Keyword arguments:
+    verdicts -- an iterable of the SourceIpVerdict of the documents
+    """
+    is_allowed = None
+    over_maximum_ip_num = None
+    for verdict in verdicts:
+        if verdict.over_maximum_ip_num is not None:
+            over_maximum_ip_num = verdict.over_maximum_ip_num
+        if verdict.is_allowed is False:
+            is_allowed = False
+        elif verdict.is_allowed is True and is_allowed is not False:
+            is_allowed = True
+        if verdict.is_denied:
+            return SourceIpVerdict(True, is_allowed, over_maximum_ip_num)
+    return SourceIpVerdict(False, is_allowed, over_maximum_ip_num)
+
+
+def get_document_digest(document):
+    return hashlib.sha256(json.dumps(document, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def compile_policy(document):
+    """Return the CompiledPolicy of a policy document (a dictionary or URL-encoded JSON), compiled once per content.
+
+    Keyword arguments:
+    document -- the policy document
+    """
+    document = decode_policy_document(document)
+    digest = get_document_digest(document)
+    with _COMPILED_POLICIES_LOCK:
+        if digest in _COMPILED_POLICIES:
+            _COMPILED_POLICIES.move_to_end(digest)
+            return _COMPILED_POLICIES[digest]
+    statements = document.get("Statement", [])
+    if isinstance(statements, dict):
+        statements = [statements]
+    elif not isinstance(statements, list):
+        print("Not recognized statement type:")
+        print(statements)
+        statements = []
+    policy = CompiledPolicy([CompiledStatement.from_statement(statement) for statement in statements], digest)
+    with _COMPILED_POLICIES_LOCK:
+        _COMPILED_POLICIES[digest] = policy
+        while len(_COMPILED_POLICIES) > COMPILED_POLICY_CACHE_SIZE:
+            _COMPILED_POLICIES.popitem(last=False)
+    return policy
+
+
+def clear_compiled_policies():
+    with _COMPILED_POLICIES_LOCK:
+        _COMPILED_POLICIES.clear()
@@ -0,0 +1,64 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+import json
+import unittest
+from urllib.parse import quote
+
+import rule_runtime
+
+def build_document(*statements):
+    return {'Version': '2012-10-17', 'Statement': list(statements)}
+
+class TestFullStar(unittest.TestCase):
+    def test_allows_full_star(self):
+        self.assertTrue(rule_runtime.compile_policy(build_document({'Effect': 'Allow', 'Action': '*', 'Resource': '*'})).allows_full_star())
+        self.assertTrue(rule_runtime.compile_policy(build_document({'Effect': 'Allow', 'Action': ['s3:Get*', '*:*'], 'Resource': ['*']})).allows_full_star())
+        self.assertTrue(rule_runtime.compile_policy({'Statement': {'Effect': 'Allow', 'Action': '*'}}).allows_full_star())
+        self.assertTrue(rule_runtime.compile_policy(quote(json.dumps(build_document({'Effect': 'Allow', 'Action': '*', 'Resource': '*'})))).allows_full_star())
+
+    def test_not_action_allows_full_star(self):
+        # Every action but those of IAM, on every resource
+        self.assertTrue(rule_runtime.compile_policy(build_document({'Effect': 'Allow', 'NotAction': 'iam:*', 'Resource': '*'})).allows_full_star())
+        self.assertTrue(rule_runtime.compile_policy(build_document({'Effect': 'Allow', 'NotAction': ['iam:*', 'organizations:*']})).allows_full_star())
+
+    def test_does_not_allow_full_star(self):
+        for statement in ({'Effect': 'Deny', 'Action': '*', 'Resource': '*'},
+                          {'Effect': 'Allow', 'Action': 's3:*', 'Resource': '*'},
+                          {'Effect': 'Allow', 'Action': '*', 'Resource': 'arn:aws:s3:::bucket/*'},
+                          {'Effect': 'Allow', 'Action': '*', 'NotResource': 'arn:aws:s3:::bucket/*'},
+                          {'Effect': 'Allow', 'NotAction': '*', 'Resource': '*'},
+                          {'Effect': 'Allow', 'NotAction': ['s3:*', '*:*'], 'Resource': '*'},
+                          {'Effect': 'Allow', 'NotAction': 'iam:*', 'Resource': 'arn:aws:s3:::bucket/*'},
+                          {'Effect': 'Deny', 'NotAction': 'iam:*', 'Resource': '*'}):
+            self.assertFalse(rule_runtime.compile_policy(build_document(statement)).allows_full_star(), statement)
+        self.assertFalse(rule_runtime.compile_policy({'Statement': 'not a statement'}).allows_full_star())
+
+    def test_same_content_is_compiled_once(self):
+        policy = rule_runtime.compile_policy(build_document({'Effect': 'Allow', 'Action': '*', 'Resource': '*'}))
+        self.assertIs(policy, rule_runtime.compile_policy({'Statement': [{'Resource': '*', 'Action': '*', 'Effect': 'Allow'}], 'Version': '2012-10-17'}))
+        rule_runtime.clear_compiled_policies()
+        self.assertIsNot(policy, rule_runtime.compile_policy(build_document({'Effect': 'Allow', 'Action': '*', 'Resource': '*'})))
+
+class TestSourceIp(unittest.TestCase):
+    def test_deny_other_source_ips(self):
+        policy = rule_runtime.compile_policy(build_document(
+            {'Effect': 'Allow', 'Action': '*', 'Resource': '*'},
+            {'Effect': 'Deny', 'Action': '*', 'Resource': '*', 'Condition': {'NotIpAddress': {'aws:sourceip': ['10.0.0.0/24', '10.0.0.0/24']}}}))
+        self.assertEqual((True, False, None), policy.get_source_ip_verdict(256))
+        self.assertEqual((False, False, 256), policy.get_source_ip_verdict(255))
+
+    def test_allow_from_source_ips(self):
+        policy = rule_runtime.compile_policy(build_document(
+            {'Effect': 'Allow', 'Action': 's3:*', 'Resource': '*', 'Condition': {'IpAddress': {'aws:SourceIp': '192.0.2.1/32'}}},
+            {'Effect': 'Allow', 'Action': 'ec2:*', 'Resource': '*', 'Condition': {'ForAnyValue:IpAddress': {'aws:SourceIp': ['192.0.2.0/31']}}}))
+        self.assertEqual((False, True, None), policy.get_source_ip_verdict(2))
+        self.assertEqual((False, False, 2), policy.get_source_ip_verdict(1))
+        self.assertEqual((False, None, None), rule_runtime.compile_policy(build_document()).get_source_ip_verdict(1))
+
+    def test_combined_verdicts_stop_at_the_denying_document(self):
+        verdicts = [rule_runtime.SourceIpVerdict(False, True, None), rule_runtime.SourceIpVerdict(False, None, 300),
+                    rule_runtime.SourceIpVerdict(True, None, None), rule_runtime.SourceIpVerdict(False, False, None)]
+        self.assertEqual((True, True, 300), rule_runtime.combine_source_ip_verdicts(iter(verdicts)))
+        self.assertEqual((False, False, None), rule_runtime.combine_source_ip_verdicts(verdicts[3:] + verdicts[:1]))
+        self.assertEqual((False, None, None), rule_runtime.combine_source_ip_verdicts([]))
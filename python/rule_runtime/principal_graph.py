@@ -0,0 +1,162 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+'''
+Graph of the IAM principals and their attached managed policies, shared by the invocations of a warm container.
+
+A burst of change notifications (e.g. a CloudFormation stack update touching hundreds of users and
+roles) evaluates many principals sharing the same groups. The graph keeps an edge list per
+principal: the users and roles are read from their configuration items, the newest one of each
+principal winning, and the groups are listed with list_attached_group_policies() once per TTL:
+
+    node = rule_runtime.PRINCIPAL_GRAPH.observe(configuration_item)
+    policy_arns = rule_runtime.PRINCIPAL_GRAPH.get_effective_policy_arns(iam_client, configuration_item)
+
+The edges of a principal are refreshed by each of its configuration items, so the graph follows
+the changes recorded by AWS Config without listing anything again. A container evaluating several
+accounts (e.g. with ASSUME_ROLE_MODE) keeps their principals apart: every node is keyed by the
+awsAccountId of its configuration item, and a group is listed with the IAM client of its account. The groups have no
+configuration item in the notifications of a user: their edges are listed again after
+PRINCIPAL_GRAPH_TTL_SECONDS, DEFAULT_TTL_SECONDS by default.
+'''
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_PRINCIPALS = 4096
+DEFAULT_TTL_SECONDS = 300
+PRINCIPAL_TYPES = {"AWS::IAM::User": "User", "AWS::IAM::Group": "Group", "AWS::IAM::Role": "Role"}
+
+
+def get_attached_policies(configuration_item):
+    """Return {policy ARN: policy name} of the attachedManagedPolicies of a user, group or role configuration item."""
+    configuration = configuration_item.get("configuration") or {}
+    return {policy["policyArn"]: policy["policyName"] for policy in configuration.get("attachedManagedPolicies") or []}
+
+
+class PrincipalNode():
+    """A principal of the graph: its attached managed policies, and its groups for a user.
+
+    Keyword arguments:
+    account_id -- the AWS account of the principal
+    principal_type -- User, Group or Role
+    name -- the name of the principal
+    policies -- {policy ARN: policy name} of the attached managed policies
+    group_names -- the names of the groups of a user (default ())
+    version -- the configurationItemCaptureTime of the configuration item of the principal, None when listed (default None)
+    expires_at -- the time.monotonic() after which a listed principal is listed again, None for a configuration item (default None)
+    """
+
+    def __init__(self, account_id, principal_type, name, policies, group_names=(), version=None, expires_at=None):
+        self.account_id = account_id
+        self.principal_type = principal_type
+        self.name = name
+        self.policies = policies
+        self.policy_arns = frozenset(policies)
+        self.group_names = tuple(group_names)
+        self.version = version
+        self.expires_at = expires_at
+
+
+class PrincipalGraph():
+    """Attached managed policies of the principals, keyed by (account, principal type, name), with hit and miss counters.
+
+    Keyword arguments:
+    max_principals -- the number of principals kept, the least recently used ones are evicted (default DEFAULT_MAX_PRINCIPALS)
+    ttl_seconds -- how long the listed policies of a group are trusted (default DEFAULT_TTL_SECONDS)
+    """
+
+    def __init__(self, max_principals=DEFAULT_MAX_PRINCIPALS, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.max_principals = max_principals
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._nodes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _put(self, node):
+        with self._lock:
+            key = (node.account_id, node.principal_type, node.name)
+            self._nodes[key] = node
+            self._nodes.move_to_end(key)
+            while len(self._nodes) > self.max_principals:
+                self._nodes.popitem(last=False)
+
+    def observe(self, configuration_item):
+        """Update the edges of the principal of a configuration item and return its PrincipalNode.
+
+        An older configuration item (e.g. a notification delivered late) does not replace a newer one.
+        """
+        account_id = configuration_item["awsAccountId"]
+        principal_type = PRINCIPAL_TYPES[configuration_item["resourceType"]]
+        name = configuration_item["resourceName"]
+        version = configuration_item.get("configurationItemCaptureTime")
+        with self._lock:
+            node = self._nodes.get((account_id, principal_type, name))
+        if node is not None and node.version is not None and version is not None and version < node.version:
+            return node
+        configuration = configuration_item.get("configuration") or {}
+        node = PrincipalNode(account_id, principal_type, name, get_attached_policies(configuration_item), configuration.get("groupList") or (), version)
+        self._put(node)
+        return node
+
+    def get_group(self, iam_client, account_id, group_name):
+        """Return the PrincipalNode of a group of an account, calling list_attached_group_policies() once per TTL.
+
+        The iam_client must be the one of account_id.
+        """
+        key = (account_id, "Group", group_name)
+        now = time.monotonic()
+        with self._lock:
+            node = self._nodes.get(key)
+            if node is not None and (node.expires_at is None or now < node.expires_at):
+                self.hits += 1
+                self._nodes.move_to_end(key)
+                return node
+            self.misses += 1
+        policies = {}
+        paginator = iam_client.get_paginator("list_attached_group_policies")
+        for page in paginator.paginate(GroupName=group_name).result_key_iters():
+            for policy in page:
+                policies[policy["PolicyArn"]] = policy["PolicyName"]
+        node = PrincipalNode(account_id, "Group", group_name, policies, expires_at=now + self.ttl_seconds)
+        self._put(node)
+        return node
+
+    def get_effective_policy_arns(self, iam_client, configuration_item, required_policy_arns=None):
+        """Return the ARNs of the managed policies attached to a principal, directly or, for a user, through its groups.
+
+        Keyword arguments:
+        iam_client -- the IAM boto client of the account of the principal, listing the policies of the groups missing from the graph
+        configuration_item -- the configurationItem of the user or role
+        required_policy_arns -- stop listing the groups once these policies are found (default None, every group)
+        """
+        node = self.observe(configuration_item)
+        policy_arns = set(node.policy_arns)
+        for group_name in node.group_names:
+            if required_policy_arns is not None and policy_arns.issuperset(required_policy_arns):
+                break
+            policy_arns.update(self.get_group(iam_client, node.account_id, group_name).policy_arns)
+        return policy_arns
+
+    def invalidate(self, account_id, principal_type, name):
+        """Drop a principal of an account, e.g. a group known to have changed."""
+        with self._lock:
+            self._nodes.pop((account_id, principal_type, name), None)
+
+    def clear(self):
+        """Drop every principal and reset the counters."""
+        with self._lock:
+            self._nodes.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "principals": len(self._nodes)}
+
+
+PRINCIPAL_GRAPH = PrincipalGraph(int(os.environ.get("PRINCIPAL_GRAPH_MAX_PRINCIPALS", DEFAULT_MAX_PRINCIPALS)),
+                                 int(os.environ.get("PRINCIPAL_GRAPH_TTL_SECONDS", DEFAULT_TTL_SECONDS)))
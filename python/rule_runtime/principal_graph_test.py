@@ -0,0 +1,78 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+import unittest
+try:
+    from unittest.mock import MagicMock, patch
+except ImportError:
+    from mock import MagicMock, patch
+
+import rule_runtime
+from rule_runtime import principal_graph
+
+ADMIN_ARN = 'arn:aws:iam::aws:policy/AdministratorAccess'
+READ_ONLY_ARN = 'arn:aws:iam::aws:policy/ReadOnlyAccess'
+ACCOUNT_ID = '123456789012'
+OTHER_ACCOUNT_ID = '210987654321'
+
+def build_configuration_item(name, policy_arns, groups=(), resource_type='AWS::IAM::User', capture_time='2018-09-07T11:24:32.476Z', account_id=ACCOUNT_ID):
+    return {'awsAccountId': account_id, 'resourceType': resource_type, 'resourceName': name, 'configurationItemCaptureTime': capture_time,
+            'configuration': {'groupList': list(groups),
+                              'attachedManagedPolicies': [{'policyArn': arn, 'policyName': arn.rsplit('/')[-1]} for arn in policy_arns]}}
+
+def build_iam_client(group_policy_arns):
+    iam_client = MagicMock()
+    iam_client.get_paginator.return_value.paginate.side_effect = lambda GroupName: MagicMock(**{
+        'result_key_iters.return_value': [[{'PolicyArn': arn, 'PolicyName': arn.rsplit('/')[-1]} for arn in group_policy_arns[GroupName]]]})
+    return iam_client
+
+class TestPrincipalGraph(unittest.TestCase):
+    def setUp(self):
+        self.graph = rule_runtime.PrincipalGraph(ttl_seconds=60)
+
+    def test_group_listed_once_per_ttl(self):
+        iam_client = build_iam_client({'admins': [ADMIN_ARN], 'readers': [READ_ONLY_ARN]})
+        for name in ('user-1', 'user-2'):
+            self.assertEqual({ADMIN_ARN, READ_ONLY_ARN},
+                             self.graph.get_effective_policy_arns(iam_client, build_configuration_item(name, [], ['admins', 'readers'])))
+        self.assertEqual(2, iam_client.get_paginator.return_value.paginate.call_count)
+        self.assertEqual({'hits': 2, 'misses': 2, 'principals': 4}, self.graph.stats())
+        with patch.object(principal_graph.time, 'monotonic', MagicMock(return_value=principal_graph.time.monotonic() + 60)):
+            self.graph.get_effective_policy_arns(iam_client, build_configuration_item('user-1', [], ['admins']))
+        self.assertEqual(3, iam_client.get_paginator.return_value.paginate.call_count)
+
+    def test_groups_not_listed_once_required_policies_found(self):
+        iam_client = build_iam_client({'admins': [ADMIN_ARN]})
+        self.assertEqual({ADMIN_ARN}, self.graph.get_effective_policy_arns(iam_client, build_configuration_item('user-1', [ADMIN_ARN], ['admins']), [ADMIN_ARN]))
+        iam_client.get_paginator.assert_not_called()
+
+    def test_newest_configuration_item_wins(self):
+        self.graph.observe(build_configuration_item('role-1', [ADMIN_ARN], resource_type='AWS::IAM::Role', capture_time='2018-09-07T12:00:00.000Z'))
+        node = self.graph.observe(build_configuration_item('role-1', [], resource_type='AWS::IAM::Role', capture_time='2018-09-07T11:00:00.000Z'))
+        self.assertEqual(frozenset([ADMIN_ARN]), node.policy_arns)
+        node = self.graph.observe(build_configuration_item('role-1', [READ_ONLY_ARN], resource_type='AWS::IAM::Role', capture_time='2018-09-07T13:00:00.000Z'))
+        self.assertEqual(frozenset([READ_ONLY_ARN]), node.policy_arns)
+
+    def test_accounts_kept_apart(self):
+        iam_client = build_iam_client({'Admins': [ADMIN_ARN]})
+        other_iam_client = build_iam_client({'Admins': [READ_ONLY_ARN]})
+        self.assertEqual({ADMIN_ARN}, self.graph.get_effective_policy_arns(iam_client, build_configuration_item('alice', [], ['Admins'])))
+        self.assertEqual({READ_ONLY_ARN}, self.graph.get_effective_policy_arns(
+            other_iam_client, build_configuration_item('alice', [], ['Admins'], account_id=OTHER_ACCOUNT_ID)))
+        other_iam_client.get_paginator.return_value.paginate.assert_called_once_with(GroupName='Admins')
+        node = self.graph.observe(build_configuration_item('role-1', [ADMIN_ARN], resource_type='AWS::IAM::Role', capture_time='2018-09-07T12:00:00.000Z'))
+        self.assertEqual(ACCOUNT_ID, node.account_id)
+        node = self.graph.observe(build_configuration_item('role-1', [], resource_type='AWS::IAM::Role', capture_time='2018-09-07T11:00:00.000Z', account_id=OTHER_ACCOUNT_ID))
+        self.assertEqual((OTHER_ACCOUNT_ID, frozenset()), (node.account_id, node.policy_arns))
+
+    def test_least_recently_used_principals_evicted(self):
+        graph = rule_runtime.PrincipalGraph(max_principals=2)
+        iam_client = build_iam_client({'admins': [ADMIN_ARN]})
+        graph.get_group(iam_client, ACCOUNT_ID, 'admins')
+        graph.observe(build_configuration_item('user-1', []))
+        graph.get_group(iam_client, ACCOUNT_ID, 'admins')
+        graph.observe(build_configuration_item('user-2', []))
+        graph.invalidate(ACCOUNT_ID, 'User', 'user-2')
+        self.assertEqual({'hits': 1, 'misses': 1, 'principals': 1}, graph.stats())
+        graph.get_group(iam_client, ACCOUNT_ID, 'admins')
+        self.assertEqual(1, iam_client.get_paginator.return_value.paginate.call_count)
@@ -0,0 +1,44 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+'''
+Token bucket pacing the calls of the threads of a container to an AWS service.
+
+Each service quota gets one RateLimiter per container, shared by every client of the service, so
+the number of workers does not change the pace of the calls:
+
+    RATE_LIMITER = rule_runtime.RateLimiter(float(os.environ.get("IAM_CALLS_PER_SECOND", 100)))
+    RATE_LIMITER.acquire()
+    iam_client.list_access_keys(UserName=user_name)
+'''
+
+import threading
+import time
+
+
+class RateLimiter():
+    """Token bucket shared by threads: acquire() blocks until a call is allowed.
+
+    Keyword arguments:
+    rate -- the number of calls allowed per second
+    burst -- the number of calls allowed at once after an idle period (default: rate)
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self._tokens = self.burst
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
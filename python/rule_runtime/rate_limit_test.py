@@ -0,0 +1,15 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+import time
+import unittest
+
+import rule_runtime
+
+class TestRateLimiter(unittest.TestCase):
+    def test_calls_are_paced(self):
+        rate_limiter = rule_runtime.RateLimiter(50, burst=1)
+        start = time.monotonic()
+        for _ in range(6):
+            rate_limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
@@ -0,0 +1,140 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+'''
+Security posture of the Redshift clusters, shared by the five Redshift rules.
+
+REDSHIFT_SSL_REQUIRED, REDSHIFT_FIPS_REQUIRED, REDSHIFT_AUDIT_ENABLED, REDSHIFT_DB_ENCRYPTED and
+REDSHIFT_USER_ACTIVITY_MONITORING_ENABLED all need the same facts of each cluster: its SSL, FIPS and
+user activity logging parameters, whether it is encrypted and whether audit logging is enabled. One
+pass collects them for every rule:
+
+    for cluster_id, posture in rule_runtime.get_redshift_posture(redshift_client, event["accountId"]):
+        if not posture["require_ssl"]:
+            ...
+
+The parameters of a parameter group are described once per pass, however many clusters share it;
+whether they are applied is read from each cluster. Every Redshift call is paced by a RateLimiter
+shared by the container, DEFAULT_REDSHIFT_CALLS_PER_SECOND by default or the
+REDSHIFT_CALLS_PER_SECOND environment variable of the Lambda function.
+
+Each rule reports through its own ResultToken, so one invocation cannot report for the others.
+When the REDSHIFT_POSTURE_TTL_SECONDS environment variable is set, the first rule to run saves its
+pass in the DynamoDB table of CHECKPOINT_TABLE (see rule_runtime.checkpoint) and the other rules of
+the account and region read it back for that many seconds instead of describing the clusters again.
+Each rule is its own Lambda function: without the table, a pass saved under /tmp would never be
+read by the other rules, so it is not saved.
+'''
+
+import os
+import time
+
+from rule_runtime.rate_limit import RateLimiter
+from rule_runtime.checkpoint import get_resumable_store
+
+CLUSTERS_PAGE_SIZE = 50
+# The THROTTLE_PERIOD of 0.5 second the rules used to sleep after each call
+DEFAULT_REDSHIFT_CALLS_PER_SECOND = 2
+DEFAULT_TTL_SECONDS = 0
+POSTURE_PARAMETERS = ("require_ssl", "use_fips_ssl", "enable_user_activity_logging")
+POSTURE_KEY_PREFIX = "redshift-posture"
+
+REDSHIFT_RATE_LIMITER = RateLimiter(float(os.environ.get("REDSHIFT_CALLS_PER_SECOND", DEFAULT_REDSHIFT_CALLS_PER_SECOND)))
+
+
+def get_non_synced_params_list(cluster_parameter_groups):
+    """Return the names of the parameters not applied yet to a cluster, from its ClusterParameterGroups."""
+    return [status["ParameterName"]
+            for parameter_group in cluster_parameter_groups
+            for status in parameter_group["ClusterParameterStatusList"]
+            if status["ParameterApplyStatus"] != "in-sync"]
+
+
+class RedshiftPostureCollector():
+    """Collects the posture of every cluster of a Redshift boto client, caching the parameters of each group during a pass.
+
+    Keyword arguments:
+    rate_limiter -- the RateLimiter pacing the Redshift calls (default REDSHIFT_RATE_LIMITER)
+    """
+
+    def __init__(self, rate_limiter=None):
+        self.rate_limiter = rate_limiter or REDSHIFT_RATE_LIMITER
+        self.calls = 0
+
+    def _call(self, operation, **kwargs):
+        self.rate_limiter.acquire()
+        self.calls += 1
+        return operation(**kwargs)
+
+    def describe_parameter_values(self, redshift_client, parameter_group_name):
+        """Return the ParameterValue of the posture parameters of a parameter group, by ParameterName."""
+        values = {}
+        kwargs = {"ParameterGroupName": parameter_group_name}
+        while True:
+            response = self._call(redshift_client.describe_cluster_parameters, **kwargs)
+            for parameter in response["Parameters"]:
+                if parameter["ParameterName"] in POSTURE_PARAMETERS:
+                    values[parameter["ParameterName"]] = parameter.get("ParameterValue")
+            if not response.get("Marker"):
+                return values
+            kwargs["Marker"] = response["Marker"]
+
+    def iter_clusters(self, redshift_client):
+        pages = iter(redshift_client.get_paginator("describe_clusters").paginate(PaginationConfig={"PageSize": CLUSTERS_PAGE_SIZE}))
+        while True:
+            self.rate_limiter.acquire()
+            page = next(pages, None)
+            if page is None:
+                return
+            self.calls += 1
+            for cluster in page["Clusters"]:
+                yield cluster
+
+    def collect(self, redshift_client):
+        """Return a (ClusterIdentifier, posture) tuple per cluster.
+
+        The posture maps require_ssl, use_fips_ssl and enable_user_activity_logging (when the parameter
+        group has them) to True if the parameter is true and applied, and db_encrypted and log_enabled
+        to the Encrypted flag and the LoggingEnabled status of the cluster.
+        """
+        group_values = {}
+        clusters = []
+        for cluster in self.iter_clusters(redshift_client):
+            parameter_groups = cluster["ClusterParameterGroups"]
+            group_name = parameter_groups[0]["ParameterGroupName"]
+            if group_name not in group_values:
+                group_values[group_name] = self.describe_parameter_values(redshift_client, group_name)
+            sync_list = get_non_synced_params_list(parameter_groups)
+            posture = {parameter_name: value == "true" and parameter_name not in sync_list
+                       for parameter_name, value in group_values[group_name].items()}
+            posture["db_encrypted"] = cluster["Encrypted"]
+            logging_status = self._call(redshift_client.describe_logging_status, ClusterIdentifier=cluster["ClusterIdentifier"])
+            posture["log_enabled"] = logging_status["LoggingEnabled"]
+            clusters.append((cluster["ClusterIdentifier"], posture))
+        return clusters
+
+
+def get_redshift_posture(redshift_client, account_id=None, ttl_seconds=None, store=None):
+    """Return the (ClusterIdentifier, posture) of every cluster, read from a recent pass of another rule when allowed.
+
+    Keyword arguments:
+    redshift_client -- the Redshift boto client of the account and region
+    account_id -- the account of the client, part of the key of the saved pass (default None)
+    ttl_seconds -- how long a saved pass is read back (default None, the REDSHIFT_POSTURE_TTL_SECONDS environment variable or 0, not saved)
+    store -- the store of the saved passes (default None, the DynamoDB table of CHECKPOINT_TABLE)
+    """
+    if ttl_seconds is None:
+        ttl_seconds = int(os.environ.get("REDSHIFT_POSTURE_TTL_SECONDS", DEFAULT_TTL_SECONDS))
+    if ttl_seconds <= 0:
+        return RedshiftPostureCollector().collect(redshift_client)
+    store = store or get_resumable_store()
+    if store is None:
+        print("REDSHIFT_POSTURE_TTL_SECONDS is set without CHECKPOINT_TABLE: the pass is not shared with the other Redshift rules.")
+        return RedshiftPostureCollector().collect(redshift_client)
+    key = "#".join([POSTURE_KEY_PREFIX, str(redshift_client.meta.region_name), str(account_id)])
+    state = store.load(key)
+    if state and time.time() < state["CollectedAt"] + ttl_seconds:
+        return [(cluster_id, posture) for cluster_id, posture in state["Clusters"]]
+    clusters = RedshiftPostureCollector().collect(redshift_client)
+    store.save(key, {"CollectedAt": time.time(), "Clusters": clusters})
+    return clusters
@@ -0,0 +1,86 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+import os
+import shutil
+import tempfile
+import unittest
+try:
+    from unittest.mock import MagicMock, patch
+except ImportError:
+    from mock import MagicMock, patch
+
+import rule_runtime
+from rule_runtime import redshift
+
+class NoLimit():
+    def acquire(self):
+        pass
+
+def build_cluster(cluster_id, group_name, encrypted=True, pending_parameters=()):
+    statuses = [{'ParameterName': parameter_name, 'ParameterApplyStatus': 'pending-reboot' if parameter_name in pending_parameters else 'in-sync'}
+                for parameter_name in ('require_ssl', 'use_fips_ssl')]
+    return {'ClusterIdentifier': cluster_id, 'Encrypted': encrypted,
+            'ClusterParameterGroups': [{'ParameterGroupName': group_name, 'ParameterApplyStatus': 'in-sync', 'ClusterParameterStatusList': statuses}]}
+
+def build_redshift_client(pages, values_by_group):
+    redshift_client = MagicMock()
+    redshift_client.meta.region_name = 'us-east-1'
+    redshift_client.get_paginator.return_value.paginate.return_value = pages
+    redshift_client.describe_cluster_parameters = MagicMock(side_effect=lambda ParameterGroupName: {'Parameters': [
+        {'ParameterName': parameter_name, 'ParameterValue': value} for parameter_name, value in values_by_group[ParameterGroupName].items()]})
+    redshift_client.describe_logging_status = MagicMock(side_effect=lambda ClusterIdentifier: {'LoggingEnabled': ClusterIdentifier != 'c3'})
+    return redshift_client
+
+class TestRedshiftPostureCollector(unittest.TestCase):
+    def setUp(self):
+        self.redshift_client = build_redshift_client(
+            [{'Clusters': [build_cluster('c1', 'secure'), build_cluster('c2', 'secure', pending_parameters=['use_fips_ssl'])]},
+             {'Clusters': [build_cluster('c3', 'default.redshift-1.0', encrypted=False)]}],
+            {'secure': {'require_ssl': 'true', 'use_fips_ssl': 'true', 'datestyle': 'ISO, MDY'},
+             'default.redshift-1.0': {'require_ssl': 'false', 'use_fips_ssl': 'false', 'enable_user_activity_logging': 'false'}})
+
+    def test_posture_of_every_cluster(self):
+        collector = rule_runtime.RedshiftPostureCollector(rate_limiter=NoLimit())
+        clusters = dict(collector.collect(self.redshift_client))
+        self.assertEqual({'require_ssl': True, 'use_fips_ssl': True, 'db_encrypted': True, 'log_enabled': True}, clusters['c1'])
+        # A parameter not applied yet to a cluster does not count
+        self.assertFalse(clusters['c2']['use_fips_ssl'])
+        self.assertEqual({'require_ssl': False, 'use_fips_ssl': False, 'enable_user_activity_logging': False, 'db_encrypted': False,
+                          'log_enabled': False}, clusters['c3'])
+
+    def test_parameter_group_described_once(self):
+        collector = rule_runtime.RedshiftPostureCollector(rate_limiter=NoLimit())
+        collector.collect(self.redshift_client)
+        self.assertEqual(['secure', 'default.redshift-1.0'],
+                         [call[1]['ParameterGroupName'] for call in self.redshift_client.describe_cluster_parameters.call_args_list])
+        self.assertEqual(3, self.redshift_client.describe_logging_status.call_count)
+        self.assertEqual(7, collector.calls)
+
+class TestGetRedshiftPosture(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = rule_runtime.LocalFileStore(self.directory)
+        self.redshift_client = build_redshift_client([{'Clusters': [build_cluster('c1', 'secure')]}], {'secure': {'require_ssl': 'true'}})
+        self.no_limit = patch.object(redshift, 'REDSHIFT_RATE_LIMITER', NoLimit())
+        self.no_limit.start()
+
+    def tearDown(self):
+        self.no_limit.stop()
+        shutil.rmtree(self.directory)
+
+    def test_pass_saved_and_read_back_by_the_next_rules(self):
+        clusters = rule_runtime.get_redshift_posture(self.redshift_client, '123456789012', ttl_seconds=60, store=self.store)
+        self.assertEqual(clusters, rule_runtime.get_redshift_posture(self.redshift_client, '123456789012', ttl_seconds=60, store=self.store))
+        self.assertEqual(1, self.redshift_client.describe_logging_status.call_count)
+        # Another account, or an expired pass, is described again
+        rule_runtime.get_redshift_posture(self.redshift_client, '210987654321', ttl_seconds=60, store=self.store)
+        rule_runtime.get_redshift_posture(self.redshift_client, '123456789012', ttl_seconds=0, store=self.store)
+        self.assertEqual(3, self.redshift_client.describe_logging_status.call_count)
+
+    def test_pass_not_saved_without_checkpoint_table(self):
+        # Each Redshift rule is its own Lambda function: a pass saved under /tmp would never be read by the others
+        with patch.dict(os.environ, {'CHECKPOINT_TABLE': ''}):
+            rule_runtime.get_redshift_posture(self.redshift_client, '123456789012', ttl_seconds=60)
+            rule_runtime.get_redshift_posture(self.redshift_client, '123456789012', ttl_seconds=60)
+        self.assertEqual(2, self.redshift_client.describe_logging_status.call_count)
@@ -0,0 +1,118 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+'''
+Multi-region fan-out of periodic rules.
+
+With multi_region_mode, one scheduled invocation runs evaluate_compliance() once per enabled
+region of the account, concurrently. Each call runs inside region_scope(region), so the clients
+it builds with get_client(service, event) are scoped to that region without changing the rule.
+The evaluations of a region are sent to AWS Config as soon as the region finishes.
+
+The evaluations of every region are reported to the Config rule of the region of the Lambda
+function, so the rule must report resource ids which are unique across regions (ARNs, URLs,
+VPC ids...).
+'''
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from rule_runtime.clients import get_client, region_scope
+from rule_runtime.evaluations import build_evaluation, iter_stale_evaluations
+from rule_runtime.submitter import EvaluationSubmitter, submit_evaluations
+
+DEFAULT_REGION_WORKERS = 8
+OPT_IN_STATUS_FILTER = [{"Name": "opt-in-status", "Values": ["opt-in-not-required", "opted-in"]}]
+
+
+def get_enabled_regions(event, assume_role_mode=False):
+    """Return the sorted names of the regions enabled in the account."""
+    ec2_client = get_client("ec2", event, assume_role_mode=assume_role_mode)
+    response = ec2_client.describe_regions(Filters=OPT_IN_STATUS_FILTER)
+    return sorted(region["RegionName"] for region in response["Regions"])
+
+
+def iter_region_results(evaluate_region, regions, max_workers=DEFAULT_REGION_WORKERS):
+    """Yield (region, result, exception) tuples as each region finishes.
+
+    Keyword arguments:
+    evaluate_region -- a function of the region name, called inside region_scope(region)
+    regions -- the names of the regions to evaluate
+    max_workers -- the number of regions evaluated concurrently (default DEFAULT_REGION_WORKERS)
+    """
+    def run_in_region(region):
+        with region_scope(region):
+            return evaluate_region(region)
+
+    if not regions:
+        return
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(regions))) as executor:
+        futures = {executor.submit(run_in_region, region): region for region in regions}
+        for future in as_completed(futures):
+            exception = future.exception()
+            yield futures[future], None if exception else future.result(), exception
+
+
+def to_evaluation_list(compliance_result, region):
+    """Return the evaluations of a region from the output of evaluate_compliance()."""
+    if not compliance_result:
+        return []
+    if isinstance(compliance_result, dict):
+        return [compliance_result]
+    if isinstance(compliance_result, list):
+        return compliance_result
+    print("Ignoring the result of region {}: a list of evaluations is expected in multi-region mode, got {}.".format(region, compliance_result))
+    return []
+
+
+def evaluate_all_regions(event, config_client, evaluate_region, default_resource_type, regions, result_token, test_mode=False,
+                         is_valid_evaluation=None, max_workers=DEFAULT_REGION_WORKERS):
+    """Evaluate every region, stream the evaluations to AWS Config and return them (the stale ones in test mode only).
+
+    The old evaluations missing from the latest ones are only cleaned up when every region
+    succeeded: a failing region must not turn the evaluations of its resources NOT_APPLICABLE.
+    The first error of a region is raised once the other regions have been reported.
+
+    Keyword arguments:
+    event -- the event variable given in the lambda handler
+    config_client -- the AWS Config boto client of the region of the Lambda function
+    evaluate_region -- a function of the region name returning the output of evaluate_compliance()
+    default_resource_type -- the DEFAULT_RESOURCE_TYPE of the rule
+    regions -- the names of the regions to evaluate
+    result_token -- the resultToken of the event
+    test_mode -- the TestMode of PutEvaluations (default False)
+    is_valid_evaluation -- a filter applied on the evaluations returned by the rule (default None)
+    max_workers -- the number of regions evaluated concurrently (default DEFAULT_REGION_WORKERS)
+    """
+    latest_evaluations = []
+    region_errors = []
+    with EvaluationSubmitter(config_client, result_token, test_mode) as submitter:
+        for region, compliance_result, exception in iter_region_results(evaluate_region, regions, max_workers):
+            if exception:
+                print("Evaluation of region {} failed: {}".format(region, exception))
+                region_errors.append(exception)
+                continue
+            region_evaluations = [evaluation for evaluation in to_evaluation_list(compliance_result, region)
+                                  if not is_valid_evaluation or is_valid_evaluation(evaluation)]
+            print("Region {}: {} evaluations".format(region, len(region_evaluations)))
+            submitter.submit(region_evaluations)
+            latest_evaluations.extend(region_evaluations)
+
+        if not region_errors and not latest_evaluations:
+            account_evaluation = build_evaluation(event["accountId"], "NOT_APPLICABLE", event, "AWS::::Account")
+            submitter.submit([account_evaluation])
+            latest_evaluations.append(account_evaluation)
+
+    stale_evaluations = []
+    if not region_errors:
+        # The old results are paged once every latest evaluation is sent: a put made while paging would change the result set
+        stale_evaluations = iter_stale_evaluations(config_client, latest_evaluations, event, default_resource_type)
+        if test_mode:
+            # Used solely for RDK test to also return the stale evaluations
+            stale_evaluations = list(stale_evaluations)
+        submit_evaluations(config_client, stale_evaluations, result_token, test_mode)
+
+    if region_errors:
+        raise region_errors[0]
+    if not test_mode:
+        return latest_evaluations
+    return latest_evaluations + stale_evaluations
@@ -0,0 +1,129 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+import json
+import sys
+import threading
+import unittest
+try:
+    from unittest.mock import MagicMock, patch
+except ImportError:
+    from mock import MagicMock, patch
+from botocore.exceptions import ClientError
+
+import rule_runtime
+
+DEFAULT_RESOURCE_TYPE = 'AWS::SQS::Queue'
+REGIONS = ['eu-west-1', 'us-east-1', 'us-west-2']
+
+CONFIG_CLIENT_MOCK = MagicMock()
+EC2_CLIENT_MOCK = MagicMock()
+SQS_CLIENT_MOCKS = {}
+CLIENT_REGIONS = []
+
+class Boto3Mock():
+    @staticmethod
+    def client(client_name, region=None, *args, **kwargs):
+        CLIENT_REGIONS.append((client_name, region))
+        if client_name == 'config':
+            return CONFIG_CLIENT_MOCK
+        if client_name == 'ec2':
+            return EC2_CLIENT_MOCK
+        if client_name == 'sqs':
+            return SQS_CLIENT_MOCKS.setdefault(region, MagicMock(region=region))
+        raise Exception("Attempting to create an unknown client")
+
+def evaluate_compliance(event, configuration_item, valid_rule_parameters):
+    sqs_client = rule_runtime.get_client('sqs', event)
+    if sqs_client.region == 'us-west-2':
+        return None
+    return [rule_runtime.build_evaluation('https://sqs.{}.amazonaws.com/123456789012/queue'.format(sqs_client.region), 'COMPLIANT', event, DEFAULT_RESOURCE_TYPE)]
+
+class TestMultiRegion(unittest.TestCase):
+    def setUp(self):
+        CONFIG_CLIENT_MOCK.reset_mock()
+        CONFIG_CLIENT_MOCK.get_compliance_details_by_config_rule = MagicMock(return_value={'EvaluationResults': [
+            {'EvaluationResultIdentifier': {'EvaluationResultQualifier': {'ResourceId': 'https://sqs.us-west-2.amazonaws.com/123456789012/deleted', 'ResourceType': DEFAULT_RESOURCE_TYPE}}}]})
+        EC2_CLIENT_MOCK.describe_regions = MagicMock(return_value={'Regions': [{'RegionName': region} for region in reversed(REGIONS)]})
+        SQS_CLIENT_MOCKS.clear()
+        del CLIENT_REGIONS[:]
+        self.boto3_patch = patch.dict(sys.modules, {'boto3': Boto3Mock()})
+        self.boto3_patch.start()
+        rule_runtime.clear_client_cache()
+
+    def tearDown(self):
+        self.boto3_patch.stop()
+
+    def test_enabled_regions(self):
+        self.assertEqual(REGIONS, rule_runtime.get_enabled_regions(build_lambda_scheduled_event()))
+        EC2_CLIENT_MOCK.describe_regions.assert_called_with(Filters=[{'Name': 'opt-in-status', 'Values': ['opt-in-not-required', 'opted-in']}])
+
+    def test_all_regions_evaluated(self):
+        response = rule_runtime.lambda_handler(build_lambda_scheduled_event(), {}, evaluate_compliance, evaluate_parameters=lambda params: params,
+                                               default_resource_type=DEFAULT_RESOURCE_TYPE, multi_region_mode=True)
+        self.assertEqual(sorted(REGIONS), sorted(SQS_CLIENT_MOCKS))
+        sent_evaluations = [evaluation for call in CONFIG_CLIENT_MOCK.put_evaluations.call_args_list for evaluation in call[1]['Evaluations']]
+        self.assertEqual([('https://sqs.eu-west-1.amazonaws.com/123456789012/queue', 'COMPLIANT'),
+                          ('https://sqs.us-east-1.amazonaws.com/123456789012/queue', 'COMPLIANT'),
+                          ('https://sqs.us-west-2.amazonaws.com/123456789012/deleted', 'NOT_APPLICABLE')],
+                         sorted((evaluation['ComplianceResourceId'], evaluation['ComplianceType']) for evaluation in sent_evaluations))
+        # The stale evaluations are streamed to AWS Config, not kept for the return value
+        self.assertEqual(2, len(response))
+        self.assertIn(('config', None), CLIENT_REGIONS)
+
+    def test_given_regions(self):
+        rule_runtime.lambda_handler(build_lambda_scheduled_event(), {}, evaluate_compliance, evaluate_parameters=lambda params: params,
+                                    default_resource_type=DEFAULT_RESOURCE_TYPE, multi_region_mode=True, regions=['eu-west-1'])
+        EC2_CLIENT_MOCK.describe_regions.assert_not_called()
+        self.assertEqual(['eu-west-1'], list(SQS_CLIENT_MOCKS))
+
+    def test_failing_region_skips_clean_up(self):
+        def failing_evaluate_compliance(event, configuration_item, valid_rule_parameters):
+            if rule_runtime.current_region() == 'us-east-1':
+                raise ClientError({'Error': {'Code': 'AccessDenied', 'Message': 'denied'}}, 'ListQueues')
+            return evaluate_compliance(event, configuration_item, valid_rule_parameters)
+        response = rule_runtime.lambda_handler(build_lambda_scheduled_event(), {}, failing_evaluate_compliance, evaluate_parameters=lambda params: params,
+                                               default_resource_type=DEFAULT_RESOURCE_TYPE, multi_region_mode=True)
+        self.assertEqual('AccessDenied', response['customerErrorCode'])
+        CONFIG_CLIENT_MOCK.get_compliance_details_by_config_rule.assert_not_called()
+        self.assertEqual(1, sum(len(call[1]['Evaluations']) for call in CONFIG_CLIENT_MOCK.put_evaluations.call_args_list))
+
+    def test_no_resource_in_any_region(self):
+        CONFIG_CLIENT_MOCK.get_compliance_details_by_config_rule = MagicMock(return_value={'EvaluationResults': []})
+        response = rule_runtime.lambda_handler(build_lambda_scheduled_event(), {}, lambda event, configuration_item: None,
+                                               default_resource_type=DEFAULT_RESOURCE_TYPE, multi_region_mode=True)
+        self.assertEqual([('123456789012', 'AWS::::Account', 'NOT_APPLICABLE')],
+                         [(evaluation['ComplianceResourceId'], evaluation['ComplianceResourceType'], evaluation['ComplianceType']) for evaluation in response])
+
+    def test_configuration_change_not_fanned_out(self):
+        evaluate = MagicMock(return_value='COMPLIANT')
+        invoking_event = {"messageType": "ConfigurationItemChangeNotification", "notificationCreationTime": "2018-07-02T23:05:34.445Z",
+                          "configurationItem": {"configurationItemStatus": "OK", "resourceType": DEFAULT_RESOURCE_TYPE, "resourceId": "queue",
+                                                "configurationItemCaptureTime": "2018-07-02T03:37:52.418Z"}}
+        event = build_lambda_scheduled_event()
+        event['invokingEvent'] = json.dumps(invoking_event)
+        rule_runtime.lambda_handler(event, {}, evaluate, multi_region_mode=True)
+        self.assertEqual(1, evaluate.call_count)
+        EC2_CLIENT_MOCK.describe_regions.assert_not_called()
+
+    def test_region_scope_is_per_thread(self):
+        seen = []
+        with rule_runtime.region_scope('eu-west-1'):
+            thread = threading.Thread(target=lambda: seen.append(rule_runtime.current_region()))
+            thread.start()
+            thread.join()
+            self.assertEqual('eu-west-1', rule_runtime.current_region())
+        self.assertEqual([None], seen)
+        self.assertIsNone(rule_runtime.current_region())
+
+def build_lambda_scheduled_event():
+    invoking_event = '{"messageType":"ScheduledNotification","notificationCreationTime":"2017-12-23T22:11:18.158Z"}'
+    return {
+        'configRuleName':'myrule',
+        'executionRoleArn':'roleArn',
+        'eventLeftScope': False,
+        'invokingEvent': invoking_event,
+        'accountId': '123456789012',
+        'configRuleArn': 'arn:aws:config:us-east-1:123456789012:config-rule/config-rule-8fngan',
+        'resultToken':'token'
+    }
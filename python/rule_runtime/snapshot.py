@@ -0,0 +1,397 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+'''
+Offline evaluation of the change-triggered rules over an AWS Config snapshot.
+
+The rules triggered by configuration changes only need the configuration item. This module
+streams the configuration items of a snapshot file (the JSON, or .json.gz, delivered by AWS
+Config to S3), routes each of them to every rule whose SourceEvents include its resource type,
+runs the evaluate_compliance() of the rules in a pool of processes and writes one JSON line per
+evaluation:
+
+    python -m rule_runtime.snapshot snapshot.json.gz --output evaluations.jsonl
+    python -m rule_runtime.snapshot snapshot.json --rules EC2_SECURITY_GROUP_BADINGRESS LAMBDA_DLQ_CHECK --workers 8
+
+Run it from the python directory of this repository. By default every rule with SourceEvents in
+its parameters.json is evaluated, with its InputParameters, whether it also has a SourcePeriodic
+or not. The rules
+are imported as they are, whether they use rule_runtime or not. No AWS call is made: a rule
+calling an API fails on the configuration item and the error is written in its line. A rule
+defining evaluate_compliance_batch() gets all the items of a batch in one call.
+'''
+
+import argparse
+import collections
+import gzip
+import importlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from rule_runtime.handler import has_missing_fields, is_applicable
+
+PYTHON_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+DEFAULT_BATCH_SIZE = 500
+READ_CHUNK_SIZE = 1 << 20
+CHANGE_MESSAGE_TYPE = "ConfigurationItemChangeNotification"
+
+# Rules loaded by the initializer of each worker process, by rule name
+_WORKER_RULES = {}
+
+
+class OfflineError(Exception):
+    pass
+
+
+class RuleSpec():
+    """A change-triggered rule: its name, directory, resource types and rule parameters."""
+
+    def __init__(self, name, rule_dir, resource_types, rule_parameters=None):
+        self.name = name
+        self.rule_dir = rule_dir
+        self.resource_types = resource_types
+        self.rule_parameters = rule_parameters or {}
+
+
+def discover_rules(python_dir=PYTHON_DIR, rule_names=None):
+    """Return the RuleSpec of the change-triggered rules of python_dir, or of the given rule names only."""
+    specs = []
+    for name in sorted(rule_names or os.listdir(python_dir)):
+        parameters_path = os.path.join(python_dir, name, "parameters.json")
+        if not os.path.isfile(parameters_path):
+            if rule_names:
+                raise ValueError("{} has no parameters.json.".format(name))
+            continue
+        with open(parameters_path) as parameters_file:
+            parameters = json.load(parameters_file)["Parameters"]
+        if not parameters.get("SourceEvents"):
+            if rule_names:
+                raise ValueError("{} is not a change-triggered rule.".format(name))
+            continue
+        resource_types = [resource_type.strip() for resource_type in parameters["SourceEvents"].split(",")]
+        specs.append(RuleSpec(name, os.path.join(python_dir, name), resource_types, json.loads(parameters.get("InputParameters") or "{}")))
+    return specs
+
+
+def iter_snapshot_items(path, chunk_size=READ_CHUNK_SIZE):
+    """Yield the configuration items of a snapshot file, holding at most one chunk and one item in memory.
+
+    Keyword arguments:
+    path -- the snapshot file, gzip compressed if its name ends with .gz
+    chunk_size -- the number of characters read at once (default READ_CHUNK_SIZE)
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    decoder = json.JSONDecoder()
+    with opener(path, "rt", encoding="utf-8") as snapshot_file:
+        buffer = ""
+        position = -1
+        # Skip the header of the snapshot, up to the array of configuration items
+        while position < 0:
+            chunk = snapshot_file.read(chunk_size)
+            if not chunk:
+                raise ValueError("{} has no configurationItems.".format(path))
+            buffer += chunk
+            key_position = buffer.find('"configurationItems"')
+            if key_position >= 0:
+                position = buffer.find("[", key_position)
+        position += 1
+        end_of_file = False
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position < len(buffer):
+                if buffer[position] == "]":
+                    return
+                try:
+                    item, position = decoder.raw_decode(buffer, position)
+                    yield item
+                    continue
+                except ValueError:
+                    # The item goes on in the next chunk
+                    pass
+            if end_of_file:
+                raise ValueError("{} is truncated or invalid.".format(path))
+            chunk = snapshot_file.read(chunk_size)
+            end_of_file = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+
+
+def block_aws_calls():
+    """Make every boto3 API call fail with an OfflineError in this process."""
+    try:
+        import boto3
+    except ImportError:
+        return
+
+    def refuse_client(service, *args, **kwargs):
+        # Failing before the client is built saves its creation on every configuration item
+        raise OfflineError("The offline evaluation cannot create a {} client.".format(service))
+
+    def refuse_call(model, **kwargs):
+        raise OfflineError("The offline evaluation cannot call {}.".format(model.name))
+
+    boto3.client = refuse_client
+    boto3.setup_default_session()
+    boto3.DEFAULT_SESSION.events.register("before-call", refuse_call)
+
+
+def init_worker(rule_specs, verbose=False):
+    """Import the rules and validate their parameters once per worker process."""
+    if not verbose:
+        # The rules print on every evaluation
+        sys.stdout = open(os.devnull, "w")
+    block_aws_calls()
+    for path in [PYTHON_DIR] + [spec.rule_dir for spec in rule_specs]:
+        if path not in sys.path:
+            sys.path.append(path)
+    for spec in rule_specs:
+        try:
+            rule = importlib.import_module(spec.name)
+            valid_rule_parameters = rule.evaluate_parameters(spec.rule_parameters) if hasattr(rule, "evaluate_parameters") else None
+            _WORKER_RULES[spec.name] = (rule, valid_rule_parameters, None)
+        except Exception as ex:
+            _WORKER_RULES[spec.name] = (None, None, "Cannot load the rule: {!r}".format(ex))
+
+
+def build_change_event(rule_name, configuration_item, rule_parameters):
+    invoking_event = {
+        "messageType": CHANGE_MESSAGE_TYPE,
+        "notificationCreationTime": configuration_item.get("configurationItemCaptureTime"),
+    }
+    return {
+        "configRuleName": rule_name,
+        "executionRoleArn": "",
+        "eventLeftScope": False,
+        "invokingEvent": json.dumps(invoking_event),
+        "ruleParameters": json.dumps(rule_parameters),
+        "accountId": configuration_item.get("awsAccountId"),
+        "resultToken": "TESTMODE",
+    }
+
+
+def build_record(rule_name, configuration_item, compliance_type=None, evaluation=None, error=None):
+    record = {
+        "ConfigRuleName": rule_name,
+        "AwsAccountId": configuration_item.get("awsAccountId"),
+        "AwsRegion": configuration_item.get("awsRegion"),
+        "ComplianceResourceType": configuration_item.get("resourceType"),
+        "ComplianceResourceId": configuration_item.get("resourceId"),
+    }
+    if evaluation:
+        record.update(evaluation)
+    if compliance_type:
+        record["ComplianceType"] = compliance_type
+    if error:
+        record["Error"] = error
+    return record
+
+
+def evaluate_item(spec, configuration_item):
+    """Return the records of the evaluation of a configuration item by a rule, like lambda_handler() would report them."""
+    rule, valid_rule_parameters, load_error = _WORKER_RULES[spec.name]
+    if load_error:
+        return [build_record(spec.name, configuration_item, error=load_error)]
+    event = build_change_event(spec.name, configuration_item, spec.rule_parameters)
+    if not is_applicable(configuration_item, event):
+        return [build_record(spec.name, configuration_item, "NOT_APPLICABLE")]
+    try:
+        if hasattr(rule, "evaluate_parameters"):
+            compliance_result = rule.evaluate_compliance(event, configuration_item, valid_rule_parameters)
+        else:
+            compliance_result = rule.evaluate_compliance(event, configuration_item)
+    except Exception as ex:
+        return [build_record(spec.name, configuration_item, error=repr(ex))]
+    return build_records(spec.name, configuration_item, compliance_result)
+
+
+def build_records(rule_name, configuration_item, compliance_result):
+    """Return the records of what evaluate_compliance() returned for a configuration item."""
+    if not compliance_result:
+        return []
+    if isinstance(compliance_result, str):
+        return [build_record(rule_name, configuration_item, compliance_result)]
+    if isinstance(compliance_result, dict):
+        compliance_result = [compliance_result]
+    if isinstance(compliance_result, list):
+        return [build_record(rule_name, configuration_item, evaluation=evaluation)
+                for evaluation in compliance_result if not has_missing_fields(evaluation)]
+    return [build_record(rule_name, configuration_item, "NOT_APPLICABLE")]
+
+
+def evaluate_items(spec, configuration_items):
+    """Return the records of the evaluation of configuration items by a rule with an evaluate_compliance_batch().
+
+    evaluate_compliance_batch(events, configuration_items, valid_rule_parameters) returns what evaluate_compliance()
+    would return for each applicable item, in one call: a naming rule matches the whole batch with one compiled matcher.
+    """
+    rule, valid_rule_parameters, load_error = _WORKER_RULES[spec.name]
+    if load_error:
+        return [build_record(spec.name, configuration_item, error=load_error) for configuration_item in configuration_items]
+    records = []
+    events = []
+    applicable_items = []
+    for configuration_item in configuration_items:
+        event = build_change_event(spec.name, configuration_item, spec.rule_parameters)
+        if is_applicable(configuration_item, event):
+            events.append(event)
+            applicable_items.append(configuration_item)
+        else:
+            records.append(build_record(spec.name, configuration_item, "NOT_APPLICABLE"))
+    if not applicable_items:
+        return records
+    try:
+        compliance_results = rule.evaluate_compliance_batch(events, applicable_items, valid_rule_parameters)
+    except Exception as ex:
+        return records + [build_record(spec.name, configuration_item, error=repr(ex)) for configuration_item in applicable_items]
+    for configuration_item, compliance_result in zip(applicable_items, compliance_results):
+        records.extend(build_records(spec.name, configuration_item, compliance_result))
+    return records
+
+
+def has_batch_evaluation(spec):
+    rule = _WORKER_RULES[spec.name][0]
+    return hasattr(rule, "evaluate_compliance_batch")
+
+
+def evaluate_batch(batch):
+    """Evaluate a list of (configuration item, rule specs) in a worker process.
+
+    Return the records and the number of evaluations and the milliseconds spent per rule.
+    """
+    records = []
+    timings = collections.defaultdict(lambda: [0, 0.0])
+    # The items of the rules evaluating a batch at once, by rule name
+    batched_items = collections.defaultdict(list)
+    batched_specs = {}
+    for configuration_item, specs in batch:
+        for spec in specs:
+            if has_batch_evaluation(spec):
+                batched_items[spec.name].append(configuration_item)
+                batched_specs[spec.name] = spec
+                continue
+            start = time.perf_counter()
+            records.extend(evaluate_item(spec, configuration_item))
+            timing = timings[spec.name]
+            timing[0] += 1
+            timing[1] += (time.perf_counter() - start) * 1000
+    for rule_name, configuration_items in batched_items.items():
+        start = time.perf_counter()
+        records.extend(evaluate_items(batched_specs[rule_name], configuration_items))
+        timing = timings[rule_name]
+        timing[0] += len(configuration_items)
+        timing[1] += (time.perf_counter() - start) * 1000
+    return records, dict(timings)
+
+
+def iter_batches(configuration_items, rule_specs, batch_size=DEFAULT_BATCH_SIZE, counters=None):
+    """Yield lists of (configuration item, matching rule specs), skipping the items no rule applies to."""
+    specs_by_type = collections.defaultdict(list)
+    for spec in rule_specs:
+        for resource_type in spec.resource_types:
+            specs_by_type[resource_type].append(spec)
+    batch = []
+    for configuration_item in configuration_items:
+        if counters is not None:
+            counters["ConfigurationItems"] += 1
+        specs = specs_by_type.get(configuration_item.get("resourceType"))
+        if not specs:
+            continue
+        batch.append((configuration_item, specs))
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def evaluate_snapshot(configuration_items, rule_specs, write_record, max_workers=None, batch_size=DEFAULT_BATCH_SIZE, verbose=False):
+    """Evaluate the configuration items with the rules, pass every record to write_record and return the counters of the run.
+
+    Keyword arguments:
+    configuration_items -- an iterable of configuration items, e.g. iter_snapshot_items()
+    rule_specs -- the RuleSpec of the rules to run, see discover_rules()
+    write_record -- a function called with each record, in the main process
+    max_workers -- the number of worker processes, 0 to evaluate in this process, for debugging: the AWS calls of the
+                   process stay blocked afterwards (default None, the number of CPUs)
+    batch_size -- the number of configuration items sent at once to a worker (default DEFAULT_BATCH_SIZE)
+    verbose -- keep what the rules print (default False)
+    """
+    counters = collections.Counter()
+    rule_timings = collections.defaultdict(lambda: [0, 0.0])
+
+    def collect(batch_result):
+        records, timings = batch_result
+        for record in records:
+            counters["Errors" if "Error" in record else "Evaluations"] += 1
+            write_record(record)
+        for rule_name, (count, millis) in timings.items():
+            rule_timings[rule_name][0] += count
+            rule_timings[rule_name][1] += millis
+
+    batches = iter_batches(configuration_items, rule_specs, batch_size, counters)
+    if max_workers == 0:
+        stdout = sys.stdout
+        try:
+            init_worker(rule_specs, verbose)
+            for batch in batches:
+                collect(evaluate_batch(batch))
+        finally:
+            sys.stdout = stdout
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker, initargs=(rule_specs, verbose)) as executor:
+            # A bounded window of batches in flight keeps the memory flat whatever the size of the snapshot
+            max_pending = 2 * (max_workers or os.cpu_count() or 1)
+            pending = collections.deque()
+            for batch in batches:
+                pending.append(executor.submit(evaluate_batch, batch))
+                if len(pending) >= max_pending:
+                    collect(pending.popleft().result())
+            while pending:
+                collect(pending.popleft().result())
+    counters["RuleTimings"] = dict(rule_timings)
+    return counters
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate the change-triggered rules over AWS Config snapshot files.")
+    parser.add_argument("snapshots", nargs="+", help="snapshot files (.json or .json.gz)")
+    parser.add_argument("--rules", nargs="*", help="the rules to run (default: every change-triggered rule)")
+    parser.add_argument("--output", default="-", help="the JSONL output file (default: stdout)")
+    parser.add_argument("--workers", type=int, default=None, help="the number of processes, 0 to run in this process (default: the number of CPUs)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--verbose", action="store_true", help="keep what the rules print")
+    args = parser.parse_args(argv)
+
+    rule_specs = discover_rules(rule_names=args.rules)
+    output_file = sys.stdout if args.output == "-" else open(args.output, "w")
+
+    def write_record(record):
+        output_file.write(json.dumps(record, default=str) + "\n")
+
+    def iter_all_items():
+        for snapshot in args.snapshots:
+            for configuration_item in iter_snapshot_items(snapshot):
+                yield configuration_item
+
+    start = time.perf_counter()
+    try:
+        counters = evaluate_snapshot(iter_all_items(), rule_specs, write_record, args.workers, args.batch_size, args.verbose)
+    finally:
+        if output_file is not sys.stdout:
+            output_file.close()
+    duration = time.perf_counter() - start
+
+    for rule_name, (count, millis) in sorted(counters["RuleTimings"].items()):
+        print("{}: {} configuration items, {:.3f} ms per item".format(rule_name, count, millis / count), file=sys.stderr)
+    print("{} configuration items, {} evaluations, {} errors, {} rules in {:.1f} s ({:.0f} items/s)".format(
+        counters["ConfigurationItems"], counters["Evaluations"], counters["Errors"], len(rule_specs), duration,
+        counters["ConfigurationItems"] / duration if duration else 0), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+try:
+    from unittest.mock import MagicMock, patch
+except ImportError:
+    from mock import MagicMock, patch
+
+from rule_runtime import snapshot
+
+FAKE_RULE_CODE = '''
+import boto3
+
+def evaluate_compliance(event, configuration_item, valid_rule_parameters):
+    if configuration_item['resourceId'] == 'sg-api':
+        boto3.client('ec2').describe_security_groups()
+    if configuration_item['configuration'].get('open'):
+        return valid_rule_parameters['NonCompliantType']
+    return {'ComplianceResourceType': configuration_item['resourceType'], 'ComplianceResourceId': configuration_item['resourceId'],
+            'ComplianceType': 'COMPLIANT', 'OrderingTimestamp': configuration_item['configurationItemCaptureTime']}
+
+def evaluate_parameters(rule_parameters):
+    return rule_parameters
+'''
+
+FAKE_BATCH_RULE_CODE = FAKE_RULE_CODE + '''
+BATCH_SIZES = []
+
+def evaluate_compliance_batch(events, configuration_items, valid_rule_parameters):
+    BATCH_SIZES.append(len(configuration_items))
+    return [evaluate_compliance(event, configuration_item, valid_rule_parameters) for event, configuration_item in zip(events, configuration_items)]
+'''
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.write_rule('FAKE_SNAPSHOT_SG_RULE', {'SourceEvents': 'AWS::EC2::SecurityGroup', 'InputParameters': '{"NonCompliantType": "NON_COMPLIANT"}'})
+        self.write_rule('FAKE_SNAPSHOT_PERIODIC_RULE', {'SourcePeriodic': 'One_Hour'})
+
+    def write_rule(self, name, parameters, code=FAKE_RULE_CODE):
+        os.makedirs(os.path.join(self.directory, name))
+        with open(os.path.join(self.directory, name, name + '.py'), 'w') as rule_file:
+            rule_file.write(code)
+        with open(os.path.join(self.directory, name, 'parameters.json'), 'w') as parameters_file:
+            json.dump({'Parameters': parameters}, parameters_file)
+
+    def write_snapshot(self, configuration_items, name='snapshot.json.gz'):
+        path = os.path.join(self.directory, name)
+        opener = gzip.open if name.endswith('.gz') else open
+        with opener(path, 'wt') as snapshot_file:
+            json.dump({'fileVersion': '1.0', 'configSnapshotId': 'id', 'configurationItems': configuration_items}, snapshot_file, indent=1)
+        return path
+
+    def test_iter_snapshot_items(self):
+        items = [build_configuration_item('sg-{}'.format(i)) for i in range(50)]
+        for name in ('snapshot.json', 'snapshot.json.gz'):
+            path = self.write_snapshot(items, name)
+            self.assertEqual(items, list(snapshot.iter_snapshot_items(path, chunk_size=7)))
+        self.assertEqual([], list(snapshot.iter_snapshot_items(self.write_snapshot([], 'empty.json'))))
+
+    def test_truncated_snapshot(self):
+        path = os.path.join(self.directory, 'truncated.json')
+        with open(path, 'w') as snapshot_file:
+            snapshot_file.write(json.dumps({'configurationItems': [build_configuration_item('sg-1'), build_configuration_item('sg-2')]})[:-40])
+        with self.assertRaises(ValueError):
+            list(snapshot.iter_snapshot_items(path, chunk_size=16))
+
+    def test_discover_change_triggered_rules(self):
+        specs = snapshot.discover_rules(self.directory)
+        self.assertEqual(['FAKE_SNAPSHOT_SG_RULE'], [spec.name for spec in specs])
+        self.assertEqual(['AWS::EC2::SecurityGroup'], specs[0].resource_types)
+        self.assertEqual({'NonCompliantType': 'NON_COMPLIANT'}, specs[0].rule_parameters)
+        self.assertRaises(ValueError, snapshot.discover_rules, self.directory, ['FAKE_SNAPSHOT_PERIODIC_RULE'])
+
+    def test_discover_rules_also_periodic(self):
+        self.write_rule('FAKE_SNAPSHOT_BOTH_RULE', {'SourcePeriodic': 'TwentyFour_Hours', 'SourceEvents': 'AWS::IAM::Role'})
+        self.assertEqual(['FAKE_SNAPSHOT_BOTH_RULE', 'FAKE_SNAPSHOT_SG_RULE'], [spec.name for spec in snapshot.discover_rules(self.directory)])
+        rule_names = ['IAM_GROUP_NO_POLICY_FULL_STAR', 'IAM_ROLE_NO_POLICY_FULL_STAR', 'IAM_USER_NO_POLICY_FULL_STAR', 'LAMBDA_ROLE_ALLOWED_ON_LOGGING']
+        self.assertEqual(rule_names, [spec.name for spec in snapshot.discover_rules() if spec.name in rule_names])
+
+    def test_evaluate_snapshot(self):
+        configuration_items = [build_configuration_item('sg-1'), build_configuration_item('sg-2', open=True), build_configuration_item('sg-api'),
+                               build_configuration_item('sg-3', status='ResourceDeleted'), build_configuration_item('bucket', 'AWS::S3::Bucket')]
+        path = self.write_snapshot(configuration_items)
+        for max_workers in (0, 2):
+            records = []
+            # The in-process run must not block the boto3 of the other tests
+            with patch.dict(sys.modules, {'boto3': MagicMock()}):
+                counters = snapshot.evaluate_snapshot(snapshot.iter_snapshot_items(path), snapshot.discover_rules(self.directory), records.append,
+                                                      max_workers=max_workers, batch_size=2)
+            by_resource = {record['ComplianceResourceId']: record for record in records}
+            self.assertEqual(4, len(records))
+            self.assertEqual('COMPLIANT', by_resource['sg-1']['ComplianceType'])
+            self.assertEqual('NON_COMPLIANT', by_resource['sg-2']['ComplianceType'])
+            self.assertEqual('NOT_APPLICABLE', by_resource['sg-3']['ComplianceType'])
+            self.assertEqual(('FAKE_SNAPSHOT_SG_RULE', '123456789012'), (by_resource['sg-1']['ConfigRuleName'], by_resource['sg-1']['AwsAccountId']))
+            self.assertIn('OfflineError', by_resource['sg-api']['Error'])
+            self.assertEqual((5, 3, 1), (counters['ConfigurationItems'], counters['Evaluations'], counters['Errors']))
+            self.assertEqual(4, counters['RuleTimings']['FAKE_SNAPSHOT_SG_RULE'][0])
+
+    def test_evaluate_snapshot_in_batches(self):
+        self.write_rule('FAKE_SNAPSHOT_BATCH_RULE', {'SourceEvents': 'AWS::EC2::SecurityGroup', 'InputParameters': '{"NonCompliantType": "NON_COMPLIANT"}'},
+                        FAKE_BATCH_RULE_CODE)
+        configuration_items = [build_configuration_item('sg-1'), build_configuration_item('sg-2', open=True),
+                               build_configuration_item('sg-3', status='ResourceDeleted'), build_configuration_item('sg-api')]
+        records = []
+        with patch.dict(sys.modules, {'boto3': MagicMock()}):
+            counters = snapshot.evaluate_snapshot(iter(configuration_items), snapshot.discover_rules(self.directory, ['FAKE_SNAPSHOT_BATCH_RULE']),
+                                                  records.append, max_workers=0, batch_size=3)
+            self.assertEqual([2, 1], sys.modules['FAKE_SNAPSHOT_BATCH_RULE'].BATCH_SIZES)
+        by_resource = {record['ComplianceResourceId']: record for record in records}
+        self.assertEqual(['COMPLIANT', 'NON_COMPLIANT', 'NOT_APPLICABLE'], [by_resource[resource_id]['ComplianceType'] for resource_id in ('sg-1', 'sg-2', 'sg-3')])
+        # An error fails every item of the call
+        self.assertIn('OfflineError', by_resource['sg-api']['Error'])
+        self.assertEqual((3, 1), (counters['Evaluations'], counters['Errors']))
+        self.assertEqual(4, counters['RuleTimings']['FAKE_SNAPSHOT_BATCH_RULE'][0])
+
+def build_configuration_item(resource_id, resource_type='AWS::EC2::SecurityGroup', status='OK', **configuration):
+    return {
+        'configurationItemCaptureTime': '2019-03-17T03:37:52.418Z',
+        'configurationItemStatus': status,
+        'awsAccountId': '123456789012',
+        'awsRegion': 'us-east-1',
+        'resourceType': resource_type,
+        'resourceId': resource_id,
+        'configuration': configuration,
+    }
@@ -0,0 +1,170 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+'''
+Concurrent PutEvaluations submitter.
+
+Evaluations are sent by chunks of 100 (the PutEvaluations limit) through a bounded pool of
+threads. A chunk failing on throttling or on a 5xx error is retried with a jittered exponential
+backoff, and the producer is blocked while too many chunks are waiting to be sent, so a
+generator of evaluations is never fully materialised.
+'''
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Maximum number of evaluations accepted by PutEvaluations
+MAX_EVALUATIONS_PER_CALL = 100
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_MAX_ATTEMPTS = 6
+DEFAULT_BASE_DELAY_SECONDS = 0.2
+DEFAULT_MAX_DELAY_SECONDS = 10
+
+THROTTLING_ERROR_CODES = ("Throttling", "ThrottlingException", "ThrottledException", "TooManyRequestsException",
+                          "RequestLimitExceeded", "RequestThrottled", "RequestThrottledException", "ProvisionedThroughputExceededException")
+
+
+def is_retryable_error(exception):
+    """Return True when the PutEvaluations call failed on throttling or on a service side error."""
+    import botocore
+    if not isinstance(exception, botocore.exceptions.ClientError):
+        return isinstance(exception, (botocore.exceptions.ConnectionError, botocore.exceptions.HTTPClientError))
+    error_code = exception.response["Error"]["Code"]
+    status_code = exception.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+    return (error_code in THROTTLING_ERROR_CODES or error_code.startswith("5") or status_code >= 500
+            or "InternalError" in error_code or "ServiceUnavailable" in error_code)
+
+
+def iter_chunks(evaluations, size=MAX_EVALUATIONS_PER_CALL):
+    """Yield lists of at most size evaluations from any iterable of evaluations."""
+    chunk = []
+    for evaluation in evaluations:
+        chunk.append(evaluation)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class ChunkReport():
+    """Outcome of the submission of one chunk of evaluations."""
+
+    def __init__(self, index, size):
+        self.index = index
+        self.size = size
+        self.attempts = 0
+        self.latency_ms = 0.0
+        self.failed_evaluations = []
+
+    def __repr__(self):
+        return "ChunkReport(index={}, size={}, attempts={}, latency_ms={:.1f}, failed_evaluations={})".format(
+            self.index, self.size, self.attempts, self.latency_ms, len(self.failed_evaluations))
+
+
+class EvaluationSubmitter():
+    """Send evaluations to AWS Config by chunks of 100 through a bounded pool of threads.
+
+    Keyword arguments:
+    config_client -- the AWS Config boto client (boto clients are thread safe)
+    result_token -- the resultToken of the event given in the lambda handler
+    test_mode -- the TestMode of PutEvaluations (default False)
+    max_workers -- the number of concurrent PutEvaluations calls (default DEFAULT_MAX_WORKERS)
+    max_attempts -- the number of attempts per chunk before giving up (default DEFAULT_MAX_ATTEMPTS)
+    base_delay -- the first backoff delay in seconds, doubled on each retry (default DEFAULT_BASE_DELAY_SECONDS)
+    max_delay -- the maximum backoff delay in seconds (default DEFAULT_MAX_DELAY_SECONDS)
+    max_pending_chunks -- the number of chunks queued or in flight before submit() blocks (default 2 * max_workers)
+    """
+
+    def __init__(self, config_client, result_token, test_mode=False, max_workers=DEFAULT_MAX_WORKERS,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS, base_delay=DEFAULT_BASE_DELAY_SECONDS,
+                 max_delay=DEFAULT_MAX_DELAY_SECONDS, max_pending_chunks=None):
+        self.config_client = config_client
+        self.result_token = result_token
+        self.test_mode = test_mode
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.reports = []
+        self._futures = []
+        self._pending = threading.BoundedSemaphore(max_pending_chunks or 2 * max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type:
+            self._executor.shutdown(wait=True)
+            return False
+        self.wait()
+        return False
+
+    def submit(self, evaluations):
+        """Queue an iterable of evaluations. Block while max_pending_chunks chunks are not sent yet."""
+        for chunk in iter_chunks(evaluations):
+            self._pending.acquire()
+            report = ChunkReport(len(self.reports), len(chunk))
+            self.reports.append(report)
+            try:
+                self._futures.append(self._executor.submit(self._send, chunk, report))
+            except Exception:
+                self._pending.release()
+                raise
+
+    def wait(self):
+        """Wait for every queued chunk, raise the first error of a chunk and return the chunk reports."""
+        try:
+            for future in self._futures:
+                future.result()
+        finally:
+            self._executor.shutdown(wait=True)
+        if self.reports:
+            print(summarize_reports(self.reports))
+        return self.reports
+
+    def _send(self, chunk, report):
+        start = time.perf_counter()
+        try:
+            while True:
+                report.attempts += 1
+                try:
+                    response = self.config_client.put_evaluations(Evaluations=chunk, ResultToken=self.result_token, TestMode=self.test_mode)
+                    break
+                except Exception as ex:
+                    if report.attempts >= self.max_attempts or not is_retryable_error(ex):
+                        raise
+                    time.sleep(self.backoff_delay(report.attempts))
+            if isinstance(response, dict):
+                report.failed_evaluations = response.get("FailedEvaluations", [])
+        finally:
+            report.latency_ms = (time.perf_counter() - start) * 1000
+            self._pending.release()
+
+    def backoff_delay(self, attempt):
+        """Return a delay picked uniformly between 0 and the exponential backoff of the attempt (full jitter)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+
+def summarize_reports(reports):
+    latencies = sorted(report.latency_ms for report in reports)
+    return "PutEvaluations: {} evaluations in {} chunks, {} retries, {} failed evaluations, chunk latency ms min/median/max: {:.1f}/{:.1f}/{:.1f}".format(
+        sum(report.size for report in reports), len(reports), sum(report.attempts - 1 for report in reports),
+        sum(len(report.failed_evaluations) for report in reports), latencies[0], latencies[len(latencies) // 2], latencies[-1])
+
+
+def submit_evaluations(config_client, evaluations, result_token, test_mode=False, **kwargs):
+    """Send an iterable of evaluations to AWS Config and return the chunk reports.
+
+    Keyword arguments:
+    config_client -- the AWS Config boto client
+    evaluations -- any iterable of evaluation dictionaries
+    result_token -- the resultToken of the event given in the lambda handler
+    test_mode -- the TestMode of PutEvaluations (default False)
+    kwargs -- the tuning arguments of EvaluationSubmitter
+    """
+    with EvaluationSubmitter(config_client, result_token, test_mode, **kwargs) as submitter:
+        submitter.submit(evaluations)
+    return submitter.reports
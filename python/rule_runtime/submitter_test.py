@@ -0,0 +1,92 @@
+#
+# This file made available under CC0 1.0 Universal (https://creativecommons.org/publicdomain/zero/1.0/legalcode)
+#
+import threading
+import time
+import unittest
+try:
+    from unittest.mock import MagicMock, ANY
+except ImportError:
+    from mock import MagicMock, ANY
+from botocore.exceptions import ClientError
+
+from rule_runtime import submitter
+
+class TestSubmitEvaluations(unittest.TestCase):
+
+    def test_chunks_of_100(self):
+        config_client = MagicMock()
+        reports = submitter.submit_evaluations(config_client, build_evaluations(250), 'token', True)
+        self.assertEqual([100, 100, 50], [report.size for report in reports])
+        self.assertEqual([50, 100, 100], sorted(len(call[1]['Evaluations']) for call in config_client.put_evaluations.call_args_list))
+        config_client.put_evaluations.assert_called_with(Evaluations=ANY, ResultToken='token', TestMode=True)
+
+    def test_no_evaluation(self):
+        config_client = MagicMock()
+        self.assertEqual([], submitter.submit_evaluations(config_client, [], 'token'))
+        config_client.put_evaluations.assert_not_called()
+
+    def test_throttled_chunk_retried(self):
+        config_client = MagicMock()
+        config_client.put_evaluations = MagicMock(side_effect=[build_client_error('ThrottlingException', 400), build_client_error('ServiceUnavailable', 503), {'FailedEvaluations': []}])
+        reports = submitter.submit_evaluations(config_client, build_evaluations(10), 'token', base_delay=0)
+        self.assertEqual(3, reports[0].attempts)
+        self.assertTrue(reports[0].latency_ms >= 0)
+
+    def test_customer_error_not_retried(self):
+        config_client = MagicMock()
+        config_client.put_evaluations = MagicMock(side_effect=build_client_error('InvalidParameterValueException', 400))
+        with self.assertRaises(ClientError):
+            submitter.submit_evaluations(config_client, build_evaluations(10), 'token', base_delay=0)
+        self.assertEqual(1, config_client.put_evaluations.call_count)
+
+    def test_retries_exhausted(self):
+        config_client = MagicMock()
+        config_client.put_evaluations = MagicMock(side_effect=build_client_error('ThrottlingException', 400))
+        with self.assertRaises(ClientError):
+            submitter.submit_evaluations(config_client, build_evaluations(10), 'token', max_attempts=3, base_delay=0)
+        self.assertEqual(3, config_client.put_evaluations.call_count)
+
+    def test_failed_evaluations_reported(self):
+        config_client = MagicMock()
+        config_client.put_evaluations = MagicMock(return_value={'FailedEvaluations': [{'ComplianceResourceId': 'id-1'}]})
+        reports = submitter.submit_evaluations(config_client, build_evaluations(1), 'token')
+        self.assertEqual([{'ComplianceResourceId': 'id-1'}], reports[0].failed_evaluations)
+
+    def test_concurrent_and_bounded(self):
+        in_flight = []
+        max_in_flight = []
+        lock = threading.Lock()
+        def put_evaluations(**kwargs):
+            with lock:
+                in_flight.append(1)
+                max_in_flight.append(len(in_flight))
+            time.sleep(0.02)
+            with lock:
+                in_flight.pop()
+        config_client = MagicMock()
+        config_client.put_evaluations = MagicMock(side_effect=put_evaluations)
+        def evaluations():
+            for evaluation in build_evaluations(2000):
+                yield evaluation
+        with submitter.EvaluationSubmitter(config_client, 'token', max_workers=4, max_pending_chunks=4) as evaluation_submitter:
+            evaluation_submitter.submit(evaluations())
+        self.assertEqual(20, config_client.put_evaluations.call_count)
+        self.assertTrue(1 < max(max_in_flight) <= 4)
+
+    def test_backoff_delay_bounded(self):
+        evaluation_submitter = submitter.EvaluationSubmitter(MagicMock(), 'token', base_delay=1, max_delay=5)
+        for attempt in range(1, 10):
+            self.assertTrue(0 <= evaluation_submitter.backoff_delay(attempt) <= min(5, 2 ** (attempt - 1)))
+        evaluation_submitter.wait()
+
+####################
+# Helper Functions #
+####################
+
+def build_evaluations(count):
+    return [{'ComplianceResourceType': 'AWS::IAM::User', 'ComplianceResourceId': 'user-{}'.format(i),
+             'ComplianceType': 'COMPLIANT', 'OrderingTimestamp': '2017-12-23T22:11:18.158Z'} for i in range(count)]
+
+def build_client_error(code, status_code):
+    return ClientError({'Error': {'Code': code, 'Message': code}, 'ResponseMetadata': {'HTTPStatusCode': status_code}}, 'PutEvaluations')